@@ -0,0 +1,180 @@
+# =================================================================
+# ADMISION.PY (v1.0 - Control de Admisión por Carriles)
+# =================================================================
+# Decide qué peticiones entran a ejecutarse y cuáles se rechazan al
+# momento con un "ocupado", para que una avalancha de charla no retrase
+# los turnos rápidos de la máquina de estados.
+# - Dos carriles independientes: 'local' (se resuelve en el proceso: modos
+#   Ticket/Diseño, consultas al archivo) y 'remoto' (espera a un LLM). Cada
+#   carril tiene su propia concurrencia, su cola acotada y una espera
+#   máxima: llenar el carril remoto nunca ocupa plazas del local.
+# - Límite por cliente (usuario o sesión) con un cubo de fichas por carril:
+#   un cliente que inunda la charla no agota el servicio de los demás.
+# - Rechazar es barato: no se abre memoria ni se llama al skillset, y la
+#   respuesta indica en cuántos segundos conviene reintentar.
+# - Todo ocurre en el bucle de eventos del worker (sin candados); las
+#   profundidades de cola y los tiempos de espera se publican en /metrics
+#   y en /estadisticas.
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from metricas import REGISTRO
+
+CARRILES = ("local", "remoto")
+
+ESPERA_ADMISION = REGISTRO.histograma(
+    "ale_admision_espera_segundos", "Tiempo en cola hasta entrar en el carril.", ["carril"])
+RECHAZOS_ADMISION = REGISTRO.contador(
+    "ale_admision_rechazos", "Peticiones rechazadas por el control de admisión.", ["carril", "motivo"])
+EN_COLA_ADMISION = REGISTRO.medidor(
+    "ale_admision_en_cola", "Peticiones esperando plaza en el carril.", ["carril"])
+EN_CURSO_ADMISION = REGISTRO.medidor(
+    "ale_admision_en_curso", "Peticiones ejecutándose en el carril.", ["carril"])
+
+
+class Ocupado(Exception):
+    """La petición no se admite: 'motivo' es cola_llena, espera_agotada o limite_cliente."""
+
+    def __init__(self, carril, motivo, reintentar_en):
+        super().__init__(f"Carril '{carril}' ocupado ({motivo}).")
+        self.carril = carril
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+
+class Carril:
+    def __init__(self, nombre, concurrencia, cola, espera_maxima):
+        self.nombre = nombre
+        self.concurrencia = max(1, concurrencia)
+        self.max_cola = max(0, cola)
+        self.espera_maxima = espera_maxima
+        self._semaforo = asyncio.Semaphore(self.concurrencia)
+        self.en_cola = 0
+        self.en_curso = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self._medidor_cola = EN_COLA_ADMISION.con(nombre).leer_de(lambda: self.en_cola)
+        self._medidor_curso = EN_CURSO_ADMISION.con(nombre).leer_de(lambda: self.en_curso)
+        self._espera = ESPERA_ADMISION.con(nombre)
+
+    def _rechazar(self, motivo, reintentar_en):
+        self.rechazadas += 1
+        RECHAZOS_ADMISION.con(self.nombre, motivo).inc()
+        raise Ocupado(self.nombre, motivo, reintentar_en)
+
+    async def entrar(self):
+        """Espera plaza (como mucho 'espera_maxima') o lanza Ocupado."""
+        inicio = time.perf_counter()
+        if self._semaforo.locked():
+            if self.en_cola >= self.max_cola:
+                self._rechazar("cola_llena", self.espera_maxima)
+            self.en_cola += 1
+            try:
+                await asyncio.wait_for(self._semaforo.acquire(), self.espera_maxima)
+            except asyncio.TimeoutError:
+                self._rechazar("espera_agotada", self.espera_maxima)
+            finally:
+                self.en_cola -= 1
+        else:
+            await self._semaforo.acquire()
+        espera = time.perf_counter() - inicio
+        self._espera.observar(espera)
+        self.espera_total += espera
+        self.espera_max = max(self.espera_max, espera)
+        self.admitidas += 1
+        self.en_curso += 1
+
+    def salir(self):
+        self.en_curso -= 1
+        self._semaforo.release()
+
+    def estadisticas(self):
+        return {
+            "concurrencia": self.concurrencia,
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "max_cola": self.max_cola,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+            "espera_media_ms": round(self.espera_total / self.admitidas * 1000, 2) if self.admitidas else 0.0,
+            "espera_max_ms": round(self.espera_max * 1000, 2),
+        }
+
+
+class LimitadorClientes:
+    """Cubo de fichas por cliente: 'tasa' fichas por segundo, acumulables hasta 'rafaga'."""
+
+    def __init__(self, tasa, rafaga, capacidad=10000):
+        self.tasa = tasa
+        self.rafaga = max(1.0, rafaga)
+        self.capacidad = capacidad
+        self._cubos = OrderedDict()
+
+    def tomar(self, cliente):
+        """Gasta una ficha del cliente. Devuelve 0 si la había, o los segundos que faltan para la siguiente."""
+        if self.tasa <= 0:
+            return 0.0
+        ahora = time.monotonic()
+        fichas, ultima = self._cubos.pop(cliente, (self.rafaga, ahora))
+        fichas = min(self.rafaga, fichas + (ahora - ultima) * self.tasa)
+        if fichas >= 1.0:
+            fichas -= 1.0
+            espera = 0.0
+        else:
+            espera = (1.0 - fichas) / self.tasa
+        self._cubos[cliente] = (fichas, ahora)
+        while len(self._cubos) > self.capacidad:
+            self._cubos.popitem(last=False)
+        return espera
+
+
+class ControlAdmision:
+    def __init__(self, carriles, limitadores):
+        self.carriles = carriles
+        self.limitadores = limitadores
+
+    def limitar(self, carril, cliente):
+        """Aplica el límite por cliente del carril; lanza Ocupado si se ha superado."""
+        limitador = self.limitadores.get(carril)
+        if not cliente or limitador is None:
+            return
+        espera = limitador.tomar(cliente)
+        if espera:
+            self.carriles[carril]._rechazar("limite_cliente", round(espera, 2))
+
+    async def entrar(self, carril, cliente=None):
+        """Ocupa una plaza del carril (tras el límite del cliente) o lanza Ocupado."""
+        self.limitar(carril, cliente)
+        await self.carriles[carril].entrar()
+
+    def salir(self, carril):
+        self.carriles[carril].salir()
+
+    def estadisticas(self):
+        return {nombre: carril.estadisticas() for nombre, carril in self.carriles.items()}
+
+
+def crear_control_admision():
+    """
+    Construye el control de admisión según las variables ALE_CARRIL_<CARRIL>_*
+    (CONCURRENCIA, COLA, ESPERA_S, TASA_CLIENTE y RAFAGA_CLIENTE; una tasa de 0
+    desactiva el límite por cliente). Con el servidor Flask cada petición en
+    cola ocupa un hilo: la concurrencia más la cola del carril remoto debe
+    quedar por debajo de los hilos del worker.
+    """
+    por_defecto = {
+        "local": {"CONCURRENCIA": "64", "COLA": "256", "ESPERA_S": "5", "TASA_CLIENTE": "20", "RAFAGA_CLIENTE": "40"},
+        "remoto": {"CONCURRENCIA": "16", "COLA": "16", "ESPERA_S": "2", "TASA_CLIENTE": "0.5", "RAFAGA_CLIENTE": "4"},
+    }
+    carriles, limitadores = {}, {}
+    for nombre in CARRILES:
+        def valor(clave):
+            return float(os.environ.get(f"ALE_CARRIL_{nombre.upper()}_{clave}", por_defecto[nombre][clave]))
+        carriles[nombre] = Carril(nombre, int(valor("CONCURRENCIA")), int(valor("COLA")), valor("ESPERA_S"))
+        limitadores[nombre] = LimitadorClientes(valor("TASA_CLIENTE"), valor("RAFAGA_CLIENTE"))
+    return ControlAdmision(carriles, limitadores)
@@ -4,47 +4,547 @@
 # Este es el motor central. Actúa como un recepcionista que dirige
 # las peticiones al especialista (skillset) adecuado.
 
+import asyncio
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+
+import registro_skillsets
+from admision import CARRILES, Ocupado, crear_control_admision
+from metricas import LATENCIA_PETICION, PETICIONES, PETICIONES_EN_VUELO
+from sesiones import calcular_delta, crear_almacen_sesiones
+
+def _modo_de(datos_peticion):
+    """Modo de conversación de la petición, para etiquetar sus métricas."""
+    estado = datos_peticion.get("estado_conversacion")
+    modo = estado.get("modo") if isinstance(estado, dict) else None
+    return modo if isinstance(modo, str) else "libre"
+
+
+def _cliente_de(datos_peticion):
+    """Clave del límite por cliente: el usuario o, sin él, la sesión."""
+    cliente = datos_peticion.get("usuario_id") or datos_peticion.get("sesion_token")
+    return cliente if isinstance(cliente, str) else None
+
+
 class ALE_Core:
-    def __init__(self):
+    # Máximo de comandos aceptados en una sola petición por lotes.
+    MAX_LOTE = 200
+    # Máximo de skillsets a los que se reparte un mismo comando (abanico).
+    MAX_ABANICO = 8
+    # Plazo en segundos para los skillsets de un abanico que no declaren el suyo.
+    TIEMPO_LIMITE_ABANICO = 30.0
+    # Respuestas recordadas por 'id_peticion' (reenvíos de la cola offline de la PWA).
+    MAX_RESPUESTAS_RECORDADAS = 4096
+    # Respuesta inmediata cuando el control de admisión rechaza una petición.
+    MENSAJE_OCUPADO = "A.L.E. está atendiendo demasiadas peticiones ahora mismo. Inténtalo de nuevo en unos segundos."
+
+    def __init__(self, sesiones=None, admision=None):
         """
         Inicializa el motor A.L.E. y prepara el diccionario
         para almacenar los skillsets que se carguen.
+        'sesiones' es el almacén del estado de conversación en el servidor
+        (por defecto, el que indiquen las variables ALE_SESIONES*) y
+        'admision' el control de carriles y límites por cliente (por
+        defecto, el que indiquen las variables ALE_CARRIL_*).
         """
         self._skillsets = {}
+        # Skillsets registrados por ruta ("modulo:Clase") que aún no se han creado.
+        self._perezosos = {}
+        # Plazo propio de cada skillset cuando se ejecuta dentro de un abanico.
+        self._tiempos_limite = {}
+        self._candado_carga = threading.Lock()
+        # (usuario_id, id_peticion) -> respuesta ya dada, en orden de llegada.
+        self._respuestas_recordadas = OrderedDict()
+        self.sesiones = sesiones or crear_almacen_sesiones()
+        self.admision = admision or crear_control_admision()
         print("✅ Motor A.L.E. Core v1.0 (Estable) inicializado.")
 
-    def cargar_skillset(self, nombre, instancia_skillset):
+    def cargar_skillset(self, nombre, instancia_skillset, tiempo_limite=None):
         """
         Carga una instancia de un skillset en el motor.
         El 'nombre' es la clave que usará la PWA para llamar a este skillset.
         """
         self._skillsets[nombre] = instancia_skillset
+        if tiempo_limite:
+            self._tiempos_limite[nombre] = float(tiempo_limite)
         print(f"    -> Skillset '{nombre}' cargado en el motor.")
 
-    async def procesar_peticion(self, datos_peticion):
+    def registrar_skillset(self, nombre, ruta, tiempo_limite=None):
+        """
+        Registra un skillset de forma perezosa por su ruta de importación
+        ("modulo:Clase"). El módulo no se importa ni la clase se instancia
+        hasta la primera petición que lo necesite (arranque en frío rápido).
+        """
+        if ":" not in ruta:
+            raise ValueError(f"Ruta de skillset inválida '{ruta}': se esperaba 'modulo:Clase'.")
+        self._perezosos[nombre] = ruta
+        if tiempo_limite:
+            self._tiempos_limite[nombre] = float(tiempo_limite)
+        print(f"    -> Skillset '{nombre}' registrado ({ruta}); se cargará en su primer uso.")
+
+    def descubrir_skillsets(self, nombre_paquete="skillsets"):
+        """
+        Registra (de forma perezosa) todos los skillsets que declaran 'SKILLSET'
+        en el paquete y los publicados en el grupo de entry points 'ale.skillsets'.
+        Devuelve la lista de nombres registrados.
+        """
+        encontrados = registro_skillsets.descubrir(nombre_paquete)
+        for nombre, entrada in sorted(encontrados.items()):
+            if nombre in self._skillsets:
+                continue
+            self.registrar_skillset(nombre, entrada["ruta"], entrada["tiempo_limite"])
+        return sorted(encontrados)
+
+    def _obtener_skillset(self, nombre):
+        """Devuelve la instancia del skillset, creándola si solo estaba registrado."""
+        skillset = self._skillsets.get(nombre)
+        if skillset is not None or nombre not in self._perezosos:
+            return skillset
+        with self._candado_carga:
+            # Otro hilo (p. ej. el precalentamiento) pudo crearlo mientras esperábamos.
+            skillset = self._skillsets.get(nombre)
+            if skillset is None:
+                nombre_modulo, nombre_clase = self._perezosos[nombre].split(":", 1)
+                inicio = time.perf_counter()
+                clase = getattr(importlib.import_module(nombre_modulo), nombre_clase)
+                skillset = clase()
+                self._skillsets[nombre] = skillset
+                del self._perezosos[nombre]
+                print(f"    -> Skillset '{nombre}' cargado en su primer uso ({(time.perf_counter() - inicio) * 1000:.0f} ms).")
+        return skillset
+
+    async def _obtener_skillset_async(self, nombre):
+        if not isinstance(nombre, str):
+            return None
+        if nombre in self._perezosos:
+            # Importar e instanciar puede tardar: se hace fuera del bucle de eventos.
+            return await asyncio.to_thread(self._obtener_skillset, nombre)
+        return self._skillsets.get(nombre)
+
+    def precalentar(self):
+        """Crea en segundo plano los skillsets registrados, sin bloquear el arranque."""
+        def cargar_todos():
+            for nombre in list(self._perezosos):
+                try:
+                    self._obtener_skillset(nombre)
+                except Exception as e:
+                    print(f"🚨 ERROR al precalentar el skillset '{nombre}': {e}")
+        threading.Thread(target=cargar_todos, name="ale-precalentar", daemon=True).start()
+
+    async def procesar_peticion(self, datos_peticion, carriles_limitados=CARRILES):
         """
         El punto de entrada principal para todas las llamadas desde el main.py.
         Lee la petición, encuentra el skillset solicitado y le pasa el trabajo.
+        Si la petición trae 'sesion_token', el estado vive en el servidor.
+        Antes de ejecutarse pasa por el control de admisión (ver '_admitir');
+        el límite por cliente solo se aplica en 'carriles_limitados'.
+        """
+        if "sesion_token" in datos_peticion:
+            token, estado_anterior, datos_peticion = self._abrir_sesion(datos_peticion)
+            respuesta = await self._despachar_admitido(datos_peticion, carriles_limitados)
+            return self._cerrar_sesion(token, estado_anterior, respuesta)
+        return await self._despachar_admitido(datos_peticion, carriles_limitados)
+
+    # --- CONTROL DE ADMISIÓN ---
+    async def _carril_de(self, datos_peticion):
+        """
+        'remoto' si algún skillset destino dice que la petición esperará a un
+        servicio externo (método 'carril'); 'local' en otro caso.
+        """
+        objetivos = datos_peticion.get("skillset_target")
+        if not isinstance(objetivos, list):
+            objetivos = [objetivos]
+        for nombre in objetivos[:self.MAX_ABANICO]:
+            skillset = await self._obtener_skillset_async(nombre)
+            if hasattr(skillset, "carril") and skillset.carril(datos_peticion) == "remoto":
+                return "remoto"
+        return "local"
+
+    async def _admitir(self, datos_peticion, carriles_limitados):
+        """
+        Clasifica la petición en su carril y espera plaza en él. Devuelve el
+        carril, o lanza Ocupado si el cliente superó su límite o el carril
+        está saturado.
         """
+        carril = await self._carril_de(datos_peticion)
+        await self.admision.entrar(carril, _cliente_de(datos_peticion) if carril in carriles_limitados else None)
+        return carril
+
+    def _respuesta_ocupado(self, datos_peticion, ocupado):
+        """Respuesta rápida de rechazo. El estado de conversación no cambia."""
+        respuesta = {
+            "mensaje_para_ui": self.MENSAJE_OCUPADO,
+            "ocupado": True,
+            "carril": ocupado.carril,
+            "reintentar_en": ocupado.reintentar_en,
+        }
+        if "estado_conversacion" in datos_peticion:
+            respuesta["nuevo_estado"] = datos_peticion["estado_conversacion"]
+        return respuesta
+
+    async def _despachar_admitido(self, datos_peticion, carriles_limitados):
+        try:
+            carril = await self._admitir(datos_peticion, carriles_limitados)
+        except Ocupado as ocupado:
+            return self._respuesta_ocupado(datos_peticion, ocupado)
+        try:
+            return await self._despachar(datos_peticion)
+        finally:
+            self.admision.salir(carril)
+
+    # --- SESIONES EN EL SERVIDOR ---
+    def _abrir_sesion(self, datos_peticion):
+        """
+        Resuelve el token de la petición (o crea uno nuevo) y le inyecta el
+        estado guardado. Un 'estado_conversacion' explícito tiene prioridad:
+        así el cliente puede sembrar o resincronizar la sesión.
+        """
+        token = datos_peticion.get("sesion_token")
+        if "estado_conversacion" in datos_peticion:
+            estado = datos_peticion["estado_conversacion"]
+        else:
+            estado = self.sesiones.obtener(token)
+        if not self.sesiones.token_valido(token):
+            token = self.sesiones.nuevo_token()
+        datos_peticion = {**datos_peticion, "sesion_token": token}
+        if estado is not None:
+            datos_peticion["estado_conversacion"] = estado
+        return token, estado, datos_peticion
+
+    def _cerrar_sesion(self, token, estado_anterior, respuesta):
+        """Guarda el nuevo estado y sustituye 'nuevo_estado' por su delta."""
+        estado_nuevo = respuesta.pop("nuevo_estado", estado_anterior)
+        if estado_nuevo is not None:
+            self.sesiones.guardar(token, estado_nuevo)
+        respuesta["sesion_token"] = token
+        respuesta["estado_delta"] = calcular_delta(estado_anterior, estado_nuevo)
+        return respuesta
+
+    async def _despachar(self, datos_peticion):
         # Extrae el nombre del skillset que la PWA quiere usar.
         nombre_skillset = datos_peticion.get("skillset_target")
 
         if not nombre_skillset:
             return {"error": "Petición inválida: No se especificó un 'skillset_target'."}
 
+        # Una lista de skillsets reparte el comando entre todos ellos (abanico).
+        if isinstance(nombre_skillset, list):
+            return await self._despachar_abanico(datos_peticion)
+
         # Busca el skillset en el diccionario.
-        skillset_seleccionado = self._skillsets.get(nombre_skillset)
+        skillset_seleccionado = await self._obtener_skillset_async(nombre_skillset)
 
         if not skillset_seleccionado:
             return {"error": f"Skillset '{nombre_skillset}' no encontrado o no cargado."}
 
         # Si lo encuentra, le pasa la petición completa para que la ejecute.
         # El skillset es quien decide qué hacer con los datos.
+        en_vuelo = PETICIONES_EN_VUELO.con(nombre_skillset)
+        en_vuelo.inc()
+        inicio = time.perf_counter()
         try:
             # La función 'ejecutar' debe ser asíncrona en cada skillset.
             resultado = await skillset_seleccionado.ejecutar(datos_peticion)
+            PETICIONES.con(nombre_skillset, "error" if "error" in resultado else "ok").inc()
             return resultado
         except Exception as e:
+            PETICIONES.con(nombre_skillset, "excepcion").inc()
             print(f"🚨 ERROR al ejecutar el skillset '{nombre_skillset}': {e}")
             return {"error": f"Hubo un error interno en el skillset '{nombre_skillset}'."}
+        finally:
+            en_vuelo.dec()
+            LATENCIA_PETICION.con(nombre_skillset, _modo_de(datos_peticion)).observar(time.perf_counter() - inicio)
+
+    # --- ABANICO: UN COMANDO, VARIOS SKILLSETS ---
+    def _objetivos_abanico(self, objetivos):
+        """Valida la lista de 'skillset_target'. Devuelve (objetivos, error)."""
+        if not objetivos or not all(isinstance(nombre, str) and nombre for nombre in objetivos):
+            return None, "Petición inválida: 'skillset_target' debe ser un nombre o una lista de nombres."
+        if len(set(objetivos)) != len(objetivos):
+            return None, "Petición inválida: 'skillset_target' repite skillsets."
+        if len(objetivos) > self.MAX_ABANICO:
+            return None, f"Petición inválida: un abanico admite como máximo {self.MAX_ABANICO} skillsets."
+        return objetivos, None
+
+    async def _ejecutar_con_plazo(self, nombre, datos_peticion):
+        """Ejecuta un skillset del abanico; si no responde a tiempo se cancela."""
+        plazo = self._tiempos_limite.get(nombre, self.TIEMPO_LIMITE_ABANICO)
+        try:
+            return await asyncio.wait_for(self._despachar({**datos_peticion, "skillset_target": nombre}), plazo)
+        except asyncio.TimeoutError:
+            PETICIONES.con(nombre, "tiempo_agotado").inc()
+            print(f"⏱️ El skillset '{nombre}' superó su plazo de {plazo:g} s en un abanico.")
+            return {"error": f"El skillset '{nombre}' no respondió a tiempo."}
+
+    @staticmethod
+    def _fusionar(principal, complementos):
+        """
+        La respuesta del primer skillset manda (su 'nuevo_estado', su acción de
+        UI); los mensajes de los demás se añaden debajo y sus respuestas
+        completas viajan en 'complementos'.
+        """
+        respuesta = dict(principal)
+        mensajes = [respuesta.get("mensaje_para_ui")]
+        for complemento in complementos.values():
+            # El estado de conversación es solo del skillset principal.
+            complemento.pop("nuevo_estado", None)
+            mensajes.append(complemento.get("mensaje_para_ui"))
+        mensajes = [mensaje for mensaje in mensajes if mensaje]
+        if mensajes:
+            respuesta["mensaje_para_ui"] = "\n\n".join(mensajes)
+        respuesta["complementos"] = complementos
+        return respuesta
+
+    async def _despachar_abanico(self, datos_peticion):
+        """
+        Envía el mismo comando a todos los skillsets de la lista a la vez.
+        Cada uno tiene su propio plazo: uno lento o caído no retrasa ni rompe
+        a los demás. El primero de la lista es el principal.
+        """
+        objetivos, error = self._objetivos_abanico(datos_peticion["skillset_target"])
+        if error:
+            return {"error": error}
+        resultados = await asyncio.gather(*(self._ejecutar_con_plazo(nombre, datos_peticion) for nombre in objetivos))
+        return self._fusionar(resultados[0], dict(zip(objetivos[1:], resultados[1:])))
+
+    async def _despachar_flujo_abanico(self, datos_peticion):
+        """
+        Variante en streaming del abanico: los fragmentos del skillset principal
+        se retransmiten en cuanto llegan (sin plazo: el principal gobierna sus
+        propios tiempos) y los complementos se esperan solo para el marco final.
+        """
+        objetivos, error = self._objetivos_abanico(datos_peticion["skillset_target"])
+        if error:
+            yield {"tipo": "final", "error": error}
+            return
+        tareas = [asyncio.ensure_future(self._ejecutar_con_plazo(nombre, datos_peticion)) for nombre in objetivos[1:]]
+        try:
+            async for marco in self._despachar_flujo({**datos_peticion, "skillset_target": objetivos[0]}):
+                if marco.get("tipo") == "final":
+                    complementos = dict(zip(objetivos[1:], await asyncio.gather(*tareas)))
+                    marco = self._fusionar(marco, complementos)
+                yield marco
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    async def procesar_lote(self, peticiones):
+        """
+        Ejecuta una lista ordenada de peticiones en un solo viaje.
+        - Las peticiones se agrupan por sesión (skillset_target, usuario_id,
+          sesion_token o sesion_id).
+        - Dentro de una sesión se ejecutan en orden y cada comando que no traiga
+          su propio 'estado_conversacion' recibe el 'nuevo_estado' del anterior
+          (con 'sesion_token' el estado ya lo encadena el almacén de sesiones).
+        - Las sesiones independientes se ejecutan concurrentemente.
+        - Los skillsets con 'escrituras_agrupadas' vuelcan su memoria una sola vez.
+        - Un comando con 'id_peticion' que ya se ejecutó no se repite: se
+          devuelve la misma respuesta (la PWA reenvía su cola offline si no
+          llegó a ver la respuesta).
+        - El lote gasta una sola ficha del límite por cliente en el carril
+          local; cada comando del carril remoto gasta además la suya, así que
+          un lote no sirve para saltarse el límite de charla. Cada comando pasa
+          por su carril. Si un carril rechaza un comando, ese comando y los
+          siguientes de su sesión se devuelven con "ocupado" sin ejecutarse
+          (ni recordarse), para reenviarlos en orden.
+        Devuelve {"respuestas": [...]} en el mismo orden que las peticiones.
+        """
+        if not isinstance(peticiones, list) or not peticiones:
+            return {"error": "Petición inválida: se esperaba una lista 'peticiones' no vacía."}
+        if len(peticiones) > self.MAX_LOTE:
+            return {"error": f"Petición inválida: el lote supera el máximo de {self.MAX_LOTE} comandos."}
+
+        clientes = {_cliente_de(peticion) for peticion in peticiones if isinstance(peticion, dict)}
+        try:
+            for cliente in clientes:
+                self.admision.limitar("local", cliente)
+        except Ocupado as ocupado:
+            return {"error": self.MENSAJE_OCUPADO, "ocupado": True, "reintentar_en": ocupado.reintentar_en}
+
+        respuestas = [None] * len(peticiones)
+        sesiones = {}
+        for indice, peticion in enumerate(peticiones):
+            if not isinstance(peticion, dict):
+                respuestas[indice] = {"error": "Petición inválida: cada comando debe ser un objeto JSON."}
+                continue
+            objetivo = peticion.get("skillset_target")
+            if isinstance(objetivo, list):
+                # Un abanico se agrupa por su lista de skillsets.
+                objetivo = tuple(str(nombre) for nombre in objetivo)
+            clave = (objetivo, peticion.get("usuario_id"),
+                     peticion.get("sesion_token") or peticion.get("sesion_id"))
+            sesiones.setdefault(clave, []).append((indice, peticion))
+
+        async def procesar_sesion(comandos):
+            estado = None
+            token = None
+            ocupado = None
+            for indice, peticion in comandos:
+                if ocupado is not None:
+                    # Tras un rechazo, el resto de la sesión no se ejecuta: dependía de ese comando.
+                    respuestas[indice] = dict(ocupado)
+                    continue
+                if estado is not None and "estado_conversacion" not in peticion:
+                    peticion = {**peticion, "estado_conversacion": estado}
+                # Una sesión abierta por el primer comando sirve para los siguientes.
+                if token and "sesion_token" in peticion and not peticion["sesion_token"]:
+                    peticion = {**peticion, "sesion_token": token}
+                clave = (peticion.get("usuario_id"), peticion.get("id_peticion"))
+                respuesta = self._respuestas_recordadas.get(clave) if clave[1] else None
+                if respuesta is None:
+                    respuesta = await self.procesar_peticion(peticion, carriles_limitados=("remoto",))
+                    if respuesta.get("ocupado"):
+                        # Un rechazo no se recuerda: el reenvío del comando debe ejecutarlo.
+                        ocupado = {clave_respuesta: respuesta[clave_respuesta]
+                                   for clave_respuesta in ("mensaje_para_ui", "ocupado", "carril", "reintentar_en", "sesion_token")
+                                   if clave_respuesta in respuesta}
+                    elif clave[1]:
+                        self._recordar_respuesta(clave, respuesta)
+                respuestas[indice] = respuesta
+                estado = respuesta.get("nuevo_estado", estado)
+                token = respuesta.get("sesion_token", token)
+
+        with ExitStack() as pila:
+            nombres = set()
+            for objetivo in (clave[0] for clave in sesiones):
+                nombres.update(objetivo if isinstance(objetivo, tuple) else (objetivo,))
+            for nombre in nombres:
+                skillset = await self._obtener_skillset_async(nombre)
+                if hasattr(skillset, "escrituras_agrupadas"):
+                    pila.enter_context(skillset.escrituras_agrupadas())
+            await asyncio.gather(*(procesar_sesion(comandos) for comandos in sesiones.values()))
+
+        return {"respuestas": respuestas}
+
+    def _recordar_respuesta(self, clave, respuesta):
+        self._respuestas_recordadas[clave] = respuesta
+        while len(self._respuestas_recordadas) > self.MAX_RESPUESTAS_RECORDADAS:
+            self._respuestas_recordadas.popitem(last=False)
+
+    async def procesar_peticion_flujo(self, datos_peticion):
+        """
+        Variante en streaming de 'procesar_peticion'. Retransmite los marcos
+        del skillset ({"tipo": "fragmento"} ... y un {"tipo": "final"}).
+        Los skillsets sin 'ejecutar_flujo' producen un único marco final.
+        Con 'sesion_token', el marco final lleva el token y el delta de estado.
+        """
+        if "sesion_token" in datos_peticion:
+            token, estado_anterior, datos_peticion = self._abrir_sesion(datos_peticion)
+            async for marco in self._despachar_flujo_admitido(datos_peticion):
+                if marco.get("tipo") == "final":
+                    marco = self._cerrar_sesion(token, estado_anterior, marco)
+                yield marco
+            return
+        async for marco in self._despachar_flujo_admitido(datos_peticion):
+            yield marco
+
+    async def _despachar_flujo_admitido(self, datos_peticion):
+        """La plaza del carril se ocupa hasta que termina el flujo (o el cliente lo abandona)."""
+        try:
+            carril = await self._admitir(datos_peticion, CARRILES)
+        except Ocupado as ocupado:
+            yield {"tipo": "final", **self._respuesta_ocupado(datos_peticion, ocupado)}
+            return
+        try:
+            async for marco in self._despachar_flujo(datos_peticion):
+                yield marco
+        finally:
+            self.admision.salir(carril)
+
+    async def _despachar_flujo(self, datos_peticion):
+        nombre_skillset = datos_peticion.get("skillset_target")
+
+        if not nombre_skillset:
+            yield {"tipo": "final", "error": "Petición inválida: No se especificó un 'skillset_target'."}
+            return
 
+        if isinstance(nombre_skillset, list):
+            async for marco in self._despachar_flujo_abanico(datos_peticion):
+                yield marco
+            return
+
+        skillset_seleccionado = await self._obtener_skillset_async(nombre_skillset)
+
+        if not skillset_seleccionado:
+            yield {"tipo": "final", "error": f"Skillset '{nombre_skillset}' no encontrado o no cargado."}
+            return
+
+        en_vuelo = PETICIONES_EN_VUELO.con(nombre_skillset)
+        en_vuelo.inc()
+        inicio = time.perf_counter()
+        try:
+            if hasattr(skillset_seleccionado, "ejecutar_flujo"):
+                async for marco in skillset_seleccionado.ejecutar_flujo(datos_peticion):
+                    if marco.get("tipo") == "final":
+                        PETICIONES.con(nombre_skillset, "error" if "error" in marco else "ok").inc()
+                    yield marco
+            else:
+                resultado = await skillset_seleccionado.ejecutar(datos_peticion)
+                PETICIONES.con(nombre_skillset, "error" if "error" in resultado else "ok").inc()
+                yield {"tipo": "final", **resultado}
+        except Exception as e:
+            PETICIONES.con(nombre_skillset, "excepcion").inc()
+            print(f"🚨 ERROR al ejecutar el skillset '{nombre_skillset}' en streaming: {e}")
+            yield {"tipo": "final", "error": f"Hubo un error interno en el skillset '{nombre_skillset}'."}
+        finally:
+            en_vuelo.dec()
+            LATENCIA_PETICION.con(nombre_skillset, _modo_de(datos_peticion)).observar(time.perf_counter() - inicio)
+
+    def cerrar(self):
+        """
+        Cierre ordenado del servidor: cada skillset cargado que lo ofrezca
+        (método 'cerrar') vuelca su estado pendiente.
+        """
+        for nombre, skillset in list(self._skillsets.items()):
+            if hasattr(skillset, "cerrar"):
+                try:
+                    skillset.cerrar()
+                except Exception as e:
+                    print(f"🚨 ERROR al cerrar el skillset '{nombre}': {e}")
+
+    async def analitica(self, nombre_skillset, usuario_id=None):
+        """
+        Analítica de un usuario según el skillset indicado (método 'analitica').
+        Devuelve None si el skillset no existe o no la ofrece.
+        """
+        skillset = await self._obtener_skillset_async(nombre_skillset)
+        if skillset is None or not hasattr(skillset, "analitica"):
+            return None
+        return skillset.analitica(usuario_id)
+
+    async def sincronizar(self, nombre_skillset, usuario_id=None, cursor="", limite=None):
+        """
+        Items del usuario posteriores a 'cursor' según el skillset indicado
+        (método 'sincronizar'). Devuelve None si el skillset no existe o no lo ofrece.
+        """
+        skillset = await self._obtener_skillset_async(nombre_skillset)
+        if skillset is None or not hasattr(skillset, "sincronizar"):
+            return None
+        if limite is None:
+            return skillset.sincronizar(usuario_id, cursor)
+        return skillset.sincronizar(usuario_id, cursor, limite)
+
+    async def suscribir(self, nombre_skillset, usuario_id, entregar, ultimo_evento=None):
+        """
+        Suscribe 'entregar(evento)' a los avisos del usuario según el skillset
+        indicado (método 'suscribir'). Devuelve la suscripción, o None si el
+        skillset no existe o no emite avisos.
+        """
+        skillset = await self._obtener_skillset_async(nombre_skillset)
+        if skillset is None or not hasattr(skillset, "suscribir"):
+            return None
+        return skillset.suscribir(usuario_id, entregar, ultimo_evento)
+
+    def estadisticas(self):
+        """
+        Reúne los contadores de tiempo de ejecución de cada skillset que
+        los ofrezca (método 'estadisticas').
+        """
+        resumen = {}
+        for nombre, skillset in self._skillsets.items():
+            if hasattr(skillset, "estadisticas"):
+                resumen[nombre] = skillset.estadisticas()
+        return {"skillsets": resumen, "sesiones": self.sesiones.estadisticas(), "admision": self.admision.estadisticas()}
@@ -0,0 +1,202 @@
+# =================================================================
+# ASGI.PY (v1.0 - MODO ASÍNCRONO NATIVO)
+# =================================================================
+# Servidor ASGI con el mismo contrato '/execute' que main.py, pero sin
+# Flask ni hilos: cada petición se atiende como una tarea del único bucle
+# de eventos del worker, así que 'procesar_peticion' y 'Guardian.ejecutar'
+# se esperan directamente y cientos de charlas con g4f pueden estar en
+# vuelo a la vez en el mismo proceso.
+#
+# Arranque:   uvicorn asgi:app --host 0.0.0.0 --port 5000
+# (El servidor Flask de main.py se mantiene como modo compatibilidad.)
+
+import sys
+import os
+import json
+import asyncio
+from urllib.parse import parse_qs
+
+# --- PREPARAR EL CAMINO A LOS MÓDULOS ---
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# --- IMPORTAR E INICIALIZAR EL CEREBRO Y LOS SKILLSETS ---
+from ale_core import ALE_Core
+from metricas import REGISTRO, TIPO_CONTENIDO, DECODIFICACION_JSON
+from skillsets.recordatorios import INTERVALO_LATIDO_S, LATIDO_SSE, formato_sse
+
+ale = ALE_Core()
+# Los skillsets se descubren sin importarlos: cada uno se crea en su primera
+# petición (arranque en frío rápido).
+nombres_skillsets = ale.descubrir_skillsets()
+
+print(f"✅ Servidor ASGI listo. A.L.E. está online con los skillsets: {', '.join(nombres_skillsets)}.")
+
+# --- CABECERAS COMUNES (CORS ABIERTO, IGUAL QUE EN main.py) ---
+CABECERAS_CORS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type,Authorization"),
+    (b"access-control-allow-methods", b"GET,PUT,POST,DELETE,OPTIONS"),
+]
+
+# --- FUNCIONES AUXILIARES DEL PROTOCOLO ---
+async def _leer_cuerpo(receive):
+    partes = []
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "http.disconnect":
+            break
+        partes.append(mensaje.get("body", b""))
+        if not mensaje.get("more_body", False):
+            break
+    return b"".join(partes)
+
+async def _enviar_respuesta(send, estado, cuerpo=b"", tipo=b"application/json"):
+    cabeceras = [(b"content-type", tipo), (b"content-length", str(len(cuerpo)).encode())]
+    await send({"type": "http.response.start", "status": estado, "headers": cabeceras + CABECERAS_CORS})
+    await send({"type": "http.response.body", "body": cuerpo})
+
+async def _enviar_json(send, datos, estado=200):
+    await _enviar_respuesta(send, estado, json.dumps(datos, ensure_ascii=False).encode("utf-8"))
+
+async def _leer_peticion_json(scope, receive, send):
+    """Devuelve el dict de la petición o None si ya se respondió con un 400."""
+    cuerpo = await _leer_cuerpo(receive)
+    try:
+        with DECODIFICACION_JSON.con(scope["path"]).cronometrar():
+            datos_peticion = json.loads(cuerpo or b"null")
+    except ValueError:
+        await _enviar_json(send, {"error": "Petición inválida: el cuerpo no es JSON."}, 400)
+        return None
+    if not isinstance(datos_peticion, dict):
+        await _enviar_json(send, {"error": "Petición inválida: se esperaba un objeto JSON."}, 400)
+        return None
+    return datos_peticion
+
+# --- RUTAS ---
+async def ruta_execute(scope, receive, send):
+    datos_peticion = await _leer_peticion_json(scope, receive, send)
+    if datos_peticion is None:
+        return
+    respuesta_de_ale = await ale.procesar_peticion(datos_peticion)
+    await _enviar_json(send, respuesta_de_ale)
+
+async def ruta_execute_batch(scope, receive, send):
+    datos_peticion = await _leer_peticion_json(scope, receive, send)
+    if datos_peticion is None:
+        return
+    respuesta_de_ale = await ale.procesar_lote(datos_peticion.get("peticiones"))
+    await _enviar_json(send, respuesta_de_ale)
+
+async def ruta_execute_stream(scope, receive, send):
+    datos_peticion = await _leer_peticion_json(scope, receive, send)
+    if datos_peticion is None:
+        return
+    cabeceras = [(b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+    await send({"type": "http.response.start", "status": 200, "headers": cabeceras + CABECERAS_CORS})
+    async for marco in ale.procesar_peticion_flujo(datos_peticion):
+        linea = json.dumps(marco, ensure_ascii=False) + "\n"
+        await send({"type": "http.response.body", "body": linea.encode("utf-8"), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+async def ruta_estadisticas(scope, receive, send):
+    await _enviar_json(send, ale.estadisticas())
+
+async def ruta_analitica(scope, receive, send):
+    parametros = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+    nombre_skillset = parametros.get("skillset", ["guardian"])[0]
+    resumen = await ale.analitica(nombre_skillset, parametros.get("usuario_id", [None])[0])
+    if resumen is None:
+        return await _enviar_json(send, {"error": f"El skillset '{nombre_skillset}' no ofrece analítica."}, 404)
+    await _enviar_json(send, resumen)
+
+async def ruta_sync(scope, receive, send):
+    parametros = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+    nombre_skillset = parametros.get("skillset", ["guardian"])[0]
+    try:
+        limite = int(parametros["limite"][0]) if "limite" in parametros else None
+    except ValueError:
+        limite = None
+    cambios = await ale.sincronizar(nombre_skillset, parametros.get("usuario_id", [None])[0],
+                                    parametros.get("cursor", [""])[0], limite)
+    if cambios is None:
+        return await _enviar_json(send, {"error": f"El skillset '{nombre_skillset}' no ofrece sincronización."}, 404)
+    await _enviar_json(send, cambios)
+
+async def _esperar_desconexion(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def ruta_eventos(scope, receive, send):
+    parametros = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+    nombre_skillset = parametros.get("skillset", ["guardian"])[0]
+    cabeceras_peticion = dict(scope.get("headers") or [])
+    ultimo_evento = cabeceras_peticion.get(b"last-event-id", b"").decode("latin-1") or parametros.get("ultimo", [None])[0]
+    # El avisador entrega desde su hilo: los eventos se pasan al bucle de esta conexión.
+    bucle = asyncio.get_running_loop()
+    avisos = asyncio.Queue()
+    suscripcion = await ale.suscribir(nombre_skillset, parametros.get("usuario_id", [None])[0],
+                                      lambda evento: bucle.call_soon_threadsafe(avisos.put_nowait, evento), ultimo_evento)
+    if suscripcion is None:
+        return await _enviar_json(send, {"error": f"El skillset '{nombre_skillset}' no emite avisos."}, 404)
+    cabeceras = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+    desconexion = asyncio.ensure_future(_esperar_desconexion(receive))
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": cabeceras + CABECERAS_CORS})
+        await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+        while not desconexion.done():
+            siguiente = asyncio.ensure_future(avisos.get())
+            await asyncio.wait({siguiente, desconexion}, timeout=INTERVALO_LATIDO_S, return_when=asyncio.FIRST_COMPLETED)
+            if siguiente.done():
+                cuerpo = formato_sse(siguiente.result())
+            else:
+                siguiente.cancel()
+                if desconexion.done():
+                    break
+                await suscripcion.latir()
+                cuerpo = LATIDO_SSE
+            await send({"type": "http.response.body", "body": cuerpo.encode("utf-8"), "more_body": True})
+    finally:
+        desconexion.cancel()
+        suscripcion.cancelar()
+
+async def ruta_metricas(scope, receive, send):
+    await _enviar_respuesta(send, 200, REGISTRO.exponer().encode("utf-8"), TIPO_CONTENIDO.encode())
+
+RUTAS = {
+    ("POST", "/execute"): ruta_execute,
+    ("POST", "/execute_batch"): ruta_execute_batch,
+    ("POST", "/execute_stream"): ruta_execute_stream,
+    ("GET", "/estadisticas"): ruta_estadisticas,
+    ("GET", "/analitica"): ruta_analitica,
+    ("GET", "/sync"): ruta_sync,
+    ("GET", "/eventos"): ruta_eventos,
+    ("GET", "/metrics"): ruta_metricas,
+}
+
+# --- APLICACIÓN ASGI ---
+async def _gestionar_ciclo_de_vida(receive, send):
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "lifespan.startup":
+            if os.environ.get("ALE_PRECALENTAR", "0") == "1":
+                ale.precalentar()
+            await send({"type": "lifespan.startup.complete"})
+        elif mensaje["type"] == "lifespan.shutdown":
+            # Nada confirmado a la PWA puede quedarse sin escribir.
+            ale.cerrar()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _gestionar_ciclo_de_vida(receive, send)
+    if scope["type"] != "http":
+        return
+
+    if scope["method"] == "OPTIONS":
+        return await _enviar_respuesta(send, 204)
+
+    manejador = RUTAS.get((scope["method"], scope["path"]))
+    if manejador is None:
+        return await _enviar_json(send, {"error": f"Ruta '{scope['path']}' no encontrada."}, 404)
+    await manejador(scope, receive, send)
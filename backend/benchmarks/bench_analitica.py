@@ -0,0 +1,77 @@
+# =================================================================
+# BENCH_ANALITICA.PY - Consulta de productividad: recorrido vs agregados
+# =================================================================
+# "¿Cuántos contratos sellé esta semana?" contestado de dos formas:
+# - recorriendo el archivador e interpretando cada fecha 'dd/mm/yy' (antes);
+# - con los agregados incrementales de skillsets/analitica.py (ahora).
+# También mide el coste de registrar un item y el de la reconstrucción única.
+#
+# Uso:   python benchmarks/bench_analitica.py [--items 100000]
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skillsets import analitica
+from skillsets.inquilinos import DATOS_USUARIO_INICIALES
+
+
+def generar(total, hoy):
+    archivador = {}
+    for i in range(total):
+        dia = hoy - timedelta(days=(total - i) * 3 // 40)
+        es_ticket = i % 3
+        identificador = f"{'TCKT' if es_ticket else 'CONT'}-{i:06d}"
+        archivador[identificador] = {
+            "tipo": "Ticket" if es_ticket else "Contrato", "id": identificador, "duracion": "25 min",
+            "fecha_emision" if es_ticket else "fecha_sellado": dia.strftime("%d/%m/%y"),
+        }
+    return archivador
+
+
+def contratos_semana_recorriendo(archivador, hoy):
+    lunes = hoy - timedelta(days=hoy.weekday())
+    total = 0
+    for item in archivador.values():
+        if item.get("tipo") != "Contrato":
+            continue
+        fecha = datetime.strptime(item["fecha_sellado"], "%d/%m/%y").date()
+        if lunes <= fecha <= hoy:
+            total += 1
+    return total
+
+
+def cronometrar(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return resultado, (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta de productividad con y sin agregados.")
+    parser.add_argument("--items", type=int, default=100000)
+    args = parser.parse_args()
+
+    hoy = date.today()
+    archivador = generar(args.items, hoy)
+    datos, reconstruccion = cronometrar(lambda: analitica.reconstruir(dict(DATOS_USUARIO_INICIALES), archivador.values()), 1)
+
+    recorrido, t_recorrido = cronometrar(lambda: contratos_semana_recorriendo(archivador, hoy), 3)
+    agregado, t_agregado = cronometrar(lambda: analitica.resumen(datos, hoy)["semana"]["contratos"], 1000)
+    assert recorrido == agregado, (recorrido, agregado)
+    item = {"tipo": "Contrato", "id": "CONT-X", "duracion": "25 min", "fecha_sellado": hoy.strftime("%d/%m/%y")}
+    _, t_registro = cronometrar(lambda: analitica.registrar(datos, item), 1000)
+
+    print(f"{args.items} items, {agregado} contratos esta semana")
+    print(f"  recorriendo el archivador: {t_recorrido * 1000:10.2f} ms/consulta")
+    print(f"  con agregados:             {t_agregado * 1000:10.3f} ms/consulta ({t_recorrido / t_agregado:.0f}x)")
+    print(f"  registrar un item:         {t_registro * 1e6:10.1f} µs")
+    print(f"  reconstrucción única:      {reconstruccion:10.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# =================================================================
+# BENCH_ARRANQUE.PY - Arranque en frío del servidor
+# =================================================================
+# Lanza un proceso nuevo por medición (arranque realmente en frío) y mide:
+#   - importación de main.py (lo que paga el proceso antes de aceptar tráfico),
+#   - primera respuesta de /execute (carga del skillset y de la memoria),
+#   - segunda respuesta (régimen normal),
+#   - si g4f quedó importado (solo debe ocurrir en la primera charla).
+# Modo 'perezoso': el comportamiento actual. Modo 'ansioso': reproduce el
+# arranque anterior (g4f y el Guardián importados y creados al importar).
+# La memoria histórica se siembra con --items items para que su carga pese.
+#
+# Uso:   python benchmarks/bench_arranque.py [--repeticiones 3] [--items 20000]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CARPETA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT_MEDICION = r'''
+import json, sys, time
+inicio = time.perf_counter()
+sys.path.insert(0, {backend!r})
+if {ansioso!r}:
+    import g4f
+    from skillsets.guardian import Guardian
+import main
+if {ansioso!r}:
+    main.ale._obtener_skillset("guardian")
+importado = time.perf_counter()
+cliente = main.app.test_client()
+peticion = {{"skillset_target": "guardian", "comando": "listar"}}
+cliente.post("/execute", json=peticion)
+primera = time.perf_counter()
+cliente.post("/execute", json=peticion)
+segunda = time.perf_counter()
+print(json.dumps({{
+    "importacion_ms": (importado - inicio) * 1000,
+    "primera_ms": (primera - importado) * 1000,
+    "segunda_ms": (segunda - primera) * 1000,
+    "g4f_importado": "g4f" in sys.modules,
+}}))
+'''
+
+
+def _sembrar_memoria(carpeta, items):
+    archivador = {
+        f"TCKT-{i:06d}": {"tipo": "Ticket", "id": f"TCKT-{i:06d}", "tarea": f"Tarea {i}", "arranque": "No definido",
+                          "duracion": "25 min", "fecha_emision": "01/01/25", "hora_emision": "10:00"}
+        for i in range(items)
+    }
+    with open(os.path.join(carpeta, "guardian_memory.json"), "w", encoding="utf-8") as f:
+        json.dump({"archivador_contratos": archivador, "datos_usuario": None}, f)
+
+
+def medir(modo, items):
+    carpeta = tempfile.mkdtemp(prefix="guardian_arranque_")
+    _sembrar_memoria(carpeta, items)
+    entorno = {**os.environ, "GUARDIAN_ALMACEN": "json"}
+    script = SCRIPT_MEDICION.format(backend=CARPETA_BACKEND, ansioso=(modo == "ansioso"))
+    salida = subprocess.run([sys.executable, "-c", script], cwd=carpeta, env=entorno,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de importación y de primera respuesta en frío.")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--items", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'modo':>9} {'importación ms':>15} {'1ª respuesta ms':>16} {'2ª respuesta ms':>16} {'g4f importado':>14}")
+    for modo in ("ansioso", "perezoso"):
+        medidas = [medir(modo, args.items) for _ in range(args.repeticiones)]
+        mediana = {clave: statistics.median(m[clave] for m in medidas) for clave in ("importacion_ms", "primera_ms", "segunda_ms")}
+        print(f"{modo:>9} {mediana['importacion_ms']:>15.0f} {mediana['primera_ms']:>16.0f} "
+              f"{mediana['segunda_ms']:>16.1f} {str(medidas[-1]['g4f_importado']):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# =================================================================
+# BENCH_BUSQUEDA.PY - Latencia de 'buscar' sobre un archivador grande
+# =================================================================
+# Construye el índice de búsqueda (skillsets/busqueda.py) sobre un archivador
+# sintético, añadiendo los items uno a uno como el Guardián, y mide:
+# - la latencia de consulta (p50/p95/p99) con consultas de 1 a 3 palabras,
+#   con y sin tildes;
+# - guardar y volver a abrir el índice (conciliando con el archivador)
+#   frente a reconstruirlo desde cero, y el tamaño del archivo.
+#
+# Uso:   python benchmarks/bench_busqueda.py [--items 100000] [--consultas 2000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skillsets.busqueda import IndiceBusqueda, texto_item
+
+VERBOS = ["estudiar", "repasar", "leer", "escribir", "programar", "limpiar", "ordenar", "practicar",
+          "preparar", "revisar", "llamar", "diseñar", "corregir", "traducir", "entrenar", "dibujar"]
+TEMAS = ["matemáticas", "física", "química", "historia", "guitarra", "inglés", "el informe", "la cocina",
+         "el capítulo", "la presentación", "el presupuesto", "álgebra", "cálculo", "redacción", "el garaje",
+         "la tesis", "piano", "francés", "estadística", "biología", "los apuntes", "el proyecto", "la web"]
+DETALLES = ["tema", "ejercicios", "parcial", "examen", "ensayo", "sección", "repaso", "práctica", "borrador"]
+
+
+def generar(total):
+    azar = random.Random(total)
+    archivador = {}
+    for i in range(total):
+        texto = f"{azar.choice(VERBOS)} {azar.choice(TEMAS)}"
+        if azar.random() < 0.6:
+            texto += f" {azar.choice(DETALLES)} {azar.randrange(1, 40)}"
+        identificador = f"{'TCKT' if i % 4 else 'CONT'}-{i:06d}"
+        archivador[identificador] = {"tipo": "Ticket", "id": identificador, "tarea": texto.capitalize()} if i % 4 else \
+            {"tipo": "Contrato", "id": identificador, "mision": texto.capitalize()}
+    return archivador
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia del índice de búsqueda BM25.")
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    args = parser.parse_args()
+
+    archivador = generar(args.items)
+    ruta = os.path.join(tempfile.mkdtemp(prefix="bench_busqueda_"), "memoria.json.indice")
+
+    inicio = time.perf_counter()
+    indice = IndiceBusqueda(ruta)
+    for identificador, item in archivador.items():
+        indice.agregar(identificador, texto_item(item))
+    construccion = time.perf_counter() - inicio
+
+    azar = random.Random(1)
+    consultas = []
+    for _ in range(args.consultas):
+        palabras = [azar.choice(VERBOS), azar.choice(TEMAS).split()[-1], azar.choice(DETALLES)][:azar.randrange(1, 4)]
+        consultas.append(" ".join(palabras).upper() if azar.random() < 0.3 else " ".join(palabras))
+    latencias = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        indice.buscar(consulta, limite=10)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    sin_tildes = indice.buscar("estudiar matematicas", limite=1)
+    assert sin_tildes and "atemáticas" in texto_item(archivador[sin_tildes[0][0]]), sin_tildes
+
+    inicio = time.perf_counter()
+    indice.guardar()
+    guardado = time.perf_counter() - inicio
+    # Tres items nuevos desde el último guardado (p. ej. una caída antes de cerrar).
+    for i in range(3):
+        archivador[f"TCKT-N{i}"] = {"tipo": "Ticket", "id": f"TCKT-N{i}", "tarea": "Repasar álgebra lineal"}
+    inicio = time.perf_counter()
+    reabierto = IndiceBusqueda.abrir(ruta, archivador)
+    apertura = time.perf_counter() - inicio
+    assert len(reabierto) == len(archivador)
+
+    print(f"{args.items} items, {args.consultas} consultas")
+    print(f"  construcción incremental: {construccion:8.2f} s ({construccion / args.items * 1e6:.1f} µs/item)")
+    print(f"  consulta: p50 {percentil(latencias, 0.5):.2f} ms | p95 {percentil(latencias, 0.95):.2f} ms | p99 {percentil(latencias, 0.99):.2f} ms")
+    print(f"  guardar: {guardado:.2f} s ({os.path.getsize(ruta) / 2**20:.1f} MiB) | abrir y conciliar: {apertura:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
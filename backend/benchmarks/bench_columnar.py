@@ -0,0 +1,134 @@
+# =================================================================
+# BENCH_COLUMNAR.PY - Archivador en columnas frente a dict de items
+# =================================================================
+# Para varios tamaños de archivador mide:
+# - la memoria que ocupa en el proceso (tracemalloc) como dict {id: item}
+#   y como ArchivadorColumnar;
+# - el tamaño en disco y el tiempo de exportar/importar en .alec frente a
+#   la instantánea JSON que escriben los motores (json.dump con sangría).
+# Los items imitan a los reales: tareas casi únicas, pocas horas, fechas y
+# duraciones distintas, contratos con especificaciones.
+#
+# Uso:   python benchmarks/bench_columnar.py [--tamanos 10000,100000,1000000]
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skillsets.columnar import ArchivadorColumnar, exportar_alec, importar_alec
+from skillsets.identificadores import componer
+
+TAREAS = ["Revisar", "Escribir", "Llamar a", "Preparar", "Estudiar", "Ordenar", "Diseñar"]
+OBJETOS = ["el informe", "la propuesta", "el cliente", "la presentación", "el capítulo", "el presupuesto"]
+
+
+def _item(i, azar):
+    dia = 1 + i // 40
+    identificador = componer("TCKT" if i % 5 else "CTRT", dia * 86400 + i % 40, 0, i % 1024)
+    fecha = f"{1 + dia % 28:02d}/{1 + dia // 28 % 12:02d}/{25 + dia // 336 % 10}"
+    hora = f"{azar.randrange(8, 22):02d}:{azar.choice((0, 15, 30, 45)):02d}"
+    if i % 5:
+        return identificador, {
+            "tipo": "Ticket", "id": identificador,
+            "tarea": f"{azar.choice(TAREAS)} {azar.choice(OBJETOS)} #{i}",
+            "arranque": hora, "duracion": f"{azar.choice((15, 25, 30, 45, 60, 90))} min",
+            "fecha_emision": fecha, "hora_emision": hora,
+        }
+    return identificador, {
+        "tipo": "Contrato", "id": identificador,
+        "mision": f"{azar.choice(TAREAS)} {azar.choice(OBJETOS)} (misión {i})",
+        "especificaciones": [f"Paso {n}" for n in range(azar.randrange(1, 4))],
+        "fecha_sellado": fecha, "hora_sellado": hora,
+    }
+
+
+def generar(total):
+    azar = random.Random(total)
+    return dict(_item(i, azar) for i in range(total))
+
+
+def memoria_de(construir):
+    """Bytes retenidos por el objeto que devuelve construir()."""
+    gc.collect()
+    tracemalloc.start()
+    objeto = construir()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, actual
+
+
+def cronometrar(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+
+def medir(total, carpeta):
+    fuente = generar(total)
+    texto = json.dumps(fuente)
+    # Ambos se construyen desde JSON, como los carga un motor, para que no
+    # compartan cadenas con 'fuente' (tracemalloc solo ve lo asignado dentro).
+    diccionario, bytes_dict = memoria_de(lambda: json.loads(texto))
+    del diccionario
+    columnar, bytes_columnar = memoria_de(lambda: ArchivadorColumnar(json.loads(texto)))
+    del texto
+
+    ruta_json = os.path.join(carpeta, f"archivo_{total}.json")
+    ruta_alec = os.path.join(carpeta, f"archivo_{total}.alec")
+
+    def _escribir_json():
+        with open(ruta_json, 'w', encoding='utf-8') as f:
+            json.dump({"archivador_contratos": fuente, "datos_usuario": {}}, f, indent=4, ensure_ascii=False)
+
+    def _leer_json():
+        with open(ruta_json, 'r', encoding='utf-8') as f:
+            return json.load(f)["archivador_contratos"]
+
+    _, t_json_escritura = cronometrar(_escribir_json)
+    leido_json, t_json_lectura = cronometrar(_leer_json)
+    _, t_alec_escritura = cronometrar(lambda: exportar_alec(columnar, {}, ruta_alec))
+    (leido_alec, _), t_alec_lectura = cronometrar(lambda: importar_alec(ruta_alec))
+    assert len(leido_json) == len(leido_alec) == total
+    muestra = next(iter(fuente))
+    assert leido_alec[muestra] == fuente[muestra]
+
+    return {
+        "items": total,
+        "memoria_dict_mb": bytes_dict / 2**20,
+        "memoria_columnar_mb": bytes_columnar / 2**20,
+        "json_mb": os.path.getsize(ruta_json) / 2**20,
+        "alec_mb": os.path.getsize(ruta_alec) / 2**20,
+        "json_escritura_s": t_json_escritura, "json_lectura_s": t_json_lectura,
+        "alec_escritura_s": t_alec_escritura, "alec_lectura_s": t_alec_lectura,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria y tamaño en disco del archivador columnar.")
+    parser.add_argument("--tamanos", default="10000,100000,1000000")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_columnar_")
+    for total in (int(tamano) for tamano in args.tamanos.split(",")):
+        r = medir(total, carpeta)
+        print(f"\n{total} items:")
+        print(f"  memoria   dict {r['memoria_dict_mb']:8.1f} MiB | columnar {r['memoria_columnar_mb']:8.1f} MiB "
+              f"({r['memoria_dict_mb'] / max(r['memoria_columnar_mb'], 1e-9):.1f}x)")
+        print(f"  disco     json {r['json_mb']:8.1f} MiB | alec     {r['alec_mb']:8.1f} MiB "
+              f"({r['json_mb'] / max(r['alec_mb'], 1e-9):.1f}x)")
+        print(f"  escritura json {r['json_escritura_s']:8.2f} s   | alec     {r['alec_escritura_s']:8.2f} s")
+        print(f"  lectura   json {r['json_lectura_s']:8.2f} s   | alec     {r['alec_lectura_s']:8.2f} s")
+        for ruta in os.listdir(carpeta):
+            os.remove(os.path.join(carpeta, ruta))
+    os.rmdir(carpeta)
+
+
+if __name__ == "__main__":
+    main()
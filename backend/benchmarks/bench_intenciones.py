@@ -0,0 +1,70 @@
+# =================================================================
+# BENCH_INTENCIONES.PY - Coste de clasificar un mensaje
+# =================================================================
+# Compara los barridos lineales originales (un 'any(palabra in texto)' por
+# lista) con el ClasificadorIntenciones compilado, a medida que crece el
+# vocabulario. Ambos responden a la misma pregunta: qué intenciones
+# aparecen en el mensaje.
+#
+# Uso:   python benchmarks/bench_intenciones.py [--mensajes 2000]
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skillsets.intenciones import ClasificadorIntenciones
+
+MENSAJES_BASE = [
+    "si, claro, adelante", "no, mejor cancelar", "quiero corregir la duración",
+    "confirmar", "siempre me olvido de estudiar por la noche", "crear combo de tres tareas",
+]
+
+
+def _vocabulario(palabras_por_intencion, intenciones=8, semilla=7):
+    azar = random.Random(semilla)
+    vocabulario = {}
+    for i in range(intenciones):
+        palabras = {"".join(azar.choices(string.ascii_lowercase, k=azar.randint(4, 10))) for _ in range(palabras_por_intencion)}
+        vocabulario[f"intencion_{i}"] = sorted(palabras)
+    vocabulario["si"] = ["si", "sí", "claro", "afirmativo", "acepto"]
+    return vocabulario
+
+
+def _barrido_lineal(vocabulario, texto):
+    return {intencion for intencion, palabras in vocabulario.items() if any(p in texto for p in palabras)}
+
+
+def _medir(funcion, mensajes):
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        funcion(mensaje)
+    return (time.perf_counter() - inicio) / len(mensajes) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste por mensaje según tamaño del vocabulario.")
+    parser.add_argument("--mensajes", type=int, default=2000)
+    args = parser.parse_args()
+    mensajes = [MENSAJES_BASE[i % len(MENSAJES_BASE)] for i in range(args.mensajes)]
+
+    print(f"{'vocabulario':>12} {'lineal µs/msg':>14} {'compilado µs/msg':>17} {'construcción ms':>16}")
+    for por_intencion in (5, 50, 500, 5000):
+        vocabulario = _vocabulario(por_intencion)
+        inicio = time.perf_counter()
+        clasificador = ClasificadorIntenciones(vocabulario)
+        construccion = (time.perf_counter() - inicio) * 1000
+        total_palabras = sum(len(p) for p in vocabulario.values())
+        lineal = _medir(lambda m: _barrido_lineal(vocabulario, m.lower()), mensajes)
+        compilado = _medir(clasificador.clasificar, mensajes)
+        print(f"{total_palabras:>12} {lineal:>14.2f} {compilado:>17.2f} {construccion:>16.1f}")
+
+    clasificador = ClasificadorIntenciones(_vocabulario(5))
+    print("\n'siempre me olvido...' →", clasificador.clasificar("siempre me olvido de estudiar") or "sin intenciones (antes: 'si')")
+
+
+if __name__ == "__main__":
+    main()
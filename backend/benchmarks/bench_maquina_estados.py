@@ -0,0 +1,97 @@
+# =================================================================
+# BENCH_MAQUINA_ESTADOS.PY - Sesiones simuladas de Diseño y Combo
+# =================================================================
+# Conduce miles de sesiones de Diseño y de Diseño Múltiple (Combo) por la
+# máquina de estados del Guardián. Un usuario simulado responde según el
+# paso en que está la conversación (a veces con ruletas, correcciones o
+# capas extra) y se comprueba que:
+#   - toda sesión termina en modo libre,
+#   - cada combo forja exactamente un contrato por tarea,
+#   - ningún turno cae en el mensaje de "Error en el flujo".
+#
+# Uso:   python benchmarks/bench_maquina_estados.py [--sesiones 2000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _respuesta_simulada(estado, azar):
+    """Lo que contestaría un usuario en el paso actual de la conversación."""
+    paso = estado.get("paso_diseno") or estado.get("paso_combo")
+    if paso in ("ESPERANDO_RESULTADO_MISION", "ESPERANDO_RESULTADO_ESPECIFICACION",
+                "ESPERANDO_RESULTADO_ARRANQUE", "ESPERANDO_RESULTADO_DURACION"):
+        # La PWA devuelve la opción elegida por la ruleta.
+        return "opcion elegida"
+    respuestas = {
+        "ESPERANDO_MISION": lambda: azar.choice(["correr", "leer, escribir, ordenar", "estudiar"]),
+        "ESPERANDO_ESPECIFICACION": lambda: "no" if azar.random() < 0.7 or estado["datos_plan"].get("especificaciones") else "si",
+        "VALIDANDO_ESPECIFICACION": lambda: azar.choice(["si", "no"]),
+        "ESPERANDO_OPCIONES_ESPECIFICACION": lambda: azar.choice(["capítulo 1", "tema a, tema b"]),
+        "ESPERANDO_ARRANQUE": lambda: azar.choice(["10:00", "10:00, 11:00"]),
+        "ESPERANDO_DECISION_DURACION": lambda: azar.choice(["si", "no"]),
+        "ESPERANDO_DURACION": lambda: azar.choice(["25 min", "aleatorio", "20 min, 40 min"]),
+        "ESPERANDO_CONFIRMACION_CONTRATO": lambda: "corregir" if azar.random() < 0.2 else "confirmar",
+        "ESPERANDO_CAMPO_A_CORREGIR": lambda: azar.choice(["misión", "arranque", "duración"]),
+        "ESPERANDO_NUEVO_VALOR": lambda: azar.choice(["nuevo valor", "x, y"]),
+        "PREGUNTAR_MANTENER_CAPAS": lambda: azar.choice(["si", "no"]),
+        "ESPERANDO_ENCADENAR": lambda: "no",
+        "ESPERANDO_TAREAS_COMBO": lambda: ", ".join(azar.sample(["a", "b", "c", "d"], azar.randint(1, 4))),
+        "ESPERANDO_INICIO_CREACION": lambda: "",
+    }
+    return respuestas[paso]()
+
+
+def simular(guardian, sesiones, semilla=11):
+    azar = random.Random(semilla)
+    turnos = 0
+    contratos = 0
+    esperados = 0
+    inicio = time.perf_counter()
+    with guardian.escrituras_agrupadas(), guardian._memoria_de_peticion({}):
+        for numero in range(sesiones):
+            comando = "crear combo" if numero % 2 else "crear diseño"
+            estado = {"modo": "libre"}
+            tareas = 0
+            while True:
+                respuesta = guardian._resolver_turno({"comando": comando, "estado_conversacion": estado})
+                turnos += 1
+                mensaje = respuesta.get("mensaje_para_ui", "")
+                assert "Error en el flujo" not in mensaje, (comando, estado, mensaje)
+                contratos += mensaje.count("**CONTRATO FORJADO**")
+                estado = respuesta["nuevo_estado"]
+                if estado.get("paso_combo") == "ESPERANDO_INICIO_CREACION":
+                    tareas = len(estado["datos_combo"]["tareas_pendientes"])
+                if estado["modo"] == "libre":
+                    break
+                comando = _respuesta_simulada(estado, azar)
+                assert turnos < sesiones * 200, "una sesión no termina"
+            esperados += tareas if numero % 2 else 1
+    duracion = time.perf_counter() - inicio
+    return turnos, contratos, esperados, duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sesiones simuladas de Diseño y Combo por la máquina de estados.")
+    parser.add_argument("--sesiones", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GUARDIAN_LLM_PROVEEDORES", "falso")
+    os.environ.setdefault("GUARDIAN_ALMACEN", "json")
+    os.chdir(tempfile.mkdtemp(prefix="guardian_maquina_"))
+    from skillsets.guardian import Guardian
+    guardian = Guardian()
+
+    turnos, contratos, esperados, duracion = simular(guardian, args.sesiones)
+    assert contratos == esperados, (contratos, esperados)
+    print(f"✅ {args.sesiones} sesiones ({args.sesiones // 2} combos), {turnos} turnos, {contratos} contratos forjados")
+    print(f"   {duracion:.2f}s en total → {turnos / duracion:,.0f} turnos/s ({duracion / turnos * 1e6:.1f} µs/turno)")
+
+
+if __name__ == "__main__":
+    main()
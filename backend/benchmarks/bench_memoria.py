@@ -0,0 +1,80 @@
+# =================================================================
+# BENCH_MEMORIA.PY - Coste de escritura de la memoria del Guardián
+# =================================================================
+# Añade items uno a uno (como hacen _emitir_ticket y _forjar_contrato) y
+# mide el coste medio por escritura en tramos del archivo. Con el motor
+# 'diario' el coste se mantiene plano; con 'json' crece con el archivo.
+# También mide el tiempo de recarga (reproducción del diario).
+# Con --diferido se repite cada motor con escritura diferida: el coste medido
+# es el que paga la petición (solo memoria) y la recarga comprueba que el
+# cierre no perdió ningún item.
+#
+# Uso:   python benchmarks/bench_memoria.py [--items 100000] [--items-json 5000] [--diferido]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skillsets.almacenamiento import crear_almacen
+from skillsets.escritor_diferido import EscritorDiferido
+
+
+def _item(i):
+    return {
+        "tipo": "Ticket", "id": f"TCKT-{i:06d}", "tarea": f"Tarea de prueba número {i}",
+        "arranque": "14:30", "duracion": "25 min", "fecha_emision": "01/01/25", "hora_emision": "10:00",
+    }
+
+
+def medir(tipo, total, tramos=10, escritor=None):
+    ruta = os.path.join(tempfile.mkdtemp(prefix=f"bench_{tipo}_"), "guardian_memory.json")
+    almacen = crear_almacen(tipo, ruta)
+    almacen.cargar()
+    if escritor is not None:
+        almacen.diferir_escrituras(escritor)
+    tamano_tramo = max(1, total // tramos)
+    resultados = []
+    inicio_tramo = time.perf_counter()
+    for i in range(total):
+        almacen.registrar_item(f"TCKT-{i:06d}", _item(i))
+        if (i + 1) % tamano_tramo == 0:
+            coste = (time.perf_counter() - inicio_tramo) / tamano_tramo
+            resultados.append((i + 1, coste * 1e6))
+            inicio_tramo = time.perf_counter()
+    if escritor is not None:
+        escritor.detener()
+    almacen.cerrar()
+
+    inicio = time.perf_counter()
+    recargado = crear_almacen(tipo, ruta)
+    archivador, _ = recargado.cargar()
+    recarga = time.perf_counter() - inicio
+    recargado.cerrar()
+    assert len(archivador) == total
+    return resultados, recarga
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste por escritura según tamaño del archivo.")
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--items-json", type=int, default=5000, help="el motor json es O(n) por item: usar menos")
+    parser.add_argument("--diferido", action="store_true", help="repetir cada motor con escritura diferida")
+    args = parser.parse_args()
+
+    for tipo, total in (("diario", args.items), ("json", args.items_json)):
+        for diferido in ((False, True) if args.diferido else (False,)):
+            escritor = EscritorDiferido(tipo) if diferido else None
+            resultados, recarga = medir(tipo, total, escritor=escritor)
+            print(f"\nMotor '{tipo}'{' con escritura diferida' if diferido else ''} ({total} items):")
+            for items, micros in resultados:
+                print(f"  hasta {items:>7} items: {micros:10.1f} µs/escritura")
+            print(f"  recarga completa: {recarga:.2f} s")
+            if escritor is not None:
+                print(f"  volcados en segundo plano: {escritor.volcados} ({total / max(1, escritor.volcados):.0f} items/volcado)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# =================================================================
+# CARGA_ASGI_VS_FLASK.PY - Prueba de carga de los dos modos de servicio
+# =================================================================
+# Lanza el servidor Flask (main.py, un worker síncrono como gunicorn) y el
+# servidor ASGI (asgi.py bajo uvicorn) en este mismo proceso, registra en
+# ambos un skillset "lento" que simula una llamada a g4f con asyncio.sleep
+# y dispara N peticiones concurrentes contra '/execute'.
+#
+# Uso:   python benchmarks/carga_asgi_vs_flask.py [--peticiones 50] [--latencia 0.5]
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CARPETA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CARPETA_BACKEND)
+# La memoria del Guardián se escribe en el directorio actual: usamos uno temporal.
+os.chdir(tempfile.mkdtemp(prefix="guardian_carga_"))
+
+
+class SkillsetLento:
+    """Simula un skillset que espera a un proveedor LLM lento."""
+    def __init__(self, latencia):
+        self.latencia = latencia
+
+    async def ejecutar(self, datos):
+        await asyncio.sleep(self.latencia)
+        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": f"eco: {datos.get('comando', '')}"}
+
+
+def _enviar_peticion(url):
+    cuerpo = json.dumps({"comando": "hola", "skillset_target": "lento", "estado_conversacion": {"modo": "libre"}}).encode()
+    peticion = urllib.request.Request(url, data=cuerpo, headers={"Content-Type": "application/json"})
+    inicio = time.perf_counter()
+    with urllib.request.urlopen(peticion, timeout=600) as respuesta:
+        json.loads(respuesta.read())
+    return time.perf_counter() - inicio
+
+
+def _medir(url, peticiones):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=peticiones) as ejecutor:
+        latencias = list(ejecutor.map(lambda _: _enviar_peticion(url), range(peticiones)))
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "total_s": round(total, 3),
+        "peticiones_por_s": round(peticiones / total, 2),
+        "p50_s": round(statistics.median(latencias), 3),
+        "max_s": round(latencias[-1], 3),
+    }
+
+
+def _lanzar_flask(puerto, latencia):
+    from werkzeug.serving import make_server
+    import main
+    main.ale.cargar_skillset("lento", SkillsetLento(latencia))
+    # threaded=False reproduce un worker 'sync' de gunicorn: una petición a la vez.
+    servidor = make_server("127.0.0.1", puerto, main.app, threaded=False)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor.shutdown
+
+
+def _lanzar_asgi(puerto, latencia):
+    import uvicorn
+    import asgi
+    asgi.ale.cargar_skillset("lento", SkillsetLento(latencia))
+    servidor = uvicorn.Server(uvicorn.Config(asgi.app, host="127.0.0.1", port=puerto, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+
+    def detener():
+        servidor.should_exit = True
+    return detener
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara Flask y ASGI bajo llamadas lentas concurrentes.")
+    parser.add_argument("--peticiones", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.5, help="segundos de la llamada lenta simulada")
+    args = parser.parse_args()
+
+    resultados = {}
+    for nombre, lanzar, puerto in (("flask", _lanzar_flask, 5071), ("asgi", _lanzar_asgi, 5072)):
+        detener = lanzar(puerto, args.latencia)
+        try:
+            resultados[nombre] = _medir(f"http://127.0.0.1:{puerto}/execute", args.peticiones)
+        finally:
+            detener()
+        print(f"{nombre:>6}: {resultados[nombre]}")
+
+    print(json.dumps({"peticiones": args.peticiones, "latencia_s": args.latencia, "resultados": resultados}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+# =================================================================
+# CARGA_CONVERSACIONES.PY - Conversaciones guionizadas contra la app Flask
+# =================================================================
+# Levanta main.py (la app Flask real, con hilos) en un proceso aparte, con un
+# directorio de memoria temporal y el proveedor LLM 'falso' en lugar de g4f
+# (latencia y tasa de fallos ajustables). N usuarios virtuales repiten, cada
+# uno con su sesión y su memoria, conversaciones guionizadas como las de la
+# PWA:
+#   - cadena de tickets (con y sin hora de arranque y duración);
+#   - diseño con ruletas y correcciones por ruleta;
+#   - combo de tres contratos;
+#   - consultas: recuperar un ticket por ID, listar, buscar, estadísticas;
+#   - charla libre (pasa por el LLM falso).
+# Informa la latencia p50/p95/p99 (global y por guion), las peticiones por
+# segundo, el volumen de escritura de la memoria (escrituras contadas en
+# /metrics, bytes escritos a disco por el servidor y tamaño final de la
+# memoria) y la RSS del servidor. El resultado se guarda en JSON; con
+# --comparar se muestra la diferencia con otra ejecución.
+# Los usuarios virtuales no esperan entre comandos, así que el límite por
+# cliente del control de admisión se desactiva salvo con --limite-clientes;
+# las respuestas "ocupado" de los carriles se cuentan aparte.
+#
+# Uso:   python benchmarks/carga_conversaciones.py [--usuarios 16] [--conversaciones 10]
+#            [--latencia-llm 0.3] [--fallos-llm 0] [--almacen diario] [--limite-clientes]
+#            [--salida carga.json] [--comparar carga_anterior.json]
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+CARPETA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CARPETA_BACKEND)
+from skillsets.identificadores import PATRON_ID
+
+SCRIPT_SERVIDOR = r'''
+import sys
+sys.path.insert(0, {backend!r})
+from werkzeug.serving import make_server
+import main
+servidor = make_server("127.0.0.1", {puerto}, main.app, threaded=True)
+print("SERVIDOR_LISTO", flush=True)
+try:
+    servidor.serve_forever()
+except KeyboardInterrupt:
+    pass
+'''
+
+# Pasos especiales de los guiones: se sustituyen por lo que devolvió el turno anterior.
+RULETA = "<ruleta>"
+ULTIMO_ID = "<id>"
+
+GUIONES = {
+    "cadena_tickets": [
+        "crear ticket",
+        "Necesito repasar física a las 18:30 durante 25 min",
+        "si",
+        "Tengo que llamar al banco durante 10 min",
+        "si",
+        "Ordenar el escritorio",
+        "no",
+    ],
+    "diseno_ruleta": [
+        "crear diseño",
+        "Escribir el informe, Preparar el examen, Revisar el correo",
+        RULETA,
+        "no",
+        "18:00, 19:00",
+        RULETA,
+        "si",
+        "25 min, 40 min",
+        RULETA,
+        "corregir",
+        "arranque",
+        "20:00, 21:00",
+        RULETA,
+        "corregir",
+        "duración",
+        "30 min",
+        "confirmar",
+        "no",
+    ],
+    "combo": [
+        "crear combo",
+        "Repasar apuntes, Correr en el parque, Cocinar la cena",
+        "continuar",
+    ] + ["no", "18:00", "si", "25 min", "confirmar"] * 3,
+    "consultas": [
+        "crear ticket",
+        "Comprar pan durante 5 min",
+        "no",
+        f"activar diseño {ULTIMO_ID}",
+        "cancelar",
+        "listar tickets",
+        "buscar pan",
+        "estadísticas",
+        "próximos",
+    ],
+    "charla": [
+        "hola, ¿cómo estás?",
+        "dame un consejo para concentrarme mejor",
+        "gracias por la ayuda",
+    ],
+}
+
+# Respuestas que indican que el guion se salió del camino previsto.
+PATRON_INESPERADO = re.compile(r'Error en el flujo|No te he entendido|no válido|Reiniciando', re.IGNORECASE)
+
+
+# --- SERVIDOR ---
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def lanzar_servidor(carpeta, puerto, entorno):
+    proceso = subprocess.Popen(
+        [sys.executable, "-c", SCRIPT_SERVIDOR.format(backend=CARPETA_BACKEND, puerto=puerto)],
+        cwd=carpeta, env={**os.environ, **entorno}, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    for linea in proceso.stdout:
+        if "SERVIDOR_LISTO" in linea:
+            break
+    else:
+        raise RuntimeError("El servidor terminó antes de estar listo.")
+    # El resto de la salida del servidor se descarta para que no bloquee su stdout.
+    threading.Thread(target=lambda: [None for _ in proceso.stdout], daemon=True).start()
+    return proceso
+
+
+def detener_servidor(proceso):
+    # SIGINT: el servidor sale por KeyboardInterrupt y vuelca la memoria pendiente (atexit).
+    proceso.send_signal(signal.SIGINT)
+    try:
+        proceso.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+
+
+def _leer_proc(pid, archivo):
+    """Campos 'clave: valor' de /proc/<pid>/<archivo> (Linux); {} si no existe."""
+    try:
+        with open(f"/proc/{pid}/{archivo}") as f:
+            return dict(linea.split(":", 1) for linea in f if ":" in linea)
+    except OSError:
+        return {}
+
+
+def medir_proceso(pid):
+    estado, io = _leer_proc(pid, "status"), _leer_proc(pid, "io")
+
+    def kb(clave):
+        return int(estado[clave].split()[0]) * 1024 if clave in estado else None
+    return {
+        "rss_bytes": kb("VmRSS"),
+        "rss_pico_bytes": kb("VmHWM"),
+        "disco_escrito_bytes": int(io["write_bytes"]) if "write_bytes" in io else None,
+    }
+
+
+def escrituras_memoria(url_base):
+    """Número de escrituras de memoria por operación, leído de /metrics."""
+    with urllib.request.urlopen(f"{url_base}/metrics", timeout=30) as respuesta:
+        texto = respuesta.read().decode("utf-8")
+    recuentos = {}
+    for operacion, valor in re.findall(r'guardian_escritura_memoria_segundos_count\{[^}]*operacion="([^"]+)"[^}]*\}\s+(\S+)', texto):
+        recuentos[operacion] = recuentos.get(operacion, 0) + int(float(valor))
+    return recuentos
+
+
+def tamano_carpeta(carpeta):
+    return sum(os.path.getsize(os.path.join(raiz, nombre)) for raiz, _, nombres in os.walk(carpeta) for nombre in nombres)
+
+
+# --- USUARIOS VIRTUALES ---
+def _enviar(url, cuerpo):
+    peticion = urllib.request.Request(url, data=json.dumps(cuerpo).encode("utf-8"), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(peticion, timeout=120) as respuesta:
+        return json.loads(respuesta.read())
+
+
+def conversar(url, usuario, conversaciones, azar, mezcla):
+    """Ejecuta 'conversaciones' guiones seguidos con la sesión del usuario. Devuelve sus mediciones."""
+    mediciones, inesperadas, errores, ocupadas = [], 0, 0, 0
+    token = ""
+    nombres, pesos = zip(*mezcla)
+    for _ in range(conversaciones):
+        nombre = azar.choices(nombres, pesos)[0]
+        respuesta, ultimo_id = {}, None
+        for paso in GUIONES[nombre]:
+            if paso == RULETA:
+                opciones = respuesta.get("opciones_ruleta")
+                if not opciones:
+                    inesperadas += 1
+                    break
+                comando = azar.choice(opciones)
+            else:
+                comando = paso.replace(ULTIMO_ID, ultimo_id or "TCKT-0000000000")
+            inicio = time.perf_counter()
+            try:
+                respuesta = _enviar(url, {"comando": comando, "skillset_target": "guardian", "usuario_id": usuario, "sesion_token": token})
+            except Exception:
+                errores += 1
+                respuesta = {}
+                continue
+            finally:
+                mediciones.append((nombre, time.perf_counter() - inicio))
+            token = respuesta.get("sesion_token", token)
+            if respuesta.get("ocupado"):
+                ocupadas += 1
+                continue
+            mensaje = respuesta.get("mensaje_para_ui") or ""
+            if PATRON_INESPERADO.search(mensaje):
+                inesperadas += 1
+            encontrado = PATRON_ID.search(mensaje)
+            if encontrado:
+                ultimo_id = encontrado.group(1)
+    return mediciones, inesperadas, errores, ocupadas
+
+
+# --- INFORME ---
+def percentiles(latencias):
+    if not latencias:
+        return {"peticiones": 0}
+    ordenadas = sorted(latencias)
+
+    def p(q):
+        return round(ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))] * 1000, 2)
+    return {"peticiones": len(ordenadas), "p50_ms": p(0.50), "p95_ms": p(0.95), "p99_ms": p(0.99), "max_ms": round(ordenadas[-1] * 1000, 2)}
+
+
+def ejecutar(args):
+    carpeta = tempfile.mkdtemp(prefix="guardian_carga_")
+    puerto = _puerto_libre()
+    url_base = f"http://127.0.0.1:{puerto}"
+    entorno = {
+        "GUARDIAN_LLM_PROVEEDORES": f"falso:{args.latencia_llm}:{args.fallos_llm}",
+        "GUARDIAN_ALMACEN": args.almacen,
+    }
+    if not args.limite_clientes:
+        entorno.update(ALE_CARRIL_LOCAL_TASA_CLIENTE="0", ALE_CARRIL_REMOTO_TASA_CLIENTE="0")
+    servidor = lanzar_servidor(carpeta, puerto, entorno)
+    try:
+        # Calentamiento: carga del skillset y de la memoria histórica fuera de la medición.
+        _enviar(f"{url_base}/execute", {"comando": "_SALUDO_INICIAL_", "skillset_target": "guardian"})
+        escrituras_antes = escrituras_memoria(url_base)
+        proceso_antes = medir_proceso(servidor.pid)
+
+        mezcla = [(nombre, float(peso)) for nombre, _, peso in (e.partition(":") for e in args.mezcla.split(","))]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.usuarios) as ejecutor:
+            resultados = list(ejecutor.map(
+                lambda n: conversar(f"{url_base}/execute", f"carga-{n}", args.conversaciones, random.Random(args.semilla + n), mezcla),
+                range(args.usuarios)))
+        duracion = time.perf_counter() - inicio
+
+        # La escritura diferida se vuelca en segundo plano: se le da tiempo antes de medir.
+        time.sleep(0.5)
+        escrituras_despues = escrituras_memoria(url_base)
+        proceso_despues = medir_proceso(servidor.pid)
+    finally:
+        detener_servidor(servidor)
+
+    mediciones = [m for r in resultados for m in r[0]]
+    por_guion = {}
+    for nombre, segundos in mediciones:
+        por_guion.setdefault(nombre, []).append(segundos)
+    disco_antes, disco_despues = proceso_antes["disco_escrito_bytes"], proceso_despues["disco_escrito_bytes"]
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "parametros": vars(args),
+        "duracion_s": round(duracion, 3),
+        "peticiones_por_s": round(len(mediciones) / duracion, 2) if duracion else 0.0,
+        "latencia": percentiles([s for _, s in mediciones]),
+        "latencia_por_guion": {nombre: percentiles(valores) for nombre, valores in sorted(por_guion.items())},
+        "respuestas_inesperadas": sum(r[1] for r in resultados),
+        "errores": sum(r[2] for r in resultados),
+        "ocupadas": sum(r[3] for r in resultados),
+        "escritura": {
+            "escrituras_memoria": {op: escrituras_despues.get(op, 0) - escrituras_antes.get(op, 0)
+                                   for op in escrituras_despues if escrituras_despues.get(op, 0) != escrituras_antes.get(op, 0)},
+            "disco_escrito_bytes": disco_despues - disco_antes if disco_antes is not None and disco_despues is not None else None,
+            "memoria_en_disco_bytes": tamano_carpeta(carpeta),
+        },
+        "servidor": {"rss_bytes": proceso_despues["rss_bytes"], "rss_pico_bytes": proceso_despues["rss_pico_bytes"]},
+    }
+    shutil.rmtree(carpeta, ignore_errors=True)
+    return informe
+
+
+def _mostrar(informe):
+    latencia = informe["latencia"]
+    print(f"{latencia['peticiones']} peticiones en {informe['duracion_s']:.2f} s -> {informe['peticiones_por_s']:.1f} pet/s "
+          f"| p50 {latencia['p50_ms']} ms · p95 {latencia['p95_ms']} ms · p99 {latencia['p99_ms']} ms")
+    for nombre, datos in informe["latencia_por_guion"].items():
+        print(f"  {nombre:>15}: {datos['peticiones']:>6} pet · p50 {datos['p50_ms']:>8} ms · p95 {datos['p95_ms']:>8} ms · p99 {datos['p99_ms']:>8} ms")
+    escritura, servidor = informe["escritura"], informe["servidor"]
+    print(f"  escrituras de memoria: {escritura['escrituras_memoria']}")
+    print(f"  disco escrito: {escritura['disco_escrito_bytes']} B · memoria en disco: {escritura['memoria_en_disco_bytes']} B")
+    print(f"  RSS del servidor: {servidor['rss_bytes']} B (pico {servidor['rss_pico_bytes']} B)")
+    if informe.get("ocupadas"):
+        print(f"  🚦 {informe['ocupadas']} respuestas 'ocupado' del control de admisión")
+    if informe["respuestas_inesperadas"] or informe["errores"]:
+        print(f"  ⚠️ {informe['respuestas_inesperadas']} respuestas inesperadas, {informe['errores']} errores HTTP")
+
+
+def _comparar(actual, anterior):
+    print(f"Comparación con la ejecución del {anterior['fecha']}:")
+    filas = [("pet/s", actual["peticiones_por_s"], anterior["peticiones_por_s"])]
+    filas += [(clave, actual["latencia"][clave], anterior["latencia"][clave]) for clave in ("p50_ms", "p95_ms", "p99_ms")]
+    filas.append(("rss_pico", actual["servidor"]["rss_pico_bytes"], anterior["servidor"]["rss_pico_bytes"]))
+    for nombre, ahora, antes in filas:
+        if ahora is None or not antes:
+            continue
+        print(f"  {nombre:>9}: {antes} -> {ahora} ({(ahora - antes) / antes * 100:+.1f} %)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversaciones guionizadas concurrentes contra la app Flask.")
+    parser.add_argument("--usuarios", type=int, default=16, help="usuarios virtuales concurrentes")
+    parser.add_argument("--conversaciones", type=int, default=10, help="guiones por usuario")
+    parser.add_argument("--mezcla", default="cadena_tickets:3,diseno_ruleta:2,combo:1,consultas:2,charla:2",
+                        help="guiones y pesos ('nombre:peso,...')")
+    parser.add_argument("--latencia-llm", type=float, default=0.3, help="segundos por respuesta del LLM falso")
+    parser.add_argument("--fallos-llm", type=float, default=0.0, help="probabilidad de fallo del LLM falso")
+    parser.add_argument("--almacen", default="diario", choices=["diario", "json", "sqlite"])
+    parser.add_argument("--limite-clientes", action="store_true", help="mantiene el límite por cliente del control de admisión")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--salida", default=None, help="archivo JSON de resultados (por defecto carga_<fecha>.json)")
+    parser.add_argument("--comparar", default=None, help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+    for nombre in (e.partition(":")[0] for e in args.mezcla.split(",")):
+        if nombre not in GUIONES:
+            parser.error(f"guion desconocido '{nombre}' (hay: {', '.join(GUIONES)})")
+
+    informe = ejecutar(args)
+    _mostrar(informe)
+    salida = args.salida or f"carga_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=4, ensure_ascii=False)
+    print(f"Resultados guardados en '{salida}'.")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            _comparar(informe, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# =================================================================
+# ESTRES_MULTIPROCESO.PY - Varios workers escribiendo la misma memoria
+# =================================================================
+# Reproduce gunicorn con N workers: N procesos con su propio Guardián
+# (GUARDIAN_MULTIPROCESO=1) emiten tickets a la vez para el mismo usuario.
+# Todos usan el mismo nodo de IDs (ALE_NODO=0), así que sin coordinación
+# generarían los mismos IDs en el mismo segundo y se pisarían.
+# Al terminar, cada worker comprueba que ve los tickets de los demás (solo
+# incorporando los cambios) y el proceso principal reabre la memoria y
+# verifica:
+# - que no falta ningún ticket ni hay IDs repetidos;
+# - que los números de secuencia ('seq') son exactamente 1..total;
+# - que la analítica cuenta todos los tickets.
+# Con el diario se fuerzan compactaciones durante la prueba.
+#
+# Uso:   python benchmarks/estres_multiproceso.py [--workers 4] [--tickets 250] [--motores diario,json,sqlite]
+# Sale con código 1 si se perdió algo.
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+USUARIO = "estres"
+
+
+def _configurar_entorno(carpeta, motor):
+    os.chdir(carpeta)
+    os.environ.update(
+        GUARDIAN_ALMACEN=motor,
+        GUARDIAN_MULTIPROCESO="1",
+        GUARDIAN_LLM_PROVEEDORES="falso",
+        ALE_NODO="0",
+    )
+
+
+def _worker(numero, carpeta, motor, tickets, barrera, resultados):
+    _configurar_entorno(carpeta, motor)
+    from skillsets.guardian import Guardian
+    from skillsets.identificadores import PATRON_ID
+
+    guardian = Guardian()
+    # Compactaciones frecuentes: también se prueba la recarga por generación.
+    with guardian.memorias.usar(USUARIO) as memoria:
+        if hasattr(memoria.almacen, "compactar_minimo"):
+            memoria.almacen.compactar_minimo = 50
+    barrera.wait()
+
+    ids = []
+    inicio = time.perf_counter()
+    for i in range(tickets):
+        with guardian._memoria_de_peticion({"usuario_id": USUARIO}):
+            texto = guardian._emitir_ticket(f"Revisar el informe {numero}-{i} durante 25 min")
+        ids.append(PATRON_ID.search(texto).group(1))
+    segundos = time.perf_counter() - inicio
+
+    # Cuando todos terminaron, cada worker debe ver lo de los demás.
+    barrera.wait()
+    with guardian.memorias.usar(USUARIO) as memoria:
+        vistos = len(memoria.archivador)
+    sincronizados, cursor, completo = 0, "", False
+    while not completo:
+        pagina = guardian.sincronizar(USUARIO, cursor)
+        sincronizados += len(pagina["items"])
+        cursor, completo = pagina["cursor"], pagina["completo"]
+    guardian.cerrar()
+    resultados.put({"worker": numero, "ids": ids, "segundos": segundos, "vistos": vistos, "sincronizados": sincronizados})
+
+
+def verificar(carpeta, motor, esperados):
+    """Reabre la memoria en este proceso y devuelve la lista de problemas encontrados."""
+    from skillsets.almacenamiento import crear_almacen
+    from skillsets.inquilinos import GestorMemorias
+
+    gestor = GestorMemorias("guardian_memory.json", os.path.join(carpeta, "guardian_memoria"), motor)
+    almacen = crear_almacen(motor, gestor.ruta_memoria(USUARIO))
+    archivador, datos_usuario = almacen.cargar()
+    try:
+        problemas = []
+        faltan = [identificador for identificador in esperados if identificador not in archivador]
+        if faltan:
+            problemas.append(f"faltan {len(faltan)} tickets (p. ej. {faltan[:3]})")
+        if len(set(esperados)) != len(esperados):
+            problemas.append(f"{len(esperados) - len(set(esperados))} IDs repetidos entre workers")
+        secuencias = sorted(archivador[identificador].get("seq") for identificador in archivador)
+        if secuencias != list(range(1, len(esperados) + 1)):
+            problemas.append("los números de secuencia no son 1..total")
+        if (datos_usuario or {}).get("secuencia") != len(esperados):
+            problemas.append(f"secuencia final {(datos_usuario or {}).get('secuencia')} != {len(esperados)}")
+        tickets_analitica = ((datos_usuario or {}).get("analitica") or {}).get("totales", {}).get("tickets")
+        if tickets_analitica != len(esperados):
+            problemas.append(f"la analítica cuenta {tickets_analitica} tickets de {len(esperados)}")
+        return problemas
+    finally:
+        almacen.cerrar()
+
+
+def ejecutar(motor, workers, tickets):
+    carpeta = tempfile.mkdtemp(prefix=f"estres_{motor}_")
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(workers)
+    resultados = contexto.Queue()
+    procesos = [contexto.Process(target=_worker, args=(numero, carpeta, motor, tickets, barrera, resultados))
+                for numero in range(workers)]
+    inicio = time.perf_counter()
+    for proceso in procesos:
+        proceso.start()
+    informes = [resultados.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+    total_s = time.perf_counter() - inicio
+
+    esperados = [identificador for informe in informes for identificador in informe["ids"]]
+    cwd = os.getcwd()
+    try:
+        os.chdir(carpeta)
+        problemas = verificar(carpeta, motor, esperados)
+    finally:
+        os.chdir(cwd)
+    for informe in informes:
+        if informe["vistos"] != len(esperados):
+            problemas.append(f"el worker {informe['worker']} ve {informe['vistos']} items de {len(esperados)}")
+        if informe["sincronizados"] != len(esperados):
+            problemas.append(f"el worker {informe['worker']} sincroniza {informe['sincronizados']} items de {len(esperados)}")
+    escritura_s = max(informe["segundos"] for informe in informes)
+    shutil.rmtree(carpeta, ignore_errors=True)
+    return {
+        "motor": motor, "workers": workers, "tickets": len(esperados),
+        "escritura_s": escritura_s, "tickets_por_s": len(esperados) / escritura_s if escritura_s else 0.0,
+        "total_s": total_s, "problemas": problemas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Workers concurrentes escribiendo la misma memoria.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tickets", type=int, default=250, help="tickets por worker")
+    parser.add_argument("--motores", default="diario,json,sqlite")
+    args = parser.parse_args()
+
+    fallos = 0
+    for motor in args.motores.split(","):
+        r = ejecutar(motor, args.workers, args.tickets)
+        estado = "✅ sin pérdidas" if not r["problemas"] else "🚨 " + "; ".join(r["problemas"])
+        print(f"{r['motor']:>7}: {r['workers']} workers, {r['tickets']} tickets en {r['escritura_s']:.2f} s "
+              f"({r['tickets_por_s']:.0f} tickets/s, {r['total_s']:.1f} s con arranque) -> {estado}")
+        fallos += bool(r["problemas"])
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == "__main__":
+    main()
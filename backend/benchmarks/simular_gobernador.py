@@ -0,0 +1,117 @@
+# =================================================================
+# SIMULAR_GOBERNADOR.PY - Escenarios del gobernador de proveedores LLM
+# =================================================================
+# Ejercita GobernadorLLM con proveedores falsos locales (latencia y tasa de
+# fallos configurables) y mide cada escenario:
+#   1. cobertura: cuánto tarda en responder el proveedor que cubre al lento,
+#   2. disyuntor: llamadas que recibe el proveedor roto y coste del rechazo,
+#   3. plazo: cuánto bloquea un proveedor colgado,
+#   4. límite de concurrencia: duración y máximo de llamadas en vuelo,
+#   5. Guardián: llamadas que llegan al proveedor con el disyuntor abierto.
+# Las garantías se comprueban en tests/test_proveedores_llm.py (pytest);
+# este script solo informa de los tiempos.
+#
+# Uso:   python benchmarks/simular_gobernador.py
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skillsets.proveedores_llm import GobernadorLLM, ProveedorFalso, SinProveedorDisponible
+
+MENSAJES = [{"role": "user", "content": "hola"}]
+
+
+async def escenario_cobertura():
+    lento = ProveedorFalso("lento", latencia=3.0)
+    rapido = ProveedorFalso("rapido", latencia=0.1)
+    gobernador = GobernadorLLM([lento, rapido], plazo=5.0, umbral_cobertura=0.3)
+    inicio = time.perf_counter()
+    respuesta = await gobernador.completar(MENSAJES)
+    duracion = time.perf_counter() - inicio
+    return f"respondió '{respuesta.split(']')[0].lstrip('[')}' en {duracion:.2f}s (coberturas={gobernador.coberturas})"
+
+
+async def escenario_disyuntor():
+    roto = ProveedorFalso("roto", latencia=0.01, tasa_fallos=1.0)
+    sano = ProveedorFalso("sano", latencia=0.01)
+    gobernador = GobernadorLLM([roto, sano], umbral_fallos=3, enfriamiento=60.0)
+    for _ in range(20):
+        await gobernador.completar(MENSAJES)
+
+    solo_roto = GobernadorLLM([ProveedorFalso("roto", latencia=0.05, tasa_fallos=1.0)], umbral_fallos=3, enfriamiento=60.0)
+    for _ in range(3):
+        try:
+            await solo_roto.completar(MENSAJES)
+        except Exception:
+            pass
+    inicio = time.perf_counter()
+    try:
+        await solo_roto.completar(MENSAJES)
+    except SinProveedorDisponible:
+        pass
+    rechazo = time.perf_counter() - inicio
+    return f"'roto' recibió {roto.llamadas} llamadas de 20; rechazo rápido en {rechazo * 1000:.2f} ms"
+
+
+async def escenario_plazo():
+    gobernador = GobernadorLLM([ProveedorFalso("colgado", colgado=True)], plazo=0.5)
+    inicio = time.perf_counter()
+    try:
+        await gobernador.completar(MENSAJES)
+    except Exception:
+        pass
+    duracion = time.perf_counter() - inicio
+    return f"plazo agotado en {duracion:.2f}s"
+
+
+async def escenario_concurrencia(peticiones=200, tope=20):
+    proveedor = ProveedorFalso("falso", latencia=0.05, variacion=0.02)
+    gobernador = GobernadorLLM([proveedor], plazo=30.0, max_en_vuelo=tope)
+    maximo = 0
+
+    async def vigilar():
+        nonlocal maximo
+        while True:
+            maximo = max(maximo, gobernador.en_vuelo)
+            await asyncio.sleep(0.001)
+
+    vigia = asyncio.ensure_future(vigilar())
+    inicio = time.perf_counter()
+    await asyncio.gather(*[gobernador.completar(MENSAJES) for _ in range(peticiones)])
+    duracion = time.perf_counter() - inicio
+    vigia.cancel()
+    return f"{peticiones} llamadas en {duracion:.2f}s con máximo {maximo} en vuelo (tope {tope})"
+
+
+async def escenario_guardian():
+    os.environ["GUARDIAN_LLM_PROVEEDORES"] = "falso:0.01:1.0"
+    os.chdir(tempfile.mkdtemp(prefix="guardian_gobernador_"))
+    from skillsets.guardian import Guardian
+    guardian = Guardian()
+    inicio = time.perf_counter()
+    respuestas = [await guardian.ejecutar({"comando": f"hola {i}"}) for i in range(8)]
+    duracion = time.perf_counter() - inicio
+    sobrecargas = sum("sobrecarga" in r["mensaje_para_ui"] for r in respuestas)
+    estado = guardian.gobernador.estadisticas()["proveedores"]["falso-0"]
+    guardian.cerrar()
+    return (f"8 mensajes en {duracion:.2f}s, {sobrecargas} con 'sobrecarga'; el proveedor recibió "
+            f"{estado['llamadas']} llamadas (disyuntor {estado['disyuntor']})")
+
+
+async def main():
+    for nombre, escenario in (
+        ("cobertura", escenario_cobertura),
+        ("disyuntor", escenario_disyuntor),
+        ("plazo", escenario_plazo),
+        ("concurrencia", escenario_concurrencia),
+        ("guardian", escenario_guardian),
+    ):
+        print(f"⏱️ {nombre:>12}: {await escenario()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+# =================================================================
+# EXPORTAR_ARCHIVO.PY - Exportación e importación del archivador
+# =================================================================
+# Copia el archivador de un usuario (tickets, contratos y datos de usuario) a
+# un archivo columnar compacto, o lo restaura desde él.
+# - .alec: formato propio sin dependencias (ver skillsets/columnar.py).
+# - .parquet: si pyarrow está instalado; se abre con pandas, DuckDB, etc.
+# Al importar, los items se fusionan con los existentes (el del archivo gana
+# si el ID coincide). Con --reemplazar el archivador se sustituye entero.
+# Ejecutar con el servidor detenido.
+#
+# Uso:   python exportar_archivo.py exportar archivo.alec [--usuario ID] [--motor diario]
+#        python exportar_archivo.py importar archivo.alec [--usuario ID] [--reemplazar]
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from skillsets.almacenamiento import crear_almacen
+from skillsets.columnar import exportar, importar
+from skillsets.inquilinos import DATOS_USUARIO_INICIALES, USUARIO_POR_DEFECTO, GestorMemorias
+
+
+def _ruta_memoria(args):
+    gestor = GestorMemorias(args.memoria, args.dir, args.motor)
+    return gestor.ruta_memoria(args.usuario)
+
+
+def exportar_memoria(motor, ruta_memoria, ruta_archivo):
+    """Exporta la memoria en 'ruta_memoria'. Devuelve el número de items."""
+    almacen = crear_almacen(motor, ruta_memoria)
+    try:
+        archivador, datos_usuario = almacen.cargar()
+        return exportar(archivador, datos_usuario, ruta_archivo)
+    finally:
+        almacen.cerrar()
+
+
+def importar_memoria(motor, ruta_memoria, ruta_archivo, reemplazar=False):
+    """Importa 'ruta_archivo' sobre la memoria. Devuelve el número de items importados."""
+    importado, datos_importados = importar(ruta_archivo)
+    os.makedirs(os.path.dirname(ruta_memoria) or ".", exist_ok=True)
+    almacen = crear_almacen(motor, ruta_memoria)
+    try:
+        _, datos_usuario = almacen.cargar()
+        if reemplazar:
+            almacen.guardar_todo(dict(importado.items()), datos_importados or copy.deepcopy(DATOS_USUARIO_INICIALES))
+            return len(importado)
+        almacen.iniciar_agrupacion()
+        try:
+            for identificador, item in importado.items():
+                almacen.registrar_item(identificador, item)
+            if datos_usuario is None and datos_importados is not None:
+                almacen.registrar_datos_usuario(datos_importados)
+        finally:
+            almacen.terminar_agrupacion()
+        return len(importado)
+    finally:
+        almacen.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o importa el archivador en formato columnar (.alec o .parquet).")
+    parser.add_argument("accion", choices=("exportar", "importar"))
+    parser.add_argument("archivo", help="ruta del archivo .alec o .parquet")
+    parser.add_argument("--usuario", default=USUARIO_POR_DEFECTO, help="usuario_id (por defecto, la memoria histórica)")
+    parser.add_argument("--motor", default=os.environ.get("GUARDIAN_ALMACEN", "diario"))
+    parser.add_argument("--memoria", default="guardian_memory.json")
+    parser.add_argument("--dir", default=os.environ.get("GUARDIAN_MEMORIA_DIR", "guardian_memoria"))
+    parser.add_argument("--reemplazar", action="store_true", help="al importar, sustituir el archivador en vez de fusionar")
+    args = parser.parse_args()
+
+    ruta = _ruta_memoria(args)
+    inicio = time.perf_counter()
+    try:
+        if args.accion == "exportar":
+            total = exportar_memoria(args.motor, ruta, args.archivo)
+            tamano = os.path.getsize(args.archivo)
+            print(f"✅ {total} items de '{ruta}' exportados a '{args.archivo}' ({tamano / 1024:.1f} KiB).")
+        else:
+            total = importar_memoria(args.motor, ruta, args.archivo, reemplazar=args.reemplazar)
+            print(f"✅ {total} items de '{args.archivo}' {'reemplazan' if args.reemplazar else 'fusionados en'} '{ruta}'.")
+    except (RuntimeError, ValueError, OSError) as e:
+        print(f"🚨 {e}")
+        sys.exit(1)
+    print(f"   ({time.perf_counter() - inicio:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
 # =================================================================
-# MAIN.PY (v1.0 - ESTABLE)
+# MAIN.PY (v1.1 - MODO COMPATIBILIDAD)
 # =================================================================
 # Este archivo crea el servidor web Flask y actúa como el punto de
 # entrada para todas las peticiones de la PWA.
+# - Modo compatibilidad: el modo de servicio recomendado es el ASGI
+#   (ver asgi.py). Este servidor sigue funcionando con gunicorn.
+# - Las corrutinas ya no crean un bucle por petición: todas se envían
+#   a un único bucle de eventos de larga vida en un hilo de fondo.
 
 import sys
 import os
 import asyncio
-from flask import Flask, request, jsonify
+import threading
+import json
+import queue
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
 # --- CONFIGURACIÓN DE LA APLICACIÓN Y CORS ---
@@ -28,38 +35,149 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # --- IMPORTAR E INICIALIZAR EL CEREBRO Y LOS SKILLSETS ---
 from ale_core import ALE_Core
-from skillsets.guardian import Guardian
+from metricas import REGISTRO, TIPO_CONTENIDO, DECODIFICACION_JSON
+from skillsets.recordatorios import INTERVALO_LATIDO_S, LATIDO_SSE, formato_sse
 
 # 1. Creamos la instancia del motor A.L.E.
 ale = ALE_Core()
 
-# 2. Cargamos el skillset del Guardián con su nombre oficial.
-#    La PWA deberá usar "guardian" para llamarlo.
-ale.cargar_skillset("guardian", Guardian())
+# 2. Registramos los skillsets que se declaran en el paquete 'skillsets' (y los
+#    de entry points 'ale.skillsets'). La PWA usa su nombre oficial ("guardian",
+#    "archivista", ...) para llamarlos. Cada uno se importa y se crea en su
+#    primera petición (o ya en segundo plano si ALE_PRECALENTAR=1).
+nombres_skillsets = ale.descubrir_skillsets()
+if os.environ.get("ALE_PRECALENTAR", "0") == "1":
+    ale.precalentar()
 
-print("✅ Servidor listo. A.L.E. está online con el skillset 'guardian'.")
+print(f"✅ Servidor listo. A.L.E. está online con los skillsets: {', '.join(nombres_skillsets)}.")
+
+# --- BUCLE DE EVENTOS COMPARTIDO ---
+# Un único bucle de larga vida por proceso. Se crea en la primera petición
+# (y no al importar) para que sobreviva al 'fork' de los workers de gunicorn.
+_bucle_eventos = None
+_candado_bucle = threading.Lock()
+
+def _obtener_bucle():
+    global _bucle_eventos
+    with _candado_bucle:
+        if _bucle_eventos is None:
+            _bucle_eventos = asyncio.new_event_loop()
+            threading.Thread(target=_bucle_eventos.run_forever, name="ale-bucle", daemon=True).start()
+    return _bucle_eventos
+
+def ejecutar_corrutina(corrutina):
+    """
+    Ejecuta una corrutina en el bucle compartido y espera su resultado
+    desde el hilo (síncrono) de Flask.
+    """
+    return asyncio.run_coroutine_threadsafe(corrutina, _obtener_bucle()).result()
+
+def _leer_peticion_json():
+    """Decodifica el cuerpo JSON de la petición midiendo cuánto cuesta."""
+    with DECODIFICACION_JSON.con(request.path).cronometrar():
+        return request.get_json()
 
 # --- DEFINIR LA RUTA DE EJECUCIÓN ---
 # Esta es la única "puerta" o "endpoint" de nuestro servidor.
 @app.route('/execute', methods=['POST'])
 def handle_execution():
-    datos_peticion = request.json
-    
-    # Manejo del bucle de eventos asíncrono, necesario para g4f.
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    datos_peticion = _leer_peticion_json()
     
     # Pasamos la petición al motor A.L.E. y esperamos su respuesta.
-    respuesta_de_ale = loop.run_until_complete(ale.procesar_peticion(datos_peticion))
+    respuesta_de_ale = ejecutar_corrutina(ale.procesar_peticion(datos_peticion))
     
     # Devolvemos la respuesta a la PWA.
     return jsonify(respuesta_de_ale)
 
+# --- RUTA DE EJECUCIÓN POR LOTES ---
+# Recibe {"peticiones": [...]} y devuelve {"respuestas": [...]} en el mismo orden.
+@app.route('/execute_batch', methods=['POST'])
+def handle_execution_batch():
+    datos_peticion = _leer_peticion_json() or {}
+    respuesta_de_ale = ejecutar_corrutina(ale.procesar_lote(datos_peticion.get("peticiones")))
+    return jsonify(respuesta_de_ale)
+
+# --- RUTA DE EJECUCIÓN EN STREAMING (NDJSON) ---
+# Cada línea de la respuesta es un marco JSON: fragmentos de texto del LLM
+# y, al final, el marco con 'nuevo_estado'.
+def _iterar_flujo(generador_asincrono):
+    bucle = _obtener_bucle()
+    try:
+        while True:
+            try:
+                marco = asyncio.run_coroutine_threadsafe(generador_asincrono.__anext__(), bucle).result()
+            except StopAsyncIteration:
+                break
+            yield json.dumps(marco, ensure_ascii=False) + "\n"
+    finally:
+        asyncio.run_coroutine_threadsafe(generador_asincrono.aclose(), bucle).result()
+
+@app.route('/execute_stream', methods=['POST'])
+def handle_execution_stream():
+    datos_peticion = _leer_peticion_json()
+    flujo = _iterar_flujo(ale.procesar_peticion_flujo(datos_peticion))
+    return Response(flujo, mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- ESTADÍSTICAS DE TIEMPO DE EJECUCIÓN ---
+@app.route('/estadisticas', methods=['GET'])
+def handle_estadisticas():
+    return jsonify(ale.estadisticas())
+
+# --- ANALÍTICA DE PRODUCTIVIDAD POR USUARIO ---
+@app.route('/analitica', methods=['GET'])
+def handle_analitica():
+    nombre_skillset = request.args.get('skillset', 'guardian')
+    resumen = ejecutar_corrutina(ale.analitica(nombre_skillset, request.args.get('usuario_id')))
+    if resumen is None:
+        return jsonify({"error": f"El skillset '{nombre_skillset}' no ofrece analítica."}), 404
+    return jsonify(resumen)
+
+# --- SINCRONIZACIÓN DELTA DE LA PWA ---
+@app.route('/sync', methods=['GET'])
+def handle_sync():
+    nombre_skillset = request.args.get('skillset', 'guardian')
+    limite = request.args.get('limite', type=int)
+    cambios = ejecutar_corrutina(ale.sincronizar(
+        nombre_skillset, request.args.get('usuario_id'), request.args.get('cursor', ''), limite))
+    if cambios is None:
+        return jsonify({"error": f"El skillset '{nombre_skillset}' no ofrece sincronización."}), 404
+    return jsonify(cambios)
+
+# --- AVISOS DE ARRANQUE (SERVER-SENT EVENTS) ---
+# La PWA mantiene abierta una conexión por usuario y recibe cada aviso cuando
+# vence. En este modo cada conexión ocupa un hilo del worker (gunicorn con
+# --threads o el servidor ASGI si hay muchos clientes).
+@app.route('/eventos', methods=['GET'])
+def handle_eventos():
+    nombre_skillset = request.args.get('skillset', 'guardian')
+    ultimo_evento = request.headers.get('Last-Event-ID') or request.args.get('ultimo')
+    avisos = queue.Queue()
+    suscripcion = ejecutar_corrutina(ale.suscribir(nombre_skillset, request.args.get('usuario_id'), avisos.put, ultimo_evento))
+    if suscripcion is None:
+        return jsonify({"error": f"El skillset '{nombre_skillset}' no emite avisos."}), 404
+
+    def flujo():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    evento = avisos.get(timeout=INTERVALO_LATIDO_S)
+                except queue.Empty:
+                    ejecutar_corrutina(suscripcion.latir())
+                    yield LATIDO_SSE
+                    continue
+                yield formato_sse(evento)
+        finally:
+            suscripcion.cancelar()
+
+    return Response(flujo(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- MÉTRICAS EN FORMATO PROMETHEUS ---
+@app.route('/metrics', methods=['GET'])
+def handle_metricas():
+    return Response(REGISTRO.exponer(), content_type=TIPO_CONTENIDO)
+
 # --- ARRANQUE DEL SERVIDOR (SOLO PARA PRUEBAS LOCALES) ---
 if __name__ == "__main__":
     # Render ignorará esto y usará el "Start Command" (gunicorn main:app).
     app.run(host='0.0.0.0', port=5000, debug=True)
-
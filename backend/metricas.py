@@ -0,0 +1,248 @@
+# =================================================================
+# METRICAS.PY (v1.0 - Instrumentación del Camino Caliente)
+# =================================================================
+# Contadores, medidores e histogramas en proceso, expuestos en el formato
+# de texto de Prometheus por la ruta GET /metrics.
+# - Cada métrica se declara una sola vez (a nivel de módulo) en el registro
+#   global; sus series por etiquetas se crean al primer uso y se cachean.
+# - Registrar una observación cuesta una búsqueda en diccionario, una
+#   bisección sobre los límites del histograma y un candado sin contención.
+# - Los medidores pueden leerse de una función en el momento del scrape
+#   (p. ej. el estado de un disyuntor) en lugar de actualizarse en caliente.
+
+import bisect
+import math
+import threading
+import time
+
+# Tope de series por métrica: etiquetas que vienen del cliente (p. ej. el modo)
+# no deben poder crear series sin límite; el excedente se agrupa en "otro".
+MAX_SERIES = 200
+
+# Límites (en segundos) pensados para latencias de disco (ms) y de LLM (s).
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _formatear(valor):
+    if valor == math.inf:
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Serie:
+    def __init__(self):
+        self._candado = threading.Lock()
+
+
+class _SerieContador(_Serie):
+    def __init__(self):
+        super().__init__()
+        self.valor = 0.0
+
+    def inc(self, cantidad=1):
+        with self._candado:
+            self.valor += cantidad
+
+    def muestras(self, nombre, etiquetas):
+        yield nombre + "_total", etiquetas, self.valor
+
+
+class _SerieMedidor(_Serie):
+    def __init__(self):
+        super().__init__()
+        self.valor = 0.0
+        self.funcion = None
+
+    def set(self, valor):
+        self.valor = valor
+
+    def inc(self, cantidad=1):
+        with self._candado:
+            self.valor += cantidad
+
+    def dec(self, cantidad=1):
+        self.inc(-cantidad)
+
+    def leer_de(self, funcion):
+        """El valor se calcula al exponer las métricas en vez de actualizarse en caliente."""
+        self.funcion = funcion
+        return self
+
+    def muestras(self, nombre, etiquetas):
+        yield nombre, etiquetas, self.funcion() if self.funcion else self.valor
+
+
+class _Cronometro:
+    # Clase en vez de @contextmanager: entrar y salir es más barato.
+    __slots__ = ("serie", "inicio")
+
+    def __init__(self, serie):
+        self.serie = serie
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.serie.observar(time.perf_counter() - self.inicio)
+        return False
+
+
+class _SerieHistograma(_Serie):
+    def __init__(self, limites):
+        super().__init__()
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+
+    def observar(self, valor):
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._candado:
+            self.cubetas[indice] += 1
+            self.suma += valor
+
+    def cronometrar(self):
+        """Contexto que observa su propia duración en segundos."""
+        return _Cronometro(self)
+
+    def muestras(self, nombre, etiquetas):
+        with self._candado:
+            cubetas = list(self.cubetas)
+            suma = self.suma
+        acumulado = 0
+        for limite, cantidad in zip(self.limites + (math.inf,), cubetas):
+            acumulado += cantidad
+            yield nombre + "_bucket", etiquetas + (("le", _formatear(limite)),), acumulado
+        yield nombre + "_sum", etiquetas, suma
+        yield nombre + "_count", etiquetas, acumulado
+
+
+class Metrica:
+    TIPO = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series = {}
+        self._candado = threading.Lock()
+        if not self.etiquetas:
+            self._sin_etiquetas = self.con()
+
+    def _nueva_serie(self):
+        raise NotImplementedError
+
+    def con(self, *valores):
+        """Serie para esos valores de etiqueta (en el orden declarado)."""
+        serie = self._series.get(valores)
+        if serie is None:
+            if len(valores) != len(self.etiquetas):
+                raise ValueError(f"'{self.nombre}' espera las etiquetas {self.etiquetas}, recibió {valores}.")
+            if len(self._series) >= MAX_SERIES:
+                valores = ("otro",) * len(valores)
+            with self._candado:
+                serie = self._series.setdefault(valores, self._nueva_serie())
+        return serie
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.TIPO}"]
+        for valores, serie in list(self._series.items()):
+            for nombre, etiquetas, valor in serie.muestras(self.nombre, tuple(zip(self.etiquetas, valores))):
+                texto_etiquetas = ",".join(f'{clave}="{_escapar(v)}"' for clave, v in etiquetas)
+                lineas.append(f"{nombre}{{{texto_etiquetas}}} {_formatear(valor)}" if texto_etiquetas else f"{nombre} {_formatear(valor)}")
+        return lineas
+
+
+class Contador(Metrica):
+    TIPO = "counter"
+
+    def _nueva_serie(self):
+        return _SerieContador()
+
+    def inc(self, cantidad=1):
+        self._sin_etiquetas.inc(cantidad)
+
+
+class Medidor(Metrica):
+    TIPO = "gauge"
+
+    def _nueva_serie(self):
+        return _SerieMedidor()
+
+    def set(self, valor):
+        self._sin_etiquetas.set(valor)
+
+    def inc(self, cantidad=1):
+        self._sin_etiquetas.inc(cantidad)
+
+    def dec(self, cantidad=1):
+        self._sin_etiquetas.dec(cantidad)
+
+
+class Histograma(Metrica):
+    TIPO = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        self.limites = tuple(sorted(limites))
+        super().__init__(nombre, ayuda, etiquetas)
+
+    def _nueva_serie(self):
+        return _SerieHistograma(self.limites)
+
+    def observar(self, valor):
+        self._sin_etiquetas.observar(valor)
+
+    def cronometrar(self):
+        return self._sin_etiquetas.cronometrar()
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+
+    def _registrar(self, metrica):
+        # Registrar dos veces el mismo nombre devuelve la métrica existente
+        # (los módulos pueden recargarse, p. ej. en los benchmarks).
+        existente = self._metricas.get(metrica.nombre)
+        if existente is not None:
+            if type(existente) is not type(metrica) or existente.etiquetas != metrica.etiquetas:
+                raise ValueError(f"La métrica '{metrica.nombre}' ya existe con otro tipo o etiquetas.")
+            return existente
+        self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def exponer(self):
+        """Todas las métricas en el formato de texto de Prometheus (0.0.4)."""
+        lineas = []
+        for metrica in list(self._metricas.values()):
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- MÉTRICAS DEL SERVIDOR Y DEL MOTOR A.L.E. ---
+DECODIFICACION_JSON = REGISTRO.histograma(
+    "ale_decodificacion_json_segundos", "Tiempo en decodificar el cuerpo JSON de la petición.", ["ruta"])
+PETICIONES = REGISTRO.contador(
+    "ale_peticiones", "Peticiones despachadas a un skillset, por resultado.", ["skillset", "resultado"])
+LATENCIA_PETICION = REGISTRO.histograma(
+    "ale_peticion_segundos", "Latencia de despacho por skillset y modo de conversación.", ["skillset", "modo"])
+PETICIONES_EN_VUELO = REGISTRO.medidor(
+    "ale_peticiones_en_vuelo", "Peticiones en curso por skillset.", ["skillset"])
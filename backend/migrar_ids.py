@@ -0,0 +1,134 @@
+# =================================================================
+# MIGRAR_IDS.PY - Migración de IDs al esquema ordenable
+# =================================================================
+# Reescribe los tickets y contratos con IDs antiguos (PREFIJO + 4 caracteres
+# al azar) con IDs del esquema nuevo (ver skillsets/identificadores.py).
+# - El segundo de cada ID nuevo sale de la fecha y hora del propio item, así
+#   que los items migrados quedan ordenados por creación junto a los nuevos.
+# - Cada item guarda su ID anterior en 'id_anterior' y el mapa completo queda
+#   en datos_usuario["alias_ids"]: buscar por un ID antiguo sigue funcionando.
+# - Antes de escribir se copian los archivos originales a '*.antes_ids'.
+# Ejecutar con el servidor detenido. Es idempotente: una segunda pasada no
+# encuentra nada que migrar.
+#
+# Uso:   python migrar_ids.py [--motor diario] [--memoria guardian_memory.json]
+#                             [--dir guardian_memoria] [--simular]
+
+import argparse
+import copy
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import pytz
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from skillsets.almacenamiento import crear_almacen, fecha_iso_item
+from skillsets.identificadores import EPOCA, MAX_NODO, MAX_SECUENCIA, componer, es_ordenable
+from skillsets.inquilinos import DATOS_USUARIO_INICIALES
+
+# Los IDs migrados usan el último nodo; su segundo es siempre del pasado.
+NODO_MIGRACION = MAX_NODO
+ZONA_HORARIA = pytz.timezone("America/Montevideo")
+
+
+def segundo_de_item(item):
+    """Segundos desde EPOCA en que se emitió o selló el item (0 si no tiene fecha)."""
+    fecha = fecha_iso_item(item)
+    hora = item.get("hora_emision") or item.get("hora_sellado") or "00:00"
+    try:
+        momento = ZONA_HORARIA.localize(datetime.strptime(f"{fecha} {hora}", "%Y-%m-%d %H:%M"))
+    except (TypeError, ValueError):
+        return 0
+    return max(0, int(momento.timestamp()) - EPOCA)
+
+
+def migrar_archivador(archivador, alias_previos=None):
+    """Devuelve (archivador con IDs nuevos ordenado por ID, alias {antiguo: nuevo})."""
+    alias = dict(alias_previos or {})
+    nuevo = {identificador: item for identificador, item in archivador.items() if es_ordenable(identificador)}
+    antiguos = sorted(
+        (identificador for identificador in archivador if not es_ordenable(identificador)),
+        key=lambda identificador: (segundo_de_item(archivador[identificador]), identificador),
+    )
+    secuencias = {}
+    for antiguo in antiguos:
+        prefijo = antiguo.partition("-")[0].upper()
+        segundo = segundo_de_item(archivador[antiguo])
+        while True:
+            secuencia = secuencias.get(segundo, 0)
+            if secuencia >= MAX_SECUENCIA:
+                segundo += 1
+                continue
+            secuencias[segundo] = secuencia + 1
+            identificador = componer(prefijo, segundo, NODO_MIGRACION, secuencia)
+            if identificador not in nuevo and identificador not in archivador:
+                break
+        item = dict(archivador[antiguo], id=identificador, id_anterior=antiguo)
+        nuevo[identificador] = item
+        alias[antiguo] = identificador
+    return dict(sorted(nuevo.items())), alias
+
+
+def _archivos_de(ruta):
+    candidatos = [ruta, f"{ruta}.journal", f"{os.path.splitext(ruta)[0]}.sqlite3"]
+    return [archivo for archivo in candidatos if os.path.exists(archivo)]
+
+
+def migrar_memoria(motor, ruta, simular=False):
+    """Migra una memoria. Devuelve cuántos items cambiaron de ID."""
+    almacen = crear_almacen(motor, ruta)
+    archivador, datos_usuario = almacen.cargar()
+    try:
+        archivador = dict(archivador.items())
+        datos_usuario = datos_usuario or copy.deepcopy(DATOS_USUARIO_INICIALES)
+        nuevo, alias = migrar_archivador(archivador, datos_usuario.get("alias_ids"))
+        migrados = len(alias) - len(datos_usuario.get("alias_ids", {}))
+    finally:
+        almacen.cerrar()
+    if not migrados or simular:
+        return migrados
+
+    # La copia se hace con el almacén cerrado (SQLite ya volcó su WAL).
+    for archivo in _archivos_de(ruta):
+        shutil.copy2(archivo, f"{archivo}.antes_ids")
+    almacen = crear_almacen(motor, ruta)
+    almacen.cargar()
+    try:
+        almacen.guardar_todo(nuevo, {**datos_usuario, "alias_ids": alias})
+    finally:
+        almacen.cerrar()
+    return migrados
+
+
+def rutas_de_memoria(memoria, carpeta):
+    """La memoria histórica y la de cada usuario encontrada en 'carpeta'."""
+    rutas = [memoria]
+    if os.path.isdir(carpeta):
+        usuarios = {nombre.split(".", 1)[0] for nombre in os.listdir(carpeta) if not nombre.endswith(".antes_ids")}
+        rutas.extend(os.path.join(carpeta, f"{usuario}.json") for usuario in sorted(usuarios) if usuario)
+    return rutas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra los IDs antiguos de tickets y contratos al esquema ordenable.")
+    parser.add_argument("--motor", default=os.environ.get("GUARDIAN_ALMACEN", "diario"))
+    parser.add_argument("--memoria", default="guardian_memory.json")
+    parser.add_argument("--dir", default=os.environ.get("GUARDIAN_MEMORIA_DIR", "guardian_memoria"))
+    parser.add_argument("--simular", action="store_true", help="contar sin escribir nada")
+    args = parser.parse_args()
+
+    total = 0
+    for ruta in rutas_de_memoria(args.memoria, args.dir):
+        if not _archivos_de(ruta):
+            continue
+        migrados = migrar_memoria(args.motor, ruta, simular=args.simular)
+        total += migrados
+        print(f"{'🔎' if args.simular else '✅'} {ruta}: {migrados} items {'por migrar' if args.simular else 'migrados'}.")
+    print(f"Total: {total} items.")
+
+
+if __name__ == "__main__":
+    main()
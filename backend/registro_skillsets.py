@@ -0,0 +1,90 @@
+# =================================================================
+# REGISTRO_SKILLSETS.PY (v1.0 - Descubrimiento de Skillsets)
+# =================================================================
+# Encuentra los skillsets disponibles sin importarlos (el arranque en frío
+# sigue siendo rápido: cada skillset se importa en su primer uso).
+# - Escaneo del paquete 'skillsets': cada módulo que declare a nivel de
+#   módulo un diccionario literal
+#       SKILLSET = {"nombre": "guardian", "clase": "Guardian", "tiempo_limite": 30}
+#   queda registrado. La declaración se lee con 'ast', no importando el módulo.
+# - Entry points del grupo 'ale.skillsets' (paquetes instalados aparte):
+#       [project.entry-points."ale.skillsets"]
+#       agenda = "mi_paquete.agenda:Agenda"
+# Devuelve {nombre: {"ruta": "modulo:Clase", "tiempo_limite": segundos o None}}.
+
+import ast
+import importlib.util
+import os
+import pkgutil
+from importlib.metadata import entry_points
+
+GRUPO_ENTRY_POINTS = "ale.skillsets"
+NOMBRE_DECLARACION = "SKILLSET"
+
+
+def leer_declaracion(ruta_archivo):
+    """Devuelve el diccionario 'SKILLSET' del archivo fuente, o None si no lo declara."""
+    try:
+        with open(ruta_archivo, 'r', encoding='utf-8') as f:
+            arbol = ast.parse(f.read(), filename=ruta_archivo)
+    except (OSError, SyntaxError, ValueError) as e:
+        print(f"⚠️ No se pudo leer el módulo '{ruta_archivo}' al buscar skillsets: {e}")
+        return None
+    for nodo in arbol.body:
+        if isinstance(nodo, ast.Assign) and any(
+                isinstance(objetivo, ast.Name) and objetivo.id == NOMBRE_DECLARACION for objetivo in nodo.targets):
+            try:
+                declaracion = ast.literal_eval(nodo.value)
+            except ValueError:
+                print(f"⚠️ '{NOMBRE_DECLARACION}' en '{ruta_archivo}' no es un diccionario literal. Se ignora.")
+                return None
+            if not isinstance(declaracion, dict) or not declaracion.get("nombre") or not declaracion.get("clase"):
+                print(f"⚠️ '{NOMBRE_DECLARACION}' en '{ruta_archivo}' necesita 'nombre' y 'clase'. Se ignora.")
+                return None
+            return declaracion
+    return None
+
+
+def escanear_paquete(nombre_paquete="skillsets"):
+    """Skillsets declarados en los módulos del paquete (sin importar ninguno de ellos)."""
+    especificacion = importlib.util.find_spec(nombre_paquete)
+    if especificacion is None or not especificacion.submodule_search_locations:
+        print(f"⚠️ No se encontró el paquete de skillsets '{nombre_paquete}'.")
+        return {}
+    encontrados = {}
+    for modulo in pkgutil.iter_modules(especificacion.submodule_search_locations):
+        if modulo.ispkg:
+            continue
+        ruta_archivo = os.path.join(modulo.module_finder.path, f"{modulo.name}.py")
+        declaracion = leer_declaracion(ruta_archivo)
+        if declaracion is None:
+            continue
+        encontrados[declaracion["nombre"]] = {
+            "ruta": f"{nombre_paquete}.{modulo.name}:{declaracion['clase']}",
+            "tiempo_limite": declaracion.get("tiempo_limite"),
+        }
+    return encontrados
+
+
+def desde_entry_points(grupo=GRUPO_ENTRY_POINTS):
+    """Skillsets publicados por otros paquetes instalados."""
+    encontrados = {}
+    for punto in entry_points(group=grupo):
+        if ":" not in punto.value:
+            print(f"⚠️ El entry point '{punto.name}' ({punto.value}) no tiene la forma 'modulo:Clase'. Se ignora.")
+            continue
+        encontrados[punto.name] = {"ruta": punto.value, "tiempo_limite": None}
+    return encontrados
+
+
+def descubrir(nombre_paquete="skillsets", grupo=GRUPO_ENTRY_POINTS):
+    """
+    Une los skillsets del paquete local y los de entry points. Si un nombre
+    aparece en ambos, gana el del paquete local.
+    """
+    encontrados = desde_entry_points(grupo)
+    for nombre, entrada in escanear_paquete(nombre_paquete).items():
+        if nombre in encontrados:
+            print(f"⚠️ El skillset '{nombre}' existe en el paquete local y como entry point: se usa el local.")
+        encontrados[nombre] = entrada
+    return encontrados
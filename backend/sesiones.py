@@ -0,0 +1,199 @@
+# =================================================================
+# SESIONES.PY (v1.0 - Estado de Conversación en el Servidor)
+# =================================================================
+# Guarda el 'estado_conversacion' de cada cliente en el servidor, bajo un
+# token de sesión. El cliente solo envía el token y el comando; el servidor
+# devuelve un 'estado_delta' pequeño en lugar del estado completo.
+# - AlmacenSesiones: en memoria, con caducidad (TTL) y LRU acotado.
+# - AlmacenSesionesDisco: igual, pero cada sesión se guarda también en un
+#   archivo propio, de modo que sobrevive a un reinicio del servidor.
+# - El protocolo antiguo (estado completo en cada petición) sigue funcionando.
+
+import copy
+import json
+import os
+import re
+import secrets
+import tempfile
+import time
+from collections import OrderedDict
+
+PATRON_TOKEN = re.compile(r'[A-Za-z0-9_-]{16,64}')
+
+
+# --- DELTAS DE ESTADO ---
+def calcular_delta(anterior, nuevo):
+    """Diferencia de primer nivel: {"fijar": {clave: valor}, "quitar": [claves]}."""
+    anterior = anterior or {}
+    nuevo = nuevo or {}
+    return {
+        "fijar": {clave: valor for clave, valor in nuevo.items() if anterior.get(clave, ...) != valor},
+        "quitar": [clave for clave in anterior if clave not in nuevo],
+    }
+
+
+def aplicar_delta(estado, delta):
+    """Reconstruye el estado nuevo a partir del anterior y su delta."""
+    estado = dict(estado or {})
+    for clave in delta.get("quitar", []):
+        estado.pop(clave, None)
+    estado.update(delta.get("fijar", {}))
+    return estado
+
+
+class AlmacenSesiones:
+    # Cada cuántas escrituras se barren las sesiones caducadas.
+    PURGAR_CADA = 1000
+
+    def __init__(self, ttl=1800, capacidad=10000):
+        self.ttl = ttl
+        self.capacidad = capacidad
+        self._sesiones = OrderedDict()
+        self._escrituras = 0
+        self.creadas = 0
+        self.caducadas = 0
+
+    @staticmethod
+    def nuevo_token():
+        return secrets.token_urlsafe(18)
+
+    @staticmethod
+    def token_valido(token):
+        return isinstance(token, str) and PATRON_TOKEN.fullmatch(token) is not None
+
+    def obtener(self, token):
+        """Estado guardado para el token, o None si no existe o ha caducado."""
+        if not self.token_valido(token):
+            return None
+        entrada = self._sesiones.get(token)
+        if entrada is None:
+            entrada = self._leer(token)
+            if entrada is None:
+                return None
+            self._sesiones[token] = entrada
+        caduca, estado = entrada
+        if caduca < time.time():
+            self.eliminar(token)
+            self.caducadas += 1
+            return None
+        self._sesiones.move_to_end(token)
+        return copy.deepcopy(estado)
+
+    def guardar(self, token, estado):
+        entrada = (time.time() + self.ttl, copy.deepcopy(estado))
+        if token not in self._sesiones and self._leer(token) is None:
+            self.creadas += 1
+        self._sesiones[token] = entrada
+        self._sesiones.move_to_end(token)
+        self._escribir(token, entrada)
+        # Al superar la capacidad se olvida la sesión menos reciente.
+        while len(self._sesiones) > self.capacidad:
+            token_viejo, _ = self._sesiones.popitem(last=False)
+            self._olvidar(token_viejo)
+        self._escrituras += 1
+        if self._escrituras % self.PURGAR_CADA == 0:
+            self.purgar()
+
+    def eliminar(self, token):
+        self._sesiones.pop(token, None)
+        self._borrar(token)
+
+    def purgar(self):
+        """Elimina las sesiones caducadas y devuelve cuántas se eliminaron."""
+        ahora = time.time()
+        caducadas = [token for token, (caduca, _) in self._sesiones.items() if caduca < ahora]
+        for token in caducadas:
+            self.eliminar(token)
+        self.caducadas += len(caducadas)
+        return len(caducadas)
+
+    # --- PERSISTENCIA (la versión en memoria no persiste nada) ---
+    def _leer(self, token):
+        return None
+
+    def _escribir(self, token, entrada):
+        pass
+
+    def _borrar(self, token):
+        pass
+
+    def _olvidar(self, token):
+        """Una sesión sale del LRU: en memoria equivale a borrarla."""
+        self._borrar(token)
+
+    def estadisticas(self):
+        return {
+            "activas": len(self._sesiones),
+            "creadas": self.creadas,
+            "caducadas": self.caducadas,
+            "ttl_s": self.ttl,
+            "capacidad": self.capacidad,
+        }
+
+
+class AlmacenSesionesDisco(AlmacenSesiones):
+    """Sesiones en memoria (LRU) respaldadas por un archivo JSON por token."""
+    def __init__(self, carpeta, ttl=1800, capacidad=10000):
+        super().__init__(ttl=ttl, capacidad=capacidad)
+        self.carpeta = carpeta
+        os.makedirs(carpeta, exist_ok=True)
+
+    def _ruta(self, token):
+        return os.path.join(self.carpeta, f"{token}.json")
+
+    def _leer(self, token):
+        try:
+            with open(self._ruta(token), 'r', encoding='utf-8') as f:
+                contenido = json.load(f)
+            return contenido["caduca"], contenido["estado"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _escribir(self, token, entrada):
+        caduca, estado = entrada
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=self.carpeta, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                json.dump({"caduca": caduca, "estado": estado}, f, ensure_ascii=False)
+            os.replace(ruta_temporal, self._ruta(token))
+        except OSError as e:
+            print(f"🚨 Error al guardar la sesión en disco: {e}")
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+
+    def _borrar(self, token):
+        try:
+            os.remove(self._ruta(token))
+        except OSError:
+            pass
+
+    def _olvidar(self, token):
+        # Fuera del LRU la sesión sigue en disco y se recarga si vuelve.
+        pass
+
+    def purgar(self):
+        eliminadas = super().purgar()
+        ahora = time.time()
+        for nombre in os.listdir(self.carpeta):
+            token, extension = os.path.splitext(nombre)
+            if extension != ".json" or token in self._sesiones:
+                continue
+            entrada = self._leer(token)
+            if entrada is None or entrada[0] < ahora:
+                self._borrar(token)
+                eliminadas += 1
+                self.caducadas += 1
+        return eliminadas
+
+
+def crear_almacen_sesiones():
+    """Construye el almacén de sesiones según las variables de entorno ALE_SESIONES*."""
+    tipo = os.environ.get("ALE_SESIONES", "memoria").strip().lower()
+    ttl = float(os.environ.get("ALE_SESIONES_TTL", "1800"))
+    capacidad = int(os.environ.get("ALE_SESIONES_CAPACIDAD", "10000"))
+    if tipo == "disco":
+        carpeta = os.environ.get("ALE_SESIONES_DIR", "ale_sesiones")
+        return AlmacenSesionesDisco(carpeta, ttl=ttl, capacidad=capacidad)
+    if tipo != "memoria":
+        print(f"⚠️ Almacén de sesiones '{tipo}' desconocido. Se usará 'memoria'.")
+    return AlmacenSesiones(ttl=ttl, capacidad=capacidad)
@@ -1,5 +1,17 @@
 # __init__.py (VERSIÓN FINAL Y DEFINITIVA)
 
 # El punto (.) significa "desde esta misma carpeta".
-# Le decimos a Python que el archivo "guardian.py" es parte de este paquete.
-from .guardian import Guardian
+# Le decimos a Python que "guardian.py" y "archivista.py" son parte de este paquete.
+# La importación es perezosa: 'from skillsets import Guardian' solo carga
+# guardian.py (y sus dependencias) cuando alguien pide el nombre.
+import importlib
+
+_EXPORTADOS = {"Guardian": ".guardian", "Archivista": ".archivista"}
+
+
+def __getattr__(nombre):
+    if nombre in _EXPORTADOS:
+        valor = getattr(importlib.import_module(_EXPORTADOS[nombre], __name__), nombre)
+        globals()[nombre] = valor
+        return valor
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,910 @@
+# =================================================================
+# ALMACENAMIENTO.PY (v1.0 - Diario de Memoria)
+# =================================================================
+# Motores de almacenamiento intercambiables para la memoria del Guardián
+# ('archivador_contratos' y 'datos_usuario').
+# - AlmacenDiario (por defecto): diario de solo-anexado. Cada mutación es una
+#   línea JSON al final de '<memoria>.journal'; el fsync se agrupa por lotes y
+#   el diario se compacta periódicamente en la instantánea '<memoria>.json'.
+# - AlmacenJSON: el comportamiento clásico, reescribe el archivo completo
+#   en cada mutación (ahora con reemplazo atómico).
+# - AlmacenSQLite (opcional): base SQLite en modo WAL con índices por id,
+#   tipo, fecha de emisión y hora de arranque. El archivador no se carga en
+#   memoria: se consulta bajo demanda.
+# Todos los motores admiten agrupar escrituras (iniciar/terminar_agrupacion):
+# mientras dura la agrupación las mutaciones solo se aplican en memoria y al
+# terminar se vuelcan a disco en una única escritura.
+# Con escritura diferida (diferir_escrituras) la agrupación no termina nunca:
+# un EscritorDiferido vuelca lo pendiente desde su propio hilo ('volcar').
+# Con columnar=True los motores en memoria (diario, json) guardan el archivador
+# como ArchivadorColumnar (columnar.py) en lugar de un dict por item.
+# La instantánea tiene el mismo formato que el antiguo guardian_memory.json,
+# así que las memorias existentes se cargan sin migración.
+# Multiproceso (compartir_entre_procesos): varios workers de gunicorn pueden
+# abrir la misma memoria. Las escrituras se hacen dentro de 'transaccion', con
+# un cerrojo de archivo ('<memoria>.lock') exclusivo: al entrar, el almacén
+# incorpora lo que escribieron los demás; al salir, vuelca lo suyo antes de
+# soltarlo. 'refrescar' incorpora los cambios ajenos con el cerrojo compartido.
+# Detectar cambios es barato y solo se lee lo nuevo: el diario lleva la
+# posición hasta la que se leyó y una generación que sube en cada compactación;
+# SQLite usa 'PRAGMA data_version' y el rowid; el motor JSON, por su naturaleza,
+# recarga el archivo entero cuando cambia.
+
+import copy
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from collections.abc import MutableMapping
+
+from .columnar import ArchivadorColumnar
+from .identificadores import sufijo
+
+try:
+    import fcntl
+except ImportError:  # Windows: no hay flock; ahí se sirve con un solo proceso.
+    fcntl = None
+
+
+def _sincronizar_directorio(ruta):
+    """fsync de la carpeta de 'ruta': sin él, un os.replace recién hecho puede perderse en un corte."""
+    if not hasattr(os, "O_DIRECTORY"):  # Windows: las carpetas no se abren para fsync.
+        return
+    descriptor = os.open(os.path.dirname(os.path.abspath(ruta)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _escribir_atomico(ruta, contenido):
+    """Escribe en un temporal, hace fsync, lo renombra sobre 'ruta' y hace fsync de la carpeta."""
+    # Temporal propio del proceso: varios workers pueden escribir la misma memoria.
+    ruta_temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with open(ruta_temporal, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+    _sincronizar_directorio(ruta)
+
+
+class CerrojoArchivo:
+    """
+    Cerrojo entre procesos (flock) sobre un archivo auxiliar que nunca se
+    reemplaza ni se trunca. Reentrante dentro del proceso: un exclusivo cubre
+    los cerrojos anidados. Los hilos del propio proceso se ordenan con el
+    '_candado_volcado' del almacén, que se toma siempre antes que este.
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._descriptor = None
+        self.profundidad = 0
+        self._exclusivo = False
+
+    @contextmanager
+    def tomar(self, exclusivo=True):
+        if self.profundidad:
+            if exclusivo and not self._exclusivo:
+                raise RuntimeError("No se puede pasar de cerrojo compartido a exclusivo sin soltarlo.")
+            self.profundidad += 1
+            try:
+                yield
+            finally:
+                self.profundidad -= 1
+            return
+        if self._descriptor is None:
+            self._descriptor = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._descriptor, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        self.profundidad, self._exclusivo = 1, exclusivo
+        try:
+            yield
+        finally:
+            self.profundidad, self._exclusivo = 0, False
+            if fcntl is not None:
+                fcntl.flock(self._descriptor, fcntl.LOCK_UN)
+
+    def cerrar(self):
+        if self._descriptor is not None:
+            os.close(self._descriptor)
+            self._descriptor = None
+
+
+def fecha_iso_item(item):
+    """Convierte la fecha 'dd/mm/yy' de un ticket o contrato a 'yyyy-mm-dd' (o None)."""
+    fecha = item.get("fecha_emision") or item.get("fecha_sellado")
+    try:
+        return datetime.strptime(fecha, "%d/%m/%y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+class AlmacenMemoria:
+    """
+    Interfaz común de los motores de almacenamiento.
+    'cargar' devuelve (archivador_contratos, datos_usuario); datos_usuario es
+    None si nunca se guardó.
+    """
+    def __init__(self, ruta, columnar=False):
+        self.ruta = ruta
+        self.columnar = columnar
+        self._agrupando = 0
+        self._escritor = None
+        # Protege el estado en memoria y lo pendiente frente al hilo del escritor diferido.
+        self._candado_pendientes = threading.RLock()
+        # Serializa las escrituras a disco (escritor diferido, cierre, compactación).
+        self._candado_volcado = threading.RLock()
+        # Cerrojo entre procesos (solo con compartir_entre_procesos).
+        self._cerrojo = None
+        # Cambios de otros procesos incorporados y aún no entregados (ver 'novedades').
+        self._ids_nuevos = set()
+        self._datos_nuevos = False
+        self._recargado = False
+
+    def existe(self):
+        return os.path.exists(self.ruta)
+
+    # --- MULTIPROCESO ---
+    def compartir_entre_procesos(self):
+        """Otros procesos escriben en la misma memoria. Se llama antes de 'cargar'."""
+        if self._cerrojo is None:
+            self._cerrojo = CerrojoArchivo(f"{self.ruta}.lock")
+
+    @property
+    def multiproceso(self):
+        return self._cerrojo is not None
+
+    @contextmanager
+    def _bloqueado(self, exclusivo=True):
+        with self._candado_volcado:
+            if self._cerrojo is None:
+                yield
+            else:
+                with self._cerrojo.tomar(exclusivo):
+                    yield
+
+    def _ponerse_al_dia(self):
+        """Incorpora lo que escribieron otros procesos. Se llama con el cerrojo tomado."""
+
+    def _novedades(self):
+        """
+        Entrega lo incorporado desde la última llamada: None si no hubo cambios
+        o (archivador, datos_usuario o None si no cambiaron, ids cambiados o
+        None si el archivador se recargó entero).
+        """
+        if not (self._ids_nuevos or self._datos_nuevos or self._recargado):
+            return None
+        with self._candado_pendientes:
+            ids = None if self._recargado else self._ids_nuevos
+            novedades = (self._archivador, self._datos_usuario if self._datos_nuevos or self._recargado else None, ids)
+            self._ids_nuevos, self._datos_nuevos, self._recargado = set(), False, False
+        return novedades
+
+    def refrescar(self):
+        """Incorpora los cambios de otros procesos (cerrojo compartido). Devuelve 'novedades'."""
+        if self._cerrojo is None:
+            return None
+        with self._bloqueado(exclusivo=False):
+            self._ponerse_al_dia()
+        return self._novedades()
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Sección de escritura entre procesos: cerrojo exclusivo, puesta al día
+        al entrar (produce 'novedades') y, al salir, una sola escritura con
+        todas las mutaciones, antes de soltar el cerrojo. Sin multiproceso
+        solo produce None.
+        """
+        if self._cerrojo is None:
+            yield None
+            return
+        with self._bloqueado(exclusivo=True):
+            if self._cerrojo.profundidad > 1:
+                yield None
+                return
+            self._ponerse_al_dia()
+            self._agrupando += 1
+            try:
+                yield self._novedades()
+            finally:
+                self._agrupando -= 1
+                self._volcar_transaccion()
+
+    def _volcar_transaccion(self):
+        self._volcar_agrupacion()
+
+    def diferir_escrituras(self, escritor):
+        """
+        A partir de aquí las mutaciones solo se aplican en memoria y se avisa
+        al 'escritor', que las vuelca en segundo plano (ver escritor_diferido.py).
+        """
+        if self._escritor is None:
+            self._escritor = escritor
+            self._agrupando += 1
+
+    def _persistir(self):
+        """Tras una mutación: se acumula (agrupación o escritura diferida) o se escribe ya."""
+        if self._escritor is not None:
+            self._escritor.marcar(self)
+        elif not self._agrupando:
+            self._volcar_agrupacion()
+
+    def volcar(self):
+        """Escribe lo pendiente. Lo llama el escritor diferido desde su hilo."""
+        self._volcar_agrupacion()
+
+    def _adoptar(self, archivador):
+        """El archivador con la representación configurada (dict o columnas)."""
+        if self.columnar and not isinstance(archivador, ArchivadorColumnar):
+            return ArchivadorColumnar(archivador)
+        return archivador
+
+    def _instantanea_actual(self):
+        # Copia superficial: los items no se modifican una vez archivados.
+        with self._candado_pendientes:
+            return dict(self._archivador), copy.deepcopy(self._datos_usuario)
+
+    def iniciar_agrupacion(self):
+        """A partir de aquí las mutaciones se acumulan hasta 'terminar_agrupacion'."""
+        self._agrupando += 1
+
+    def terminar_agrupacion(self):
+        if self._agrupando <= 0:
+            return
+        self._agrupando -= 1
+        if self._agrupando == 0:
+            self._volcar_agrupacion()
+
+    def _volcar_agrupacion(self):
+        """Escribe de una vez todo lo acumulado durante la agrupación."""
+
+    def cargar(self):
+        raise NotImplementedError
+
+    def apartar_y_cargar(self):
+        """Aparta una instantánea ilegible como '<memoria>.corrupto' y carga sin ella."""
+        if os.path.exists(self.ruta):
+            os.replace(self.ruta, f"{self.ruta}.corrupto")
+        return self.cargar()
+
+    def registrar_item(self, identificador, item):
+        raise NotImplementedError
+
+    def registrar_datos_usuario(self, datos_usuario):
+        raise NotImplementedError
+
+    def guardar_todo(self, archivador, datos_usuario):
+        raise NotImplementedError
+
+    def cerrar(self):
+        if self._escritor is not None:
+            self._escritor.olvidar(self)
+
+    def _cerrar_cerrojo(self):
+        if self._cerrojo is not None:
+            self._cerrojo.cerrar()
+
+    def consultar(self, tipo=None, desde=None, hasta=None, limite=10, desplazamiento=0):
+        """
+        Lista items filtrando por tipo ('Ticket'/'Contrato') y por rango de
+        fechas ISO inclusivo, del más reciente al más antiguo (dentro del mismo
+        minuto desempata la parte del ID tras el prefijo, que es ordenable por
+        creación: así un ticket y un contrato se ordenan entre sí).
+        Devuelve (items_de_la_pagina, total). Los motores en memoria recorren
+        el archivador completo, pero solo ordenan la página pedida; SQLite usa
+        sus índices.
+        """
+        candidatos = []
+        for item in self._archivador.values():
+            if tipo and item.get("tipo") != tipo:
+                continue
+            fecha = fecha_iso_item(item)
+            if (desde and (not fecha or fecha < desde)) or (hasta and (not fecha or fecha > hasta)):
+                continue
+            candidatos.append((fecha or "", item.get("hora_emision") or item.get("hora_sellado") or "", item))
+        primeros = heapq.nlargest(desplazamiento + limite, candidatos, key=lambda c: (c[0], c[1], sufijo(c[2].get("id") or "")))
+        return [c[2] for c in primeros[desplazamiento:]], len(candidatos)
+
+    def _leer_instantanea(self):
+        if not os.path.exists(self.ruta):
+            archivador, datos_usuario = {}, None
+        else:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                memoria = json.load(f)
+            archivador, datos_usuario = memoria.get("archivador_contratos", {}), memoria.get("datos_usuario")
+        return self._adoptar(archivador), datos_usuario
+
+    def _escribir_instantanea(self, archivador, datos_usuario):
+        memoria = {"archivador_contratos": archivador, "datos_usuario": datos_usuario}
+        _escribir_atomico(self.ruta, json.dumps(memoria, indent=4, ensure_ascii=False))
+
+
+class AlmacenJSON(AlmacenMemoria):
+    """
+    Reescribe el archivo completo en cada mutación: O(archivo) por item.
+    En multiproceso, si otro proceso reescribió el archivo, se recarga y se
+    le superponen las mutaciones propias antes de escribir.
+    """
+    def cargar(self):
+        with self._bloqueado():
+            self._archivador, self._datos_usuario = self._leer_instantanea()
+            self._sello = self._sello_archivo()
+        self._sucio = False
+        # Mutaciones propias sin escribir ({id: item} y datos), para superponerlas tras recargar.
+        self._items_propios = {}
+        self._datos_propios = False
+        return self._archivador, self._datos_usuario
+
+    def _sello_archivo(self):
+        # El reemplazo atómico crea un inodo nuevo en cada escritura.
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return estado.st_ino, estado.st_mtime_ns, estado.st_size
+
+    def _ponerse_al_dia(self):
+        sello = self._sello_archivo()
+        if sello == self._sello:
+            return
+        archivador, datos_usuario = self._leer_instantanea()
+        with self._candado_pendientes:
+            archivador.update(self._items_propios)
+            if self._datos_propios:
+                datos_usuario = self._datos_usuario
+            self._archivador, self._datos_usuario = archivador, datos_usuario
+            self._recargado = True
+        self._sello = sello
+
+    def registrar_item(self, identificador, item):
+        with self._candado_pendientes:
+            self._archivador[identificador] = item
+            if self.multiproceso:
+                self._items_propios[identificador] = item
+            self._sucio = True
+        self._persistir()
+
+    def registrar_datos_usuario(self, datos_usuario):
+        with self._candado_pendientes:
+            self._datos_usuario = datos_usuario
+            self._datos_propios = self.multiproceso
+            self._sucio = True
+        self._persistir()
+
+    def guardar_todo(self, archivador, datos_usuario):
+        with self._candado_pendientes:
+            self._archivador, self._datos_usuario = self._adoptar(archivador), datos_usuario
+            # Un archivador completo nuevo sustituye también a lo de otros procesos.
+            self._items_propios, self._datos_propios = {}, False
+            self._sello = self._sello_archivo()
+            self._sucio = True
+        self._persistir()
+
+    def _volcar_agrupacion(self):
+        with self._bloqueado():
+            with self._candado_pendientes:
+                if not self._sucio:
+                    return
+            if self.multiproceso:
+                self._ponerse_al_dia()
+            with self._candado_pendientes:
+                self._sucio = False
+                items_propios, self._items_propios = self._items_propios, {}
+                datos_propios, self._datos_propios = self._datos_propios, False
+            archivador, datos_usuario = self._instantanea_actual()
+            try:
+                self._escribir_instantanea(archivador, datos_usuario)
+                self._sello = self._sello_archivo()
+            except OSError:
+                with self._candado_pendientes:
+                    self._sucio = True
+                    self._items_propios = {**items_propios, **self._items_propios}
+                    self._datos_propios = self._datos_propios or datos_propios
+                raise
+
+    def cerrar(self):
+        super().cerrar()
+        self._agrupando = 0
+        if getattr(self, "_sucio", False):
+            self._volcar_agrupacion()
+        self._cerrar_cerrojo()
+
+
+class AlmacenDiario(AlmacenMemoria):
+    """
+    Diario de solo-anexado con instantánea compactada.
+    Cada mutación cuesta una línea en disco, independientemente del tamaño
+    del archivo. El fsync se hace cada 'lote_fsync' registros o cada
+    'intervalo_fsync' segundos. La compactación se dispara cuando el diario
+    supera el tamaño del propio archivador (y al menos 'compactar_minimo'
+    registros), de modo que su coste amortizado por mutación es O(1).
+    Cada compactación empieza el diario con su generación
+    ({"op": "generacion", "n": N}); en multiproceso, un proceso que ve otra
+    generación recarga la instantánea, y si no, lee solo desde la posición
+    hasta la que ya había leído.
+    """
+    def __init__(self, ruta, lote_fsync=32, intervalo_fsync=1.0, compactar_minimo=1000, columnar=False):
+        super().__init__(ruta, columnar=columnar)
+        self.ruta_diario = f"{ruta}.journal"
+        self.lote_fsync = lote_fsync
+        self.intervalo_fsync = intervalo_fsync
+        self.compactar_minimo = compactar_minimo
+        self._archivador = {}
+        self._datos_usuario = None
+        self._diario = None
+        self._pendientes = []
+        self._registros_diario = 0
+        self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+        # Bytes del diario ya aplicados y generación (compactaciones) que se leyó.
+        self._posicion = 0
+        self._generacion = 0
+
+    def existe(self):
+        return os.path.exists(self.ruta) or os.path.exists(self.ruta_diario)
+
+    def cargar(self):
+        with self._bloqueado():
+            self._archivador, self._datos_usuario = self._leer_instantanea()
+            self._generacion = 0
+            self._registros_diario, bytes_validos = self._reproducir_diario()
+            self._diario = open(self.ruta_diario, 'a+b')
+            # Un corte a mitad de escritura deja una última línea incompleta: se descarta.
+            # (En multiproceso se hace con el cerrojo exclusivo: nadie está escribiendo.)
+            self._diario.truncate(bytes_validos)
+            self._diario.seek(0, os.SEEK_END)
+            self._posicion = bytes_validos
+        return self._archivador, self._datos_usuario
+
+    def _reproducir_diario(self, desde=0, anotar=None):
+        """Aplica los registros completos desde el byte 'desde'. Devuelve (registros, byte final válido)."""
+        registros, bytes_validos = 0, desde
+        if not os.path.exists(self.ruta_diario):
+            return registros, bytes_validos
+        with open(self.ruta_diario, 'rb') as f:
+            f.seek(desde)
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    break
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    break
+                self._aplicar(registro)
+                if anotar is not None:
+                    anotar(registro)
+                registros += 1
+                bytes_validos += len(linea)
+        return registros, bytes_validos
+
+    def _aplicar(self, registro):
+        if registro["op"] == "item":
+            self._archivador[registro["id"]] = registro["item"]
+        elif registro["op"] == "usuario":
+            self._datos_usuario = registro["datos"]
+        elif registro["op"] == "generacion":
+            self._generacion = registro["n"]
+
+    def _generacion_en_disco(self):
+        # La cabecera de generación es la primera línea (los diarios antiguos no la tienen: 0).
+        primera = os.pread(self._diario.fileno(), 64, 0).split(b"\n", 1)[0]
+        if primera.startswith(b'{"op":"generacion"'):
+            try:
+                return json.loads(primera)["n"]
+            except (ValueError, KeyError):
+                pass
+        return 0
+
+    def _ponerse_al_dia(self):
+        if self._diario is None or self._diario.closed:
+            return
+        if self._generacion_en_disco() != self._generacion:
+            # Otro proceso compactó: la instantánea nueva ya trae todo lo anterior.
+            with self._candado_pendientes:
+                self._archivador, self._datos_usuario = self._leer_instantanea()
+                self._generacion = 0
+                self._registros_diario, self._posicion = self._reproducir_diario()
+                # Lo propio aún sin escribir se vuelve a aplicar encima.
+                for registro in self._pendientes:
+                    self._aplicar(registro)
+                self._recargado = True
+            return
+        if os.fstat(self._diario.fileno()).st_size <= self._posicion:
+            return
+
+        def anotar(registro):
+            if registro["op"] == "item":
+                self._ids_nuevos.add(registro["id"])
+            elif registro["op"] == "usuario":
+                self._datos_nuevos = True
+
+        with self._candado_pendientes:
+            registros, self._posicion = self._reproducir_diario(self._posicion, anotar)
+            # Lo propio pendiente es más reciente que lo leído: se vuelve a aplicar encima.
+            for registro in self._pendientes:
+                self._aplicar(registro)
+            self._registros_diario += registros
+
+    def _anexar(self, registro):
+        # Se llama con '_candado_pendientes' tomado, junto con la mutación en memoria.
+        self._pendientes.append(registro)
+
+    def _persistir(self):
+        if self._escritor is None and not self._agrupando:
+            # Escritura inmediata: el fsync se agrupa por lotes, como siempre.
+            self._volcar_agrupacion(forzar_fsync=False)
+        else:
+            super()._persistir()
+
+    def _escribir_registros(self, registros, forzar_fsync=False):
+        lineas = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in registros)
+        datos = lineas.encode('utf-8')
+        self._diario.write(datos)
+        self._diario.flush()
+        # Se escribe al final de lo ya leído (en multiproceso, tras ponerse al día con el cerrojo).
+        self._posicion += len(datos)
+        self._registros_diario += len(registros)
+        self._pendientes_fsync += len(registros)
+        if forzar_fsync or self._pendientes_fsync >= self.lote_fsync or time.monotonic() - self._ultimo_fsync >= self.intervalo_fsync:
+            self._sincronizar()
+        if self._registros_diario >= max(self.compactar_minimo, len(self._archivador)):
+            self.compactar()
+
+    def _volcar_agrupacion(self, forzar_fsync=True):
+        with self._bloqueado():
+            if not self._pendientes:
+                return
+            if self.multiproceso:
+                self._ponerse_al_dia()
+            with self._candado_pendientes:
+                registros, self._pendientes = self._pendientes, []
+            if not registros:
+                return
+            try:
+                self._escribir_registros(registros, forzar_fsync=forzar_fsync)
+            except OSError:
+                # Se reintentará en el próximo volcado (reaplicar un registro es inocuo).
+                with self._candado_pendientes:
+                    self._pendientes[:0] = registros
+                raise
+
+    def _volcar_transaccion(self):
+        # Los demás procesos ya ven lo escrito; el fsync sigue agrupándose por lotes.
+        self._volcar_agrupacion(forzar_fsync=False)
+
+    def _sincronizar(self):
+        if self._pendientes_fsync:
+            os.fsync(self._diario.fileno())
+            self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def registrar_item(self, identificador, item):
+        with self._candado_pendientes:
+            self._archivador[identificador] = item
+            self._anexar({"op": "item", "id": identificador, "item": item})
+        self._persistir()
+
+    def registrar_datos_usuario(self, datos_usuario):
+        with self._candado_pendientes:
+            self._datos_usuario = datos_usuario
+            self._anexar({"op": "usuario", "datos": datos_usuario})
+        self._persistir()
+
+    def guardar_todo(self, archivador, datos_usuario):
+        with self._candado_pendientes:
+            self._archivador, self._datos_usuario = self._adoptar(archivador), datos_usuario
+        self.compactar()
+
+    def compactar(self):
+        """Vuelca el estado completo en la instantánea y empieza un diario de la generación siguiente."""
+        with self._bloqueado():
+            if self.multiproceso:
+                # La instantánea debe incluir lo que escribieron los demás.
+                self._ponerse_al_dia()
+            self._sincronizar()
+            with self._candado_pendientes:
+                archivador, datos_usuario = self._instantanea_actual()
+                # La instantánea ya incluye lo pendiente (agrupación o escritura diferida).
+                self._pendientes = []
+            # '_escribir_atomico' deja la instantánea (y su renombrado) en disco
+            # antes de truncar el diario: un corte entre ambos no pierde nada.
+            self._escribir_instantanea(archivador, datos_usuario)
+            self._generacion += 1
+            cabecera = json.dumps({"op": "generacion", "n": self._generacion}, separators=(",", ":")) + "\n"
+            self._diario.truncate(0)
+            self._diario.seek(0)
+            self._diario.write(cabecera.encode('utf-8'))
+            self._diario.flush()
+            os.fsync(self._diario.fileno())
+            self._posicion = len(cabecera)
+            self._registros_diario = 0
+
+    def cerrar(self):
+        super().cerrar()
+        with self._candado_volcado:
+            if self._diario and not self._diario.closed:
+                self._agrupando = 0
+                self._volcar_agrupacion()
+                self._sincronizar()
+                self._diario.close()
+        self._cerrar_cerrojo()
+
+
+class ArchivadorSQLite(MutableMapping):
+    """Vista tipo diccionario del archivador guardado en SQLite (nada se carga por adelantado)."""
+    def __init__(self, almacen):
+        self._almacen = almacen
+
+    def __getitem__(self, identificador):
+        # Lo pendiente se retira una vez confirmado en la base: si ya no está, se lee de ella.
+        item = self._almacen._pendientes.get(identificador)
+        if item is not None:
+            return item
+        fila = self._almacen._consultar_uno("SELECT datos FROM items WHERE id = ?", (identificador,))
+        if fila is None:
+            raise KeyError(identificador)
+        return json.loads(fila[0])
+
+    def __setitem__(self, identificador, item):
+        self._almacen.registrar_item(identificador, item)
+
+    def __delitem__(self, identificador):
+        self._almacen._volcar_agrupacion()
+        with self._almacen._candado, self._almacen._conexion:
+            cursor = self._almacen._conexion.execute("DELETE FROM items WHERE id = ?", (identificador,))
+        if cursor.rowcount == 0:
+            raise KeyError(identificador)
+
+    def __contains__(self, identificador):
+        if identificador in self._almacen._pendientes:
+            return True
+        return self._almacen._consultar_uno("SELECT 1 FROM items WHERE id = ?", (identificador,)) is not None
+
+    def __iter__(self):
+        # Se materializa solo la lista de ids, no los items.
+        self._almacen._volcar_agrupacion()
+        with self._almacen._candado:
+            ids = [fila[0] for fila in self._almacen._conexion.execute("SELECT id FROM items")]
+        return iter(ids)
+
+    def __len__(self):
+        self._almacen._volcar_agrupacion()
+        return self._almacen._consultar_uno("SELECT COUNT(*) FROM items")[0]
+
+
+class AlmacenSQLite(AlmacenMemoria):
+    """
+    Archivador en SQLite (modo WAL). Arrancar solo lee 'datos_usuario'.
+    Si existe una memoria JSON/diario previa y aún no hay base, se importa una vez.
+    Los items ajenos se leen siempre de la base; en multiproceso, 'PRAGMA
+    data_version' avisa de que otro proceso escribió y los items con rowid
+    mayor que el último visto son los que cambiaron (INSERT OR REPLACE
+    asigna un rowid nuevo).
+    """
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY,
+            tipo TEXT,
+            fecha TEXT,
+            hora TEXT,
+            arranque TEXT,
+            datos TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_items_tipo_fecha ON items (tipo, fecha, hora);
+        CREATE INDEX IF NOT EXISTS idx_items_fecha ON items (fecha, hora);
+        CREATE INDEX IF NOT EXISTS idx_items_arranque ON items (arranque);
+        CREATE TABLE IF NOT EXISTS usuario (
+            clave TEXT PRIMARY KEY,
+            datos TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, ruta, columnar=False):
+        # El archivador ya vive en la base, no en memoria: 'columnar' no aplica.
+        super().__init__(ruta)
+        self.ruta_sqlite = f"{os.path.splitext(ruta)[0]}.sqlite3"
+        self._conexion = None
+        self._pendientes = {}
+        self._datos_pendientes = None
+        # Flask y ASGI pueden tocar la base desde hilos distintos al de creación.
+        self._candado = threading.Lock()
+        self._version_datos = None
+        self._ultimo_rowid = 0
+
+    def existe(self):
+        return os.path.exists(self.ruta_sqlite) or AlmacenDiario(self.ruta).existe()
+
+    def cargar(self):
+        with self._bloqueado():
+            es_nueva = not os.path.exists(self.ruta_sqlite)
+            self._conexion = sqlite3.connect(self.ruta_sqlite, check_same_thread=False)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("PRAGMA synchronous=NORMAL")
+            if self.multiproceso:
+                # Espera en vez de fallar si otro proceso está escribiendo.
+                self._conexion.execute("PRAGMA busy_timeout=10000")
+            self._conexion.executescript(self.ESQUEMA)
+            if es_nueva:
+                self._importar_memoria_previa()
+            self._archivador = ArchivadorSQLite(self)
+            fila = self._consultar_uno("SELECT datos FROM usuario WHERE clave = 'datos_usuario'")
+            self._datos_usuario = json.loads(fila[0]) if fila else None
+            if self.multiproceso:
+                self._version_datos = self._consultar_uno("PRAGMA data_version")[0]
+                self._ultimo_rowid = self._consultar_uno("SELECT COALESCE(MAX(rowid), 0) FROM items")[0]
+        return self._archivador, self._datos_usuario
+
+    def _ponerse_al_dia(self):
+        if self._conexion is None:
+            return
+        # data_version solo cambia cuando escribe otra conexión: comprobarlo es casi gratis.
+        version = self._consultar_uno("PRAGMA data_version")[0]
+        if version == self._version_datos:
+            return
+        self._version_datos = version
+        with self._candado:
+            filas = self._conexion.execute("SELECT rowid, id FROM items WHERE rowid > ?", (self._ultimo_rowid,)).fetchall()
+            fila_datos = self._conexion.execute("SELECT datos FROM usuario WHERE clave = 'datos_usuario'").fetchone()
+        with self._candado_pendientes:
+            for rowid, identificador in filas:
+                self._ids_nuevos.add(identificador)
+                self._ultimo_rowid = max(self._ultimo_rowid, rowid)
+            datos_usuario = json.loads(fila_datos[0]) if fila_datos else None
+            if datos_usuario != self._datos_usuario and self._datos_pendientes is None:
+                self._datos_usuario = datos_usuario
+                self._datos_nuevos = True
+
+    def apartar_y_cargar(self):
+        if os.path.exists(self.ruta_sqlite):
+            self.cerrar()
+            os.replace(self.ruta_sqlite, f"{self.ruta_sqlite}.corrupto")
+        return self.cargar()
+
+    def _importar_memoria_previa(self):
+        previo = AlmacenDiario(self.ruta)
+        if not previo.existe():
+            return
+        archivador, datos_usuario = previo.cargar()
+        previo.cerrar()
+        with self._candado, self._conexion:
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                (self._fila(identificador, item) for identificador, item in archivador.items()),
+            )
+            if datos_usuario is not None:
+                self._escribir_datos_usuario(datos_usuario)
+        print(f"      -> Memoria previa importada a SQLite ({len(archivador)} items).")
+
+    def _consultar_uno(self, sql, parametros=()):
+        with self._candado:
+            return self._conexion.execute(sql, parametros).fetchone()
+
+    @staticmethod
+    def _fila(identificador, item):
+        return (
+            identificador,
+            item.get("tipo"),
+            fecha_iso_item(item),
+            item.get("hora_emision") or item.get("hora_sellado"),
+            item.get("arranque"),
+            json.dumps(item, ensure_ascii=False),
+        )
+
+    def _escribir_datos_usuario(self, datos_usuario):
+        self._conexion.execute(
+            "INSERT OR REPLACE INTO usuario VALUES ('datos_usuario', ?)",
+            (json.dumps(datos_usuario, ensure_ascii=False),),
+        )
+
+    def registrar_item(self, identificador, item):
+        with self._candado_pendientes:
+            self._pendientes[identificador] = item
+        self._persistir()
+
+    def registrar_datos_usuario(self, datos_usuario):
+        with self._candado_pendientes:
+            self._datos_pendientes = datos_usuario
+            self._datos_usuario = datos_usuario
+        self._persistir()
+
+    def _volcar_agrupacion(self):
+        with self._bloqueado():
+            with self._candado_pendientes:
+                if not self._pendientes and self._datos_pendientes is None:
+                    return
+            if self.multiproceso:
+                self._ponerse_al_dia()
+            with self._candado_pendientes:
+                pendientes = dict(self._pendientes)
+                datos_usuario = self._datos_pendientes
+            with self._candado, self._conexion:
+                self._conexion.executemany(
+                    "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._fila(identificador, item) for identificador, item in pendientes.items()),
+                )
+                if datos_usuario is not None:
+                    self._escribir_datos_usuario(datos_usuario)
+                if self.multiproceso:
+                    # Con el cerrojo exclusivo, los rowid nuevos son los propios.
+                    self._ultimo_rowid = self._conexion.execute("SELECT COALESCE(MAX(rowid), 0) FROM items").fetchone()[0]
+            # Lo pendiente sigue visible (ArchivadorSQLite lo consulta) hasta quedar
+            # confirmado en la base; solo se retira lo que no cambió mientras tanto.
+            with self._candado_pendientes:
+                for identificador, item in pendientes.items():
+                    if self._pendientes.get(identificador) is item:
+                        del self._pendientes[identificador]
+                if self._datos_pendientes is datos_usuario:
+                    self._datos_pendientes = None
+
+    def guardar_todo(self, archivador, datos_usuario):
+        with self._candado_volcado, self._candado, self._conexion:
+            if archivador is not self._archivador:
+                # Un archivador completo nuevo reemplaza al guardado (p. ej. tras migrar IDs),
+                # incluido lo que estuviera pendiente de volcar.
+                with self._candado_pendientes:
+                    self._pendientes.clear()
+                    self._datos_pendientes = None
+                self._conexion.execute("DELETE FROM items")
+                self._conexion.executemany(
+                    "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._fila(identificador, item) for identificador, item in archivador.items()),
+                )
+            if datos_usuario is not None:
+                self._escribir_datos_usuario(datos_usuario)
+
+    def consultar(self, tipo=None, desde=None, hasta=None, limite=10, desplazamiento=0):
+        self._volcar_agrupacion()
+        condiciones, parametros = [], []
+        if tipo:
+            condiciones.append("tipo = ?")
+            parametros.append(tipo)
+        if desde:
+            condiciones.append("fecha >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("fecha <= ?")
+            parametros.append(hasta)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        with self._candado:
+            total = self._conexion.execute(f"SELECT COUNT(*) FROM items {donde}", parametros).fetchone()[0]
+            filas = self._conexion.execute(
+                f"SELECT datos FROM items {donde} ORDER BY fecha DESC, hora DESC, SUBSTR(id, INSTR(id, '-') + 1) DESC LIMIT ? OFFSET ?",
+                parametros + [limite, desplazamiento],
+            ).fetchall()
+        return [json.loads(fila[0]) for fila in filas], total
+
+    def cerrar(self):
+        super().cerrar()
+        with self._candado_volcado:
+            if self._conexion is not None:
+                self._agrupando = 0
+                self._volcar_agrupacion()
+                with self._candado:
+                    self._conexion.close()
+                self._conexion = None
+        self._cerrar_cerrojo()
+
+
+MOTORES_ALMACENAMIENTO = {
+    "diario": AlmacenDiario,
+    "json": AlmacenJSON,
+    "sqlite": AlmacenSQLite,
+}
+
+def crear_almacen(tipo, ruta, columnar=False):
+    """Instancia el motor de almacenamiento 'tipo' sobre la ruta de memoria dada."""
+    clase = MOTORES_ALMACENAMIENTO.get(tipo)
+    if clase is None:
+        raise ValueError(f"Motor de almacenamiento desconocido: '{tipo}'. Opciones: {', '.join(MOTORES_ALMACENAMIENTO)}")
+    return clase(ruta, columnar=columnar)
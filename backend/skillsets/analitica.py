@@ -0,0 +1,192 @@
+# =================================================================
+# ANALITICA.PY (v1.0 - Productividad Incremental)
+# =================================================================
+# Agregados de productividad que se actualizan al archivar cada ticket o
+# contrato, de modo que "¿cuántos contratos sellé esta semana?" no recorre
+# el archivador ni vuelve a interpretar sus fechas 'dd/mm/yy'.
+# - Se guardan en datos_usuario["analitica"]: totales, recuentos por día
+#   (solo los últimos DIAS_RETENIDOS, para que el registro no crezca) y por
+#   mes, más la racha máxima.
+# - La racha diaria y los logros usan los campos de siempre de datos_usuario
+#   ('racha_diaria', 'fecha_ultima_racha', 'logros').
+# - Las actualizaciones no modifican el dict recibido: devuelven uno nuevo.
+#   El almacén (o su escritor diferido) puede estar serializando el anterior
+#   desde otro hilo.
+# - Si la memoria no tiene agregados (o no cuadran con el archivador, p. ej.
+#   tras una importación) se reconstruyen una vez recorriendo el archivador.
+
+import re
+from datetime import date, timedelta
+
+from .almacenamiento import fecha_iso_item
+
+VERSION = 1
+DIAS_RETENIDOS = 62
+# "25 min", "1 h 30 min", "2 horas" o un número solo (minutos, como lo deja el Modo Diseño).
+PATRON_DURACION = re.compile(r'(\d+)\s*(h(?:oras?)?|min(?:utos)?)?\b', re.IGNORECASE)
+
+# Posiciones de cada recuento en las listas por día y por mes.
+TICKETS, CONTRATOS, MINUTOS = 0, 1, 2
+
+# (id, nombre, condición sobre (analitica, racha)). Se comprueban solo los pendientes.
+LOGROS = [
+    ("primer_ticket", "Primer ticket emitido", lambda a, r: a["totales"]["tickets"] >= 1),
+    ("primer_contrato", "Primer contrato forjado", lambda a, r: a["totales"]["contratos"] >= 1),
+    ("items_10", "10 items en el archivador", lambda a, r: a["items"] >= 10),
+    ("items_100", "100 items en el archivador", lambda a, r: a["items"] >= 100),
+    ("items_1000", "1000 items en el archivador", lambda a, r: a["items"] >= 1000),
+    ("racha_3", "Racha de 3 días", lambda a, r: r >= 3),
+    ("racha_7", "Una semana sin fallar", lambda a, r: r >= 7),
+    ("racha_30", "Un mes sin fallar", lambda a, r: r >= 30),
+    ("horas_10", "10 horas planificadas", lambda a, r: a["totales"]["minutos"] >= 600),
+    ("horas_100", "100 horas planificadas", lambda a, r: a["totales"]["minutos"] >= 6000),
+]
+
+
+def nueva():
+    return {
+        "version": VERSION,
+        "items": 0,
+        "totales": {"tickets": 0, "contratos": 0, "minutos": 0},
+        "por_dia": {},
+        "por_mes": {},
+        "racha_maxima": 0,
+    }
+
+
+def minutos_de(item):
+    minutos = 0
+    for cantidad, unidad in PATRON_DURACION.findall(str(item.get("duracion", ""))):
+        minutos += int(cantidad) * (60 if unidad.lower().startswith("h") else 1)
+    return minutos
+
+
+def _sumar(recuentos, tipo, minutos):
+    nuevos = list(recuentos) if recuentos else [0, 0, 0]
+    nuevos[TICKETS if tipo == "Ticket" else CONTRATOS] += 1
+    nuevos[MINUTOS] += minutos
+    return nuevos
+
+
+def _podar_dias(por_dia):
+    if len(por_dia) > DIAS_RETENIDOS:
+        for dia in sorted(por_dia)[:len(por_dia) - DIAS_RETENIDOS]:
+            del por_dia[dia]
+
+
+def _avanzar_racha(racha, ultima, dia):
+    """(racha, fecha_ultima_racha) tras un item del día 'dia' (ISO)."""
+    if ultima is None or dia > ultima:
+        consecutivo = ultima is not None and date.fromisoformat(dia) - date.fromisoformat(ultima) == timedelta(days=1)
+        return (racha + 1 if consecutivo else 1), dia
+    return racha, ultima
+
+
+def _logros_nuevos(analitica, racha, logros, dia):
+    obtenidos = {logro["id"] for logro in logros}
+    return [{"id": identificador, "nombre": nombre, "fecha": dia}
+            for identificador, nombre, condicion in LOGROS
+            if identificador not in obtenidos and condicion(analitica, racha)]
+
+
+def _aplicar(analitica, racha, ultima, item, dia):
+    """Suma el item (del día ISO 'dia') a 'analitica', que debe ser propia. Devuelve (racha, fecha_ultima_racha)."""
+    tipo = item.get("tipo")
+    minutos = minutos_de(item)
+    totales = analitica["totales"]
+    totales["tickets" if tipo == "Ticket" else "contratos"] += 1
+    totales["minutos"] += minutos
+    analitica["items"] += 1
+    if dia:
+        por_dia, por_mes = analitica["por_dia"], analitica["por_mes"]
+        por_dia[dia] = _sumar(por_dia.get(dia), tipo, minutos)
+        por_mes[dia[:7]] = _sumar(por_mes.get(dia[:7]), tipo, minutos)
+        racha, ultima = _avanzar_racha(racha, ultima, dia)
+        analitica["racha_maxima"] = max(analitica["racha_maxima"], racha)
+    return racha, ultima
+
+
+def registrar(datos_usuario, item):
+    """
+    Suma un item a los agregados. Devuelve (datos_usuario nuevo, logros
+    desbloqueados). Coste O(1): no depende del tamaño del archivador.
+    """
+    anterior = datos_usuario.get("analitica") or nueva()
+    analitica = dict(anterior, totales=dict(anterior["totales"]),
+                     por_dia=dict(anterior["por_dia"]), por_mes=dict(anterior["por_mes"]))
+    dia = fecha_iso_item(item)
+    racha, ultima = _aplicar(analitica, datos_usuario.get("racha_diaria", 0), datos_usuario.get("fecha_ultima_racha"), item, dia)
+    _podar_dias(analitica["por_dia"])
+
+    logros = list(datos_usuario.get("logros") or [])
+    nuevos_logros = _logros_nuevos(analitica, racha, logros, dia or date.today().isoformat())
+    nuevos = dict(datos_usuario, analitica=analitica, racha_diaria=racha, fecha_ultima_racha=ultima,
+                  logros=logros + nuevos_logros)
+    return nuevos, nuevos_logros
+
+
+def reconstruir(datos_usuario, items):
+    """Recalcula los agregados recorriendo todos los items (una sola vez por memoria)."""
+    analitica = nueva()
+    racha, ultima = 0, None
+    logros = list(datos_usuario.get("logros") or [])
+    # Muchos items comparten fecha: cada 'dd/mm/yy' distinta se interpreta una sola vez.
+    fechas = {}
+    def dia_de(item):
+        fecha = item.get("fecha_emision") or item.get("fecha_sellado")
+        if fecha not in fechas:
+            fechas[fecha] = fecha_iso_item(item)
+        return fechas[fecha]
+    con_dia = sorted(((dia_de(item) or "", item) for item in items), key=lambda par: par[0])
+    for dia, item in con_dia:
+        racha, ultima = _aplicar(analitica, racha, ultima, item, dia or None)
+        if len(logros) < len(LOGROS):
+            logros += _logros_nuevos(analitica, racha, logros, ultima or date.today().isoformat())
+    _podar_dias(analitica["por_dia"])
+    return dict(datos_usuario, analitica=analitica, racha_diaria=racha, fecha_ultima_racha=ultima, logros=logros)
+
+
+def al_dia(datos_usuario, total_items):
+    """True si los agregados existen y cuentan los mismos items que el archivador."""
+    analitica = datos_usuario.get("analitica")
+    return bool(analitica) and analitica.get("version") == VERSION and analitica.get("items") == total_items
+
+
+def racha_vigente(datos_usuario, hoy):
+    """La racha sigue viva si el último día con actividad es hoy o ayer."""
+    ultima = datos_usuario.get("fecha_ultima_racha")
+    if not ultima or date.fromisoformat(ultima) < hoy - timedelta(days=1):
+        return 0
+    return datos_usuario.get("racha_diaria", 0)
+
+
+def _como_dict(recuentos):
+    recuentos = recuentos or [0, 0, 0]
+    return {"tickets": recuentos[TICKETS], "contratos": recuentos[CONTRATOS], "minutos": recuentos[MINUTOS]}
+
+
+def periodo(datos_usuario, desde, hasta):
+    """Recuentos entre dos fechas (date) dentro de los días retenidos."""
+    por_dia = (datos_usuario.get("analitica") or nueva())["por_dia"]
+    suma = [0, 0, 0]
+    dia = desde
+    while dia <= hasta:
+        recuentos = por_dia.get(dia.isoformat())
+        if recuentos:
+            suma = [a + b for a, b in zip(suma, recuentos)]
+        dia += timedelta(days=1)
+    return _como_dict(suma)
+
+
+def resumen(datos_usuario, hoy):
+    """Hoy, esta semana (desde el lunes), este mes, totales, racha y logros."""
+    analitica = datos_usuario.get("analitica") or nueva()
+    return {
+        "hoy": periodo(datos_usuario, hoy, hoy),
+        "semana": periodo(datos_usuario, hoy - timedelta(days=hoy.weekday()), hoy),
+        "mes": _como_dict(analitica["por_mes"].get(hoy.isoformat()[:7])),
+        "totales": dict(analitica["totales"]),
+        "racha": racha_vigente(datos_usuario, hoy),
+        "racha_maxima": analitica["racha_maxima"],
+        "logros": list(datos_usuario.get("logros") or []),
+    }
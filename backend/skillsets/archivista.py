@@ -0,0 +1,78 @@
+# =================================================================
+# ARCHIVISTA.PY (v1.0 - Lo Relacionado en el Archivador)
+# =================================================================
+# Skillset que busca en el archivador del usuario los tickets y contratos
+# relacionados con lo que acaba de decir. Está pensado para ir en abanico
+# junto al Guardián ("skillset_target": ["guardian", "archivista"]): corre a
+# la vez que él y, si no encuentra nada, no añade nada a la respuesta.
+# - Usa el mismo gestor de memorias que el Guardián: no carga nada de nuevo.
+# - Consulta el índice de búsqueda del usuario (busqueda.py, BM25) con las
+#   palabras clave del comando: cubre todo el archivador sin recorrerlo.
+# - En medio de un modo guiado (Ticket, Diseño, Combo) no interviene.
+
+import re
+
+from .busqueda import indice_de
+from .inquilinos import gestor_compartido
+
+# Declaración para el registro de skillsets de A.L.E. (se lee sin importar el módulo).
+SKILLSET = {"nombre": "archivista", "clase": "Archivista", "tiempo_limite": 2}
+
+PATRON_PALABRA = re.compile(r'\w{4,}')
+
+# Palabras demasiado comunes (o de control del Guardián) para buscar por ellas.
+PALABRAS_VACIAS = frozenset({
+    "activar", "crear", "gestionar", "listar", "consultar", "cancelar", "confirmar",
+    "ticket", "tickets", "contrato", "contratos", "diseño", "combo", "página",
+    "quiero", "necesito", "tengo", "tener", "ganas", "debería", "hora", "bueno", "mira",
+    "para", "como", "cómo", "pero", "porque", "cuando", "donde", "esto", "esta", "este",
+    "estas", "estos", "eso", "hacer", "hoy", "ayer", "mañana", "algo", "nada", "todo",
+    "muy", "más", "menos", "sobre", "entre", "desde", "hasta", "durante", "minutos",
+    "buscar", "busca", "encontrar", "estadísticas", "estadisticas", "progreso", "resumen", "racha", "logros",
+    "próximo", "proximo", "próximos", "proximos", "agenda", "pendientes",
+})
+
+
+class Archivista:
+    MAX_RESULTADOS = 3
+
+    def __init__(self):
+        self.memorias = gestor_compartido()
+        print("    - Especialista 'Archivista' v1.0 listo.")
+
+    @staticmethod
+    def _palabras_clave(comando_lower):
+        return {palabra for palabra in PATRON_PALABRA.findall(comando_lower) if palabra not in PALABRAS_VACIAS}
+
+    def buscar_relacionados(self, usuario_id, comando):
+        """Items cuyo texto comparte palabras con el comando, del más al menos parecido (BM25)."""
+        palabras = self._palabras_clave(comando.lower())
+        if not palabras:
+            return []
+        with self.memorias.usar(usuario_id) as memoria:
+            resultados = indice_de(memoria).buscar(" ".join(palabras), limite=self.MAX_RESULTADOS)
+            items = [memoria.archivador.get(identificador) for identificador, _ in resultados]
+        return [item for item in items if item is not None]
+
+    async def ejecutar(self, datos):
+        estado = datos.get("estado_conversacion") or {}
+        comando = datos.get("comando", "").strip()
+        if estado.get("modo", "libre") != "libre" or not comando or comando.startswith("_"):
+            return {"relacionados": []}
+
+        relacionados = self.buscar_relacionados(datos.get("usuario_id"), comando)
+        if not relacionados:
+            return {"relacionados": []}
+        lineas = []
+        for item in relacionados:
+            if item.get("tipo") == "Ticket":
+                lineas.append(f"- **{item['id']}** · Ticket · {item.get('fecha_emision', '?')} · {item.get('tarea', '')}")
+            else:
+                lineas.append(f"- **{item['id']}** · Contrato · {item.get('fecha_sellado', '?')} · {item.get('mision', '')}")
+        return {
+            "relacionados": [item["id"] for item in relacionados],
+            "mensaje_para_ui": "📂 **Relacionado en tu archivador:**\n" + "\n".join(lineas),
+        }
+
+    def estadisticas(self):
+        return {"usuarios_en_memoria": len(self.memorias.usuarios_calientes())}
@@ -0,0 +1,253 @@
+# =================================================================
+# BUSQUEDA.PY (v1.0 - Índice de Texto Completo)
+# =================================================================
+# Índice invertido en memoria sobre la tarea de los tickets y la misión de
+# los contratos, con ranking BM25.
+# - Normalización: minúsculas, sin tildes ("matemáticas" = "MATEMATICAS"),
+#   sin palabras vacías y con el plural simple plegado ("clases" = "clase").
+# - Incremental: cada ticket o contrato archivado se añade al momento.
+# - Las listas de apariciones son arrays (documento, frecuencia) que solo
+#   crecen; un item reemplazado o borrado se marca y se descarta al guardar.
+# - Persistente: se guarda junto a la memoria ('<memoria>.indice') al
+#   cerrarla. Al abrirlo se concilia con el archivador: solo se indexan los
+#   items que falten (p. ej. tras una caída) y se quitan los que ya no estén,
+#   sin reconstruir el índice desde cero.
+
+import heapq
+import json
+import math
+import os
+import re
+import struct
+import unicodedata
+from array import array
+
+from .columnar import array_desde_bytes, bloque, bytes_de_array, leer_bloque
+
+MAGIA = b"ALEI"
+VERSION = 1
+_CABECERA = struct.Struct("<4sBI")
+
+# Parámetros de BM25.
+K1 = 1.2
+B = 0.75
+
+PATRON_TOKEN = re.compile(r'\w+')
+PALABRAS_VACIAS = frozenset({
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los", "mi", "mis", "para",
+    "por", "que", "se", "su", "sus", "un", "una", "unos", "unas", "y", "o", "e", "u", "es",
+})
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes ni diéresis (la ñ también se pliega a n)."""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+
+
+def terminos(texto):
+    resultado = []
+    for token in PATRON_TOKEN.findall(normalizar_texto(texto or "")):
+        if token in PALABRAS_VACIAS or len(token) < 2:
+            continue
+        if len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        resultado.append(token)
+    return resultado
+
+
+def texto_item(item):
+    """Texto indexable de un ticket ('tarea') o contrato ('mision')."""
+    return item.get("tarea") or item.get("mision") or ""
+
+
+class _Apariciones:
+    __slots__ = ("documentos", "frecuencias")
+
+    def __init__(self, documentos=None, frecuencias=None):
+        self.documentos = documentos if documentos is not None else array('I')
+        self.frecuencias = frecuencias if frecuencias is not None else array('H')
+
+
+class IndiceBusqueda:
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        # Número de documento -> ID del item (None si se quitó).
+        self._ids = []
+        self._documentos = {}
+        self._longitudes = array('I')
+        self._apariciones = {}
+        self._vivos = 0
+        self._longitud_total = 0
+        self.sucio = False
+
+    # --- ACTUALIZACIÓN ---
+    def agregar(self, identificador, texto):
+        if identificador in self._documentos:
+            self.quitar(identificador)
+        palabras = terminos(texto)
+        documento = len(self._ids)
+        self._ids.append(identificador)
+        self._documentos[identificador] = documento
+        self._longitudes.append(len(palabras))
+        frecuencias = {}
+        for palabra in palabras:
+            frecuencias[palabra] = frecuencias.get(palabra, 0) + 1
+        for palabra, frecuencia in frecuencias.items():
+            apariciones = self._apariciones.get(palabra)
+            if apariciones is None:
+                apariciones = self._apariciones[palabra] = _Apariciones()
+            apariciones.documentos.append(documento)
+            apariciones.frecuencias.append(min(frecuencia, 0xFFFF))
+        self._vivos += 1
+        self._longitud_total += len(palabras)
+        self.sucio = True
+
+    def quitar(self, identificador):
+        documento = self._documentos.pop(identificador, None)
+        if documento is None:
+            return
+        self._ids[documento] = None
+        self._vivos -= 1
+        self._longitud_total -= self._longitudes[documento]
+        self.sucio = True
+
+    def __len__(self):
+        return self._vivos
+
+    def __contains__(self, identificador):
+        return identificador in self._documentos
+
+    # --- CONSULTA ---
+    def buscar(self, consulta, limite=10):
+        """Los 'limite' items más relevantes para la consulta: [(id, puntuación)]."""
+        if not self._vivos:
+            return []
+        longitud_media = self._longitud_total / self._vivos or 1.0
+        # normalización BM25 de un documento = fija + proporcional * longitud
+        fija, proporcional = K1 * (1 - B), K1 * B / longitud_media
+        ids, longitudes = self._ids, self._longitudes
+        hay_quitados = self._vivos != len(ids)
+        puntuaciones = {}
+        acumulada = puntuaciones.get
+        for palabra in set(terminos(consulta)):
+            apariciones = self._apariciones.get(palabra)
+            if apariciones is None:
+                continue
+            # Las apariciones de documentos quitados cuentan en df hasta la próxima compactación.
+            df = len(apariciones.documentos)
+            peso = math.log(1 + (self._vivos - df + 0.5) / (df + 0.5)) * (K1 + 1)
+            for documento, frecuencia in zip(apariciones.documentos, apariciones.frecuencias):
+                if hay_quitados and ids[documento] is None:
+                    continue
+                puntuaciones[documento] = acumulada(documento, 0.0) + peso * frecuencia / (frecuencia + fija + proporcional * longitudes[documento])
+        # A igual puntuación, primero el item más reciente (número de documento mayor).
+        mejores = heapq.nlargest(limite, puntuaciones.items(), key=lambda par: (par[1], par[0]))
+        return [(self._ids[documento], puntuacion) for documento, puntuacion in mejores]
+
+    # --- PERSISTENCIA ---
+    def _compactar(self):
+        """Renumera los documentos vivos y descarta las apariciones de los quitados."""
+        if self._vivos == len(self._ids):
+            return
+        nuevos = {}
+        ids, longitudes = [], array('I')
+        for documento, identificador in enumerate(self._ids):
+            if identificador is not None:
+                nuevos[documento] = len(ids)
+                ids.append(identificador)
+                longitudes.append(self._longitudes[documento])
+        apariciones_nuevas = {}
+        for palabra, apariciones in self._apariciones.items():
+            compactas = _Apariciones()
+            for documento, frecuencia in zip(apariciones.documentos, apariciones.frecuencias):
+                if documento in nuevos:
+                    compactas.documentos.append(nuevos[documento])
+                    compactas.frecuencias.append(frecuencia)
+            if compactas.documentos:
+                apariciones_nuevas[palabra] = compactas
+        self._ids, self._longitudes, self._apariciones = ids, longitudes, apariciones_nuevas
+        self._documentos = {identificador: documento for documento, identificador in enumerate(ids)}
+
+    def guardar(self):
+        """Escribe el índice en 'ruta' (temporal + rename) si cambió desde la última vez."""
+        if not self.sucio or not self.ruta:
+            return
+        self._compactar()
+        palabras = list(self._apariciones)
+        cabecera = json.dumps({
+            "ids": self._ids,
+            "terminos": palabras,
+            "tamanos": [len(self._apariciones[palabra].documentos) for palabra in palabras],
+        }, ensure_ascii=False).encode('utf-8')
+        documentos, frecuencias = array('I'), array('H')
+        for palabra in palabras:
+            documentos.extend(self._apariciones[palabra].documentos)
+            frecuencias.extend(self._apariciones[palabra].frecuencias)
+        # Temporal propio del proceso: varios workers pueden guardar el mismo índice.
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(_CABECERA.pack(MAGIA, VERSION, len(cabecera)))
+            f.write(cabecera)
+            f.write(bloque(bytes_de_array(self._longitudes)))
+            f.write(bloque(bytes_de_array(documentos)))
+            f.write(bloque(bytes_de_array(frecuencias)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta)
+        self.sucio = False
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Lee el índice de 'ruta'. Lanza ValueError u OSError si no es válido."""
+        indice = cls(ruta)
+        with open(ruta, 'rb') as f:
+            magia, version, longitud = _CABECERA.unpack(f.read(_CABECERA.size))
+            if magia != MAGIA or version != VERSION:
+                raise ValueError(f"'{ruta}' no es un índice de búsqueda compatible.")
+            cabecera = json.loads(f.read(longitud))
+            longitudes = array_desde_bytes('I', leer_bloque(f))
+            documentos = array_desde_bytes('I', leer_bloque(f))
+            frecuencias = array_desde_bytes('H', leer_bloque(f))
+        if len(longitudes) != len(cabecera["ids"]) or len(documentos) != sum(cabecera["tamanos"]):
+            raise ValueError(f"El índice '{ruta}' está incompleto.")
+        posicion = 0
+        for palabra, tamano in zip(cabecera["terminos"], cabecera["tamanos"]):
+            indice._apariciones[palabra] = _Apariciones(documentos[posicion:posicion + tamano], frecuencias[posicion:posicion + tamano])
+            posicion += tamano
+        indice._ids = cabecera["ids"]
+        indice._documentos = {identificador: documento for documento, identificador in enumerate(indice._ids)}
+        indice._longitudes = longitudes
+        indice._vivos = len(indice._ids)
+        indice._longitud_total = sum(longitudes)
+        return indice
+
+    @classmethod
+    def abrir(cls, ruta, archivador):
+        """
+        Carga el índice guardado (o empieza uno vacío) y lo concilia con el
+        archivador: indexa los items que falten y quita los que sobren.
+        """
+        indice = None
+        if os.path.exists(ruta):
+            try:
+                indice = cls.cargar(ruta)
+            except (ValueError, OSError, KeyError, struct.error) as e:
+                print(f"      -> ⚠️ Índice de búsqueda '{ruta}' ilegible ({e}). Se reconstruirá.")
+        if indice is None:
+            indice = cls(ruta)
+        presentes = set()
+        for identificador in archivador:
+            presentes.add(identificador)
+            if identificador not in indice._documentos:
+                indice.agregar(identificador, texto_item(archivador[identificador]))
+        for identificador in [i for i in indice._documentos if i not in presentes]:
+            indice.quitar(identificador)
+        return indice
+
+
+def indice_de(memoria):
+    """Índice de la memoria de un usuario (inquilinos.MemoriaUsuario), abriéndolo si hace falta."""
+    if memoria.indice is None:
+        memoria.indice = IndiceBusqueda.abrir(f"{memoria.almacen.ruta}.indice", memoria.archivador)
+    return memoria.indice
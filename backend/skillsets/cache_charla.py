@@ -0,0 +1,126 @@
+# =================================================================
+# CACHE_CHARLA.PY (v1.0 - Memoria de Respuestas)
+# =================================================================
+# Caché de respuestas del modo charla, con clave (prompt normalizado, modelo).
+# - LRU acotado por tamaño, con caducidad (TTL) por entrada.
+# - Fusión de peticiones en vuelo: si llegan varios prompts idénticos a la vez,
+#   solo el primero llama al proveedor (en su propia tarea) y el resto espera
+#   esa misma tarea; cancelar a uno de ellos no cancela a los demás.
+# - Contadores de aciertos, fallos y peticiones fusionadas legibles en caliente.
+
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalizar_prompt(texto):
+    """Minúsculas, sin tildes, espacios colapsados y sin signos en los extremos."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'\s+', ' ', texto)
+    return texto.strip(" ¡!¿?.,;:")
+
+
+class CacheCharla:
+    def __init__(self, capacidad=512, ttl=600):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._en_vuelo = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.fusionadas = 0
+
+    @staticmethod
+    def _clave(prompt, modelo):
+        return (normalizar_prompt(prompt), str(getattr(modelo, "name", modelo)))
+
+    def buscar(self, prompt, modelo):
+        """Respuesta cacheada o None (cuenta como acierto o fallo)."""
+        respuesta = self._buscar(self._clave(prompt, modelo))
+        if respuesta is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return respuesta
+
+    def guardar(self, prompt, modelo, respuesta):
+        if respuesta:
+            self._guardar(self._clave(prompt, modelo), respuesta)
+
+    def _buscar(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        caduca, respuesta = entrada
+        if caduca < time.monotonic():
+            del self._entradas[clave]
+            return None
+        self._entradas.move_to_end(clave)
+        return respuesta
+
+    def _guardar(self, clave, respuesta):
+        self._entradas[clave] = (time.monotonic() + self.ttl, respuesta)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.capacidad:
+            self._entradas.popitem(last=False)
+
+    async def obtener(self, prompt, modelo, productor):
+        """
+        Devuelve la respuesta cacheada para (prompt, modelo) o la calcula con
+        'await productor()'. Las respuestas vacías no se cachean y las
+        excepciones del productor se propagan a todas las peticiones fusionadas.
+        El productor corre en su propia tarea: cancelar a quien lo lanzó no
+        afecta a los demás que esperan; solo se abandona si ya no espera nadie.
+        """
+        clave = self._clave(prompt, modelo)
+        respuesta = self._buscar(clave)
+        if respuesta is not None:
+            self.aciertos += 1
+            return respuesta
+
+        vuelo = self._en_vuelo.get(clave)
+        if vuelo is not None:
+            self.fusionadas += 1
+        else:
+            self.fallos += 1
+            vuelo = {"tarea": asyncio.ensure_future(productor()), "esperando": 0}
+            self._en_vuelo[clave] = vuelo
+            vuelo["tarea"].add_done_callback(lambda tarea: self._aterrizar(clave, vuelo))
+        vuelo["esperando"] += 1
+        try:
+            # 'shield' evita que cancelar a uno que espera cancele la llamada compartida.
+            return await asyncio.shield(vuelo["tarea"])
+        finally:
+            vuelo["esperando"] -= 1
+            if not vuelo["esperando"] and not vuelo["tarea"].done():
+                # Nadie espera ya la respuesta: se abandona la llamada.
+                if self._en_vuelo.get(clave) is vuelo:
+                    del self._en_vuelo[clave]
+                vuelo["tarea"].cancel()
+
+    def _aterrizar(self, clave, vuelo):
+        """Al terminar la tarea del productor: cachea su respuesta y la saca de 'en vuelo'."""
+        if self._en_vuelo.get(clave) is vuelo:
+            del self._en_vuelo[clave]
+        tarea = vuelo["tarea"]
+        # Si nadie recoge la excepción, no debe quedar "sin recuperar".
+        if tarea.cancelled() or tarea.exception() is not None:
+            return
+        if tarea.result():
+            self._guardar(clave, tarea.result())
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos + self.fusionadas
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "fusionadas": self.fusionadas,
+            "tasa_aciertos": round((self.aciertos + self.fusionadas) / consultas, 4) if consultas else 0.0,
+            "entradas": len(self._entradas),
+            "en_vuelo": len(self._en_vuelo),
+            "capacidad": self.capacidad,
+            "ttl_s": self.ttl,
+        }
@@ -0,0 +1,303 @@
+# =================================================================
+# COLUMNAR.PY (v1.0 - Archivador en Columnas)
+# =================================================================
+# Representación compacta del archivador, en memoria y en disco.
+# - ArchivadorColumnar: se comporta como el diccionario {id: item}, pero
+#   guarda cada campo en una columna: un array('I') de índices por fila y un
+#   diccionario de valores distintos por columna. Las claves ("tarea",
+#   "fecha_emision"...) no se repiten por item y los valores repetidos
+#   (tipo, fechas, horas, duraciones) se guardan una sola vez. Los items se
+#   reconstruyen como dict al leerlos.
+# - Formato binario .alec: cabecera JSON + bloques zlib (ids, diccionarios
+#   y arrays de índices). Leer una columna no exige decodificar un dict por
+#   item, y el archivo ocupa una fracción del JSON con sangría.
+# - Parquet (.parquet) si pyarrow está instalado; es opcional.
+
+import json
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import MutableMapping
+
+MAGIA = b"ALEC"
+VERSION = 1
+_CABECERA = struct.Struct("<4sBI")
+_LONGITUD = struct.Struct("<I")
+
+# Índices reservados en cada columna.
+AUSENTE = 0
+# Solo en la columna "id": el valor es la propia clave del item (no se duplica).
+IGUAL_A_CLAVE = 1
+
+
+def _clave_de(valor):
+    """Clave del diccionario de una columna: el propio texto, o (tipo, valor) para lo demás."""
+    if type(valor) is str:
+        return valor
+    try:
+        clave = (type(valor), valor)
+        hash(clave)
+        return clave
+    except TypeError:
+        # Valores no hashables (listas de especificaciones): se indexan por su JSON.
+        return (list, json.dumps(valor, sort_keys=True, ensure_ascii=False))
+
+
+class _Columna:
+    __slots__ = ("valores", "indices", "_posiciones")
+
+    # Por encima de este número de valores distintos, si más de la mitad de las
+    # filas tienen un valor propio (tarea, misión), el diccionario de posiciones
+    # cuesta más memoria de la que ahorra: la columna pasa a solo-anexar.
+    UMBRAL_DICCIONARIO = 1024
+
+    def __init__(self, filas=0):
+        # valores[0] marca "campo ausente"; valores[1] es el marcador IGUAL_A_CLAVE.
+        self.valores = [None, None]
+        self.indices = array('I', bytes(4 * filas))
+        self._posiciones = {}
+
+    def _casi_unica(self):
+        return len(self.valores) > self.UMBRAL_DICCIONARIO and len(self.valores) > len(self.indices) // 2
+
+    def codificar(self, valor):
+        """Índice del valor en el diccionario de la columna (se añade si es nuevo)."""
+        if self._posiciones is None:
+            self.valores.append(valor)
+            return len(self.valores) - 1
+        clave = _clave_de(valor)
+        posicion = self._posiciones.get(clave)
+        if posicion is None:
+            posicion = len(self.valores)
+            self.valores.append(valor)
+            self._posiciones[clave] = posicion
+            if self._casi_unica():
+                self._posiciones = None
+        return posicion
+
+    @classmethod
+    def desde_partes(cls, valores, indices):
+        columna = cls()
+        columna.valores = valores
+        columna.indices = indices
+        if columna._casi_unica():
+            columna._posiciones = None
+        else:
+            columna._posiciones = {_clave_de(valor): posicion for posicion, valor in enumerate(valores[2:], start=2)}
+        return columna
+
+
+class ArchivadorColumnar(MutableMapping):
+    """Diccionario {id: item} respaldado por columnas. Los items leídos son copias nuevas."""
+    def __init__(self, items=None):
+        self._filas = {}
+        self._columnas = {}
+        self._total_filas = 0
+        if items:
+            for identificador, item in items.items():
+                self[identificador] = item
+
+    # --- INTERFAZ DE DICCIONARIO ---
+    def __getitem__(self, identificador):
+        fila = self._filas[identificador]
+        item = {}
+        for nombre, columna in self._columnas.items():
+            indice = columna.indices[fila]
+            if indice == IGUAL_A_CLAVE:
+                item[nombre] = identificador
+            elif indice != AUSENTE:
+                valor = columna.valores[indice]
+                item[nombre] = json.loads(json.dumps(valor)) if isinstance(valor, (list, dict)) else valor
+        return item
+
+    def __setitem__(self, identificador, item):
+        fila = self._filas.get(identificador)
+        if fila is None:
+            fila = self._total_filas
+            self._total_filas += 1
+            self._filas[identificador] = fila
+            for columna in self._columnas.values():
+                columna.indices.append(AUSENTE)
+        else:
+            for columna in self._columnas.values():
+                columna.indices[fila] = AUSENTE
+        for nombre, valor in item.items():
+            columna = self._columnas.get(nombre)
+            if columna is None:
+                columna = self._columnas[nombre] = _Columna(self._total_filas)
+            columna.indices[fila] = IGUAL_A_CLAVE if nombre == "id" and valor == identificador else columna.codificar(valor)
+
+    def __delitem__(self, identificador):
+        # La fila queda vacía; se descarta al exportar (los borrados son raros).
+        fila = self._filas.pop(identificador)
+        for columna in self._columnas.values():
+            columna.indices[fila] = AUSENTE
+
+    def __contains__(self, identificador):
+        return identificador in self._filas
+
+    def __iter__(self):
+        return iter(self._filas)
+
+    def __len__(self):
+        return len(self._filas)
+
+    # --- ACCESO POR COLUMNAS ---
+    def columnas(self):
+        return list(self._columnas)
+
+    def columna(self, nombre):
+        """Valores de un campo en el orden de los items (None si el item no lo tiene)."""
+        columna = self._columnas.get(nombre)
+        if columna is None:
+            return [None] * len(self._filas)
+        valores = columna.valores
+        return [identificador if columna.indices[fila] == IGUAL_A_CLAVE else valores[columna.indices[fila]]
+                for identificador, fila in self._filas.items()]
+
+    def _partes_compactas(self):
+        """(ids, {nombre: (valores, indices)}) sin filas borradas."""
+        ids = list(self._filas)
+        if len(ids) == self._total_filas:
+            return ids, {nombre: (c.valores, c.indices) for nombre, c in self._columnas.items()}
+        filas = list(self._filas.values())
+        return ids, {nombre: (c.valores, array('I', (c.indices[f] for f in filas))) for nombre, c in self._columnas.items()}
+
+    @classmethod
+    def _desde_partes(cls, ids, columnas):
+        archivador = cls()
+        archivador._filas = {identificador: fila for fila, identificador in enumerate(ids)}
+        archivador._total_filas = len(ids)
+        archivador._columnas = {nombre: _Columna.desde_partes(valores, indices) for nombre, (valores, indices) in columnas.items()}
+        return archivador
+
+
+def como_columnar(archivador):
+    return archivador if isinstance(archivador, ArchivadorColumnar) else ArchivadorColumnar(archivador)
+
+
+# --- FORMATO BINARIO .alec ---
+# Bloques y arrays en little-endian; también los usa el índice de búsqueda (busqueda.py).
+def bloque(datos):
+    comprimido = zlib.compress(datos, 6)
+    return _LONGITUD.pack(len(comprimido)) + comprimido
+
+
+def leer_bloque(archivo):
+    (longitud,) = _LONGITUD.unpack(archivo.read(_LONGITUD.size))
+    return zlib.decompress(archivo.read(longitud))
+
+
+def bytes_de_array(valores):
+    if sys.byteorder == "big":
+        valores = array(valores.typecode, valores)
+        valores.byteswap()
+    return valores.tobytes()
+
+
+def array_desde_bytes(tipo, datos):
+    valores = array(tipo)
+    valores.frombytes(datos)
+    if sys.byteorder == "big":
+        valores.byteswap()
+    return valores
+
+
+def exportar_alec(archivador, datos_usuario, ruta):
+    """Escribe el archivador (cualquier mapeo {id: item}) en formato .alec."""
+    ids, columnas = como_columnar(archivador)._partes_compactas()
+    cabecera = json.dumps({
+        "filas": len(ids),
+        "columnas": list(columnas),
+        "datos_usuario": datos_usuario,
+    }, ensure_ascii=False).encode('utf-8')
+    with open(ruta, 'wb') as f:
+        f.write(_CABECERA.pack(MAGIA, VERSION, len(cabecera)))
+        f.write(cabecera)
+        f.write(bloque(json.dumps(ids, ensure_ascii=False).encode('utf-8')))
+        for valores, indices in columnas.values():
+            f.write(bloque(json.dumps(valores, ensure_ascii=False).encode('utf-8')))
+            f.write(bloque(bytes_de_array(indices)))
+    return len(ids)
+
+
+def importar_alec(ruta):
+    """Lee un archivo .alec. Devuelve (ArchivadorColumnar, datos_usuario)."""
+    with open(ruta, 'rb') as f:
+        magia, version, longitud = _CABECERA.unpack(f.read(_CABECERA.size))
+        if magia != MAGIA:
+            raise ValueError(f"'{ruta}' no es un archivo .alec.")
+        if version > VERSION:
+            raise ValueError(f"'{ruta}' usa la versión {version} del formato; se admite hasta la {VERSION}.")
+        cabecera = json.loads(f.read(longitud))
+        ids = json.loads(leer_bloque(f))
+        columnas = {}
+        for nombre in cabecera["columnas"]:
+            valores = json.loads(leer_bloque(f))
+            indices = array_desde_bytes('I', leer_bloque(f))
+            if len(indices) != len(ids):
+                raise ValueError(f"La columna '{nombre}' de '{ruta}' está incompleta.")
+            columnas[nombre] = (valores, indices)
+    return ArchivadorColumnar._desde_partes(ids, columnas), cabecera.get("datos_usuario")
+
+
+# --- PARQUET (OPCIONAL, CON PYARROW) ---
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("El formato Parquet necesita 'pyarrow' (pip install pyarrow). Usa .alec en su lugar.")
+    return pyarrow
+
+
+def exportar_parquet(archivador, datos_usuario, ruta):
+    pa = _pyarrow()
+    columnar = como_columnar(archivador)
+    columnas = {"_clave": list(columnar)}
+    for nombre in columnar.columnas():
+        valores = columnar.columna(nombre)
+        if any(isinstance(valor, (list, dict)) for valor in valores):
+            valores = [None if valor is None else json.dumps(valor, ensure_ascii=False) for valor in valores]
+            nombre = f"{nombre}.json"
+        columnas[nombre] = valores
+    tabla = pa.table({nombre: pa.array(valores).dictionary_encode() if nombre != "_clave" else pa.array(valores)
+                      for nombre, valores in columnas.items()})
+    tabla = tabla.replace_schema_metadata({"datos_usuario": json.dumps(datos_usuario, ensure_ascii=False)})
+    pa.parquet.write_table(tabla, ruta, compression="zstd")
+    return len(columnar)
+
+
+def importar_parquet(ruta):
+    pa = _pyarrow()
+    tabla = pa.parquet.read_table(ruta)
+    metadatos = tabla.schema.metadata or {}
+    columnas = tabla.to_pydict()
+    claves = columnas.pop("_clave")
+    archivador = ArchivadorColumnar()
+    for fila, clave in enumerate(claves):
+        item = {}
+        for nombre, valores in columnas.items():
+            valor = valores[fila]
+            if valor is None:
+                continue
+            if nombre.endswith(".json"):
+                item[nombre[:-5]] = json.loads(valor)
+            else:
+                item[nombre] = valor
+        archivador[clave] = item
+    return archivador, json.loads(metadatos.get(b"datos_usuario", b"null"))
+
+
+def exportar(archivador, datos_usuario, ruta):
+    """Exporta según la extensión: .parquet (pyarrow) o .alec (sin dependencias)."""
+    if ruta.endswith(".parquet"):
+        return exportar_parquet(archivador, datos_usuario, ruta)
+    return exportar_alec(archivador, datos_usuario, ruta)
+
+
+def importar(ruta):
+    if ruta.endswith(".parquet"):
+        return importar_parquet(ruta)
+    return importar_alec(ruta)
@@ -0,0 +1,197 @@
+# =================================================================
+# CONTEXTO_CHARLA.PY (v1.0 - Memoria de la Conversación)
+# =================================================================
+# Contexto acotado para el modo charla: el Guardián recuerda la
+# conversación sin que el prompt crezca con ella.
+# - Por sesión (token de sesión o, sin él, el usuario) se guardan los
+#   últimos 'turnos' intercambios en un búfer circular.
+# - El turno que sale del búfer se pliega en un resumen que se mantiene
+#   de forma incremental: una línea breve por turno (su primera frase,
+#   recortada) y, si el resumen pasa de su presupuesto, se descartan las
+#   líneas más antiguas. No se llama al LLM para resumir.
+# - Cada prompt incluye además los tickets y contratos del archivador que
+#   vienen al caso (búsqueda BM25 sobre el comando) y los más recientes.
+# - Todo el contexto cabe en 'presupuesto_tokens' (tokens estimados a
+#   razón de ~4 caracteres por token): el coste de cada llamada al LLM no
+#   depende de lo larga que sea la conversación ni del archivador. El
+#   mensaje actual del usuario tiene prioridad: para hacerle sitio se
+#   descartan antes los turnos, los items y el resumen.
+# - Las conversaciones viven en memoria del proceso, con LRU y caducidad
+#   como las sesiones (sesiones.py); con varios workers cada uno recuerda
+#   los turnos que atendió.
+# - Una clave None (cliente sin usuario ni sesión) no tiene conversación:
+#   esos clientes son indistinguibles y no deben leer los turnos de otros.
+
+import re
+import time
+from collections import OrderedDict, deque
+
+PATRON_FRASE = re.compile(r'[^.!?\n]+[.!?]?')
+
+# Reparto del presupuesto: el resto es para los turnos recientes y el comando.
+FRACCION_RESUMEN = 0.2
+FRACCION_ARCHIVO = 0.25
+PALABRAS_POR_LINEA_RESUMEN = 18
+SIN_VALOR = (None, "", "No definido", "No definida", "N/A")
+# Se añade al comando en el raro caso de que no quepa entero en el presupuesto.
+MARCA_RECORTE = " [mensaje recortado por longitud]"
+
+
+def estimar_tokens(texto):
+    return len(texto) // 4 + 1
+
+
+def recortar(texto, max_tokens):
+    """El texto truncado a unos 'max_tokens' tokens (por palabras)."""
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+    return texto[:max(0, max_tokens * 4 - 1)].rsplit(" ", 1)[0] + "…"
+
+
+def linea_resumen(comando, respuesta):
+    """Una línea por turno plegado: la primera frase de cada parte, recortada."""
+    def primera_frase(texto):
+        encontrada = PATRON_FRASE.search(" ".join(texto.split()))
+        palabras = (encontrada.group(0) if encontrada else "").strip().split()
+        return " ".join(palabras[:PALABRAS_POR_LINEA_RESUMEN]) + ("…" if len(palabras) > PALABRAS_POR_LINEA_RESUMEN else "")
+    return f"- El usuario dijo: {primera_frase(comando)} / Respondiste: {primera_frase(respuesta)}"
+
+
+def linea_item(item):
+    """Un ticket o contrato en una línea para el prompt."""
+    if item.get("tipo") == "Ticket":
+        texto, fecha = item.get("tarea", ""), item.get("fecha_emision", "?")
+    else:
+        texto, fecha = item.get("mision", ""), item.get("fecha_sellado", "?")
+    detalles = []
+    if item.get("arranque") not in SIN_VALOR:
+        detalles.append(f"arranque {item['arranque']}")
+    if item.get("duracion") not in SIN_VALOR:
+        detalles.append(item["duracion"])
+    extra = f" ({', '.join(detalles)})" if detalles else ""
+    return f"- {item.get('tipo', 'Item')} {item.get('id', '')} del {fecha}: {texto}{extra}"
+
+
+class _Conversacion:
+    __slots__ = ("turnos", "resumen", "tokens_resumen", "caduca")
+
+    def __init__(self, max_turnos):
+        self.turnos = deque(maxlen=max_turnos)
+        self.resumen = deque()
+        self.tokens_resumen = 0
+        self.caduca = 0.0
+
+
+class ContextoCharla:
+    def __init__(self, turnos=6, presupuesto_tokens=800, capacidad=4096, ttl=1800):
+        self.max_turnos = max(1, turnos)
+        self.presupuesto_tokens = presupuesto_tokens
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._conversaciones = OrderedDict()
+        self.turnos_plegados = 0
+        self.prompts = 0
+        self.tokens_prompt_total = 0
+        self.tokens_prompt_max = 0
+        self.comandos_recortados = 0
+
+    # --- CONVERSACIONES ---
+    def _conversacion(self, clave, crear=False):
+        conversacion = self._conversaciones.get(clave)
+        ahora = time.monotonic()
+        if conversacion is not None and conversacion.caduca < ahora:
+            del self._conversaciones[clave]
+            conversacion = None
+        if conversacion is None:
+            if not crear:
+                return None
+            conversacion = self._conversaciones[clave] = _Conversacion(self.max_turnos)
+            while len(self._conversaciones) > self.capacidad:
+                self._conversaciones.popitem(last=False)
+        self._conversaciones.move_to_end(clave)
+        conversacion.caduca = ahora + self.ttl
+        return conversacion
+
+    def anotar(self, clave, comando, respuesta):
+        """Guarda un turno de charla; el más antiguo del búfer se pliega en el resumen."""
+        if clave is None:
+            return
+        conversacion = self._conversacion(clave, crear=True)
+        if len(conversacion.turnos) == conversacion.turnos.maxlen:
+            linea = linea_resumen(*conversacion.turnos[0])
+            conversacion.resumen.append(linea)
+            conversacion.tokens_resumen += estimar_tokens(linea)
+            limite = int(self.presupuesto_tokens * FRACCION_RESUMEN)
+            while conversacion.tokens_resumen > limite and len(conversacion.resumen) > 1:
+                conversacion.tokens_resumen -= estimar_tokens(conversacion.resumen.popleft())
+            self.turnos_plegados += 1
+        # Una respuesta muy larga no puede ocupar sola el presupuesto de los turnos recientes.
+        limite_turno = int(self.presupuesto_tokens * FRACCION_RESUMEN)
+        conversacion.turnos.append((recortar(comando, limite_turno), recortar(respuesta, limite_turno)))
+
+    def olvidar(self, clave):
+        self._conversaciones.pop(clave, None)
+
+    # --- CONSTRUCCIÓN DEL PROMPT ---
+    def mensajes(self, clave, instrucciones, comando, items=()):
+        """
+        Mensajes para el LLM: instrucciones con el resumen y los items del
+        archivador, los turnos recientes que quepan (de más nuevo a más
+        antiguo) y el comando. El total no pasa de 'presupuesto_tokens'.
+        El comando va entero: se sacrifica antes el contexto (turnos, items
+        y resumen) y solo si el comando no cabe ni solo se recorta, con marca.
+        """
+        conversacion = self._conversacion(clave) if clave is not None else None
+        restante = self.presupuesto_tokens - estimar_tokens(instrucciones)
+        if estimar_tokens(comando) > restante:
+            comando = recortar(comando, restante - estimar_tokens(MARCA_RECORTE)) + MARCA_RECORTE
+            self.comandos_recortados += 1
+        restante -= estimar_tokens(comando)
+
+        contexto = []
+        if conversacion is not None and conversacion.resumen:
+            # Si no cabe entero, se quedan las líneas más recientes del resumen.
+            lineas_resumen = list(conversacion.resumen)
+            while lineas_resumen and estimar_tokens("Antes en esta conversación:\n" + "\n".join(lineas_resumen)) > restante:
+                lineas_resumen.pop(0)
+            if lineas_resumen:
+                contexto.append("Antes en esta conversación:\n" + "\n".join(lineas_resumen))
+                restante -= estimar_tokens(contexto[-1]) + 1
+        lineas_items, tokens_items = [], 0
+        limite_items = min(int(self.presupuesto_tokens * FRACCION_ARCHIVO), restante - 16)
+        for item in items:
+            linea = linea_item(item)
+            if tokens_items + estimar_tokens(linea) > limite_items:
+                break
+            lineas_items.append(linea)
+            tokens_items += estimar_tokens(linea)
+        if lineas_items:
+            contexto.append("Tickets y contratos del usuario que pueden venir al caso:\n" + "\n".join(lineas_items))
+            restante -= estimar_tokens(contexto[-1]) + 1
+        sistema = "\n\n".join([instrucciones] + contexto)
+
+        recientes = []
+        for anterior, respuesta in reversed(conversacion.turnos if conversacion is not None else ()):
+            coste = estimar_tokens(anterior) + estimar_tokens(respuesta)
+            if coste > restante:
+                break
+            recientes[:0] = [{"role": "user", "content": anterior}, {"role": "assistant", "content": respuesta}]
+            restante -= coste
+
+        mensajes = [{"role": "system", "content": sistema}] + recientes + [{"role": "user", "content": comando}]
+        tokens = sum(estimar_tokens(mensaje["content"]) for mensaje in mensajes)
+        self.prompts += 1
+        self.tokens_prompt_total += tokens
+        self.tokens_prompt_max = max(self.tokens_prompt_max, tokens)
+        return mensajes
+
+    def estadisticas(self):
+        return {
+            "conversaciones": len(self._conversaciones),
+            "turnos_plegados": self.turnos_plegados,
+            "prompts": self.prompts,
+            "tokens_prompt_medio": round(self.tokens_prompt_total / self.prompts, 1) if self.prompts else 0.0,
+            "tokens_prompt_max": self.tokens_prompt_max,
+            "comandos_recortados": self.comandos_recortados,
+            "presupuesto_tokens": self.presupuesto_tokens,
+        }
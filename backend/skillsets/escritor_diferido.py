@@ -0,0 +1,120 @@
+# =================================================================
+# ESCRITOR_DIFERIDO.PY (v1.0 - Persistencia en Segundo Plano)
+# =================================================================
+# Saca la E/S de disco de la memoria del camino de la petición.
+# - Una mutación (ticket, contrato, datos de usuario) solo se aplica en
+#   memoria y marca su almacén como sucio: coste de microsegundos.
+# - Un hilo escritor vuelca los almacenes sucios como mucho cada
+#   'intervalo_ms' desde la primera mutación pendiente, o antes si se
+#   acumulan 'max_mutaciones'. Una cadena de tickets o un combo de tres
+#   contratos acaban en una sola escritura.
+# - Cada motor escribe con su mecanismo atómico (temporal + rename y fsync
+#   para instantáneas y diario; transacción para SQLite).
+# - detener() espera al hilo; el cierre de cada almacén vuelca lo que quede,
+#   de modo que un cierre ordenado (atexit, lifespan ASGI) no pierde nada.
+#   Ante una caída abrupta se pierden como mucho 'intervalo_ms' de cambios.
+
+import threading
+import time
+
+from metricas import REGISTRO
+
+VOLCADOS_DIFERIDOS = REGISTRO.histograma(
+    "guardian_volcado_diferido_segundos", "Duración de cada volcado del escritor diferido por motor.", ["motor"])
+MUTACIONES_POR_VOLCADO = REGISTRO.histograma(
+    "guardian_mutaciones_por_volcado", "Mutaciones agrupadas en cada volcado del escritor diferido.",
+    limites=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+
+class EscritorDiferido:
+    def __init__(self, motor, intervalo_ms=200, max_mutaciones=64):
+        self.motor = motor
+        self.intervalo = intervalo_ms / 1000
+        self.max_mutaciones = max(1, max_mutaciones)
+        # id(almacen) -> almacen con mutaciones sin volcar.
+        self._sucios = {}
+        self._mutaciones = 0
+        self._condicion = threading.Condition()
+        self._hilo = None
+        self._detenido = False
+        self.volcados = 0
+        self.errores = 0
+        self.mutaciones_totales = 0
+
+    def marcar(self, almacen):
+        """Anota una mutación de 'almacen' (la llama el propio almacén)."""
+        with self._condicion:
+            self._sucios[id(almacen)] = almacen
+            self._mutaciones += 1
+            self.mutaciones_totales += 1
+            if self._hilo is None and not self._detenido:
+                # El hilo nace con la primera mutación (y no al importar), igual
+                # que el bucle de eventos de main.py, para sobrevivir al 'fork'.
+                self._hilo = threading.Thread(target=self._bucle, name="memoria-escritor", daemon=True)
+                self._hilo.start()
+            if self._mutaciones >= self.max_mutaciones:
+                self._condicion.notify()
+
+    def olvidar(self, almacen):
+        """El almacén se cierra (y vuelca por su cuenta): deja de estar pendiente."""
+        with self._condicion:
+            self._sucios.pop(id(almacen), None)
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                while not self._sucios and not self._detenido:
+                    self._condicion.wait()
+                if self._detenido:
+                    return
+                # Ventana de agrupación: hasta 'intervalo' o hasta 'max_mutaciones'.
+                limite = time.monotonic() + self.intervalo
+                while self._mutaciones < self.max_mutaciones and not self._detenido:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicion.wait(restante)
+                sucios, self._sucios = self._sucios, {}
+                mutaciones, self._mutaciones = self._mutaciones, 0
+            self._volcar(list(sucios.values()), mutaciones)
+
+    def _volcar(self, almacenes, mutaciones):
+        with VOLCADOS_DIFERIDOS.con(self.motor).cronometrar():
+            for almacen in almacenes:
+                try:
+                    almacen.volcar()
+                except (IOError, OSError) as e:
+                    self.errores += 1
+                    print(f"      -> 🚨 Error en la escritura diferida de '{almacen.ruta}': {e}. Se reintentará.")
+                    with self._condicion:
+                        self._sucios.setdefault(id(almacen), almacen)
+        self.volcados += 1
+        MUTACIONES_POR_VOLCADO.observar(mutaciones)
+
+    def vaciar(self):
+        """Vuelca ya, desde el hilo que llama, todo lo pendiente."""
+        with self._condicion:
+            sucios, self._sucios = self._sucios, {}
+            mutaciones, self._mutaciones = self._mutaciones, 0
+        if sucios:
+            self._volcar(list(sucios.values()), mutaciones)
+
+    def detener(self, espera=10.0):
+        """Para el hilo (esperando a que termine su volcado en curso) y vuelca lo que quede."""
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+            hilo = self._hilo
+        if hilo is not None and hilo is not threading.current_thread():
+            hilo.join(espera)
+        self.vaciar()
+
+    def estadisticas(self):
+        return {
+            "intervalo_ms": self.intervalo * 1000,
+            "max_mutaciones": self.max_mutaciones,
+            "mutaciones": self.mutaciones_totales,
+            "volcados": self.volcados,
+            "errores": self.errores,
+            "pendientes": len(self._sucios),
+        }
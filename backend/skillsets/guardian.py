@@ -6,27 +6,79 @@
 # - TONO DE GUARDIÁN MEJORADO: Las respuestas de activación son más acordes a la personalidad del Guardián.
 # - BUGFIX DE ENCADENAMIENTO: Corregido el error que impedía encadenar la creación de tickets.
 
-import g4f
 import re
 from datetime import datetime, timedelta
 import pytz
 import random
-import string
-import json
 import os
+import contextvars
+from contextlib import contextmanager
+from metricas import REGISTRO
+from .inquilinos import gestor_compartido, RUTA_MEMORIA_HISTORICA, USUARIO_POR_DEFECTO, ESCRITURAS_MEMORIA, ERRORES_MEMORIA
+from .cache_charla import CacheCharla
+from .contexto_charla import ContextoCharla
+from .proveedores_llm import GobernadorLLM, crear_proveedores
+from .intenciones import ClasificadorIntenciones
+from .maquina_estados import MaquinaEstados
+from .identificadores import GeneradorIds, PATRON_ID, normalizar
+from . import analitica
+from .busqueda import indice_de, texto_item
+from .sincronizacion import MAX_POR_PAGINA, cambios_de
+from .recordatorios import avisador_compartido, hora_local, marcar_tiempos, recordatorios_de
+
+# Patrones del Modo Ticket, compilados una sola vez.
+PATRON_ARRANQUE = re.compile(r'a las\s+(\d{1,2}:\d{2})', re.IGNORECASE)
+PATRON_DURACION = re.compile(r'(?:durante\s+|por\s+)?\(?(\d+)\s*min(?:utos)?\)?', re.IGNORECASE)
+# Frases de intención que preceden a la acción pura (se pueden encadenar).
+PATRON_FRASES_INTENCION = re.compile(
+    r'^(?:(?:bueno mira tengo ganas de|tengo ganas de|necesito|tengo que|debería|es hora de|voy a|quiero)\s+)+',
+    re.IGNORECASE,
+)
+
+INSTRUCCIONES_CHARLA = ("Eres el Guardián, una IA compañera de Juan. Eres directo, sabio y motivador. "
+                        "Responde en español y con brevedad; si viene al caso, menciona sus tickets o contratos.")
+# Lo único que puede seguir a 'estadísticas' (o 'progreso', 'resumen'...): el
+# periodo pedido. Con cualquier otra palabra el mensaje es charla ("resumen de lo que hablamos").
+PALABRAS_PERIODO_ANALITICA = {"hoy", "semana", "mes", "total", "de", "del", "la", "el", "esta", "este"}
+# Items del archivador que se ofrecen al LLM: los relacionados con el comando y los más recientes.
+ITEMS_CHARLA_RELACIONADOS = 3
+ITEMS_CHARLA_RECIENTES = 3
+
+# Declaración para el registro de skillsets de A.L.E. (se lee sin importar el módulo).
+SKILLSET = {"nombre": "guardian", "clase": "Guardian", "tiempo_limite": 60}
+
+# Tiempo de la parte determinista de cada turno (máquina de estados, consultas).
+LATENCIA_TURNO = REGISTRO.histograma(
+    "guardian_turno_segundos", "Duración de la resolución determinista del turno por modo.", ["modo"])
+
+# Memoria del usuario que está siendo atendido en la tarea asíncrona actual.
+_memoria_activa = contextvars.ContextVar("memoria_activa", default=None)
 
 class Guardian:
     def __init__(self):
         """
-        Inicializa el especialista Guardian y carga la memoria persistente.
+        Inicializa el especialista Guardian y prepara la memoria persistente
+        por usuario (cada usuario se carga la primera vez que aparece).
         """
-        self.memory_file = "guardian_memory.json"
-        self.archivador_contratos = {}
-        self.datos_usuario = {
-            "racha_diaria": 0,
-            "fecha_ultima_racha": None,
-            "logros": []
-        }
+        self.memory_file = RUTA_MEMORIA_HISTORICA
+        # El gestor es compartido con los demás skillsets que leen la memoria (p. ej. el Archivista).
+        self.memorias = gestor_compartido()
+        self.cache_charla = CacheCharla(
+            capacidad=int(os.environ.get("GUARDIAN_CACHE_CHARLA_CAPACIDAD", "512")),
+            ttl=float(os.environ.get("GUARDIAN_CACHE_CHARLA_TTL", "600")),
+        )
+        # Turnos recientes, resumen y items del archivador de cada conversación, en un presupuesto fijo.
+        self.contexto_charla = ContextoCharla(
+            turnos=int(os.environ.get("GUARDIAN_CHARLA_TURNOS", "6")),
+            presupuesto_tokens=int(os.environ.get("GUARDIAN_CHARLA_PRESUPUESTO_TOKENS", "800")),
+        )
+        self.gobernador = GobernadorLLM(
+            crear_proveedores(os.environ.get("GUARDIAN_LLM_PROVEEDORES", "g4f:default,g4f:gpt-4o-mini")),
+            plazo=float(os.environ.get("GUARDIAN_LLM_PLAZO", "25")),
+            max_en_vuelo=int(os.environ.get("GUARDIAN_LLM_MAX_EN_VUELO", "64")),
+            max_por_proveedor=int(os.environ.get("GUARDIAN_LLM_MAX_POR_PROVEEDOR", "16")),
+            umbral_cobertura=float(os.environ.get("GUARDIAN_LLM_UMBRAL_COBERTURA", "6")),
+        )
         # Listas de sinónimos y palabras clave
         self.PALABRAS_ACTIVACION = ["activar", "crear", "gestionar"]
         self.PALABRAS_CONFIRMACION = ["confirmar", "confirmo", "acepto", "dale", "proceder", "adelante", "si", "sí", "seguro"]
@@ -34,41 +86,240 @@ class Guardian:
         self.PALABRAS_SI = ["si", "sí", "claro", "afirmativo", "acepto"]
         self.PALABRAS_NO = ["no", "negativo", "cancelar"]
         self.PALABRAS_DISENO_MULTIPLE = ["múltiple", "multiple", "combo", "ráfaga", "secuencia"]
+        self.PALABRAS_LISTADO = ["listar", "consultar"]
+        self.PALABRAS_BUSQUEDA = ["buscar", "busca", "encontrar"]
+        self.PALABRAS_ANALITICA = ["estadísticas", "estadisticas", "progreso", "resumen", "racha", "logros"]
+        self.PALABRAS_AGENDA = ["próximo", "proximo", "próximos", "proximos", "agenda", "pendientes"]
+        self.PALABRAS_DISENO = ["diseño", "contrato", "forjar", "ruleta"]
+        self._palabras_consulta = set(self.PALABRAS_LISTADO + self.PALABRAS_BUSQUEDA)
+        self.ITEMS_POR_PAGINA = 10
         self.MISIONES_GENERICAS = ["estudiar", "trabajar", "leer", "programar", "escribir", "dibujar", "practicar", "ordenar", "limpiar"]
 
-        self._cargar_memoria()
+        # La memoria histórica se carga en segundo plano: el arranque no la espera.
+        self.memorias.precargar(USUARIO_POR_DEFECTO)
+        # Todas las listas anteriores en un único clasificador compilado.
+        self.clasificador = ClasificadorIntenciones({
+            "confirmacion": self.PALABRAS_CONFIRMACION,
+            "correccion": self.PALABRAS_CORRECCION,
+            "si": self.PALABRAS_SI,
+            "no": self.PALABRAS_NO,
+            "diseno_multiple": self.PALABRAS_DISENO_MULTIPLE,
+            "diseno": self.PALABRAS_DISENO,
+            "aleatorio": ["aleatorio"],
+        }, por_prefijo=("diseno", "diseno_multiple"))
+        # IDs de tickets y contratos: ordenables por creación y sin colisiones.
+        self.generador_ids = GeneradorIds()
+        # Los modos guiados se ejecutan sobre una tabla de pasos declarada una sola vez.
+        self.maquina = self._construir_maquina()
+
         print(f"    - Especialista 'Guardian' v19.0 (El Intérprete) listo.")
 
     # --- GESTIÓN DE MEMORIA PERSISTENTE ---
-    def _cargar_memoria(self):
-        if os.path.exists(self.memory_file):
-            try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    memoria = json.load(f)
-                    self.archivador_contratos = memoria.get("archivador_contratos", {})
-                    self.datos_usuario = memoria.get("datos_usuario", self.datos_usuario)
-                    print("      -> Memoria del Guardián cargada exitosamente.")
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"      -> 🚨 Error al cargar la memoria: {e}. Se usará una memoria nueva.")
-        else:
-            print("      -> No se encontró archivo de memoria. Se creará uno nuevo.")
+    @property
+    def memoria(self):
+        """Memoria del usuario de la petición en curso (o la histórica fuera de una petición)."""
+        return _memoria_activa.get() or self.memorias.obtener(USUARIO_POR_DEFECTO)
+
+    @property
+    def almacen(self):
+        return self.memoria.almacen
+
+    @property
+    def archivador_contratos(self):
+        return self.memoria.archivador
+
+    @property
+    def datos_usuario(self):
+        return self.memoria.datos_usuario
+
+    def escrituras_agrupadas(self):
+        """Contexto en el que las escrituras de memoria se vuelcan juntas al salir (lotes)."""
+        return self.memorias.agrupar_escrituras()
+
+    def _transaccion(self):
+        """Escrituras sobre la memoria actual que no deben pisar las de otros workers."""
+        return self.memorias.transaccion(self.memoria)
 
     def _guardar_memoria(self):
         try:
-            with open(self.memory_file, 'w', encoding='utf-8') as f:
-                memoria = {
-                    "archivador_contratos": self.archivador_contratos,
-                    "datos_usuario": self.datos_usuario
-                }
-                json.dump(memoria, f, indent=4, ensure_ascii=False)
+            with ESCRITURAS_MEMORIA.con(self.memorias.tipo_almacen, "guardar_todo").cronometrar():
+                self.almacen.guardar_todo(self.archivador_contratos, self.datos_usuario)
+        except IOError as e:
+            ERRORES_MEMORIA.con("guardar_todo").inc()
+            print(f"      -> 🚨 Error crítico al guardar la memoria: {e}")
+
+    def _archivar_item(self, identificador, item):
+        """
+        Guarda un ticket o contrato (una sola mutación para el motor de
+        almacenamiento) y lo suma a la analítica. Devuelve los logros desbloqueados.
+        """
+        with self._transaccion():
+            # Los agregados se verifican antes de añadir el item, para que sigan cuadrando.
+            logros = self._analitica_al_dia(self.memoria)
+            # Número de secuencia del usuario: la PWA sincroniza los items posteriores a su cursor.
+            item["seq"] = self.datos_usuario.get("secuencia", 0) + 1
+            try:
+                with ESCRITURAS_MEMORIA.con(self.memorias.tipo_almacen, "registrar_item").cronometrar():
+                    self.almacen.registrar_item(identificador, item)
+            except IOError as e:
+                ERRORES_MEMORIA.con("registrar_item").inc()
+                print(f"      -> 🚨 Error crítico al guardar la memoria: {e}")
+                return logros
+            if self.memoria.indice is not None:
+                # Si el índice aún no se abrió, lo pondrá al día la conciliación al abrirlo.
+                self.memoria.indice.agregar(identificador, texto_item(item))
+            if self.memoria.cambios is not None:
+                self.memoria.cambios.anotar(item["seq"], identificador)
+            if item.get("inicio"):
+                recordatorios_de(self.memoria).agregar(item)
+            return logros + self._actualizar_analitica(item)
+
+    # --- ANALÍTICA INCREMENTAL ---
+    def _analitica_al_dia(self, memoria):
+        """
+        Reconstruye los agregados si faltan o no cuadran con el archivador (una
+        vez por carga). Devuelve los logros que la reconstrucción desbloqueó.
+        """
+        if memoria.analitica_verificada:
+            return []
+        with self.memorias.transaccion(memoria):
+            memoria.analitica_verificada = True
+            if analitica.al_dia(memoria.datos_usuario, len(memoria.archivador)):
+                return []
+            if len(memoria.archivador):
+                print(f"      -> 📊 Reconstruyendo la analítica de '{memoria.usuario_id}' ({len(memoria.archivador)} items).")
+            previos = len(memoria.datos_usuario.get("logros") or [])
+            datos_usuario = analitica.reconstruir(memoria.datos_usuario, memoria.archivador.values())
+            self._guardar_datos_usuario(memoria, datos_usuario)
+            return datos_usuario["logros"][previos:]
+
+    def _guardar_datos_usuario(self, memoria, datos_usuario):
+        # Se sustituye el dict entero: el anterior puede estar volcándose en otro hilo.
+        memoria.datos_usuario = datos_usuario
+        try:
+            with ESCRITURAS_MEMORIA.con(self.memorias.tipo_almacen, "registrar_datos_usuario").cronometrar():
+                memoria.almacen.registrar_datos_usuario(datos_usuario)
         except IOError as e:
+            ERRORES_MEMORIA.con("registrar_datos_usuario").inc()
             print(f"      -> 🚨 Error crítico al guardar la memoria: {e}")
 
+    def _actualizar_analitica(self, item):
+        memoria = self.memoria
+        datos_usuario, logros = analitica.registrar(memoria.datos_usuario, item)
+        # 'registrar' devuelve un dict nuevo: se puede completar antes de guardarlo.
+        datos_usuario["secuencia"] = item["seq"]
+        self._guardar_datos_usuario(memoria, datos_usuario)
+        return logros
+
+    def _texto_logros(self, logros):
+        return "".join(f"\n🏆 **Logro desbloqueado:** {logro['nombre']}" for logro in logros)
+
+    def _pide_analitica(self, comando_partes):
+        """True si el mensaje es solo la palabra de analítica, con el periodo como mucho."""
+        return (bool(comando_partes) and comando_partes[0] in self.PALABRAS_ANALITICA
+                and all(palabra in PALABRAS_PERIODO_ANALITICA for palabra in comando_partes[1:]))
+
+    def _consultar_analitica(self, comando_lower):
+        """
+        'estadísticas' (o 'progreso', 'resumen'): hoy, semana, mes y totales;
+        'estadísticas semana' (o hoy, mes, total) solo ese periodo; 'racha'; 'logros'.
+        """
+        memoria = self.memoria
+        self._analitica_al_dia(memoria)
+        hoy = datetime.now(pytz.timezone("America/Montevideo")).date()
+        datos = analitica.resumen(memoria.datos_usuario, hoy)
+
+        if comando_lower.startswith("logros"):
+            if not datos["logros"]:
+                return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Aún no hay logros. Emite tu primer ticket para empezar."}
+            lineas = [f"- 🏆 **{logro['nombre']}** ({logro['fecha']})" for logro in datos["logros"]]
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "**LOGROS**\n--------------------\n" + "\n".join(lineas)}
+
+        if comando_lower.startswith("racha"):
+            mensaje = (f"**RACHA DIARIA**\n--------------------\n"
+                       f"**Actual:** {datos['racha']} día(s)\n**Máxima:** {datos['racha_maxima']} día(s)")
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": mensaje}
+
+        periodos = [("hoy", "hoy", "Hoy"), ("semana", "semana", "Esta semana"), ("mes", "mes", "Este mes"), ("totales", "total", "Total")]
+        palabras = set(comando_lower.split())
+        pedidos = [(clave, titulo) for clave, palabra, titulo in periodos if palabra in palabras]
+        lineas = []
+        for clave, titulo in pedidos or [(clave, titulo) for clave, _, titulo in periodos]:
+            recuentos = datos[clave]
+            horas, minutos = divmod(recuentos["minutos"], 60)
+            lineas.append(f"**{titulo}:** {recuentos['tickets']} tickets · {recuentos['contratos']} contratos · {horas} h {minutos:02d} min planificados")
+        lineas.append(f"**Racha:** {datos['racha']} día(s) (máxima {datos['racha_maxima']})")
+        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "**ESTADÍSTICAS**\n--------------------\n" + "\n".join(lineas)}
+
+    def analitica(self, usuario_id=None):
+        """Resumen de analítica de un usuario (para el endpoint '/analitica')."""
+        with self._memoria_de_peticion({"usuario_id": usuario_id}) as memoria:
+            self._analitica_al_dia(memoria)
+            hoy = datetime.now(pytz.timezone("America/Montevideo")).date()
+            return analitica.resumen(memoria.datos_usuario, hoy)
+
+    # --- SINCRONIZACIÓN DE LA PWA ---
+    def sincronizar(self, usuario_id=None, cursor="", limite=MAX_POR_PAGINA):
+        """
+        Items archivados después de 'cursor' (para el endpoint '/sync'), como
+        {"items": [...], "cursor": ..., "completo": bool}. Con el cursor vacío
+        devuelve el archivador desde el principio, por páginas de 'limite'.
+        """
+        limite = max(1, min(int(limite), MAX_POR_PAGINA))
+        with self._memoria_de_peticion({"usuario_id": usuario_id}) as memoria:
+            identificadores, siguiente, completo = cambios_de(memoria).desde(cursor, limite)
+            archivador = memoria.archivador
+            items = [archivador[identificador] for identificador in identificadores if identificador in archivador]
+        return {"items": items, "cursor": siguiente, "completo": completo}
+
+    # --- AGENDA Y AVISOS ---
+    def _pide_agenda(self, comando_partes):
+        """True si el mensaje es solo 'agenda', 'próximos'...: "próximo lunes tengo examen" es charla."""
+        return len(comando_partes) == 1 and comando_partes[0] in self.PALABRAS_AGENDA
+
+    def _consultar_agenda(self):
+        """'próximos' (o 'agenda', 'pendientes'): los siguientes arranques y finales por llegar."""
+        proximos = recordatorios_de(self.memoria).proximos(self.ITEMS_POR_PAGINA)
+        if not proximos:
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "No hay arranques pendientes. Emite un ticket con hora, por ejemplo: 'a las 18:00'."}
+        hoy = datetime.now(pytz.timezone("America/Montevideo")).date()
+        lineas = []
+        for marca, identificador, momento, titulo in proximos:
+            cuando = hora_local(marca)
+            dia = "hoy" if cuando.date() == hoy else "mañana" if cuando.date() == hoy + timedelta(days=1) else cuando.strftime("%d/%m")
+            etiqueta = "Arranque" if momento == "inicio" else "Fin"
+            lineas.append(f"- **{dia} {cuando.strftime('%H:%M')}** · {etiqueta} · {titulo} ({identificador})")
+        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "**PRÓXIMOS AVISOS**\n--------------------\n" + "\n".join(lineas)}
+
+    def suscribir(self, usuario_id, entregar, ultimo_evento=None):
+        """
+        Suscribe a los avisos de arranque y fin del usuario (endpoint
+        '/eventos'). Devuelve la recordatorios.Suscripcion; cada latido de la
+        conexión incorpora lo que hayan archivado otros workers.
+        """
+        with self._memoria_de_peticion({"usuario_id": usuario_id}) as memoria:
+            recordatorios_de(memoria)
+            usuario_normalizado = memoria.usuario_id
+
+        async def al_latir():
+            with self._memoria_de_peticion({"usuario_id": usuario_id}) as memoria:
+                recordatorios_de(memoria)
+
+        return avisador_compartido().suscribir(usuario_normalizado, entregar, ultimo_evento, al_latir)
+
     # --- FUNCIONES AUXILIARES ---
-    def _generar_id_aleatorio(self, prefijo="PLAN"):
-        caracteres = string.ascii_uppercase + string.digits
-        sufijo = ''.join(random.choices(caracteres, k=4))
-        return f"{prefijo}-{sufijo}"
+    def _generar_id(self, prefijo="PLAN"):
+        # La comprobación contra el archivador es O(1) (diccionario o clave primaria).
+        return self.generador_ids.nuevo_id(prefijo, self.archivador_contratos.__contains__)
+
+    def _buscar_item(self, item_id):
+        """Item por su ID; los IDs anteriores a una migración se resuelven por 'alias_ids'."""
+        item = self.archivador_contratos.get(item_id)
+        if item is None:
+            alias = (self.datos_usuario or {}).get("alias_ids", {}).get(item_id)
+            if alias:
+                item = self.archivador_contratos.get(alias)
+        return item
 
     # --- FUNCIONES DEL MODO TICKET DE ACCIÓN ---
     def _analizar_texto_ticket(self, texto):
@@ -81,64 +332,120 @@ class Guardian:
         duracion = "No definida"
 
         # Buscar hora de arranque (ej: a las 14:30)
-        match_arranque = re.search(r'a las\s+(\d{1,2}:\d{2})', texto, re.IGNORECASE)
+        match_arranque = PATRON_ARRANQUE.search(texto)
         if match_arranque:
             arranque = match_arranque.group(1)
             tarea = tarea.replace(match_arranque.group(0), "").strip()
 
         # Buscar duración (ej: durante 25 min, (25 min))
-        match_duracion = re.search(r'(?:durante\s+|por\s+)?\(?(\d+)\s*min(?:utos)?\)?', texto, re.IGNORECASE)
+        match_duracion = PATRON_DURACION.search(texto)
         if match_duracion:
             duracion = f"{match_duracion.group(1)} min"
             tarea = tarea.replace(match_duracion.group(0), "").strip()
         
         # Limpiar frases de intención para extraer la acción pura
-        frases_intencion = [
-            r'^bueno mira tengo ganas de\s+', r'^tengo ganas de\s+', r'^necesito\s+',
-            r'^tengo que\s+', r'^debería\s+', r'^es hora de\s+', r'^voy a\s+', r'^quiero\s+'
-        ]
-        for patron in frases_intencion:
-            tarea = re.sub(patron, '', tarea, flags=re.IGNORECASE).strip()
+        tarea = PATRON_FRASES_INTENCION.sub('', tarea).strip()
 
         return tarea.capitalize(), arranque, duracion
 
     def _emitir_ticket(self, detalles_texto):
-        if not detalles_texto:
-            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "La descripción del ticket no puede estar vacía. Operación cancelada."}
-
         tarea, arranque, duracion = self._analizar_texto_ticket(detalles_texto)
         
         zona_horaria_usuario = pytz.timezone("America/Montevideo")
         ahora = datetime.now(zona_horaria_usuario)
-        identificador = self._generar_id_aleatorio("TCKT")
-
-        ticket_obj = {
-            "tipo": "Ticket",
-            "id": identificador,
-            "tarea": tarea,
-            "arranque": arranque,
-            "duracion": duracion,
-            "fecha_emision": ahora.strftime("%d/%m/%y"),
-            "hora_emision": ahora.strftime("%H:%M")
-        }
-        self.archivador_contratos[identificador] = ticket_obj
-        self._guardar_memoria()
-
-        ticket_texto = (
+        # El ID se elige con la memoria al día, para que no choque con el de otro worker.
+        with self._transaccion():
+            identificador = self._generar_id("TCKT")
+
+            ticket_obj = {
+                "tipo": "Ticket",
+                "id": identificador,
+                "tarea": tarea,
+                "arranque": arranque,
+                "duracion": duracion,
+                "fecha_emision": ahora.strftime("%d/%m/%y"),
+                "hora_emision": ahora.strftime("%H:%M")
+            }
+            # El arranque se interpreta una sola vez: la agenda trabaja con las marcas de tiempo.
+            marcar_tiempos(ticket_obj, ahora)
+            logros = self._archivar_item(identificador, ticket_obj)
+
+        return (
             f"**TICKET DE ACCIÓN EMITIDO**\n--------------------\n"
             f"**ID:** {identificador}\n"
             f"**Tarea:** {tarea}\n"
             f"**Arranque:** {arranque}\n"
             f"**Duración:** {duracion}\n"
-            f"**Emitido:** {ticket_obj['fecha_emision']} a las {ticket_obj['hora_emision']}\n--------------------\n\n"
+            f"**Emitido:** {ticket_obj['fecha_emision']} a las {ticket_obj['hora_emision']}\n--------------------"
+            f"{self._texto_logros(logros)}\n\n"
             f"¿Deseas gestionar otro ticket?"
         )
-        
-        nuevo_estado = {"modo": "ticket", "paso_ticket": "ESPERANDO_ENCADENAR"}
-        return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": ticket_texto}
+
+    # --- TABLA DE FLUJOS GUIADOS ---
+    def _construir_maquina(self):
+        """Declara los pasos de los modos Ticket, Diseño y Diseño Múltiple y sus transiciones."""
+        maquina = MaquinaEstados(self.clasificador)
+
+        ticket = maquina.flujo("ticket", "paso_ticket", None, "ESPERANDO_DETALLES", "Error en el flujo de Ticket. Reiniciando.")
+        ticket.paso("ESPERANDO_DETALLES", self._ticket_detalles, destinos=["ESPERANDO_ENCADENAR"])
+        ticket.paso("ESPERANDO_ENCADENAR", self._ticket_encadenar, destinos=["ESPERANDO_DETALLES"])
+
+        diseno = maquina.flujo("diseño", "paso_diseno", "datos_plan", "ESPERANDO_MISION", "Error en el flujo de diseño. Reiniciando.")
+        diseno.paso("ESPERANDO_MISION", self._diseno_mision,
+                    destinos=["ESPERANDO_ESPECIFICACION", "ESPERANDO_RESULTADO_MISION"])
+        diseno.paso("ESPERANDO_RESULTADO_MISION", self._diseno_resultado_mision,
+                    destinos=["ESPERANDO_ESPECIFICACION", "PREGUNTAR_MANTENER_CAPAS", "ESPERANDO_CONFIRMACION_CONTRATO"])
+        diseno.paso("ESPERANDO_ESPECIFICACION", self._diseno_especificacion,
+                    destinos=["ESPERANDO_OPCIONES_ESPECIFICACION", "VALIDANDO_ESPECIFICACION", "ESPERANDO_ARRANQUE"])
+        diseno.paso("VALIDANDO_ESPECIFICACION", self._diseno_validando_especificacion,
+                    destinos=["ESPERANDO_ARRANQUE", "ESPERANDO_OPCIONES_ESPECIFICACION"])
+        diseno.paso("ESPERANDO_OPCIONES_ESPECIFICACION", self._diseno_opciones_especificacion,
+                    destinos=["ESPERANDO_ESPECIFICACION", "ESPERANDO_RESULTADO_ESPECIFICACION"])
+        diseno.paso("ESPERANDO_RESULTADO_ESPECIFICACION", self._diseno_resultado_especificacion,
+                    destinos=["ESPERANDO_ESPECIFICACION"])
+        diseno.paso("ESPERANDO_ARRANQUE", self._diseno_arranque,
+                    destinos=["ESPERANDO_DECISION_DURACION", "ESPERANDO_RESULTADO_ARRANQUE"])
+        diseno.paso("ESPERANDO_RESULTADO_ARRANQUE", self._diseno_resultado_arranque,
+                    destinos=["ESPERANDO_DECISION_DURACION", "ESPERANDO_CONFIRMACION_CONTRATO"])
+        diseno.paso("ESPERANDO_DECISION_DURACION", self._diseno_decision_duracion,
+                    destinos=["ESPERANDO_DURACION", "ESPERANDO_CONFIRMACION_CONTRATO"])
+        diseno.paso("ESPERANDO_DURACION", self._diseno_duracion,
+                    destinos=["ESPERANDO_RESULTADO_DURACION", "ESPERANDO_CONFIRMACION_CONTRATO"])
+        diseno.paso("ESPERANDO_RESULTADO_DURACION", self._diseno_resultado_duracion,
+                    destinos=["ESPERANDO_CONFIRMACION_CONTRATO"])
+        diseno.paso("ESPERANDO_CONFIRMACION_CONTRATO", self._diseno_confirmacion,
+                    destinos=["ESPERANDO_ENCADENAR", "ESPERANDO_CAMPO_A_CORREGIR"])
+        diseno.paso("ESPERANDO_CAMPO_A_CORREGIR", self._diseno_campo_a_corregir,
+                    destinos=["ESPERANDO_NUEVO_VALOR"])
+        diseno.paso("ESPERANDO_NUEVO_VALOR", self._diseno_nuevo_valor,
+                    destinos=["PREGUNTAR_MANTENER_CAPAS", "ESPERANDO_CONFIRMACION_CONTRATO", "ESPERANDO_RESULTADO_MISION",
+                              "ESPERANDO_RESULTADO_ARRANQUE", "ESPERANDO_RESULTADO_DURACION"])
+        diseno.paso("PREGUNTAR_MANTENER_CAPAS", self._diseno_mantener_capas,
+                    destinos=["ESPERANDO_CONFIRMACION_CONTRATO"])
+        diseno.paso("ESPERANDO_ENCADENAR", self._diseno_encadenar, destinos=["ESPERANDO_MISION"])
+
+        combo = maquina.flujo("diseno_multiple", "paso_combo", "datos_combo", "INICIO_COMBO", "Error en el flujo de Diseño Múltiple. Reiniciando.")
+        combo.paso("INICIO_COMBO", self._combo_inicio, destinos=["ESPERANDO_TAREAS_COMBO"])
+        combo.paso("ESPERANDO_TAREAS_COMBO", self._combo_tareas, destinos=["ESPERANDO_INICIO_CREACION"])
+        combo.paso("ESPERANDO_INICIO_CREACION", self._combo_siguiente_contrato, destinos=["CONFIGURANDO_CONTRATO"])
+        # Mientras se configura cada contrato, el combo espera apilado bajo un flujo de Diseño.
+        combo.paso("CONFIGURANDO_CONTRATO", al_retornar=self._combo_contrato_forjado)
+        return maquina
+
+    # --- PASOS DEL MODO TICKET ---
+    def _ticket_detalles(self, turno):
+        if not turno.comando:
+            return turno.terminar("La descripción del ticket no puede estar vacía. Operación cancelada.")
+        return turno.ir("ESPERANDO_ENCADENAR", self._emitir_ticket(turno.comando))
+
+    def _ticket_encadenar(self, turno):
+        if "si" in turno.intenciones:
+            return turno.ir("ESPERANDO_DETALLES", "Entendido. Describe la tarea para el siguiente ticket.")
+        return turno.terminar("Entendido. Guardián en espera.")
 
     # --- FUNCIONES DEL MODO DISEÑO ---
-    def _presentar_borrador_contrato(self, datos_plan):
+    def _presentar_borrador_contrato(self, turno):
+        datos_plan = turno.datos
         mision_base = datos_plan.get('mision', 'N/A')
         especificaciones = datos_plan.get('especificaciones', [])
         mision_completa = f"{mision_base} -> {' -> '.join(especificaciones)}" if especificaciones else mision_base
@@ -150,17 +457,10 @@ class Guardian:
             f"**Duración:** {datos_plan.get('duracion', 'N/A')}\n--------------------\n"
             f"¿Confirmas este contrato o quieres corregir algo?"
         )
-        
-        paso_actual = datos_plan.get("paso_origen_borrador", "ESPERANDO_CONFIRMACION_CONTRATO")
-        modo_actual = datos_plan.get("modo_origen_borrador", "diseño")
-
-        nuevo_estado = {"modo": modo_actual, "paso_diseno": paso_actual, "datos_plan": datos_plan}
-        if modo_actual == "diseno_multiple":
-            nuevo_estado["paso_combo"] = "ESPERANDO_CONFIRMACION_CONTRATO_COMBO"
-
-        return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": contrato_borrador_texto}
+        return turno.ir("ESPERANDO_CONFIRMACION_CONTRATO", contrato_borrador_texto)
 
     def _forjar_contrato(self, datos_plan):
+        """Sella y archiva el contrato. Devuelve (texto del contrato, identificador)."""
         zona_horaria_usuario = pytz.timezone("America/Montevideo")
         ahora = datetime.now(zona_horaria_usuario)
         fecha_sellado = ahora.strftime("%d/%m/%y")
@@ -170,19 +470,20 @@ class Guardian:
         especificaciones = datos_plan.get('especificaciones', [])
         mision_completa = f"{mision_base} -> {' -> '.join(especificaciones)}" if especificaciones else mision_base
         
-        identificador = self._generar_id_aleatorio("CONT")
-        
-        contrato_obj = {
-            "tipo": "Contrato",
-            "mision": mision_completa,
-            "arranque": datos_plan.get('arranque', 'N/A'),
-            "duracion": datos_plan.get('duracion', 'N/A'),
-            "fecha_sellado": fecha_sellado,
-            "hora_sellado": hora_sellado,
-            "id": identificador
-        }
-        self.archivador_contratos[identificador] = contrato_obj
-        self._guardar_memoria()
+        with self._transaccion():
+            identificador = self._generar_id("CONT")
+
+            contrato_obj = {
+                "tipo": "Contrato",
+                "mision": mision_completa,
+                "arranque": datos_plan.get('arranque', 'N/A'),
+                "duracion": datos_plan.get('duracion', 'N/A'),
+                "fecha_sellado": fecha_sellado,
+                "hora_sellado": hora_sellado,
+                "id": identificador
+            }
+            marcar_tiempos(contrato_obj, ahora)
+            logros = self._archivar_item(identificador, contrato_obj)
 
         contrato_texto = (
             f"**CONTRATO FORJADO**\n--------------------\n"
@@ -191,275 +492,448 @@ class Guardian:
             f"**Duración:** {contrato_obj['duracion']}\n"
             f"**Sellado:** {fecha_sellado} a las {hora_sellado}\n"
             f"**Identificador:** {identificador}\n--------------------"
+            f"{self._texto_logros(logros)}"
         )
-        
-        if datos_plan.get("en_combo"):
-            return {"nuevo_estado": {"modo": "diseno_multiple"}, "mensaje_para_ui": contrato_texto, "evento": "CONTRATO_COMBO_FORJADO"}
-        else:
-            contrato_texto += "\nContrato sellado. ¿Deseas forjar otro contrato?"
-            nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_ENCADENAR", "datos_plan": {}}
-            return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": contrato_texto}
-
-    def _gestionar_diseno(self, estado_actual, comando):
-        paso = estado_actual.get("paso_diseno")
-        datos_plan = estado_actual.get("datos_plan", {})
-        comando_lower = comando.lower()
-        
-        if paso == "ESPERANDO_MISION":
-            opciones = [opt.strip() for opt in comando.split(',') if opt.strip()]
-            if not opciones: return {"nuevo_estado": estado_actual, "mensaje_para_ui": "Define la misión."}
-            if len(opciones) == 1:
-                datos_plan["mision"] = opciones[0]
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_ESPECIFICACION", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": f"Misión: **{opciones[0]}**. ¿Necesitas especificar más?"}
+        return contrato_texto, identificador
+
+    def _diseno_mision(self, turno):
+        opciones = [opt.strip() for opt in turno.comando.split(',') if opt.strip()]
+        if not opciones: return turno.quedarse("Define la misión.")
+        if len(opciones) == 1:
+            turno.datos["mision"] = opciones[0]
+            return turno.ir("ESPERANDO_ESPECIFICACION", f"Misión: **{opciones[0]}**. ¿Necesitas especificar más?")
+        return turno.ruleta("ESPERANDO_RESULTADO_MISION", opciones)
+
+    def _diseno_resultado_mision(self, turno):
+        datos_plan = turno.datos
+        if datos_plan.pop("corrigiendo_con_ruleta", None):
+            campo_en_edicion = datos_plan.pop("campo_en_edicion", None)
+            datos_plan["mision"] = turno.comando
+            if campo_en_edicion and "especificaciones" in datos_plan:
+                return turno.ir("PREGUNTAR_MANTENER_CAPAS", "Has cambiado la misión. ¿Quieres mantener las especificaciones (capas) actuales?")
+            return self._presentar_borrador_contrato(turno)
+
+        datos_plan["mision"] = turno.comando
+        return turno.ir("ESPERANDO_ESPECIFICACION", f"Misión elegida: **{turno.comando}**. ¿Necesitas especificar más?")
+
+    def _diseno_especificacion(self, turno):
+        datos_plan = turno.datos
+        if "si" in turno.intenciones:
+            return turno.ir("ESPERANDO_OPCIONES_ESPECIFICACION", "Entendido. Dame las opciones para la siguiente capa.")
+        mision_actual = datos_plan.get("mision", "").lower()
+        tiene_especificaciones = "especificaciones" in datos_plan and datos_plan["especificaciones"]
+        if mision_actual in self.MISIONES_GENERICAS and not tiene_especificaciones:
+            mensaje = f"**¡Atención!** La misión '{datos_plan.get('mision')}' es muy amplia. Para que sea más efectiva, te recomiendo añadir una especificación. ¿Estás seguro de que quieres forjarla así de general?"
+            return turno.ir("VALIDANDO_ESPECIFICACION", mensaje)
+        return turno.ir("ESPERANDO_ARRANQUE", "Misión definida. Ahora, define el momento de arranque.")
+
+    def _diseno_validando_especificacion(self, turno):
+        if "si" in turno.intenciones:
+            return turno.ir("ESPERANDO_ARRANQUE", "Entendido. Misión definida. Ahora, define el momento de arranque.")
+        return turno.ir("ESPERANDO_OPCIONES_ESPECIFICACION", "Perfecto. Dame las opciones para la siguiente capa.")
+
+    def _diseno_opciones_especificacion(self, turno):
+        opciones = [opt.strip() for opt in turno.comando.split(',') if opt.strip()]
+        if not opciones: return turno.quedarse("Define las opciones.")
+        if len(opciones) == 1:
+            return self._anadir_especificacion(turno, opciones[0])
+        return turno.ruleta("ESPERANDO_RESULTADO_ESPECIFICACION", opciones)
+
+    def _diseno_resultado_especificacion(self, turno):
+        return self._anadir_especificacion(turno, turno.comando)
+
+    def _anadir_especificacion(self, turno, especificacion):
+        datos_plan = turno.datos
+        datos_plan.setdefault("especificaciones", []).append(especificacion)
+        mision_completa = f"{datos_plan.get('mision', '')} -> {' -> '.join(datos_plan['especificaciones'])}"
+        return turno.ir("ESPERANDO_ESPECIFICACION", f"Entendido: **{mision_completa}**. ¿Otra capa más?")
+
+    def _diseno_arranque(self, turno):
+        opciones = [opt.strip() for opt in turno.comando.split(',') if opt.strip()]
+        if not opciones: return turno.quedarse("Define el momento de arranque.")
+        if len(opciones) == 1:
+            turno.datos["arranque"] = opciones[0]
+            return turno.ir("ESPERANDO_DECISION_DURACION", f"Arranque: **{opciones[0]}**. ¿Necesitas definir una duración?")
+        return turno.ruleta("ESPERANDO_RESULTADO_ARRANQUE", opciones)
+
+    def _diseno_resultado_arranque(self, turno):
+        datos_plan = turno.datos
+        datos_plan["arranque"] = turno.comando
+        if datos_plan.pop("corrigiendo_con_ruleta", None):
+            datos_plan.pop("campo_en_edicion", None)
+            return self._presentar_borrador_contrato(turno)
+        return turno.ir("ESPERANDO_DECISION_DURACION", f"Arranque: **{turno.comando}**. ¿Necesitas definir una duración?")
+
+    def _diseno_decision_duracion(self, turno):
+        if "si" in turno.intenciones:
+            return turno.ir("ESPERANDO_DURACION", "Entendido. Dime las opciones para la duración o di 'aleatorio'.")
+        turno.datos["duracion"] = "No definida"
+        return self._presentar_borrador_contrato(turno)
+
+    def _diseno_duracion(self, turno):
+        if "aleatorio" in turno.intenciones:
+            duracion_aleatoria = random.randint(30, 70)
+            duracion_redondeada = 5 * round(duracion_aleatoria / 5)
+            turno.datos["duracion"] = f"{duracion_redondeada} min"
+            return self._presentar_borrador_contrato(turno)
+
+        opciones = [opt.strip() for opt in turno.comando.split(',') if opt.strip()]
+        if not opciones: return turno.quedarse("Define la duración o di 'aleatorio'.")
+        if len(opciones) == 1:
+            turno.datos["duracion"] = opciones[0]
+            return self._presentar_borrador_contrato(turno)
+        return turno.ruleta("ESPERANDO_RESULTADO_DURACION", opciones)
+
+    def _diseno_resultado_duracion(self, turno):
+        turno.datos.pop("corrigiendo_con_ruleta", None)
+        turno.datos.pop("campo_en_edicion", None)
+        turno.datos["duracion"] = turno.comando
+        return self._presentar_borrador_contrato(turno)
+
+    def _diseno_confirmacion(self, turno):
+        if "confirmacion" in turno.intenciones:
+            contrato_texto, identificador = self._forjar_contrato(turno.datos)
+            # Dentro de un Combo, el contrato vuelve al flujo padre.
+            if turno.anidado:
+                return turno.retornar(contrato_texto, resultado=identificador)
+            turno.datos.clear()
+            return turno.ir("ESPERANDO_ENCADENAR", contrato_texto + "\nContrato sellado. ¿Deseas forjar otro contrato?")
+        if "correccion" in turno.intenciones:
+            return turno.ir("ESPERANDO_CAMPO_A_CORREGIR", "Entendido. ¿Qué campo quieres corregir? (misión / arranque / duración)")
+        return turno.quedarse("No te he entendido. Por favor, responde con algo como 'confirmar' o 'corregir'.")
+
+    def _diseno_campo_a_corregir(self, turno):
+        campo_a_corregir = {"mision": "misión", "duracion": "duración"}.get(turno.comando_lower, turno.comando_lower)
+        if campo_a_corregir not in ("misión", "arranque", "duración"):
+            return turno.quedarse("Campo no válido. Por favor, elige entre 'misión', 'arranque' o 'duración'.")
+        turno.datos["campo_en_edicion"] = campo_a_corregir
+        return turno.ir("ESPERANDO_NUEVO_VALOR", f"De acuerdo. ¿Cuál es el nuevo valor para '{campo_a_corregir}'?")
+
+    def _diseno_nuevo_valor(self, turno):
+        datos_plan = turno.datos
+        campo_en_edicion = datos_plan.get("campo_en_edicion")
+        opciones = [opt.strip() for opt in turno.comando.split(',') if opt.strip()]
+
+        if len(opciones) == 1:
+            datos_plan.pop("campo_en_edicion", None)
+            if campo_en_edicion == "misión":
+                datos_plan["mision"] = turno.comando
+                if "especificaciones" in datos_plan:
+                    return turno.ir("PREGUNTAR_MANTENER_CAPAS", "Has cambiado la misión. ¿Quieres mantener las especificaciones (capas) actuales?")
             else:
-                estado_actual["paso_diseno"] = "ESPERANDO_RESULTADO_MISION"
-                return {"nuevo_estado": estado_actual, "accion_ui": "MOSTRAR_RULETA", "opciones_ruleta": opciones}
+                datos_plan[campo_en_edicion] = turno.comando
+            return self._presentar_borrador_contrato(turno)
+
+        mapa_pasos = {
+            "misión": "ESPERANDO_RESULTADO_MISION",
+            "arranque": "ESPERANDO_RESULTADO_ARRANQUE",
+            "duración": "ESPERANDO_RESULTADO_DURACION"
+        }
+        paso_siguiente = mapa_pasos.get(campo_en_edicion)
+        if not paso_siguiente:
+            return turno.terminar("Error en la corrección con ruleta. Reiniciando.")
+        datos_plan["corrigiendo_con_ruleta"] = True
+        return turno.ruleta(paso_siguiente, opciones)
+
+    def _diseno_mantener_capas(self, turno):
+        if "si" not in turno.intenciones:
+            turno.datos.pop("especificaciones", None)
+        return self._presentar_borrador_contrato(turno)
+
+    def _diseno_encadenar(self, turno):
+        if "si" in turno.intenciones:
+            turno.datos.clear()
+            return turno.ir("ESPERANDO_MISION", "Modo Diseño reiniciado. Define la misión.")
+        return turno.terminar("Entendido. Guardián en espera.")
+
+    # --- MODO DISEÑO MÚLTIPLE (COMBO) ---
+    def _combo_inicio(self, turno):
+        turno.datos.clear()
+        turno.datos.update({"tareas_pendientes": [], "contratos_forjados": [], "indice_actual": 0})
+        mensaje = "Modo Diseño Múltiple activado. Dame la lista de tareas que quieres encadenar, separadas por comas (máximo 3)."
+        return turno.ir("ESPERANDO_TAREAS_COMBO", mensaje)
+
+    def _combo_tareas(self, turno):
+        tareas = [t.strip() for t in turno.comando.split(',') if t.strip()]
+        if not tareas:
+            return turno.quedarse("Necesito al menos una tarea. Por favor, dame la lista de tareas.")
         
-        elif paso == "ESPERANDO_RESULTADO_MISION":
-            if datos_plan.get("corrigiendo_con_ruleta"):
-                datos_plan.pop("corrigiendo_con_ruleta", None)
-                campo_en_edicion = datos_plan.pop("campo_en_edicion", None)
-                datos_plan["mision"] = comando
-                if campo_en_edicion and "especificaciones" in datos_plan:
-                    nuevo_estado = {"modo": "diseño", "paso_diseno": "PREGUNTAR_MANTENER_CAPAS", "datos_plan": datos_plan}
-                    return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Has cambiado la misión. ¿Quieres mantener las especificaciones (capas) actuales?"}
-                return self._presentar_borrador_contrato(datos_plan)
-            
-            datos_plan["mision"] = comando
-            nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_ESPECIFICACION", "datos_plan": datos_plan}
-            return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": f"Misión elegida: **{comando}**. ¿Necesitas especificar más?"}
+        random.shuffle(tareas)
+        tareas_seleccionadas = tareas[:3]
+        turno.datos["tareas_pendientes"] = tareas_seleccionadas
         
-        elif paso == "ESPERANDO_ESPECIFICACION":
-            if any(palabra in comando_lower for palabra in self.PALABRAS_SI):
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_OPCIONES_ESPECIFICACION", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Entendido. Dame las opciones para la siguiente capa."}
-            else:
-                mision_actual = datos_plan.get("mision", "").lower()
-                tiene_especificaciones = "especificaciones" in datos_plan and datos_plan["especificaciones"]
-                if mision_actual in self.MISIONES_GENERICAS and not tiene_especificaciones:
-                    nuevo_estado = {"modo": "diseño", "paso_diseno": "VALIDANDO_ESPECIFICACION", "datos_plan": datos_plan}
-                    mensaje = f"**¡Atención!** La misión '{datos_plan.get('mision')}' es muy amplia. Para que sea más efectiva, te recomiendo añadir una especificación. ¿Estás seguro de que quieres forjarla así de general?"
-                    return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": mensaje}
-                
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_ARRANQUE", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Misión definida. Ahora, define el momento de arranque."}
-
-        elif paso == "VALIDANDO_ESPECIFICACION":
-            if any(palabra in comando_lower for palabra in self.PALABRAS_SI):
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_ARRANQUE", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Entendido. Misión definida. Ahora, define el momento de arranque."}
-            else:
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_OPCIONES_ESPECIFICACION", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Perfecto. Dame las opciones para la siguiente capa."}
-
-        elif paso == "ESPERANDO_OPCIONES_ESPECIFICACION":
-            opciones = [opt.strip() for opt in comando.split(',') if opt.strip()]
-            if not opciones: return {"nuevo_estado": estado_actual, "mensaje_para_ui": "Define las opciones."}
-            if "especificaciones" not in datos_plan: datos_plan["especificaciones"] = []
-            if len(opciones) == 1:
-                datos_plan["especificaciones"].append(opciones[0])
-                mision_completa = f"{datos_plan.get('mision', '')} -> {' -> '.join(datos_plan['especificaciones'])}"
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_ESPECIFICACION", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": f"Entendido: **{mision_completa}**. ¿Otra capa más?"}
-            else:
-                estado_actual["paso_diseno"] = "ESPERANDO_RESULTADO_ESPECIFICACION"
-                return {"nuevo_estado": estado_actual, "accion_ui": "MOSTRAR_RULETA", "opciones_ruleta": opciones}
-                
-        elif paso == "ESPERANDO_RESULTADO_ESPECIFICACION":
-            if "especificaciones" not in datos_plan: datos_plan["especificaciones"] = []
-            datos_plan["especificaciones"].append(comando)
-            mision_completa = f"{datos_plan.get('mision', '')} -> {' -> '.join(datos_plan['especificaciones'])}"
-            nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_ESPECIFICACION", "datos_plan": datos_plan}
-            return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": f"Entendido: **{mision_completa}**. ¿Otra capa más?"}
-            
-        elif paso == "ESPERANDO_ARRANQUE":
-            opciones = [opt.strip() for opt in comando.split(',') if opt.strip()]
-            if not opciones: return {"nuevo_estado": estado_actual, "mensaje_para_ui": "Define el momento de arranque."}
-            if len(opciones) == 1:
-                datos_plan["arranque"] = opciones[0]
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_DECISION_DURACION", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": f"Arranque: **{opciones[0]}**. ¿Necesitas definir una duración?"}
-            else:
-                estado_actual["paso_diseno"] = "ESPERANDO_RESULTADO_ARRANQUE"
-                return {"nuevo_estado": estado_actual, "accion_ui": "MOSTRAR_RULETA", "opciones_ruleta": opciones}
-                
-        elif paso == "ESPERANDO_RESULTADO_ARRANQUE":
-            if datos_plan.get("corrigiendo_con_ruleta"):
-                datos_plan.pop("corrigiendo_con_ruleta", None)
-                datos_plan.pop("campo_en_edicion", None)
-                datos_plan["arranque"] = comando
-                return self._presentar_borrador_contrato(datos_plan)
-
-            datos_plan["arranque"] = comando
-            nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_DECISION_DURACION", "datos_plan": datos_plan}
-            return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": f"Arranque: **{comando}**. ¿Necesitas definir una duración?"}
-            
-        elif paso == "ESPERANDO_DECISION_DURACION":
-            if any(palabra in comando_lower for palabra in self.PALABRAS_SI):
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_DURACION", "datos_plan": datos_plan}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Entendido. Dime las opciones para la duración o di 'aleatorio'."}
-            else:
-                datos_plan["duracion"] = "No definida"
-                return self._presentar_borrador_contrato(datos_plan)
-                
-        elif paso == "ESPERANDO_DURACION":
-            if "aleatorio" in comando_lower:
-                duracion_aleatoria = random.randint(30, 70)
-                duracion_redondeada = 5 * round(duracion_aleatoria / 5)
-                datos_plan["duracion"] = f"{duracion_redondeada} min"
-                return self._presentar_borrador_contrato(datos_plan)
-
-            opciones = [opt.strip() for opt in comando.split(',') if opt.strip()]
-            if not opciones: return {"nuevo_estado": estado_actual, "mensaje_para_ui": "Define la duración o di 'aleatorio'."}
-            if len(opciones) == 1:
-                datos_plan["duracion"] = opciones[0]
-                return self._presentar_borrador_contrato(datos_plan)
-            else:
-                estado_actual["paso_diseno"] = "ESPERANDO_RESULTADO_DURACION"
-                return {"nuevo_estado": estado_actual, "accion_ui": "MOSTRAR_RULETA", "opciones_ruleta": opciones}
-                
-        elif paso == "ESPERANDO_RESULTADO_DURACION":
-            if datos_plan.get("corrigiendo_con_ruleta"):
-                datos_plan.pop("corrigiendo_con_ruleta", None)
-                datos_plan.pop("campo_en_edicion", None)
-                datos_plan["duracion"] = comando
-                return self._presentar_borrador_contrato(datos_plan)
-
-            datos_plan["duracion"] = comando
-            return self._presentar_borrador_contrato(datos_plan)
-
-        elif paso == "ESPERANDO_CONFIRMACION_CONTRATO":
-            if any(palabra in comando_lower for palabra in self.PALABRAS_CONFIRMACION):
-                return self._forjar_contrato(datos_plan)
-            elif any(palabra in comando_lower for palabra in self.PALABRAS_CORRECCION):
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_CAMPO_A_CORREGIR", "datos_plan": datos_plan}
-                mensaje = "Entendido. ¿Qué campo quieres corregir? (misión / arranque / duración)"
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": mensaje}
-            else:
-                return {"nuevo_estado": estado_actual, "mensaje_para_ui": "No te he entendido. Por favor, responde con algo como 'confirmar' o 'corregir'."}
-
-        elif paso == "ESPERANDO_CAMPO_A_CORREGIR":
-            campo_a_corregir = comando.lower()
-            if campo_a_corregir in ["misión", "mision", "arranque", "duración", "duracion"]:
-                if campo_a_corregir == "mision": campo_a_corregir = "misión"
-                if campo_a_corregir == "duracion": campo_a_corregir = "duración"
-                
-                datos_plan["campo_en_edicion"] = campo_a_corregir
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_NUEVO_VALOR", "datos_plan": datos_plan}
-                mensaje = f"De acuerdo. ¿Cuál es el nuevo valor para '{campo_a_corregir}'?"
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": mensaje}
-            else:
-                return {"nuevo_estado": estado_actual, "mensaje_para_ui": "Campo no válido. Por favor, elige entre 'misión', 'arranque' o 'duración'."}
-
-        elif paso == "ESPERANDO_NUEVO_VALOR":
-            campo_en_edicion = datos_plan.get("campo_en_edicion")
-            opciones = [opt.strip() for opt in comando.split(',') if opt.strip()]
-            
-            if len(opciones) == 1:
-                if campo_en_edicion == "misión":
-                    datos_plan["mision"] = comando
-                    datos_plan.pop("campo_en_edicion", None)
-                    if "especificaciones" in datos_plan:
-                        nuevo_estado = {"modo": "diseño", "paso_diseno": "PREGUNTAR_MANTENER_CAPAS", "datos_plan": datos_plan}
-                        return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Has cambiado la misión. ¿Quieres mantener las especificaciones (capas) actuales?"}
-                else:
-                    datos_plan[campo_en_edicion] = comando
-                    datos_plan.pop("campo_en_edicion", None)
-                return self._presentar_borrador_contrato(datos_plan)
-            
-            else:
-                mapa_pasos = {
-                    "misión": "ESPERANDO_RESULTADO_MISION",
-                    "arranque": "ESPERANDO_RESULTADO_ARRANQUE",
-                    "duración": "ESPERANDO_RESULTADO_DURACION"
-                }
-                paso_siguiente = mapa_pasos.get(campo_en_edicion)
-                if paso_siguiente:
-                    datos_plan["corrigiendo_con_ruleta"] = True
-                    estado_actual["paso_diseno"] = paso_siguiente
-                    return {"nuevo_estado": estado_actual, "accion_ui": "MOSTRAR_RULETA", "opciones_ruleta": opciones}
-                else:
-                    return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Error en la corrección con ruleta. Reiniciando."}
-
-        elif paso == "PREGUNTAR_MANTENER_CAPAS":
-            if any(palabra in comando_lower for palabra in self.PALABRAS_SI):
-                pass
+        orden_texto = "\n".join([f"{i+1}. {tarea}" for i, tarea in enumerate(tareas_seleccionadas)])
+        mensaje = f"Perfecto. He establecido el siguiente orden aleatorio para tus contratos:\n\n{orden_texto}\n\nPresiona Enter o di 'continuar' para empezar a configurar el primer contrato: **{tareas_seleccionadas[0]}**."
+        return turno.ir("ESPERANDO_INICIO_CREACION", mensaje)
+
+    def _combo_contrato_forjado(self, turno):
+        datos_combo = turno.datos
+        datos_combo.setdefault("contratos_forjados", []).append(turno.resultado_hijo)
+        datos_combo["indice_actual"] = datos_combo.get("indice_actual", 0) + 1
+        return self._combo_siguiente_contrato(turno)
+
+    def _combo_siguiente_contrato(self, turno):
+        """Lanza el Diseño del siguiente contrato del combo, o cierra el combo si no quedan."""
+        indice = turno.datos.get("indice_actual", 0)
+        tareas = turno.datos.get("tareas_pendientes", [])
+
+        if indice < len(tareas):
+            mision_actual = tareas[indice]
+            mensaje = f"**Configurando Contrato {indice + 1}/{len(tareas)}: {mision_actual}**\n\n¿Necesitas especificar más esta misión?"
+            return turno.subflujo("CONFIGURANDO_CONTRATO", "diseño", "ESPERANDO_ESPECIFICACION", {"mision": mision_actual}, mensaje)
+        return turno.terminar(f"¡Combo completado! Se han forjado {len(tareas)} contratos con éxito. Guardián en espera.")
+
+    # --- CONSULTAS AL ARCHIVADOR ---
+    def _interpretar_fecha(self, texto, ahora):
+        if texto == "hoy":
+            return ahora.strftime("%Y-%m-%d")
+        if texto == "ayer":
+            return (ahora - timedelta(days=1)).strftime("%Y-%m-%d")
+        for formato in ("%d/%m/%y", "%d/%m/%Y"):
+            try:
+                return datetime.strptime(texto, formato).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+        return None
+
+    def _listar_archivo(self, comando_lower):
+        """
+        Lista tickets y contratos con filtros opcionales, por ejemplo:
+        'listar tickets', 'listar contratos página 2',
+        'listar desde 01/10/25 hasta 15/10/25', 'listar hoy'.
+        """
+        tipo = None
+        if "ticket" in comando_lower:
+            tipo = "Ticket"
+        elif "contrato" in comando_lower:
+            tipo = "Contrato"
+
+        ahora = datetime.now(pytz.timezone("America/Montevideo"))
+        fechas = [self._interpretar_fecha(f, ahora) for f in re.findall(r'\b(hoy|ayer|\d{1,2}/\d{1,2}/\d{2,4})\b', comando_lower)]
+        fechas = [f for f in fechas if f]
+        desde = hasta = None
+        if len(fechas) == 1:
+            if "desde" in comando_lower:
+                desde = fechas[0]
+            elif "hasta" in comando_lower:
+                hasta = fechas[0]
             else:
-                datos_plan.pop("especificaciones", None)
-            return self._presentar_borrador_contrato(datos_plan)
+                desde = hasta = fechas[0]
+        elif len(fechas) >= 2:
+            desde, hasta = sorted(fechas[:2])
 
-        elif paso == "ESPERANDO_ENCADENAR":
-            if any(palabra in comando_lower for palabra in self.PALABRAS_SI):
-                nuevo_estado = {"modo": "diseño", "paso_diseno": "ESPERANDO_MISION", "datos_plan": {}}
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Modo Diseño reiniciado. Define la misión."}
+        match_pagina = re.search(r'p[aá]gina\s+(\d+)', comando_lower)
+        pagina = max(1, int(match_pagina.group(1))) if match_pagina else 1
+
+        items, total = self.almacen.consultar(
+            tipo=tipo, desde=desde, hasta=hasta,
+            limite=self.ITEMS_POR_PAGINA, desplazamiento=(pagina - 1) * self.ITEMS_POR_PAGINA,
+        )
+        if total == 0:
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "No hay items en el archivador que coincidan con esa consulta."}
+
+        paginas = (total + self.ITEMS_POR_PAGINA - 1) // self.ITEMS_POR_PAGINA
+        if pagina > paginas:
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": f"La consulta solo tiene {paginas} página(s)."}
+        lineas = []
+        for item in items:
+            if item.get("tipo") == "Ticket":
+                lineas.append(f"- **{item['id']}** · Ticket · {item.get('fecha_emision', '?')} · {item.get('tarea', '')} ({item.get('arranque', 'No definido')})")
             else:
-                return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Entendido. Guardián en espera."}
-            
-        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Error en el flujo de diseño. Reiniciando."}
-    # --- MODO DISEÑO MÚLTIPLE (COMBO) ---
-    def _gestionar_diseno_multiple(self, estado_actual, comando):
-        paso_combo = estado_actual.get("paso_combo", "INICIO_COMBO")
-        datos_combo = estado_actual.get("datos_combo", {})
-        
-        if paso_combo == "INICIO_COMBO":
-            datos_combo = {"tareas_pendientes": [], "contratos_forjados": [], "indice_actual": 0}
-            nuevo_estado = {"modo": "diseno_multiple", "paso_combo": "ESPERANDO_TAREAS_COMBO", "datos_combo": datos_combo}
-            mensaje = "Modo Diseño Múltiple activado. Dame la lista de tareas que quieres encadenar, separadas por comas (máximo 3)."
-            return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": mensaje}
-
-        elif paso_combo == "ESPERANDO_TAREAS_COMBO":
-            tareas = [t.strip() for t in comando.split(',') if t.strip()]
-            if not tareas:
-                return {"nuevo_estado": estado_actual, "mensaje_para_ui": "Necesito al menos una tarea. Por favor, dame la lista de tareas."}
-            
-            random.shuffle(tareas)
-            tareas_seleccionadas = tareas[:3]
-            datos_combo["tareas_pendientes"] = tareas_seleccionadas
-            
-            orden_texto = "\n".join([f"{i+1}. {tarea}" for i, tarea in enumerate(tareas_seleccionadas)])
-            mensaje = f"Perfecto. He establecido el siguiente orden aleatorio para tus contratos:\n\n{orden_texto}\n\nPresiona Enter o di 'continuar' para empezar a configurar el primer contrato: **{tareas_seleccionadas[0]}**."
-            
-            nuevo_estado = {"modo": "diseno_multiple", "paso_combo": "ESPERANDO_INICIO_CREACION", "datos_combo": datos_combo}
-            return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": mensaje}
-
-        elif paso_combo == "ESPERANDO_INICIO_CREACION" or estado_actual.get("evento") == "CONTRATO_COMBO_FORJADO":
-            if estado_actual.get("evento") == "CONTRATO_COMBO_FORJADO":
-                datos_combo = estado_actual["datos_combo"]
-                datos_combo["indice_actual"] += 1
-
-            indice = datos_combo["indice_actual"]
-            tareas = datos_combo["tareas_pendientes"]
-
-            if indice < len(tareas):
-                mision_actual = tareas[indice]
-                datos_plan = {"mision": mision_actual, "en_combo": True}
-                
-                nuevo_estado = {
-                    "modo": "diseño", 
-                    "paso_diseno": "ESPERANDO_ESPECIFICACION",
-                    "datos_plan": datos_plan,
-                    "estado_combo_padre": {"modo": "diseno_multiple", "paso_combo": paso_combo, "datos_combo": datos_combo}
-                }
-                mensaje = f"**Configurando Contrato {indice + 1}/{len(tareas)}: {mision_actual}**\n\n¿Necesitas especificar más esta misión?"
-                return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": mensaje}
+                lineas.append(f"- **{item['id']}** · Contrato · {item.get('fecha_sellado', '?')} · {item.get('mision', '')} ({item.get('arranque', 'N/A')})")
+        mensaje = f"**ARCHIVADOR** — página {pagina}/{paginas} ({total} items)\n--------------------\n" + "\n".join(lineas)
+        if pagina < paginas:
+            mensaje += f"\n--------------------\nAñade 'página {pagina + 1}' a tu consulta para ver más."
+        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": mensaje}
+
+    def _buscar_archivo(self, comando):
+        """'buscar estudiar matemáticas': los items más relevantes por su tarea o misión (BM25)."""
+        partes = comando.split(None, 1)
+        consulta = partes[1].strip() if len(partes) > 1 else ""
+        if not consulta:
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Dime qué buscar, por ejemplo: 'buscar estudiar matemáticas'."}
+        resultados = indice_de(self.memoria).buscar(consulta, limite=self.ITEMS_POR_PAGINA)
+        lineas = []
+        for identificador, _ in resultados:
+            item = self.archivador_contratos.get(identificador)
+            if item is None:
+                continue
+            if item.get("tipo") == "Ticket":
+                lineas.append(f"- **{item['id']}** · Ticket · {item.get('fecha_emision', '?')} · {item.get('tarea', '')}")
             else:
-                mensaje_final = f"¡Combo completado! Se han forjado {len(tareas)} contratos con éxito. Guardián en espera."
-                return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": mensaje_final}
-        
-        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Error en el flujo de Diseño Múltiple. Reiniciando."}
+                lineas.append(f"- **{item['id']}** · Contrato · {item.get('fecha_sellado', '?')} · {item.get('mision', '')}")
+        if not lineas:
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": f"No encontré nada en el archivador sobre '{consulta}'."}
+        mensaje = f"**BÚSQUEDA:** {consulta}\n--------------------\n" + "\n".join(lineas)
+        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": mensaje}
 
     # --- CHARLA Y EJECUCIÓN ---
-    async def _gestionar_charla_ia(self, comando):
+    def _items_para_charla(self, memoria, comando):
+        """
+        Tickets y contratos que se ofrecen al LLM: los relacionados con el
+        comando y luego los más recientes. Un turno de charla no abre nada que
+        recorra el archivador entero: los relacionados solo salen si el índice
+        de búsqueda ya está abierto, y los recientes son una consulta acotada
+        del almacén (indexada en SQLite).
+        """
+        items = {}
+        if memoria.indice is not None:
+            for identificador, _ in memoria.indice.buscar(comando, limite=ITEMS_CHARLA_RELACIONADOS):
+                item = memoria.archivador.get(identificador)
+                if item is not None:
+                    items[identificador] = item
+        recientes, _ = memoria.almacen.consultar(limite=ITEMS_CHARLA_RECIENTES)
+        for item in recientes:
+            items.setdefault(item.get("id"), item)
+        return list(items.values())
+
+    def _preparar_charla(self, datos, memoria):
+        """
+        (clave de la conversación, mensajes para el LLM) de un turno de charla.
+        Sin 'usuario_id' ni 'sesion_token' la clave es None: el turno va sin
+        historial, porque todos esos clientes comparten el usuario por defecto.
+        """
+        comando = datos.get("comando", "").strip()
+        if datos.get("usuario_id") or datos.get("sesion_token"):
+            clave = (memoria.usuario_id, datos.get("sesion_token") or "")
+        else:
+            clave = None
+        mensajes = self.contexto_charla.mensajes(clave, INSTRUCCIONES_CHARLA, comando, self._items_para_charla(memoria, comando))
+        return clave, mensajes
+
+    @staticmethod
+    def _clave_cache(mensajes):
+        # Con contexto, la misma frase puede pedir respuestas distintas: la caché usa el prompt entero.
+        return "\n".join(mensaje["content"] for mensaje in mensajes)
+
+    async def _gestionar_charla_ia(self, comando, clave, mensajes):
         try:
-            prompt = f"Eres el Guardián, una IA compañera de Juan. Eres directo, sabio y motivador. El usuario dice: '{comando}'"
-            respuesta_ia = await g4f.ChatCompletion.create_async(model=g4f.models.default, messages=[{"role": "user", "content": prompt}])
-            return respuesta_ia or "No he podido procesar eso. Intenta de nuevo."
+            respuesta_ia = await self.cache_charla.obtener(self._clave_cache(mensajes), self.gobernador.firma, lambda: self.gobernador.completar(mensajes))
         except Exception as e:
-            print(f"🚨 Error en la llamada a g4f: {e}")
+            print(f"🚨 Error en la llamada al proveedor LLM: {e}")
             return "Mi núcleo cognitivo tuvo una sobrecarga. Inténtalo de nuevo."
+        if not respuesta_ia:
+            return "No he podido procesar eso. Intenta de nuevo."
+        self.contexto_charla.anotar(clave, comando, respuesta_ia)
+        return respuesta_ia
+
+    async def _fluir_charla_ia(self, comando, clave, mensajes):
+        """Como '_gestionar_charla_ia', pero entrega la respuesta del LLM a medida que llega."""
+        en_cache = self.cache_charla.buscar(self._clave_cache(mensajes), self.gobernador.firma)
+        if en_cache is not None:
+            self.contexto_charla.anotar(clave, comando, en_cache)
+            yield en_cache
+            return
+
+        partes = []
+        try:
+            async for fragmento in self.gobernador.fluir(mensajes):
+                partes.append(fragmento)
+                yield fragmento
+        except Exception as e:
+            print(f"🚨 Error en la llamada al proveedor LLM: {e}")
+            yield ("\n\n" if partes else "") + "Mi núcleo cognitivo tuvo una sobrecarga. Inténtalo de nuevo."
+            return
+
+        if partes:
+            self.cache_charla.guardar(self._clave_cache(mensajes), self.gobernador.firma, "".join(partes))
+            self.contexto_charla.anotar(clave, comando, "".join(partes))
+        else:
+            yield "No he podido procesar eso. Intenta de nuevo."
+
+    def estadisticas(self):
+        """Contadores de tiempo de ejecución del Guardián."""
+        return {
+            "cache_charla": self.cache_charla.estadisticas(),
+            "contexto_charla": self.contexto_charla.estadisticas(),
+            "proveedores_llm": self.gobernador.estadisticas(),
+            "usuarios_en_memoria": len(self.memorias.usuarios_calientes()),
+            "escritura_diferida": self.memorias.escritor.estadisticas() if self.memorias.escritor else None,
+            "avisos": avisador_compartido().estadisticas(),
+        }
+
+    def cerrar(self):
+        """Cierre ordenado: vuelca a disco toda la memoria pendiente."""
+        self.memorias.cerrar_todo()
+
+    @contextmanager
+    def _memoria_de_peticion(self, datos):
+        """Activa la memoria del usuario de la petición ('usuario_id') en el contexto actual."""
+        with self.memorias.usar(datos.get("usuario_id")) as memoria:
+            token = _memoria_activa.set(memoria)
+            try:
+                yield memoria
+            finally:
+                _memoria_activa.reset(token)
 
     async def ejecutar(self, datos):
+        with self._memoria_de_peticion(datos) as memoria:
+            respuesta = self._resolver_turno_medido(datos)
+            if respuesta is not None:
+                return respuesta
+            # El contexto se arma con la memoria activa; la llamada al LLM se espera fuera.
+            clave, mensajes = self._preparar_charla(datos, memoria)
+
+        # --- MODO CHARLA POR DEFECTO ---
+        comando = datos.get("comando", "").strip()
+        respuesta_conversacional = await self._gestionar_charla_ia(comando, clave, mensajes)
+        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": respuesta_conversacional}
+
+    async def ejecutar_flujo(self, datos):
+        """
+        Variante en streaming de 'ejecutar'. Produce marcos:
+        {"tipo": "fragmento", "texto": ...} mientras el LLM genera la charla y
+        siempre un último {"tipo": "final", "nuevo_estado": ..., "mensaje_para_ui": ...}.
+        Los turnos de los modos Ticket/Diseño producen solo el marco final.
+        """
+        with self._memoria_de_peticion(datos) as memoria:
+            respuesta = self._resolver_turno_medido(datos)
+            if respuesta is None:
+                clave, mensajes = self._preparar_charla(datos, memoria)
+        if respuesta is not None:
+            yield {"tipo": "final", **respuesta}
+            return
+
+        comando = datos.get("comando", "").strip()
+        partes = []
+        async for fragmento in self._fluir_charla_ia(comando, clave, mensajes):
+            partes.append(fragmento)
+            yield {"tipo": "fragmento", "texto": fragmento}
+        yield {"tipo": "final", "nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "".join(partes)}
+
+    def carril(self, datos):
+        """
+        Carril de admisión del turno (ver admision.py), sin ejecutarlo:
+        'local' si lo resuelve '_resolver_turno' (modos activos, activación,
+        consultas al archivo) y 'remoto' si acabará en la charla con el LLM.
+        """
+        estado = datos.get("estado_conversacion") or {"modo": "libre"}
+        comando_lower = datos.get("comando", "").strip().lower()
+        if comando_lower in ("cancelar", "_saludo_inicial_"):
+            return "local"
+        if isinstance(estado, dict) and self.maquina.gestiona(estado):
+            return "local"
+        comando_partes = comando_lower.split()
+        if not comando_partes:
+            return "remoto"
+        if comando_partes[0] in self._palabras_consulta or self._pide_analitica(comando_partes) or self._pide_agenda(comando_partes):
+            return "local"
+        if comando_partes[0] in self.PALABRAS_ACTIVACION:
+            comando_sin_activar = " ".join(comando_partes[1:])
+            if comando_sin_activar.startswith("ticket") or self.clasificador.clasificar(comando_sin_activar) & {"diseno", "diseno_multiple"}:
+                return "local"
+        return "remoto"
+
+    def _resolver_turno_medido(self, datos):
+        modo = (datos.get("estado_conversacion") or {}).get("modo", "libre")
+        with LATENCIA_TURNO.con(modo).cronometrar():
+            return self._resolver_turno(datos)
+
+    def _resolver_turno(self, datos):
+        """
+        Resuelve los turnos deterministas (comandos universales, modos activos,
+        activación y consultas). Devuelve None si el turno es de charla libre.
+        """
         estado = datos.get("estado_conversacion", {"modo": "libre"})
         comando = datos.get("comando", "").strip()
         comando_lower = comando.lower()
@@ -471,36 +945,24 @@ class Guardian:
         if comando == "_SALUDO_INICIAL_":
             return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Guardián online. Para iniciar, di 'Crear [modo]'."}
 
-        # --- GESTIÓN DE MODOS ACTIVOS ---
-        if estado.get("estado_combo_padre"):
-            respuesta_diseno = self._gestionar_diseno(estado, comando)
-            if respuesta_diseno.get("evento") == "CONTRATO_COMBO_FORJADO":
-                estado_combo = estado["estado_combo_padre"]
-                estado_combo["evento"] = "CONTRATO_COMBO_FORJADO"
-                return self._gestionar_diseno_multiple(estado_combo, comando)
-            return respuesta_diseno
-
-        if estado.get("modo") == "diseño":
-            return self._gestionar_diseno(estado, comando)
-        
-        if estado.get("modo") == "diseno_multiple":
-            return self._gestionar_diseno_multiple(estado, comando)
-        
-        if estado.get("modo") == "ticket":
-            if estado.get("paso_ticket") == "ESPERANDO_DETALLES":
-                return self._emitir_ticket(comando)
-            elif estado.get("paso_ticket") == "ESPERANDO_ENCADENAR":
-                if any(palabra in comando_lower for palabra in self.PALABRAS_SI):
-                    nuevo_estado = {"modo": "ticket", "paso_ticket": "ESPERANDO_DETALLES"}
-                    return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Entendido. Describe la tarea para el siguiente ticket."}
-                else:
-                    return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Entendido. Guardián en espera."}
-            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": "Error en el flujo de Ticket. Reiniciando."}
+        # --- GESTIÓN DE MODOS ACTIVOS (Ticket, Diseño y Diseño Múltiple) ---
+        if self.maquina.gestiona(estado):
+            return self.maquina.avanzar(estado, comando)
 
         # --- LÓGICA DE ACTIVACIÓN DE MODOS (SOLO SI NO HAY UN MODO ACTIVO) ---
         comando_partes = comando_lower.split()
+        if comando_partes and comando_partes[0] in self.PALABRAS_LISTADO:
+            return self._listar_archivo(comando_lower)
+        if comando_partes and comando_partes[0] in self.PALABRAS_BUSQUEDA:
+            return self._buscar_archivo(comando)
+        if self._pide_analitica(comando_partes):
+            return self._consultar_analitica(comando_lower)
+        if self._pide_agenda(comando_partes):
+            return self._consultar_agenda()
+
         if comando_partes and comando_partes[0] in self.PALABRAS_ACTIVACION:
             comando_sin_activar = " ".join(comando_partes[1:])
+            intenciones = self.clasificador.clasificar(comando_sin_activar)
 
             # Prioridad 1: Ticket de Acción
             if comando_sin_activar.startswith("ticket"):
@@ -508,16 +970,15 @@ class Guardian:
                 return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Entendido. Modo Ticket de Acción iniciado. Describe la tarea a ejecutar."}
 
             # Prioridad 2: Diseño Múltiple
-            if any(palabra in comando_sin_activar for palabra in self.PALABRAS_DISENO_MULTIPLE):
-                return self._gestionar_diseno_multiple({"modo": "diseno_multiple"}, comando)
+            if "diseno_multiple" in intenciones:
+                return self.maquina.avanzar({"modo": "diseno_multiple"}, comando)
 
             # Prioridad 3: Diseño Simple (y recuperación por ID)
-            palabras_clave_diseno = ["diseño", "contrato", "forjar", "ruleta"]
-            if any(palabra in comando_sin_activar for palabra in palabras_clave_diseno):
-                match_id = re.search(r'([A-Z]{4,5}-[A-Z0-9]{4})', comando, re.IGNORECASE)
+            if "diseno" in intenciones:
+                match_id = PATRON_ID.search(comando)
                 if match_id:
-                    item_id = match_id.group(1).upper()
-                    item = self.archivador_contratos.get(item_id)
+                    item_id = normalizar(match_id.group(1))
+                    item = self._buscar_item(item_id)
                     if item:
                         if item.get("tipo") == "Ticket":
                             item_texto = (
@@ -545,5 +1006,4 @@ class Guardian:
                 return {"nuevo_estado": nuevo_estado, "mensaje_para_ui": "Modo Diseño activado. Define la misión."}
 
         # --- MODO CHARLA POR DEFECTO ---
-        respuesta_conversacional = await self._gestionar_charla_ia(comando)
-        return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": respuesta_conversacional}
+        return None
@@ -0,0 +1,128 @@
+# =================================================================
+# IDENTIFICADORES.PY (v1.0 - IDs Ordenables sin Colisiones)
+# =================================================================
+# Identificadores de tickets y contratos con la forma PREFIJO-TTTTTTTNSS:
+# - TTTTTTT: segundos desde EPOCA (2024-01-01 UTC) en base32 de Crockford
+#   (7 caracteres: más de mil años de margen).
+# - N: nodo (0-31) que generó el ID; distingue workers o servidores.
+# - SS: secuencia dentro del mismo segundo (1024 IDs por segundo y nodo;
+#   si se agota, el generador avanza al segundo siguiente).
+# Son monótonos: el orden alfabético es el orden de creación, así que un
+# rango por fecha de creación es un rango de IDs. El alfabeto de Crockford
+# no tiene I, L, O ni U, y al leer se aceptan minúsculas y las confusiones
+# típicas (I/L por 1, O por 0), de modo que se pueden teclear a mano.
+# Los IDs antiguos (PREFIJO + 4 caracteres al azar) siguen siendo válidos.
+
+import os
+import re
+import threading
+import time
+
+ALFABETO = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_VALORES = {caracter: valor for valor, caracter in enumerate(ALFABETO)}
+_VALORES.update({"I": 1, "L": 1, "O": 0})
+
+EPOCA = 1704067200  # 2024-01-01T00:00:00Z
+CARACTERES_TIEMPO = 7
+CARACTERES_SECUENCIA = 2
+MAX_NODO = len(ALFABETO) - 1
+MAX_SECUENCIA = len(ALFABETO) ** CARACTERES_SECUENCIA
+LONGITUD_SUFIJO = CARACTERES_TIEMPO + 1 + CARACTERES_SECUENCIA
+
+# Reconoce IDs antiguos (4 caracteres) y nuevos (10) dentro de un texto.
+PATRON_ID = re.compile(r'\b([A-Z]{4,5}-[A-Z0-9]{4,10})\b', re.IGNORECASE)
+
+
+def codificar(numero, ancho):
+    caracteres = []
+    for _ in range(ancho):
+        numero, resto = divmod(numero, len(ALFABETO))
+        caracteres.append(ALFABETO[resto])
+    if numero:
+        raise ValueError("El número no cabe en el ancho pedido.")
+    return "".join(reversed(caracteres))
+
+
+def decodificar(texto):
+    numero = 0
+    for caracter in texto.upper():
+        numero = numero * len(ALFABETO) + _VALORES[caracter]
+    return numero
+
+
+def componer(prefijo, segundo, nodo, secuencia):
+    """Arma el ID a partir de sus partes ('segundo' contado desde EPOCA)."""
+    return f"{prefijo}-{codificar(segundo, CARACTERES_TIEMPO)}{ALFABETO[nodo]}{codificar(secuencia, CARACTERES_SECUENCIA)}"
+
+
+def es_ordenable(identificador):
+    """True si el ID es del esquema nuevo (y no uno antiguo al azar)."""
+    _, _, sufijo = identificador.partition("-")
+    return len(sufijo) == LONGITUD_SUFIJO and all(caracter in _VALORES for caracter in sufijo.upper())
+
+
+def sufijo(identificador):
+    """El ID sin su prefijo de tipo: en los nuevos, ordenable por creación entre tickets y contratos."""
+    return identificador.partition("-")[2]
+
+
+def normalizar(identificador):
+    """Forma canónica de un ID tecleado: mayúsculas y, en los nuevos, I/L -> 1 y O -> 0."""
+    identificador = identificador.upper()
+    if not es_ordenable(identificador):
+        return identificador
+    prefijo, _, sufijo = identificador.partition("-")
+    return f"{prefijo}-{''.join(ALFABETO[_VALORES[caracter]] for caracter in sufijo)}"
+
+
+def instante(identificador):
+    """Momento de creación (epoch en segundos) de un ID nuevo, o None si es antiguo."""
+    if not es_ordenable(identificador):
+        return None
+    _, _, sufijo = identificador.partition("-")
+    return EPOCA + decodificar(sufijo[:CARACTERES_TIEMPO])
+
+
+def _nodo_por_defecto():
+    nodo = os.environ.get("ALE_NODO")
+    if nodo is not None:
+        return int(nodo) % (MAX_NODO + 1)
+    return os.getpid() % (MAX_NODO + 1)
+
+
+class GeneradorIds:
+    """Generador monótono por proceso. Seguro entre hilos."""
+    def __init__(self, nodo=None, reloj=time.time):
+        self.nodo = _nodo_por_defecto() if nodo is None else nodo
+        if not 0 <= self.nodo <= MAX_NODO:
+            raise ValueError(f"El nodo debe estar entre 0 y {MAX_NODO}.")
+        self._reloj = reloj
+        self._ultimo_segundo = -1
+        self._secuencia = 0
+        self._candado = threading.Lock()
+
+    def siguiente(self, prefijo):
+        with self._candado:
+            # Si el reloj retrocede se sigue desde el último segundo usado.
+            segundo = max(int(self._reloj()) - EPOCA, self._ultimo_segundo)
+            if segundo == self._ultimo_segundo:
+                self._secuencia += 1
+                if self._secuencia >= MAX_SECUENCIA:
+                    segundo += 1
+                    self._secuencia = 0
+            else:
+                self._secuencia = 0
+            self._ultimo_segundo = segundo
+            return componer(prefijo, segundo, self.nodo, self._secuencia)
+
+    def nuevo_id(self, prefijo, ocupado):
+        """
+        Devuelve un ID libre. 'ocupado(id)' es la comprobación O(1) contra el
+        archivador (diccionario o clave primaria de SQLite); solo hace falta
+        repetir si otro proceso con el mismo nodo o un reinicio con el reloj
+        atrasado ya usó ese ID.
+        """
+        while True:
+            identificador = self.siguiente(prefijo)
+            if not ocupado(identificador):
+                return identificador
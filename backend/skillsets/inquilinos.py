@@ -0,0 +1,350 @@
+# =================================================================
+# INQUILINOS.PY (v1.0 - Memoria por Usuario)
+# =================================================================
+# Cada usuario (inquilino) de la PWA tiene su propio fragmento de memoria:
+# su archivador, sus datos_usuario y su propio motor de almacenamiento.
+# - Carga perezosa: un usuario frío se carga del disco al llegar su primera petición.
+# - LRU acotado: solo 'capacidad' usuarios calientes viven en memoria; al
+#   desalojar a uno se vacía su almacenamiento a disco y el avisador suelta
+#   sus recordatorios en cuanto no le quede ninguno pendiente.
+# - Agrupación de escrituras: un lote de peticiones vuelca cada almacén una sola vez.
+#   Solo se agrupan las memorias que toca el propio lote (variable de contexto):
+#   las peticiones sueltas que llegan mientras tanto escriben como siempre.
+# - Las peticiones sin usuario usan el archivo histórico 'guardian_memory.json'.
+# - Precarga: una memoria puede empezar a cargarse en segundo plano (al arrancar).
+# - Escritura diferida: con un EscritorDiferido, las mutaciones no tocan el
+#   disco en la petición; el escritor las vuelca en segundo plano.
+# - Gestor compartido: todos los skillsets del proceso que leen la memoria de
+#   los usuarios usan el mismo gestor (cada archivador se carga una sola vez).
+# - Multiproceso (varios workers de gunicorn sobre los mismos archivos; activo
+#   por defecto, GUARDIAN_MULTIPROCESO=0 para un único proceso): cada
+#   petición empieza incorporando solo los cambios que escribieron los demás
+#   workers, y las escrituras van dentro de 'transaccion' (cerrojo de archivo
+#   exclusivo, ver almacenamiento.py). La escritura diferida no se usa: lo
+#   escrito por un worker tiene que estar en disco antes de soltar el cerrojo.
+
+import atexit
+import contextvars
+import copy
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metricas import REGISTRO
+
+from .almacenamiento import crear_almacen
+from .busqueda import texto_item
+from .escritor_diferido import EscritorDiferido
+from .recordatorios import olvidar_recordatorios, recordatorios_de
+
+ESCRITURAS_MEMORIA = REGISTRO.histograma(
+    "guardian_escritura_memoria_segundos", "Duración de las escrituras de memoria por motor y operación.", ["motor", "operacion"])
+ERRORES_MEMORIA = REGISTRO.contador(
+    "guardian_errores_memoria", "Errores de E/S al cargar o guardar la memoria.", ["operacion"])
+
+# Almacenes agrupados por el lote en curso ({usuario: almacén}); None fuera de un lote.
+_agrupacion_activa = contextvars.ContextVar("agrupacion_activa", default=None)
+
+USUARIO_POR_DEFECTO = "default"
+RUTA_MEMORIA_HISTORICA = "guardian_memory.json"
+
+DATOS_USUARIO_INICIALES = {
+    "racha_diaria": 0,
+    "fecha_ultima_racha": None,
+    "logros": []
+}
+
+
+class MemoriaUsuario:
+    """Estado en memoria de un usuario: su archivador, sus datos y su almacén."""
+    def __init__(self, usuario_id, almacen, archivador, datos_usuario):
+        self.usuario_id = usuario_id
+        self.almacen = almacen
+        self.archivador = archivador
+        self.datos_usuario = datos_usuario
+        self.en_uso = 0
+        # Los agregados de analítica se comprueban contra el archivador una vez por carga.
+        self.analitica_verificada = False
+        # Índice de búsqueda (busqueda.py): se abre en la primera búsqueda y se guarda al cerrar.
+        self.indice = None
+        # Registro de cambios para '/sync' (sincronizacion.py): se construye en la primera sincronización.
+        self.cambios = None
+        # Avisos pendientes (recordatorios.py): se construyen con el primer item que tiene hora de arranque.
+        self.recordatorios = None
+
+
+class GestorMemorias:
+    def __init__(self, ruta_por_defecto, carpeta, tipo_almacen, capacidad=128, escritor=None, columnar=False, multiproceso=False):
+        self.ruta_por_defecto = ruta_por_defecto
+        self.carpeta = carpeta
+        self.tipo_almacen = tipo_almacen
+        self.capacidad = max(1, capacidad)
+        # EscritorDiferido opcional: sin él cada mutación se escribe en la petición.
+        self.escritor = escritor
+        # Archivador en columnas (menos memoria por item; ver columnar.py).
+        self.columnar = columnar
+        # Otros procesos comparten los mismos archivos de memoria.
+        self.multiproceso = multiproceso
+        self._calientes = OrderedDict()
+        # Agrupaciones de escrituras abiertas (una por lote en curso): {usuario: almacén}.
+        self._agrupaciones = []
+        # Cargas en segundo plano (precargar): usuario -> Future con su MemoriaUsuario.
+        self._precargas = {}
+        self._candado_precargas = threading.Lock()
+
+    # --- RESOLUCIÓN DE FRAGMENTOS ---
+    @staticmethod
+    def normalizar_usuario(usuario_id):
+        usuario_id = str(usuario_id or "").strip()
+        if not usuario_id:
+            return USUARIO_POR_DEFECTO
+        if re.fullmatch(r'[A-Za-z0-9_-]{1,64}', usuario_id):
+            return usuario_id
+        # Cualquier otro identificador se convierte en un nombre de archivo seguro.
+        return hashlib.sha256(usuario_id.encode('utf-8')).hexdigest()[:32]
+
+    def ruta_memoria(self, usuario_id):
+        if usuario_id == USUARIO_POR_DEFECTO:
+            return self.ruta_por_defecto
+        return os.path.join(self.carpeta, f"{usuario_id}.json")
+
+    # --- CICLO DE VIDA ---
+    def _cargar(self, usuario_id):
+        ruta = self.ruta_memoria(usuario_id)
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        almacen = crear_almacen(self.tipo_almacen, ruta, columnar=self.columnar)
+        if self.multiproceso:
+            almacen.compartir_entre_procesos()
+        existia = almacen.existe()
+        try:
+            archivador, datos_usuario = almacen.cargar()
+            if existia:
+                print(f"      -> Memoria del Guardián cargada exitosamente (usuario '{usuario_id}').")
+        except (ValueError, IOError) as e:
+            ERRORES_MEMORIA.con("cargar").inc()
+            print(f"      -> 🚨 Error al cargar la memoria de '{usuario_id}': {e}. Se usará una memoria nueva.")
+            archivador, datos_usuario = almacen.apartar_y_cargar()
+        if self.escritor is not None and not self.multiproceso:
+            almacen.diferir_escrituras(self.escritor)
+        return MemoriaUsuario(usuario_id, almacen, archivador, datos_usuario or copy.deepcopy(DATOS_USUARIO_INICIALES))
+
+    def obtener(self, usuario_id):
+        """Devuelve la memoria del usuario, cargándola si está fría."""
+        usuario_id = self.normalizar_usuario(usuario_id)
+        memoria = self._calientes.get(usuario_id)
+        if memoria is None:
+            memoria = self._recoger_precarga(usuario_id) or self._cargar(usuario_id)
+            self._calientes[usuario_id] = memoria
+            self._desalojar()
+        else:
+            self._calientes.move_to_end(usuario_id)
+        agrupados = _agrupacion_activa.get()
+        if agrupados is not None and usuario_id not in agrupados:
+            memoria.almacen.iniciar_agrupacion()
+            agrupados[usuario_id] = memoria.almacen
+        return memoria
+
+    def precargar(self, usuario_id=None):
+        """
+        Empieza a cargar la memoria del usuario en un hilo aparte (p. ej. la
+        memoria histórica al arrancar el servidor). 'obtener' la recoge al
+        llegar la primera petición, esperando solo lo que quede de la carga.
+        """
+        usuario_id = self.normalizar_usuario(usuario_id)
+        with self._candado_precargas:
+            if usuario_id in self._calientes or usuario_id in self._precargas:
+                return
+            futuro = Future()
+            self._precargas[usuario_id] = futuro
+
+        def cargar():
+            try:
+                futuro.set_result(self._cargar(usuario_id))
+            except BaseException as e:
+                futuro.set_exception(e)
+
+        threading.Thread(target=cargar, name=f"memoria-{usuario_id}", daemon=True).start()
+
+    def _recoger_precarga(self, usuario_id):
+        with self._candado_precargas:
+            futuro = self._precargas.pop(usuario_id, None)
+        if futuro is None:
+            return None
+        try:
+            return futuro.result()
+        except Exception as e:
+            print(f"      -> 🚨 Falló la precarga de la memoria de '{usuario_id}': {e}. Se cargará de nuevo.")
+            return None
+
+    @contextmanager
+    def usar(self, usuario_id):
+        """Fija la memoria del usuario mientras dura una petición (no se puede desalojar)."""
+        memoria = self.obtener(usuario_id)
+        memoria.en_uso += 1
+        try:
+            if self.multiproceso:
+                self._incorporar(memoria, memoria.almacen.refrescar())
+            yield memoria
+        finally:
+            memoria.en_uso -= 1
+
+    @contextmanager
+    def transaccion(self, memoria):
+        """
+        Escrituras sobre la memoria que no deben pisar las de otros procesos:
+        al entrar, la memoria está al día; al salir, lo escrito ya está en
+        disco. Es reentrante y, sin multiproceso, no hace nada.
+        """
+        with memoria.almacen.transaccion() as novedades:
+            self._incorporar(memoria, novedades)
+            yield memoria
+
+    def _incorporar(self, memoria, novedades):
+        """Aplica a la memoria (índice, registro de cambios y avisos incluidos) lo que escribieron otros procesos."""
+        if novedades is None:
+            return
+        archivador, datos_usuario, ids = novedades
+        memoria.archivador = archivador
+        if datos_usuario is not None:
+            memoria.datos_usuario = datos_usuario
+        if ids is None:
+            # Recarga completa: el índice y el registro de cambios se rehacen al usarse.
+            memoria.indice = None
+            memoria.cambios = None
+            memoria.analitica_verificada = False
+            # Los avisos, en cambio, se vigilan sin que nadie los consulte: se rehacen ya.
+            if memoria.recordatorios is not None:
+                memoria.recordatorios = None
+                recordatorios_de(memoria)
+            return
+        for identificador in ids:
+            item = archivador.get(identificador)
+            if item is None:
+                continue
+            if memoria.indice is not None:
+                memoria.indice.agregar(identificador, texto_item(item))
+            if memoria.cambios is not None:
+                memoria.cambios.anotar(int(item.get("seq") or 0), identificador)
+            if memoria.recordatorios is not None:
+                memoria.recordatorios.agregar(item)
+
+    @contextmanager
+    def agrupar_escrituras(self):
+        """
+        Mientras dure, las mutaciones de los usuarios que toque este mismo
+        contexto (el lote y las tareas que lance) se acumulan en memoria; al
+        salir, cada uno de esos almacenes se vuelca con una sola escritura.
+        Las peticiones concurrentes de fuera del lote no se agrupan.
+        """
+        if _agrupacion_activa.get() is not None:
+            # Anidada en otra agrupación del mismo contexto: vuelca la exterior.
+            yield
+            return
+        agrupados = {}
+        token = _agrupacion_activa.set(agrupados)
+        self._agrupaciones.append(agrupados)
+        try:
+            yield
+        finally:
+            _agrupacion_activa.reset(token)
+            self._agrupaciones.remove(agrupados)
+            for usuario_id, almacen in agrupados.items():
+                try:
+                    with ESCRITURAS_MEMORIA.con(self.tipo_almacen, "volcar_lote").cronometrar():
+                        almacen.terminar_agrupacion()
+                except IOError as e:
+                    ERRORES_MEMORIA.con("volcar_lote").inc()
+                    print(f"      -> 🚨 Error crítico al guardar la memoria de '{usuario_id}': {e}")
+
+    def _desalojar(self):
+        # Se desaloja del menos reciente al más reciente, saltando los que están en uso.
+        for usuario_id in list(self._calientes):
+            if len(self._calientes) <= self.capacidad:
+                break
+            memoria = self._calientes[usuario_id]
+            if memoria.en_uso:
+                continue
+            del self._calientes[usuario_id]
+            for agrupados in self._agrupaciones:
+                agrupados.pop(usuario_id, None)
+            self._vaciar(memoria)
+
+    def _vaciar(self, memoria):
+        olvidar_recordatorios(memoria)
+        if memoria.indice is not None:
+            try:
+                memoria.indice.guardar()
+            except OSError as e:
+                # No es grave: al abrirlo de nuevo se concilia con el archivador.
+                print(f"      -> ⚠️ No se pudo guardar el índice de búsqueda de '{memoria.usuario_id}': {e}")
+        try:
+            with ESCRITURAS_MEMORIA.con(self.tipo_almacen, "cerrar").cronometrar():
+                memoria.almacen.cerrar()
+        except IOError as e:
+            ERRORES_MEMORIA.con("cerrar").inc()
+            print(f"      -> 🚨 Error al vaciar la memoria de '{memoria.usuario_id}': {e}")
+
+    def usuarios_calientes(self):
+        return list(self._calientes)
+
+    def cerrar_todo(self):
+        """Vuelca y cierra todas las memorias. Se puede llamar más de una vez."""
+        if self.escritor is not None:
+            self.escritor.detener()
+        for usuario_id in list(self._precargas):
+            memoria = self._recoger_precarga(usuario_id)
+            if memoria is not None:
+                self._vaciar(memoria)
+        while self._calientes:
+            _, memoria = self._calientes.popitem(last=False)
+            self._vaciar(memoria)
+
+
+# --- GESTOR COMPARTIDO POR PROCESO ---
+_gestor_compartido = None
+_candado_gestor = threading.Lock()
+
+
+def _multiproceso_configurado():
+    # Activado salvo que se desactive a mano: 'gunicorn -w N main:app' no deja
+    # ninguna variable que diga cuántos workers comparten los archivos.
+    valor = os.environ.get("GUARDIAN_MULTIPROCESO", "1")
+    return valor.strip().lower() not in ("0", "no", "false", "off")
+
+
+def gestor_compartido():
+    """
+    Devuelve el GestorMemorias del proceso (configurado con las variables
+    GUARDIAN_*), creándolo en la primera llamada. Se vacía a disco al salir.
+    GUARDIAN_ESCRITURA_DIFERIDA_MS=0 desactiva la escritura diferida,
+    GUARDIAN_ARCHIVADOR=columnar guarda los archivadores en columnas y
+    GUARDIAN_MULTIPROCESO=0 desactiva la coordinación entre workers (solo es
+    seguro con un único proceso; a cambio vuelve la escritura diferida).
+    """
+    global _gestor_compartido
+    with _candado_gestor:
+        if _gestor_compartido is None:
+            tipo_almacen = os.environ.get("GUARDIAN_ALMACEN", "diario")
+            intervalo_ms = float(os.environ.get("GUARDIAN_ESCRITURA_DIFERIDA_MS", "200"))
+            escritor = None
+            if intervalo_ms > 0:
+                escritor = EscritorDiferido(
+                    motor=tipo_almacen,
+                    intervalo_ms=intervalo_ms,
+                    max_mutaciones=int(os.environ.get("GUARDIAN_ESCRITURA_DIFERIDA_MUTACIONES", "64")),
+                )
+            _gestor_compartido = GestorMemorias(
+                ruta_por_defecto=RUTA_MEMORIA_HISTORICA,
+                carpeta=os.environ.get("GUARDIAN_MEMORIA_DIR", "guardian_memoria"),
+                tipo_almacen=tipo_almacen,
+                capacidad=int(os.environ.get("GUARDIAN_USUARIOS_EN_MEMORIA", "128")),
+                escritor=escritor,
+                columnar=os.environ.get("GUARDIAN_ARCHIVADOR", "dict").strip().lower() == "columnar",
+                multiproceso=_multiproceso_configurado(),
+            )
+            atexit.register(_gestor_compartido.cerrar_todo)
+    return _gestor_compartido
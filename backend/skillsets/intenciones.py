@@ -0,0 +1,57 @@
+# =================================================================
+# INTENCIONES.PY (v1.0 - Clasificador Compilado)
+# =================================================================
+# Sustituye los barridos 'any(palabra in comando ...)' por un único índice
+# construido una sola vez: {palabra o frase -> intenciones}.
+# - Una sola pasada por el mensaje (por palabras y sus n-gramas) devuelve
+#   TODAS las intenciones presentes; el coste depende de la longitud del
+#   mensaje, no del tamaño del vocabulario.
+# - Coincidencia por palabra completa: "si" ya no coincide dentro de "siempre"
+#   ni "no" dentro de "noche".
+# - Las intenciones declaradas 'por_prefijo' (las de activación: "contrato",
+#   "combo"...) reconocen también las palabras que empiezan por su vocabulario,
+#   de modo que "contratos", "combos" o "ruletas" siguen activando el modo.
+
+import re
+
+PATRON_PALABRA = re.compile(r'\w+')
+
+
+class ClasificadorIntenciones:
+    def __init__(self, vocabulario, por_prefijo=()):
+        """
+        'vocabulario' es un dict {intencion: [palabras o frases]}. Una misma
+        palabra puede pertenecer a varias intenciones (p. ej. "acepto").
+        Las palabras sueltas de las intenciones de 'por_prefijo' coinciden
+        también como comienzo de palabra ("contrato" -> "contratos").
+        """
+        indice, prefijos = {}, {}
+        for intencion, palabras in vocabulario.items():
+            for palabra in palabras:
+                clave = " ".join(PATRON_PALABRA.findall(palabra.lower()))
+                if clave:
+                    indice.setdefault(clave, set()).add(intencion)
+                    if intencion in por_prefijo and " " not in clave:
+                        prefijos.setdefault(clave, set()).add(intencion)
+        self._intenciones_por_frase = {clave: frozenset(intenciones) for clave, intenciones in indice.items()}
+        self._intenciones_por_prefijo = {clave: frozenset(intenciones) for clave, intenciones in prefijos.items()}
+        self._min_prefijo = min((len(clave) for clave in prefijos), default=0)
+        # Longitud (en palabras) de la frase más larga del vocabulario.
+        self._max_palabras = max((clave.count(" ") + 1 for clave in indice), default=0)
+
+    def clasificar(self, texto):
+        """Conjunto de intenciones presentes en 'texto' (vacío si ninguna)."""
+        intenciones = set()
+        palabras = PATRON_PALABRA.findall(texto.lower())
+        for inicio in range(len(palabras)):
+            for fin in range(inicio + 1, min(inicio + self._max_palabras, len(palabras)) + 1):
+                encontradas = self._intenciones_por_frase.get(" ".join(palabras[inicio:fin]))
+                if encontradas:
+                    intenciones |= encontradas
+        if self._intenciones_por_prefijo:
+            for palabra in palabras:
+                for longitud in range(self._min_prefijo, len(palabra)):
+                    encontradas = self._intenciones_por_prefijo.get(palabra[:longitud])
+                    if encontradas:
+                        intenciones |= encontradas
+        return intenciones
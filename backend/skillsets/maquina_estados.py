@@ -0,0 +1,215 @@
+# =================================================================
+# MAQUINA_ESTADOS.PY (v1.0 - Flujos Declarativos)
+# =================================================================
+# Motor de máquina de estados para los modos guiados del Guardián.
+# - Cada flujo (modo) declara sus pasos en una tabla {paso: Paso}: el paso
+#   actual se resuelve con una sola búsqueda en diccionario.
+# - Cada paso declara a qué pasos puede ir; una transición no declarada es
+#   un error del flujo y reinicia la conversación en vez de corromperla.
+# - Los flujos anidados (un Diseño dentro de un Combo) se apilan: el estado
+#   lleva el marco activo en el primer nivel y los marcos padre en 'pila'.
+#
+# Forma del estado (compatible con el protocolo anterior):
+#   {"modo": "diseño", "paso_diseno": "...", "datos_plan": {...},
+#    "pila": [{"modo": "diseno_multiple", "paso_combo": "...", "datos_combo": {...}}]}
+
+import copy
+
+
+class TransicionInvalida(Exception):
+    """Un manejador intentó ir a un paso que su tabla no declara."""
+    pass
+
+
+class Paso:
+    def __init__(self, nombre, manejador, destinos=(), al_retornar=None):
+        self.nombre = nombre
+        self.manejador = manejador
+        # Quedarse en el mismo paso siempre es válido.
+        self.destinos = frozenset(destinos) | {nombre}
+        self.al_retornar = al_retornar
+
+
+class Flujo:
+    def __init__(self, modo, campo_paso, campo_datos, paso_inicial, mensaje_error):
+        self.modo = modo
+        self.campo_paso = campo_paso
+        self.campo_datos = campo_datos
+        self.paso_inicial = paso_inicial
+        self.mensaje_error = mensaje_error
+        self.pasos = {}
+
+    def paso(self, nombre, manejador=None, destinos=(), al_retornar=None):
+        """
+        Registra un paso. 'manejador(turno)' atiende el comando del usuario;
+        'al_retornar(turno)' atiende la vuelta de un subflujo lanzado desde él.
+        """
+        self.pasos[nombre] = Paso(nombre, manejador, destinos, al_retornar)
+        return self
+
+    def marco(self, paso, datos):
+        marco = {"modo": self.modo, self.campo_paso: paso}
+        if self.campo_datos:
+            marco[self.campo_datos] = datos
+        return marco
+
+
+class Transicion:
+    """Resultado de un manejador; el motor lo valida y lo aplica."""
+    IR, SUBFLUJO, RETORNAR, TERMINAR = "ir", "subflujo", "retornar", "terminar"
+
+    def __init__(self, tipo, paso=None, mensaje=None, extra=None, subflujo=None, resultado=None):
+        self.tipo = tipo
+        self.paso = paso
+        self.mensaje = mensaje
+        self.extra = extra or {}
+        self.subflujo = subflujo
+        self.resultado = resultado
+
+
+class Turno:
+    """Lo que ve un manejador: el comando, los datos de su marco y los constructores de transiciones."""
+    def __init__(self, comando, datos, paso, anidado, clasificador, resultado_hijo=None):
+        self.comando = comando
+        self.comando_lower = comando.lower()
+        self.datos = datos
+        self.paso_actual = paso
+        self.anidado = anidado
+        self.resultado_hijo = resultado_hijo
+        self._clasificador = clasificador
+        self._intenciones = None
+
+    @property
+    def intenciones(self):
+        if self._intenciones is None:
+            self._intenciones = self._clasificador.clasificar(self.comando_lower) if self._clasificador else set()
+        return self._intenciones
+
+    def ir(self, paso, mensaje=None, **extra):
+        return Transicion(Transicion.IR, paso=paso, mensaje=mensaje, extra=extra)
+
+    def quedarse(self, mensaje):
+        return Transicion(Transicion.IR, paso=self.paso_actual, mensaje=mensaje)
+
+    def ruleta(self, paso, opciones):
+        return Transicion(Transicion.IR, paso=paso, extra={"accion_ui": "MOSTRAR_RULETA", "opciones_ruleta": opciones})
+
+    def subflujo(self, paso_espera, modo, paso, datos, mensaje):
+        """Apila el marco actual (esperando en 'paso_espera') y entra en otro flujo."""
+        return Transicion(Transicion.SUBFLUJO, paso=paso_espera, mensaje=mensaje, subflujo=(modo, paso, datos))
+
+    def retornar(self, mensaje, resultado=None):
+        """Termina este flujo y devuelve el control (y un resultado) al marco padre."""
+        return Transicion(Transicion.RETORNAR, mensaje=mensaje, resultado=resultado)
+
+    def terminar(self, mensaje):
+        """Termina toda la conversación guiada: vuelta al modo libre."""
+        return Transicion(Transicion.TERMINAR, mensaje=mensaje)
+
+
+class MaquinaEstados:
+    def __init__(self, clasificador=None):
+        self._flujos = {}
+        self._clasificador = clasificador
+
+    def flujo(self, modo, campo_paso, campo_datos, paso_inicial, mensaje_error):
+        """Registra un flujo ('campo_datos' puede ser None si el flujo no guarda datos)."""
+        flujo = Flujo(modo, campo_paso, campo_datos, paso_inicial, mensaje_error)
+        self._flujos[modo] = flujo
+        return flujo
+
+    def gestiona(self, estado):
+        return estado.get("modo") in self._flujos
+
+    # --- ESTADO <-> PILA DE MARCOS ---
+    def _pila(self, estado):
+        """Lista de marcos (el último es el activo) a partir del estado del cliente."""
+        pila = [copy.deepcopy(marco) for marco in estado.get("pila", [])]
+        # Conversión del formato anterior: un único padre en 'estado_combo_padre'.
+        padre = estado.get("estado_combo_padre")
+        if padre and not pila:
+            padre = {clave: valor for clave, valor in padre.items() if clave != "evento"}
+            padre["paso_combo"] = "CONFIGURANDO_CONTRATO"
+            pila.append(copy.deepcopy(padre))
+        activo = {clave: copy.deepcopy(valor) for clave, valor in estado.items() if clave not in ("pila", "estado_combo_padre")}
+        pila.append(activo)
+        return pila
+
+    @staticmethod
+    def _estado(pila):
+        if not pila:
+            return {"modo": "libre"}
+        estado = dict(pila[-1])
+        if len(pila) > 1:
+            estado["pila"] = pila[:-1]
+        return estado
+
+    # --- EJECUCIÓN ---
+    def avanzar(self, estado, comando):
+        """Atiende un turno del usuario y devuelve la respuesta con su 'nuevo_estado'."""
+        pila = self._pila(estado)
+        flujo = self._flujos[pila[-1]["modo"]]
+        try:
+            flujo, paso = self._resolver_paso(pila[-1])
+            if paso.manejador is None:
+                raise TransicionInvalida(f"el paso '{paso.nombre}' no atiende comandos")
+            turno = self._turno(pila, flujo, paso, comando)
+            mensajes = []
+            respuesta = self._aplicar(pila, flujo, paso, paso.manejador(turno), comando, mensajes)
+        except TransicionInvalida as e:
+            print(f"🚨 Flujo '{flujo.modo}' inválido: {e}")
+            return {"nuevo_estado": {"modo": "libre"}, "mensaje_para_ui": flujo.mensaje_error}
+        if mensajes:
+            respuesta["mensaje_para_ui"] = "\n\n".join(mensajes)
+        respuesta["nuevo_estado"] = self._estado(pila)
+        return respuesta
+
+    def _resolver_paso(self, marco):
+        flujo = self._flujos.get(marco.get("modo"))
+        if flujo is None:
+            raise TransicionInvalida(f"modo desconocido '{marco.get('modo')}'")
+        nombre = marco.get(flujo.campo_paso) or flujo.paso_inicial
+        paso = flujo.pasos.get(nombre)
+        if paso is None:
+            raise TransicionInvalida(f"paso desconocido '{nombre}'")
+        marco[flujo.campo_paso] = nombre
+        if flujo.campo_datos:
+            marco.setdefault(flujo.campo_datos, {})
+        return flujo, paso
+
+    def _turno(self, pila, flujo, paso, comando, resultado_hijo=None):
+        datos = pila[-1][flujo.campo_datos] if flujo.campo_datos else None
+        return Turno(comando, datos, paso.nombre, len(pila) > 1, self._clasificador, resultado_hijo)
+
+    def _aplicar(self, pila, flujo, paso, transicion, comando, mensajes):
+        """Valida la transición y actualiza la pila. Devuelve los campos extra de la respuesta."""
+        if transicion.mensaje:
+            mensajes.append(transicion.mensaje)
+
+        if transicion.tipo == Transicion.TERMINAR:
+            pila.clear()
+            return dict(transicion.extra)
+
+        if transicion.tipo == Transicion.RETORNAR:
+            pila.pop()
+            if not pila:
+                return dict(transicion.extra)
+            flujo_padre, paso_padre = self._resolver_paso(pila[-1])
+            if paso_padre.al_retornar is None:
+                raise TransicionInvalida(f"el paso '{paso_padre.nombre}' no espera ningún subflujo")
+            turno = self._turno(pila, flujo_padre, paso_padre, comando, transicion.resultado)
+            return self._aplicar(pila, flujo_padre, paso_padre, paso_padre.al_retornar(turno), comando, mensajes)
+
+        if transicion.paso not in paso.destinos:
+            raise TransicionInvalida(f"'{paso.nombre}' -> '{transicion.paso}' no está declarada")
+        pila[-1][flujo.campo_paso] = transicion.paso
+
+        if transicion.tipo == Transicion.SUBFLUJO:
+            modo, paso_hijo, datos = transicion.subflujo
+            flujo_hijo = self._flujos.get(modo)
+            if flujo_hijo is None or paso_hijo not in flujo_hijo.pasos:
+                raise TransicionInvalida(f"subflujo desconocido '{modo}:{paso_hijo}'")
+            if flujo.pasos[transicion.paso].al_retornar is None:
+                raise TransicionInvalida(f"el paso '{transicion.paso}' no puede esperar un subflujo")
+            pila.append(flujo_hijo.marco(paso_hijo, datos))
+        return dict(transicion.extra)
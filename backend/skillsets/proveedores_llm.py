@@ -0,0 +1,396 @@
+# =================================================================
+# PROVEEDORES_LLM.PY (v1.0 - El Gobernador)
+# =================================================================
+# Capa entre el modo charla del Guardián y los proveedores LLM.
+# - Plazo por llamada: ninguna llamada espera más de 'plazo' segundos.
+# - Semáforos global y por proveedor: limitan las llamadas en vuelo.
+# - Disyuntor por proveedor: tras 'umbral_fallos' fallos seguidos se abre y
+#   falla al instante (el Guardián responde con su mensaje de "sobrecarga")
+#   hasta que pasa el 'enfriamiento' y se deja pasar una llamada de prueba.
+# - Cobertura (hedging): si el primer proveedor no respondió tras
+#   'umbral_cobertura' segundos se lanza el siguiente y gana el primero.
+# - ProveedorFalso: proveedor local con latencia y tasa de fallos
+#   configurables, para pruebas de carga y desarrollo sin red.
+# - g4f se importa en la primera llamada de charla, no al arrancar el servidor.
+
+import asyncio
+import importlib
+import random
+import time
+
+from metricas import REGISTRO
+
+LATENCIA_LLM = REGISTRO.histograma(
+    "llm_llamada_segundos", "Duración de cada llamada a un proveedor LLM, por resultado.", ["proveedor", "resultado"])
+PRIMER_FRAGMENTO_LLM = REGISTRO.histograma(
+    "llm_primer_fragmento_segundos", "Espera hasta el primer fragmento en streaming.", ["proveedor"])
+COBERTURAS_LLM = REGISTRO.contador("llm_coberturas", "Llamadas de cobertura lanzadas por lentitud del proveedor anterior.")
+RECHAZOS_LLM = REGISTRO.contador("llm_rechazos_rapidos", "Peticiones rechazadas al instante con todos los disyuntores abiertos.")
+# 0 = cerrado, 1 = semiabierto, 2 = abierto.
+VALOR_DISYUNTOR = {"cerrado": 0, "semiabierto": 1, "abierto": 2}
+
+class ErrorProveedor(Exception):
+    """Fallo de un proveedor LLM (excepción, respuesta vacía o plazo agotado)."""
+
+
+class SinProveedorDisponible(ErrorProveedor):
+    """Todos los disyuntores están abiertos o no hay capacidad dentro del plazo."""
+
+
+# --- PROVEEDORES ---
+_modulo_g4f = None
+
+async def _g4f():
+    """Importa g4f (y su gran árbol de proveedores) la primera vez que se usa, no al arrancar."""
+    global _modulo_g4f
+    if _modulo_g4f is None:
+        # La primera importación tarda: se hace fuera del bucle de eventos.
+        _modulo_g4f = await asyncio.to_thread(importlib.import_module, "g4f")
+    return _modulo_g4f
+
+
+class ProveedorG4F:
+    def __init__(self, nombre, modelo="default", proveedor=None):
+        self.nombre = nombre
+        self.modelo = modelo
+        self.proveedor = proveedor
+
+    def _modelo_g4f(self, g4f):
+        return g4f.models.default if self.modelo == "default" else self.modelo
+
+    async def completar(self, mensajes):
+        g4f = await _g4f()
+        return await g4f.ChatCompletion.create_async(model=self._modelo_g4f(g4f), messages=mensajes, provider=self.proveedor)
+
+    async def fluir(self, mensajes):
+        g4f = await _g4f()
+        flujo = g4f.ChatCompletion.create_async(model=self._modelo_g4f(g4f), messages=mensajes, provider=self.proveedor, stream=True)
+        async for fragmento in flujo:
+            # g4f intercala objetos de control (motivo de fin, uso...) entre el texto.
+            if isinstance(fragmento, str) and fragmento:
+                yield fragmento
+
+
+class ProveedorFalso:
+    """
+    Proveedor local sin red. Tarda 'latencia' ± 'variacion' segundos y falla
+    con probabilidad 'tasa_fallos'. Con 'colgado=True' nunca responde.
+    """
+    def __init__(self, nombre="falso", latencia=0.2, variacion=0.0, tasa_fallos=0.0, colgado=False, semilla=None):
+        self.nombre = nombre
+        self.latencia = latencia
+        self.variacion = variacion
+        self.tasa_fallos = tasa_fallos
+        self.colgado = colgado
+        self.llamadas = 0
+        self._azar = random.Random(semilla)
+
+    def _espera(self):
+        return max(0.0, self.latencia + self._azar.uniform(-self.variacion, self.variacion))
+
+    def _respuesta(self, mensajes):
+        return f"[{self.nombre}] Sigue adelante. Has dicho: {mensajes[-1]['content'][-60:]}"
+
+    async def completar(self, mensajes):
+        self.llamadas += 1
+        if self.colgado:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self._espera())
+        if self._azar.random() < self.tasa_fallos:
+            raise ErrorProveedor(f"Fallo simulado en '{self.nombre}'.")
+        return self._respuesta(mensajes)
+
+    async def fluir(self, mensajes):
+        respuesta = await self.completar(mensajes)
+        for palabra in respuesta.split(" "):
+            await asyncio.sleep(0)
+            yield palabra + " "
+
+
+def crear_proveedores(especificacion):
+    """
+    Construye la lista de proveedores desde una cadena como
+    'g4f:default,g4f:gpt-4o-mini' o 'falso:0.3:0.1' (latencia:tasa_fallos).
+    """
+    proveedores = []
+    for i, entrada in enumerate(e.strip() for e in especificacion.split(",") if e.strip()):
+        tipo, _, resto = entrada.partition(":")
+        if tipo == "g4f":
+            proveedores.append(ProveedorG4F(f"g4f-{resto or 'default'}", modelo=resto or "default"))
+        elif tipo == "falso":
+            partes = [float(p) for p in resto.split(":") if p]
+            latencia = partes[0] if partes else 0.2
+            tasa_fallos = partes[1] if len(partes) > 1 else 0.0
+            proveedores.append(ProveedorFalso(f"falso-{i}", latencia=latencia, tasa_fallos=tasa_fallos))
+        else:
+            raise ValueError(f"Proveedor LLM desconocido: '{entrada}'.")
+    if not proveedores:
+        raise ValueError("Se necesita al menos un proveedor LLM.")
+    return proveedores
+
+
+# --- DISYUNTOR ---
+class Disyuntor:
+    CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+
+    def __init__(self, umbral_fallos=5, enfriamiento=30.0):
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self.estado = self.CERRADO
+        self.fallos_seguidos = 0
+        self._reabre_en = 0.0
+        self._probando = False
+
+    def disponible(self):
+        """Consulta sin efectos: ¿dejaría pasar una llamada ahora?"""
+        if self.estado == self.CERRADO:
+            return True
+        if self.estado == self.ABIERTO:
+            return time.monotonic() >= self._reabre_en
+        return not self._probando
+
+    def permite(self):
+        """Autoriza una llamada; en semiabierto solo deja pasar una prueba a la vez."""
+        if self.estado == self.CERRADO:
+            return True
+        if self.estado == self.ABIERTO and time.monotonic() >= self._reabre_en:
+            self.estado = self.SEMIABIERTO
+        if self.estado == self.SEMIABIERTO and not self._probando:
+            self._probando = True
+            return True
+        return False
+
+    def registrar_exito(self):
+        self.estado = self.CERRADO
+        self.fallos_seguidos = 0
+        self._probando = False
+
+    def registrar_fallo(self):
+        self.fallos_seguidos += 1
+        self._probando = False
+        if self.estado == self.SEMIABIERTO or self.fallos_seguidos >= self.umbral_fallos:
+            self.estado = self.ABIERTO
+            self._reabre_en = time.monotonic() + self.enfriamiento
+
+    def liberar_prueba(self):
+        """La llamada de prueba se canceló sin resultado: se permite otra."""
+        self._probando = False
+
+
+# --- GOBERNADOR ---
+class GobernadorLLM:
+    def __init__(self, proveedores, plazo=25.0, max_en_vuelo=64, max_por_proveedor=16,
+                 umbral_fallos=5, enfriamiento=30.0, umbral_cobertura=6.0, plazo_fragmento=15.0):
+        self.proveedores = proveedores
+        self.plazo = plazo
+        self.umbral_cobertura = umbral_cobertura
+        self.plazo_fragmento = plazo_fragmento
+        self._global = asyncio.Semaphore(max_en_vuelo)
+        self._semaforos = {p.nombre: asyncio.Semaphore(max_por_proveedor) for p in proveedores}
+        self._disyuntores = {p.nombre: Disyuntor(umbral_fallos, enfriamiento) for p in proveedores}
+        self._contadores = {p.nombre: {"llamadas": 0, "exitos": 0, "fallos": 0, "plazos_agotados": 0, "en_vuelo": 0} for p in proveedores}
+        self.en_vuelo = 0
+        self.coberturas = 0
+        self.rechazos_rapidos = 0
+        # Medidores leídos en el momento del scrape de /metrics.
+        REGISTRO.medidor("llm_en_vuelo", "Llamadas LLM en curso.").con().leer_de(lambda: self.en_vuelo)
+        disyuntores = REGISTRO.medidor("llm_disyuntor_estado", "Estado del disyuntor (0 cerrado, 1 semiabierto, 2 abierto).", ["proveedor"])
+        for nombre, disyuntor in self._disyuntores.items():
+            disyuntores.con(nombre).leer_de(lambda d=disyuntor: VALOR_DISYUNTOR[d.estado])
+
+    @property
+    def firma(self):
+        """Identifica la cadena de proveedores (se usa como 'modelo' en la caché de charla)."""
+        return "+".join(p.nombre for p in self.proveedores)
+
+    def _disponibles(self):
+        return [p for p in self.proveedores if self._disyuntores[p.nombre].disponible()]
+
+    async def _adquirir(self, semaforo, limite):
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            raise SinProveedorDisponible("Plazo agotado esperando capacidad.")
+        try:
+            await asyncio.wait_for(semaforo.acquire(), timeout=restante)
+        except asyncio.TimeoutError:
+            raise SinProveedorDisponible("Plazo agotado esperando capacidad.")
+
+    async def _llamar(self, proveedor, mensajes, limite):
+        disyuntor = self._disyuntores[proveedor.nombre]
+        contador = self._contadores[proveedor.nombre]
+        semaforo = self._semaforos[proveedor.nombre]
+        if not disyuntor.permite():
+            raise SinProveedorDisponible(f"'{proveedor.nombre}' está en pausa (disyuntor abierto).")
+        try:
+            await self._adquirir(semaforo, limite)
+        except SinProveedorDisponible:
+            disyuntor.liberar_prueba()
+            raise
+        contador["llamadas"] += 1
+        contador["en_vuelo"] += 1
+        inicio = time.perf_counter()
+        resultado = "exito"
+        try:
+            respuesta = await asyncio.wait_for(proveedor.completar(mensajes), timeout=max(0.0, limite - time.monotonic()))
+            if not respuesta:
+                raise ErrorProveedor(f"Respuesta vacía de '{proveedor.nombre}'.")
+        except asyncio.CancelledError:
+            # Perdió la carrera de cobertura: no es un fallo del proveedor.
+            resultado = "cancelada"
+            disyuntor.liberar_prueba()
+            raise
+        except asyncio.TimeoutError:
+            resultado = "plazo_agotado"
+            contador["plazos_agotados"] += 1
+            contador["fallos"] += 1
+            disyuntor.registrar_fallo()
+            raise ErrorProveedor(f"'{proveedor.nombre}' no respondió dentro del plazo.")
+        except Exception:
+            resultado = "fallo"
+            contador["fallos"] += 1
+            disyuntor.registrar_fallo()
+            raise
+        finally:
+            contador["en_vuelo"] -= 1
+            semaforo.release()
+            LATENCIA_LLM.con(proveedor.nombre, resultado).observar(time.perf_counter() - inicio)
+        contador["exitos"] += 1
+        disyuntor.registrar_exito()
+        return respuesta
+
+    async def completar(self, mensajes):
+        """Respuesta completa del primer proveedor que conteste dentro del plazo."""
+        limite = time.monotonic() + self.plazo
+        candidatos = self._disponibles()
+        if not candidatos:
+            self.rechazos_rapidos += 1
+            RECHAZOS_LLM.inc()
+            raise SinProveedorDisponible("Todos los proveedores LLM están en pausa (disyuntor abierto).")
+
+        await self._adquirir(self._global, limite)
+        self.en_vuelo += 1
+        tareas = {}
+        ultimo_error = None
+        try:
+            def lanzar_siguiente():
+                proveedor = candidatos.pop(0)
+                tareas[asyncio.ensure_future(self._llamar(proveedor, mensajes, limite))] = proveedor
+
+            lanzar_siguiente()
+            while tareas:
+                restante = limite - time.monotonic()
+                espera = min(self.umbral_cobertura, restante) if candidatos else restante
+                hechas, _ = await asyncio.wait(tareas, timeout=max(0.0, espera), return_when=asyncio.FIRST_COMPLETED)
+                if not hechas:
+                    if candidatos and limite - time.monotonic() > 0:
+                        # El proveedor en curso va lento: cubrimos con el siguiente.
+                        self.coberturas += 1
+                        COBERTURAS_LLM.inc()
+                        lanzar_siguiente()
+                        continue
+                    break
+                for tarea in hechas:
+                    del tareas[tarea]
+                    try:
+                        return tarea.result()
+                    except Exception as e:
+                        ultimo_error = e
+                if not tareas and candidatos:
+                    lanzar_siguiente()
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            self.en_vuelo -= 1
+            self._global.release()
+        raise ultimo_error or ErrorProveedor("Ningún proveedor respondió dentro del plazo.")
+
+    async def fluir(self, mensajes):
+        """
+        Versión en streaming: plazo por fragmento y paso al siguiente proveedor
+        solo si el actual falla antes de emitir texto (sin cobertura).
+        """
+        limite = time.monotonic() + self.plazo
+        candidatos = self._disponibles()
+        if not candidatos:
+            self.rechazos_rapidos += 1
+            RECHAZOS_LLM.inc()
+            raise SinProveedorDisponible("Todos los proveedores LLM están en pausa (disyuntor abierto).")
+
+        await self._adquirir(self._global, limite)
+        self.en_vuelo += 1
+        ultimo_error = None
+        try:
+            for proveedor in candidatos:
+                disyuntor = self._disyuntores[proveedor.nombre]
+                contador = self._contadores[proveedor.nombre]
+                semaforo = self._semaforos[proveedor.nombre]
+                if not disyuntor.permite():
+                    continue
+                try:
+                    await self._adquirir(semaforo, limite)
+                except SinProveedorDisponible as e:
+                    disyuntor.liberar_prueba()
+                    ultimo_error = e
+                    break
+                contador["llamadas"] += 1
+                contador["en_vuelo"] += 1
+                emitido = False
+                flujo = proveedor.fluir(mensajes)
+                inicio = time.perf_counter()
+                resultado = "exito"
+                try:
+                    while True:
+                        # Hasta el primer fragmento rige el plazo total; después, el plazo entre fragmentos.
+                        espera = self.plazo_fragmento if emitido else max(0.0, limite - time.monotonic())
+                        try:
+                            fragmento = await asyncio.wait_for(flujo.__anext__(), timeout=espera)
+                        except StopAsyncIteration:
+                            break
+                        if not emitido:
+                            PRIMER_FRAGMENTO_LLM.con(proveedor.nombre).observar(time.perf_counter() - inicio)
+                        emitido = True
+                        yield fragmento
+                except asyncio.CancelledError:
+                    resultado = "cancelada"
+                    disyuntor.liberar_prueba()
+                    raise
+                except GeneratorExit:
+                    # El cliente dejó de leer: no es un fallo del proveedor.
+                    resultado = "cancelada"
+                    disyuntor.liberar_prueba()
+                    raise
+                except Exception as e:
+                    resultado = "fallo"
+                    if isinstance(e, asyncio.TimeoutError):
+                        resultado = "plazo_agotado"
+                        contador["plazos_agotados"] += 1
+                        e = ErrorProveedor(f"'{proveedor.nombre}' no respondió dentro del plazo.")
+                    contador["fallos"] += 1
+                    disyuntor.registrar_fallo()
+                    ultimo_error = e
+                    if emitido:
+                        raise e
+                    continue
+                finally:
+                    contador["en_vuelo"] -= 1
+                    semaforo.release()
+                    LATENCIA_LLM.con(proveedor.nombre, resultado).observar(time.perf_counter() - inicio)
+                    await flujo.aclose()
+                contador["exitos"] += 1
+                disyuntor.registrar_exito()
+                return
+        finally:
+            self.en_vuelo -= 1
+            self._global.release()
+        raise ultimo_error or ErrorProveedor("Ningún proveedor respondió dentro del plazo.")
+
+    def estadisticas(self):
+        return {
+            "en_vuelo": self.en_vuelo,
+            "coberturas": self.coberturas,
+            "rechazos_rapidos": self.rechazos_rapidos,
+            "proveedores": {
+                p.nombre: {**self._contadores[p.nombre], "disyuntor": self._disyuntores[p.nombre].estado}
+                for p in self.proveedores
+            },
+        }
@@ -0,0 +1,372 @@
+# =================================================================
+# RECORDATORIOS.PY (v1.0 - Agenda de Arranques y Avisos)
+# =================================================================
+# Avisa a la PWA cuando empieza (y cuando termina) un ticket o contrato.
+# - El 'arranque' ("14:30", "a las 9", "mañana 8:15", "en 20 min", "ahora")
+#   y la 'duracion' se interpretan una sola vez, al crear el item, y quedan
+#   en el item como marcas de tiempo ('inicio' y 'fin', segundos Unix).
+# - RecordatoriosUsuario: montículo con los avisos pendientes de un usuario.
+#   Se construye al primer uso por carga de memoria (como el índice de
+#   búsqueda) y solo contiene lo que aún no pasó, no el archivador entero:
+#   "¿qué viene ahora?" es leer la cima del montículo.
+# - Avisador: uno por proceso. Un hilo duerme hasta el siguiente aviso de
+#   cualquier usuario (otro montículo, con la próxima marca de cada uno),
+#   saca los vencidos en O(log n) y los entrega a los suscriptores del
+#   usuario (endpoint '/eventos', Server-Sent Events). Los últimos avisos
+#   se recuerdan para repetirlos a quien se reconecta.
+
+import heapq
+import itertools
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import pytz
+
+from .analitica import minutos_de
+from .busqueda import texto_item
+
+ZONA_HORARIA = pytz.timezone("America/Montevideo")
+
+# Avisos recordados por usuario y antigüedad máxima para repetirlos a un cliente sin 'Last-Event-ID'.
+MAX_AVISOS_RECIENTES = 32
+VENTANA_REPETICION_S = 300
+# Items de los últimos días que se miran al cargar un usuario para programar sus avisos.
+MAX_ITEMS_AGENDA = 256
+# Cada cuánto se manda un comentario por '/eventos' para que proxies y navegadores no corten la conexión.
+INTERVALO_LATIDO_S = 25
+LATIDO_SSE = ": latido\n\n"
+# Un arranque escrito con la hora de hace un momento ("ahora son las 14:30") sigue siendo hoy.
+TOLERANCIA_PASADO_S = 60
+
+SIN_ARRANQUE = frozenset({"", "no definido", "no definida", "n/a", "na", "-", "ninguno", "nada"})
+PATRON_RELATIVO = re.compile(r'\ben\s+(\d+)\s*(min(?:uto)?s?|h(?:ora)?s?)\b')
+PATRON_HORA_MINUTOS = re.compile(r'\b([01]?\d|2[0-3])\s*[:.h]\s*([0-5]\d)\b')
+PATRON_HORA_SOLA = re.compile(
+    r'(?:\ba las\s+([01]?\d|2[0-3])\b|\b([01]?\d|2[0-3])\s*(?:h|hs|horas)\b|\b([01]?\d|2[0-3])\s+de la\b|^([01]?\d|2[0-3])$)')
+
+
+# --- INTERPRETACIÓN DEL ARRANQUE ---
+def interpretar_arranque(texto, ahora):
+    """
+    Momento (datetime con zona) en que arranca un item, o None si el texto no
+    dice cuándo. Una hora sin día es la próxima vez que llegue esa hora.
+    """
+    texto = " ".join(str(texto or "").lower().split())
+    if texto in SIN_ARRANQUE:
+        return None
+    if texto in ("ahora", "ya", "ahora mismo", "ya mismo", "inmediato", "inmediatamente"):
+        return ahora
+    relativo = PATRON_RELATIVO.search(texto)
+    if relativo:
+        cantidad, unidad = int(relativo.group(1)), relativo.group(2)
+        return ahora + (timedelta(hours=cantidad) if unidad.startswith("h") else timedelta(minutes=cantidad))
+
+    tarde = "de la tarde" in texto or "de la noche" in texto or " pm" in f" {texto}"
+    sin_franja = texto.replace("de la mañana", "")
+    dias = 2 if "pasado mañana" in sin_franja else 1 if "mañana" in sin_franja else 0
+
+    hora_minutos = PATRON_HORA_MINUTOS.search(texto)
+    if hora_minutos:
+        hora, minuto = int(hora_minutos.group(1)), int(hora_minutos.group(2))
+    else:
+        hora_sola = PATRON_HORA_SOLA.search(texto)
+        if not hora_sola:
+            return None
+        hora, minuto = int(next(grupo for grupo in hora_sola.groups() if grupo)), 0
+    if tarde and hora < 12:
+        hora += 12
+
+    fecha = ahora.date() + timedelta(days=dias)
+    momento = ZONA_HORARIA.localize(datetime(fecha.year, fecha.month, fecha.day, hora, minuto))
+    if not dias and momento.timestamp() < ahora.timestamp() - TOLERANCIA_PASADO_S:
+        siguiente = fecha + timedelta(days=1)
+        momento = ZONA_HORARIA.localize(datetime(siguiente.year, siguiente.month, siguiente.day, hora, minuto))
+    return momento
+
+
+def marcar_tiempos(item, ahora):
+    """Añade al item 'inicio' y 'fin' (segundos Unix) si su arranque dice cuándo empieza."""
+    inicio = interpretar_arranque(item.get("arranque"), ahora)
+    if inicio is None:
+        return item
+    item["inicio"] = int(inicio.timestamp())
+    minutos = minutos_de(item)
+    if minutos:
+        item["fin"] = item["inicio"] + minutos * 60
+    return item
+
+
+def hora_local(marca):
+    return datetime.fromtimestamp(marca, ZONA_HORARIA)
+
+
+# --- AVISOS PENDIENTES DE UN USUARIO ---
+class RecordatoriosUsuario:
+    def __init__(self, usuario_id, avisador):
+        self.usuario_id = usuario_id
+        self._avisador = avisador
+        # Montículo de (marca, id, momento, título): momento es "inicio" o "fin".
+        self._pendientes = []
+        self._programados = set()
+        # Su memoria se desalojó: el avisador lo suelta en cuanto no le quede nada pendiente.
+        self.olvidado = False
+
+    def _anotar(self, item, ahora):
+        identificador = item.get("id")
+        for momento in ("inicio", "fin"):
+            marca = item.get(momento)
+            if not marca or marca < ahora - TOLERANCIA_PASADO_S or (identificador, momento) in self._programados:
+                continue
+            self._programados.add((identificador, momento))
+            heapq.heappush(self._pendientes, (marca, identificador, momento, texto_item(item)))
+
+    def agregar(self, item):
+        """Programa los avisos de un item nuevo (los ya programados no se repiten)."""
+        with self._avisador.condicion:
+            self._anotar(item, time.time())
+            self._avisador.despertar(self)
+
+    def _vencidos(self, ahora):
+        vencidos = []
+        while self._pendientes and self._pendientes[0][0] <= ahora:
+            aviso = heapq.heappop(self._pendientes)
+            self._programados.discard((aviso[1], aviso[2]))
+            vencidos.append(aviso)
+        return vencidos
+
+    def siguiente(self):
+        return self._pendientes[0][0] if self._pendientes else None
+
+    def proximos(self, limite=5):
+        """Los 'limite' avisos más cercanos aún no vencidos: [(marca, id, momento, título)]."""
+        with self._avisador.condicion:
+            return heapq.nsmallest(limite, self._pendientes)
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    @classmethod
+    def desde_almacen(cls, usuario_id, almacen, avisador):
+        """
+        Avisos pendientes de un usuario recién cargado. Un arranque cae como
+        mucho al día siguiente de crear el item: basta con los MAX_ITEMS_AGENDA
+        items más recientes de los últimos días (SQLite los saca por su índice
+        de fechas).
+        """
+        recordatorios = cls(usuario_id, avisador)
+        ahora = time.time()
+        desde = (hora_local(ahora) - timedelta(days=2)).strftime("%Y-%m-%d")
+        items, _ = almacen.consultar(desde=desde, limite=MAX_ITEMS_AGENDA)
+        for item in items:
+            recordatorios._anotar(item, ahora)
+        return recordatorios
+
+
+def recordatorios_de(memoria):
+    """Avisos pendientes de la memoria de un usuario (inquilinos.MemoriaUsuario), empezando a vigilarlos si hace falta."""
+    if memoria.recordatorios is None:
+        avisador = avisador_compartido()
+        memoria.recordatorios = RecordatoriosUsuario.desde_almacen(memoria.usuario_id, memoria.almacen, avisador)
+        avisador.vigilar(memoria.recordatorios)
+    return memoria.recordatorios
+
+
+def olvidar_recordatorios(memoria):
+    """Al desalojar la memoria de un usuario: el avisador deja de guardar lo suyo cuando ya no haga falta."""
+    if memoria.recordatorios is not None:
+        avisador_compartido().olvidar(memoria.usuario_id)
+
+
+# --- SUSCRIPCIONES Y EVENTOS ---
+def formato_sse(evento):
+    """Un aviso como evento de Server-Sent Events."""
+    return f"id: {evento['id']}\nevent: recordatorio\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+class Suscripcion:
+    """
+    Un cliente escuchando los avisos de un usuario. 'entregar(evento)' se
+    llama desde el hilo del avisador: debe ser rápido y seguro entre hilos
+    (p. ej. 'queue.Queue.put' o 'loop.call_soon_threadsafe').
+    """
+    def __init__(self, avisador, usuario_id, entregar, al_latir=None):
+        self.usuario_id = usuario_id
+        self._avisador = avisador
+        self._entregar = entregar
+        self._al_latir = al_latir
+
+    async def latir(self):
+        """Se llama en cada latido de la conexión (p. ej. para incorporar lo que escribieron otros workers)."""
+        if self._al_latir is not None:
+            await self._al_latir()
+
+    def cancelar(self):
+        self._avisador.cancelar(self)
+
+
+class Avisador:
+    def __init__(self):
+        self.condicion = threading.Condition()
+        # Montículo de (marca, usuario): la próxima marca de cada usuario vigilado.
+        self._cola = []
+        self._en_cola = {}
+        self._usuarios = {}
+        self._suscriptores = {}
+        self._recientes = {}
+        self._numeros = itertools.count(1)
+        self._hilo = None
+        self._detenido = False
+        self.avisos_emitidos = 0
+        self.avisos_entregados = 0
+
+    # --- PROGRAMACIÓN ---
+    def vigilar(self, recordatorios):
+        """Empieza a vigilar los avisos de un usuario (sustituye a los de una carga anterior)."""
+        with self.condicion:
+            self._usuarios[recordatorios.usuario_id] = recordatorios
+            self._en_cola.pop(recordatorios.usuario_id, None)
+            self.despertar(recordatorios)
+
+    def olvidar(self, usuario_id):
+        """
+        La memoria del usuario salió de la LRU. Sus avisos pendientes se siguen
+        vigilando; cuando no queda ninguno ni hay clientes escuchando, se
+        sueltan su montículo y sus avisos recientes.
+        """
+        with self.condicion:
+            recordatorios = self._usuarios.get(usuario_id)
+            if recordatorios is not None:
+                recordatorios.olvidado = True
+                self._soltar_si_inactivo(usuario_id)
+
+    def _soltar_si_inactivo(self, usuario_id):
+        """Con 'condicion' tomada: suelta a un usuario olvidado sin avisos pendientes ni suscriptores."""
+        recordatorios = self._usuarios.get(usuario_id)
+        if recordatorios is None or not recordatorios.olvidado or len(recordatorios) or usuario_id in self._suscriptores:
+            return
+        del self._usuarios[usuario_id]
+        self._en_cola.pop(usuario_id, None)
+        self._recientes.pop(usuario_id, None)
+
+    def despertar(self, recordatorios):
+        """Con 'condicion' tomada: pone en cola la próxima marca del usuario si se adelantó."""
+        siguiente = recordatorios.siguiente()
+        if siguiente is None or self._usuarios.get(recordatorios.usuario_id) is not recordatorios:
+            return
+        en_cola = self._en_cola.get(recordatorios.usuario_id)
+        if en_cola is not None and en_cola <= siguiente:
+            return
+        self._en_cola[recordatorios.usuario_id] = siguiente
+        heapq.heappush(self._cola, (siguiente, recordatorios.usuario_id))
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="avisador-recordatorios", daemon=True)
+            self._hilo.start()
+        elif self._cola[0][0] == siguiente:
+            self.condicion.notify()
+
+    def _bucle(self):
+        while True:
+            with self.condicion:
+                while not self._detenido and (not self._cola or self._cola[0][0] > time.time()):
+                    self.condicion.wait(self._cola[0][0] - time.time() if self._cola else None)
+                if self._detenido:
+                    return
+                ahora = time.time()
+                avisos = []
+                while self._cola and self._cola[0][0] <= ahora:
+                    marca, usuario_id = heapq.heappop(self._cola)
+                    if self._en_cola.get(usuario_id) != marca:
+                        continue
+                    del self._en_cola[usuario_id]
+                    recordatorios = self._usuarios[usuario_id]
+                    avisos.extend((usuario_id, aviso) for aviso in recordatorios._vencidos(ahora))
+                    self.despertar(recordatorios)
+                entregas = [self._publicar(usuario_id, aviso) for usuario_id, aviso in avisos]
+                for usuario_id in {usuario_id for usuario_id, _ in avisos}:
+                    self._soltar_si_inactivo(usuario_id)
+            for evento, suscriptores in entregas:
+                for suscripcion in suscriptores:
+                    try:
+                        suscripcion._entregar(evento)
+                        self.avisos_entregados += 1
+                    except Exception as e:
+                        print(f"      -> ⚠️ No se pudo entregar un aviso a '{suscripcion.usuario_id}': {e}")
+
+    def _publicar(self, usuario_id, aviso):
+        """Con 'condicion' tomada: convierte el aviso en evento y lo recuerda. Devuelve (evento, suscriptores)."""
+        marca, identificador, momento, titulo = aviso
+        evento = {
+            "id": next(self._numeros), "momento": momento, "item_id": identificador, "titulo": titulo,
+            "marca": marca, "hora": hora_local(marca).strftime("%H:%M"),
+        }
+        recientes = self._recientes.get(usuario_id)
+        if recientes is None:
+            recientes = self._recientes[usuario_id] = deque(maxlen=MAX_AVISOS_RECIENTES)
+        recientes.append(evento)
+        self.avisos_emitidos += 1
+        return evento, list(self._suscriptores.get(usuario_id, ()))
+
+    # --- SUSCRIPCIONES ---
+    def suscribir(self, usuario_id, entregar, ultimo_evento=None, al_latir=None):
+        """
+        Suscribe un cliente a los avisos del usuario. Le entrega enseguida los
+        recordados posteriores a 'ultimo_evento' (cabecera Last-Event-ID); sin
+        él, los de los últimos VENTANA_REPETICION_S segundos.
+        """
+        suscripcion = Suscripcion(self, usuario_id, entregar, al_latir)
+        try:
+            ultimo = int(ultimo_evento) if ultimo_evento not in (None, "") else None
+        except ValueError:
+            ultimo = None
+        with self.condicion:
+            self._suscriptores.setdefault(usuario_id, []).append(suscripcion)
+            if ultimo is None:
+                limite = time.time() - VENTANA_REPETICION_S
+                pendientes = [evento for evento in self._recientes.get(usuario_id, ()) if evento["marca"] >= limite]
+            else:
+                pendientes = [evento for evento in self._recientes.get(usuario_id, ()) if evento["id"] > ultimo]
+        for evento in pendientes:
+            entregar(evento)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self.condicion:
+            suscriptores = self._suscriptores.get(suscripcion.usuario_id, [])
+            if suscripcion in suscriptores:
+                suscriptores.remove(suscripcion)
+            if not suscriptores:
+                self._suscriptores.pop(suscripcion.usuario_id, None)
+                self._soltar_si_inactivo(suscripcion.usuario_id)
+
+    def estadisticas(self):
+        with self.condicion:
+            return {
+                "usuarios_vigilados": len(self._usuarios),
+                "avisos_pendientes": sum(len(recordatorios) for recordatorios in self._usuarios.values()),
+                "suscripciones": sum(len(suscriptores) for suscriptores in self._suscriptores.values()),
+                "avisos_emitidos": self.avisos_emitidos,
+                "avisos_entregados": self.avisos_entregados,
+            }
+
+    def detener(self):
+        with self.condicion:
+            self._detenido = True
+            self.condicion.notify_all()
+
+
+# --- AVISADOR COMPARTIDO POR PROCESO ---
+_avisador_compartido = None
+_candado_avisador = threading.Lock()
+
+
+def avisador_compartido():
+    """Devuelve el Avisador del proceso, creándolo en la primera llamada."""
+    global _avisador_compartido
+    with _candado_avisador:
+        if _avisador_compartido is None:
+            _avisador_compartido = Avisador()
+        return _avisador_compartido
@@ -0,0 +1,69 @@
+# =================================================================
+# SINCRONIZACION.PY (v1.0 - Deltas del Archivador para la PWA)
+# =================================================================
+# La PWA guarda una copia local del archivador y solo pide lo nuevo.
+# - Cada item archivado recibe un número de secuencia ('seq') creciente por
+#   usuario (datos_usuario["secuencia"]).
+# - El cursor es opaco para el cliente ("<seq>:<id>"): la respuesta trae los
+#   items posteriores al cursor, en orden, y el cursor para la siguiente
+#   página. Los items anteriores a la numeración tienen seq 0 y llegan en la
+#   primera sincronización (cursor vacío), ordenados por ID.
+# - RegistroCambios se construye una vez por carga de memoria (al primer
+#   /sync) y luego crece con cada item archivado: una consulta es una
+#   búsqueda binaria, no un recorrido del archivador.
+
+from bisect import bisect_left, bisect_right
+
+MAX_POR_PAGINA = 500
+
+
+def codificar_cursor(secuencia, identificador):
+    return f"{secuencia}:{identificador}"
+
+
+def decodificar_cursor(cursor):
+    """(seq, id) del cursor; el cursor vacío o inválido empieza desde el principio."""
+    secuencia, _, identificador = (cursor or "").partition(":")
+    try:
+        return int(secuencia), identificador
+    except ValueError:
+        return -1, ""
+
+
+class RegistroCambios:
+    def __init__(self, archivador):
+        claves = []
+        for identificador in archivador:
+            claves.append((int(archivador[identificador].get("seq") or 0), identificador))
+        claves.sort()
+        self._claves = claves
+
+    def anotar(self, secuencia, identificador):
+        clave = (secuencia, identificador)
+        if not self._claves or clave > self._claves[-1]:
+            self._claves.append(clave)
+            return
+        # Un item anotado dos veces (p. ej. visto al refrescar desde otro worker) no se duplica.
+        posicion = bisect_left(self._claves, clave)
+        if posicion == len(self._claves) or self._claves[posicion] != clave:
+            self._claves.insert(posicion, clave)
+
+    def recientes(self, limite):
+        """IDs de los 'limite' últimos items archivados, del más nuevo al más antiguo."""
+        return [identificador for _, identificador in reversed(self._claves[-limite:])] if limite > 0 else []
+
+    def desde(self, cursor, limite=MAX_POR_PAGINA):
+        """(ids posteriores al cursor, cursor siguiente, completo)."""
+        inicio = bisect_right(self._claves, decodificar_cursor(cursor))
+        pagina = self._claves[inicio:inicio + limite]
+        if not pagina:
+            return [], cursor or "", True
+        siguiente = codificar_cursor(*pagina[-1])
+        return [identificador for _, identificador in pagina], siguiente, inicio + len(pagina) >= len(self._claves)
+
+
+def cambios_de(memoria):
+    """Registro de cambios de la memoria de un usuario (inquilinos.MemoriaUsuario)."""
+    if memoria.cambios is None:
+        memoria.cambios = RegistroCambios(memoria.archivador)
+    return memoria.cambios
@@ -0,0 +1,5 @@
+# Las pruebas importan los módulos del backend igual que main.py y asgi.py.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+# =================================================================
+# TEST_CACHE_CHARLA.PY - Fusión de peticiones en vuelo
+# =================================================================
+# Varias peticiones con el mismo prompt comparten una sola llamada al
+# proveedor, y cancelar a una de ellas (plazo del abanico, cliente que se
+# desconecta) no deja sin respuesta a las demás.
+
+import asyncio
+
+import pytest
+
+from skillsets.cache_charla import CacheCharla
+
+
+def _productor_lento(llamadas, latencia=0.1):
+    async def productor():
+        llamadas.append(1)
+        await asyncio.sleep(latencia)
+        return "respuesta compartida"
+    return productor
+
+
+def test_peticiones_identicas_comparten_una_llamada():
+    cache, llamadas = CacheCharla(), []
+
+    async def escenario():
+        return await asyncio.gather(*(cache.obtener("Hola", "m", _productor_lento(llamadas)) for _ in range(5)))
+
+    assert asyncio.run(escenario()) == ["respuesta compartida"] * 5
+    assert len(llamadas) == 1
+    assert cache.fusionadas == 4
+    assert cache.buscar("hola", "m") == "respuesta compartida"
+
+
+def test_cancelar_al_primero_no_cancela_a_los_fusionados():
+    cache, llamadas = CacheCharla(), []
+
+    async def escenario():
+        primero = asyncio.ensure_future(cache.obtener("hola", "m", _productor_lento(llamadas)))
+        await asyncio.sleep(0.01)
+        seguidor = asyncio.ensure_future(cache.obtener("hola", "m", _productor_lento(llamadas)))
+        await asyncio.sleep(0.01)
+        primero.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await primero
+        return await seguidor
+
+    assert asyncio.run(escenario()) == "respuesta compartida"
+    assert len(llamadas) == 1
+    assert cache.estadisticas()["en_vuelo"] == 0
+
+
+def test_llamada_sin_nadie_esperando_se_abandona():
+    cache, llamadas = CacheCharla(), []
+
+    async def escenario():
+        unico = asyncio.ensure_future(cache.obtener("hola", "m", _productor_lento(llamadas, latencia=5.0)))
+        await asyncio.sleep(0.01)
+        unico.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await unico
+        # Una petición nueva no hereda la llamada cancelada: lanza la suya.
+        return await cache.obtener("hola", "m", _productor_lento(llamadas))
+
+    assert asyncio.run(escenario()) == "respuesta compartida"
+    assert len(llamadas) == 2
@@ -0,0 +1,74 @@
+# =================================================================
+# TEST_MULTIPROCESO.PY - Varios workers sobre la misma memoria
+# =================================================================
+# Como 'gunicorn -w N main:app': N procesos con la configuración por defecto
+# (sin GUARDIAN_MULTIPROCESO) emiten tickets a la vez para el mismo usuario
+# y ninguno se pierde. La versión larga, con tiempos y compactaciones
+# forzadas, es benchmarks/estres_multiproceso.py.
+
+import asyncio
+import multiprocessing
+import os
+
+import pytest
+
+WORKERS = 3
+TICKETS = 20
+USUARIO = "estres"
+
+
+def _worker(numero, carpeta, motor, barrera, resultados):
+    os.chdir(carpeta)
+    os.environ.pop("GUARDIAN_MULTIPROCESO", None)
+    os.environ.update(GUARDIAN_ALMACEN=motor, GUARDIAN_LLM_PROVEEDORES="falso", ALE_NODO="0")
+    from skillsets.guardian import Guardian
+    from skillsets.identificadores import PATRON_ID
+
+    guardian = Guardian()
+    with guardian.memorias.usar(USUARIO) as memoria:
+        if hasattr(memoria.almacen, "compactar_minimo"):
+            memoria.almacen.compactar_minimo = 10
+    barrera.wait()
+
+    async def emitir():
+        ids = []
+        for i in range(TICKETS):
+            respuesta = await guardian.ejecutar({
+                "comando": f"Revisar el informe {numero}-{i} durante 25 min",
+                "usuario_id": USUARIO,
+                "estado_conversacion": {"modo": "ticket", "paso_ticket": "ESPERANDO_DETALLES"},
+            })
+            ids.append(PATRON_ID.search(respuesta["mensaje_para_ui"]).group(1))
+        return ids
+
+    ids = asyncio.run(emitir())
+    guardian.cerrar()
+    resultados.put(ids)
+
+
+@pytest.mark.parametrize("motor", ["diario", "json", "sqlite"])
+def test_workers_concurrentes_no_pierden_tickets(motor, tmp_path):
+    from skillsets.almacenamiento import crear_almacen
+    from skillsets.inquilinos import GestorMemorias
+
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(WORKERS)
+    resultados = contexto.Queue()
+    procesos = [contexto.Process(target=_worker, args=(numero, str(tmp_path), motor, barrera, resultados))
+                for numero in range(WORKERS)]
+    for proceso in procesos:
+        proceso.start()
+    esperados = [identificador for _ in procesos for identificador in resultados.get(timeout=120)]
+    for proceso in procesos:
+        proceso.join(timeout=30)
+        assert proceso.exitcode == 0
+
+    gestor = GestorMemorias("guardian_memory.json", str(tmp_path / "guardian_memoria"), motor)
+    almacen = crear_almacen(motor, gestor.ruta_memoria(USUARIO))
+    archivador, datos_usuario = almacen.cargar()
+    try:
+        assert len(set(esperados)) == WORKERS * TICKETS
+        assert [identificador for identificador in esperados if identificador not in archivador] == []
+        assert sorted(archivador[identificador]["seq"] for identificador in archivador) == list(range(1, WORKERS * TICKETS + 1))
+    finally:
+        almacen.cerrar()
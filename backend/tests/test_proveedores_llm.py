@@ -0,0 +1,105 @@
+# =================================================================
+# TEST_PROVEEDORES_LLM.PY - Garantías del gobernador de proveedores LLM
+# =================================================================
+# Cobertura, disyuntor, plazo, límite de concurrencia y la respuesta de
+# "sobrecarga" del Guardián, con proveedores falsos locales (sin red).
+# Los tiempos de cada escenario se miden en benchmarks/simular_gobernador.py.
+
+import asyncio
+import time
+
+import pytest
+
+from skillsets.proveedores_llm import GobernadorLLM, ProveedorFalso, SinProveedorDisponible
+
+MENSAJES = [{"role": "user", "content": "hola"}]
+
+
+def test_cobertura_con_el_siguiente_proveedor():
+    lento = ProveedorFalso("lento", latencia=3.0)
+    rapido = ProveedorFalso("rapido", latencia=0.1)
+    gobernador = GobernadorLLM([lento, rapido], plazo=5.0, umbral_cobertura=0.3)
+    inicio = time.perf_counter()
+    respuesta = asyncio.run(gobernador.completar(MENSAJES))
+    assert respuesta.startswith("[rapido]")
+    assert time.perf_counter() - inicio < 1.0
+    assert gobernador.coberturas == 1
+
+
+def test_disyuntor_deja_de_llamar_al_proveedor_roto():
+    roto = ProveedorFalso("roto", latencia=0.01, tasa_fallos=1.0)
+    sano = ProveedorFalso("sano", latencia=0.01)
+    gobernador = GobernadorLLM([roto, sano], umbral_fallos=3, enfriamiento=60.0)
+
+    async def veinte_llamadas():
+        return [await gobernador.completar(MENSAJES) for _ in range(20)]
+
+    respuestas = asyncio.run(veinte_llamadas())
+    assert all(respuesta.startswith("[sano]") for respuesta in respuestas)
+    assert roto.llamadas == 3
+
+
+def test_disyuntor_abierto_falla_al_instante():
+    gobernador = GobernadorLLM([ProveedorFalso("roto", latencia=0.05, tasa_fallos=1.0)], umbral_fallos=3, enfriamiento=60.0)
+
+    async def escenario():
+        for _ in range(3):
+            with pytest.raises(Exception):
+                await gobernador.completar(MENSAJES)
+        inicio = time.perf_counter()
+        with pytest.raises(SinProveedorDisponible):
+            await gobernador.completar(MENSAJES)
+        return time.perf_counter() - inicio
+
+    assert asyncio.run(escenario()) < 0.01
+
+
+def test_plazo_corta_un_proveedor_colgado():
+    gobernador = GobernadorLLM([ProveedorFalso("colgado", colgado=True)], plazo=0.5)
+    inicio = time.perf_counter()
+    with pytest.raises(Exception):
+        asyncio.run(gobernador.completar(MENSAJES))
+    assert time.perf_counter() - inicio < 0.7
+
+
+def test_limite_de_llamadas_en_vuelo():
+    tope = 20
+    gobernador = GobernadorLLM([ProveedorFalso("falso", latencia=0.05, variacion=0.02)], plazo=30.0, max_en_vuelo=tope)
+    maximo = 0
+
+    async def escenario():
+        nonlocal maximo
+
+        async def vigilar():
+            nonlocal maximo
+            while True:
+                maximo = max(maximo, gobernador.en_vuelo)
+                await asyncio.sleep(0.001)
+
+        vigia = asyncio.ensure_future(vigilar())
+        try:
+            await asyncio.gather(*[gobernador.completar(MENSAJES) for _ in range(200)])
+        finally:
+            vigia.cancel()
+
+    asyncio.run(escenario())
+    assert 0 < maximo <= tope
+
+
+def test_guardian_responde_sobrecarga_y_abre_el_disyuntor(monkeypatch, tmp_path):
+    monkeypatch.setenv("GUARDIAN_LLM_PROVEEDORES", "falso:0.01:1.0")
+    monkeypatch.chdir(tmp_path)
+    from skillsets.guardian import Guardian
+
+    guardian = Guardian()
+    try:
+        async def ocho_mensajes():
+            return [await guardian.ejecutar({"comando": f"hola {i}"}) for i in range(8)]
+
+        respuestas = asyncio.run(ocho_mensajes())
+        assert all("sobrecarga" in respuesta["mensaje_para_ui"] for respuesta in respuestas)
+        estado = guardian.gobernador.estadisticas()["proveedores"]["falso-0"]
+        assert estado["disyuntor"] == "abierto"
+        assert estado["llamadas"] == 5
+    finally:
+        guardian.cerrar()
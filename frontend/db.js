@@ -0,0 +1,120 @@
+// =================================================================
+// DB.JS - v1.0 BASE DE DATOS LOCAL (IndexedDB)
+// La comparten la app (main.js) y el service worker (importScripts).
+// - 'sistema': registros sueltos por id (p. ej. el cursor del archivo).
+// - 'cola': comandos escritos sin conexión, en orden, pendientes de enviar.
+// - 'chat': historial del chat como registros {autor, texto, ts}, limitado.
+// - 'archivo': copia local de los tickets y contratos, por id.
+// =================================================================
+
+const NOMBRE_DB = 'GuardianDB';
+const VERSION_DB = 2;
+// Mensajes del chat que se conservan (los más antiguos se descartan).
+const MAX_MENSAJES_CHAT = 200;
+
+let promesaDB = null;
+
+// Abre (y crea o actualiza) la base de datos una sola vez.
+function openDB() {
+    if (!promesaDB) {
+        promesaDB = new Promise((resolve, reject) => {
+            const request = indexedDB.open(NOMBRE_DB, VERSION_DB);
+            request.onerror = () => { promesaDB = null; reject("Error abriendo DB"); };
+            request.onsuccess = () => resolve(request.result);
+            // La versión 1 solo tenía 'sistema': se añaden los almacenes que falten.
+            request.onupgradeneeded = event => {
+                const db = event.target.result;
+                if (!db.objectStoreNames.contains('sistema')) db.createObjectStore('sistema', { keyPath: 'id' });
+                if (!db.objectStoreNames.contains('cola')) db.createObjectStore('cola', { keyPath: 'clave', autoIncrement: true });
+                if (!db.objectStoreNames.contains('chat')) db.createObjectStore('chat', { keyPath: 'clave', autoIncrement: true });
+                if (!db.objectStoreNames.contains('archivo')) db.createObjectStore('archivo', { keyPath: 'id' });
+            };
+        });
+    }
+    return promesaDB;
+}
+
+// Ejecuta 'accion(almacenes)' en una transacción y resuelve con su resultado al completarse.
+async function transaccion(nombres, modo, accion) {
+    const db = await openDB();
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(nombres, modo);
+        const almacenes = nombres.map(nombre => tx.objectStore(nombre));
+        let resultado;
+        const peticion = accion(...almacenes);
+        if (peticion) peticion.onsuccess = () => { resultado = peticion.result; };
+        tx.oncomplete = () => resolve(resultado);
+        tx.onerror = () => reject(tx.error);
+        tx.onabort = () => reject(tx.error);
+    });
+}
+
+// --- SISTEMA ---
+async function leerSistema(id) {
+    const registro = await transaccion(['sistema'], 'readonly', sistema => sistema.get(id));
+    return registro ? registro.data : null;
+}
+
+function guardarSistema(id, data) {
+    return transaccion(['sistema'], 'readwrite', sistema => sistema.put({ id, data }));
+}
+
+// --- COLA DE COMANDOS OFFLINE ---
+function encolarComando(comando) {
+    return transaccion(['cola'], 'readwrite', cola => cola.add({ ...comando, ts: Date.now() }));
+}
+
+// Los primeros 'limite' comandos pendientes, en orden de llegada.
+function leerCola(limite) {
+    return transaccion(['cola'], 'readonly', cola => cola.getAll(null, limite));
+}
+
+function contarCola() {
+    return transaccion(['cola'], 'readonly', cola => cola.count());
+}
+
+function quitarDeCola(claves) {
+    return transaccion(['cola'], 'readwrite', cola => { claves.forEach(clave => cola.delete(clave)); });
+}
+
+// --- HISTORIAL DEL CHAT ---
+// Añade un mensaje y descarta los más antiguos por encima de MAX_MENSAJES_CHAT.
+function guardarMensajeChat(autor, texto) {
+    return transaccion(['chat'], 'readwrite', chat => {
+        chat.add({ autor, texto, ts: Date.now() });
+        const recuento = chat.count();
+        recuento.onsuccess = () => {
+            let sobrantes = recuento.result - MAX_MENSAJES_CHAT;
+            if (sobrantes <= 0) return;
+            chat.openCursor().onsuccess = event => {
+                const cursor = event.target.result;
+                if (!cursor || sobrantes <= 0) return;
+                cursor.delete();
+                sobrantes--;
+                cursor.continue();
+            };
+        };
+    });
+}
+
+function leerChat() {
+    return transaccion(['chat'], 'readonly', chat => chat.getAll());
+}
+
+function guardarMensajesChat(mensajes) {
+    return transaccion(['chat'], 'readwrite', chat => { mensajes.forEach(mensaje => chat.add(mensaje)); });
+}
+
+// --- COPIA LOCAL DEL ARCHIVO ---
+// Guarda una página de '/sync' y su cursor en la misma transacción:
+// si se corta a medias, la siguiente sincronización repite la página.
+function guardarPaginaArchivo(items, cursor) {
+    return transaccion(['archivo', 'sistema'], 'readwrite', (archivo, sistema) => {
+        items.forEach(item => archivo.put(item));
+        sistema.put({ id: 'cursor_archivo', data: cursor });
+    });
+}
+
+function leerArchivo() {
+    return transaccion(['archivo'], 'readonly', archivo => archivo.getAll());
+}
@@ -1,13 +1,31 @@
 // =================================================================
-// MAIN.JS - v2.0 CON PERSISTENCIA LOCAL
-// Guarda el historial del chat en el navegador para que no se
-// pierda al cerrar la aplicación.
+// MAIN.JS - v3.0 OFFLINE-FIRST
+// Guarda el historial del chat en IndexedDB (db.js) como mensajes
+// sueltos y limitados. Sin conexión, los comandos de tickets y
+// contratos se encolan y se envían en lote al reconectar; el archivo
+// local se sincroniza por deltas desde el cursor del servidor.
+// Los avisos de arranque llegan del servidor por '/eventos' (SSE):
+// el cliente ya no revisa sus contratos a intervalos.
 // =================================================================
 
 // --- CONFIGURACIÓN GLOBAL Y ESTADO DEL CLIENTE ---
 const NOMBRE_USUARIO = "Juan";
 const URL_ALE_SERVER = 'https://el-guardian.onrender.com/execute';
+// Variante en streaming: responde con líneas NDJSON (fragmentos y un marco final).
+const URL_ALE_STREAM = URL_ALE_SERVER.replace(/\/execute$/, '/execute_stream');
+const URL_ALE_BATCH = URL_ALE_SERVER.replace(/\/execute$/, '/execute_batch');
+const URL_ALE_SYNC = URL_ALE_SERVER.replace(/\/execute$/, '/sync');
+const URL_ALE_EVENTOS = URL_ALE_SERVER.replace(/\/execute$/, '/eventos');
+// Comandos de la cola que viajan en cada petición por lotes.
+const MAX_LOTE_COLA = 50;
+// Sin conexión se encolan los comandos que abren un modo (la charla necesita al servidor).
+const PALABRAS_ENCOLABLES = ['crear', 'activar', 'gestionar'];
 let estadoConversacion = { modo: 'libre' };
+// Token de la sesión en el servidor: el estado de la conversación vive allí
+// y solo viajan el token, el comando y pequeños deltas de estado.
+let sesionToken = localStorage.getItem('guardian_sesion_token');
+// Identificador anónimo de este dispositivo: el servidor guarda una memoria por usuario.
+const USUARIO_ID = obtenerUsuarioId();
 
 // --- REFERENCIAS AL DOM ---
 let bootContainer, bootMessage, appContainer, history, chatInput, sendButton, navBar, screens;
@@ -25,6 +43,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     setupEventListeners();
     iniciarSecuenciaArranque();
+
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('./service-worker.js')
+            .catch(error => console.warn("No se pudo registrar el service worker:", error));
+    }
 });
 
 function setupEventListeners() {
@@ -50,27 +73,77 @@ function setupEventListeners() {
         screens.forEach(screen => screen.classList.toggle('active', screen.id === targetScreenId));
         document.querySelectorAll('.nav-button').forEach(button => button.classList.remove('active'));
         targetButton.classList.add('active');
+        if (targetScreenId === 'calendario-screen') pintarCalendario();
     });
+
+    // Al recuperar la conexión se envía la cola pendiente.
+    window.addEventListener('online', () => vaciarCola());
 }
 
-// --- NUEVAS FUNCIONES DE PERSISTENCIA CON LOCALSTORAGE ---
-function guardarHistorial() {
-    localStorage.setItem('guardian_chat_history', history.innerHTML);
+// --- IDENTIDAD DEL USUARIO ---
+function obtenerUsuarioId() {
+    let usuarioId = localStorage.getItem('guardian_usuario_id');
+    if (!usuarioId) {
+        usuarioId = (self.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : `u-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+        localStorage.setItem('guardian_usuario_id', usuarioId);
+    }
+    return usuarioId;
+}
+
+// --- PERSISTENCIA LOCAL (IndexedDB, ver db.js) ---
+function guardarEstado() {
     localStorage.setItem('guardian_chat_state', JSON.stringify(estadoConversacion));
 }
 
-function cargarHistorial() {
-    const historialGuardado = localStorage.getItem('guardian_chat_history');
+// Cada mensaje se guarda una vez, completo, como registro {autor, texto, ts}.
+function registrarMensaje(autor, texto) {
+    if (!texto) return;
+    guardarMensajeChat(autor, texto).catch(error => console.warn("No se pudo guardar el mensaje:", error));
+}
+
+// El DOM tampoco crece sin límite: se conservan los últimos MAX_MENSAJES_CHAT mensajes.
+function limitarHistorialVisible() {
+    const burbujas = history.querySelectorAll('.message-bubble:not(#thinking-bubble)');
+    for (let i = 0; i < burbujas.length - MAX_MENSAJES_CHAT; i++) burbujas[i].remove();
+}
+
+function crearBurbuja(autor) {
+    const messageBubble = document.createElement('div');
+    messageBubble.className = `message-bubble ${autor === 'usuario' ? 'user-message' : 'guardian-message'}`;
+    history.appendChild(messageBubble);
+    limitarHistorialVisible();
+    return messageBubble;
+}
+
+// El historial de la v2.0 era un bloque HTML en localStorage: se convierte una vez.
+async function migrarHistorialAntiguo() {
+    const historialAntiguo = localStorage.getItem('guardian_chat_history');
+    if (historialAntiguo === null) return;
+    // DOMParser no ejecuta nada: solo se extrae el texto de cada burbuja.
+    const documento = new DOMParser().parseFromString(historialAntiguo, 'text/html');
+    const mensajes = Array.from(documento.querySelectorAll('.message-bubble'))
+        .filter(burbuja => burbuja.id !== 'thinking-bubble' && burbuja.textContent)
+        .slice(-MAX_MENSAJES_CHAT)
+        .map(burbuja => ({
+            autor: burbuja.classList.contains('user-message') ? 'usuario' : 'guardian',
+            texto: burbuja.textContent,
+            ts: Date.now()
+        }));
+    if (mensajes.length) await guardarMensajesChat(mensajes);
+    localStorage.removeItem('guardian_chat_history');
+}
+
+async function cargarHistorial() {
     const estadoGuardado = localStorage.getItem('guardian_chat_state');
+    if (estadoGuardado) estadoConversacion = JSON.parse(estadoGuardado);
 
-    if (historialGuardado && estadoGuardado) {
-        history.innerHTML = historialGuardado;
-        estadoConversacion = JSON.parse(estadoGuardado);
-        history.scrollTop = history.scrollHeight;
-        return true; // Éxito: se cargó un historial.
-    }
-    
-    return false; // Fracaso: no había nada que cargar.
+    await migrarHistorialAntiguo();
+    const mensajes = await leerChat();
+    mensajes.forEach(mensaje => { crearBurbuja(mensaje.autor).textContent = mensaje.texto; });
+    history.scrollTop = history.scrollHeight;
+    return mensajes.length > 0;
 }
 
 // --- SECUENCIA DE ARRANQUE VISUAL (CON PERSISTENCIA) ---
@@ -92,11 +165,20 @@ function iniciarSecuenciaArranque() {
             appContainer.classList.remove('hidden');
             chatInput.focus();
             
-            const historialCargado = cargarHistorial();
-            
-            if (!historialCargado) {
-                llamarALE("_SALUDO_INICIAL_");
-            }
+            cargarHistorial()
+                .catch(error => {
+                    console.warn("No se pudo leer el historial local:", error);
+                    return false;
+                })
+                .then(historialCargado => {
+                    if (!historialCargado) {
+                        llamarALE("_SALUDO_INICIAL_");
+                    }
+                    // Lo que quedó en cola en la sesión anterior sale ahora; luego, el archivo.
+                    vaciarCola();
+                    pintarCalendario();
+                    conectarAvisos();
+                });
         }
     }
     siguienteMensaje();
@@ -104,6 +186,7 @@ function iniciarSecuenciaArranque() {
 
 // --- PROCESAMIENTO DE ENTRADA DEL USUARIO ---
 function procesarComandoUsuario(comando) {
+    pedirPermisoAvisos();
     addUserMessage(comando);
     llamarALE(comando);
     chatInput.value = '';
@@ -111,18 +194,16 @@ function procesarComandoUsuario(comando) {
 
 // --- FUNCIONES PARA MANEJAR LA INTERFAZ DE CHAT ---
 function addUserMessage(texto) {
-    const messageBubble = document.createElement('div');
-    messageBubble.className = 'message-bubble user-message';
+    const messageBubble = crearBurbuja('usuario');
     messageBubble.textContent = texto;
-    history.appendChild(messageBubble);
     history.scrollTop = history.scrollHeight;
-    guardarHistorial(); // Guardamos después de añadir mensaje de usuario.
+    registrarMensaje('usuario', texto);
 }
 
 function addGuardianMessage(texto, conTypewriter = true) {
-    const messageBubble = document.createElement('div');
-    messageBubble.className = 'message-bubble guardian-message';
-    history.appendChild(messageBubble);
+    const messageBubble = crearBurbuja('guardian');
+    // Se guarda el texto completo ya: la animación es solo visual.
+    registrarMensaje('guardian', texto);
     
     if (conTypewriter && texto) {
         let i = 0;
@@ -134,14 +215,11 @@ function addGuardianMessage(texto, conTypewriter = true) {
                 i++;
                 history.scrollTop = history.scrollHeight;
                 setTimeout(typeWriter, speed);
-            } else {
-                guardarHistorial(); // Guardamos cuando termina de escribir.
             }
         }
         typeWriter();
     } else {
         messageBubble.textContent = texto;
-        guardarHistorial(); // Guardamos para mensajes sin animación.
     }
     history.scrollTop = history.scrollHeight;
 }
@@ -207,46 +285,313 @@ function mostrarRuleta(opciones) {
 }
 
 // --- LÓGICA DE COMUNICACIÓN CON EL CEREBRO (A.L.E.) ---
+// Lee la respuesta NDJSON línea a línea y llama a 'alRecibirMarco' por cada marco.
+async function leerMarcos(respuestaServidor, alRecibirMarco) {
+    if (!respuestaServidor.body || !respuestaServidor.body.getReader) {
+        // Navegadores sin ReadableStream: procesamos todo al final.
+        const texto = await respuestaServidor.text();
+        texto.split('\n').filter(linea => linea.trim()).forEach(linea => alRecibirMarco(JSON.parse(linea)));
+        return;
+    }
+    const lector = respuestaServidor.body.getReader();
+    const decodificador = new TextDecoder();
+    let pendiente = '';
+    while (true) {
+        const { value, done } = await lector.read();
+        if (done) break;
+        pendiente += decodificador.decode(value, { stream: true });
+        const lineas = pendiente.split('\n');
+        pendiente = lineas.pop();
+        lineas.filter(linea => linea.trim()).forEach(linea => alRecibirMarco(JSON.parse(linea)));
+    }
+    if (pendiente.trim()) alRecibirMarco(JSON.parse(pendiente));
+}
+
+// --- COLA OFFLINE ---
+// Los modos Ticket y Diseño son deterministas: sus turnos se pueden resolver más tarde.
+function debeEncolarse(comando) {
+    if (estadoConversacion.modo && estadoConversacion.modo !== 'libre') return true;
+    return PALABRAS_ENCOLABLES.includes(comando.trim().toLowerCase().split(/\s+/)[0]);
+}
+
+function nuevoIdPeticion() {
+    return (self.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `p-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+}
+
+async function encolar(comando) {
+    // 'id_peticion' permite al servidor no repetir un comando si el lote se reenvía.
+    await encolarComando({ comando, id_peticion: nuevoIdPeticion() });
+    addGuardianMessage("📥 Comando en cola. Se enviará en cuanto haya conexión.", false);
+    vaciarCola();
+}
+
+let vaciandoCola = false;
+
+// El servidor estaba saturado: se vuelve a intentar pasado el tiempo que indicó.
+function programarReintentoCola(segundos) {
+    setTimeout(vaciarCola, Math.max(1, segundos || 5) * 1000);
+}
+
+// Envía la cola en lotes a '/execute_batch', en orden, y pinta las respuestas.
+// Un comando solo sale de la cola cuando el servidor respondió a su lote.
+async function vaciarCola() {
+    if (vaciandoCola || !navigator.onLine) return;
+    vaciandoCola = true;
+    try {
+        while (true) {
+            const pendientes = await leerCola(MAX_LOTE_COLA);
+            if (!pendientes.length) break;
+
+            const respuestaServidor = await fetch(URL_ALE_BATCH, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    // Mismo token en todo el lote: el servidor lo ejecuta como una sesión, en orden.
+                    peticiones: pendientes.map((pendiente, i) => ({
+                        comando: pendiente.comando,
+                        skillset_target: 'guardian',
+                        usuario_id: USUARIO_ID,
+                        sesion_token: sesionToken,
+                        id_peticion: pendiente.id_peticion,
+                        ...(sesionToken || i > 0 ? {} : { estado_conversacion: estadoConversacion })
+                    }))
+                })
+            });
+            if (!respuestaServidor.ok) {
+                throw new Error(`Error ${respuestaServidor.status} del servidor A.L.E.`);
+            }
+            const { respuestas, error, ocupado, reintentar_en } = await respuestaServidor.json();
+            if (ocupado) {
+                programarReintentoCola(reintentar_en);
+                break;
+            }
+            if (!respuestas) throw new Error(error);
+
+            // Los comandos rechazados por "ocupado" no se ejecutaron: siguen en la cola, en orden.
+            const ejecutadas = pendientes.filter((_, i) => !respuestas[i].ocupado);
+            respuestas.filter(respuesta => !respuesta.ocupado).forEach(respuesta => procesarRespuestaFinal(respuesta, null));
+            await quitarDeCola(ejecutadas.map(pendiente => pendiente.clave));
+            const rechazada = respuestas.find(respuesta => respuesta.ocupado);
+            if (rechazada) {
+                programarReintentoCola(rechazada.reintentar_en);
+                break;
+            }
+        }
+        sincronizarArchivo();
+    } catch (error) {
+        // Se reintenta con el próximo evento 'online' o el próximo comando.
+        console.warn("No se pudo vaciar la cola:", error);
+    } finally {
+        vaciandoCola = false;
+    }
+}
+
+// --- SINCRONIZACIÓN DELTA DEL ARCHIVO ---
+let sincronizando = false;
+
+// Trae de '/sync' solo los items posteriores al cursor guardado.
+async function sincronizarArchivo() {
+    if (sincronizando || !navigator.onLine) return;
+    sincronizando = true;
+    try {
+        let cursor = (await leerSistema('cursor_archivo')) || '';
+        let hayCambios = false;
+        while (true) {
+            const parametros = new URLSearchParams({ usuario_id: USUARIO_ID, cursor });
+            const respuestaServidor = await fetch(`${URL_ALE_SYNC}?${parametros}`);
+            if (!respuestaServidor.ok) {
+                throw new Error(`Error ${respuestaServidor.status} del servidor A.L.E.`);
+            }
+            const pagina = await respuestaServidor.json();
+            await guardarPaginaArchivo(pagina.items, pagina.cursor);
+            cursor = pagina.cursor;
+            hayCambios = hayCambios || pagina.items.length > 0;
+            if (pagina.completo) break;
+        }
+        if (hayCambios) pintarCalendario();
+    } catch (error) {
+        console.warn("No se pudo sincronizar el archivo:", error);
+    } finally {
+        sincronizando = false;
+    }
+}
+
+// Pinta los contratos y tickets de la copia local (funciona sin conexión).
+async function pintarCalendario() {
+    const contenedor = document.getElementById('lista-contratos-container');
+    if (!contenedor) return;
+    let items;
+    try {
+        items = await leerArchivo();
+    } catch (error) {
+        console.warn("No se pudo leer el archivo local:", error);
+        return;
+    }
+    // Lo más reciente primero: por secuencia y, a igualdad, por ID (ordenable por fecha).
+    items.sort((a, b) => (b.seq || 0) - (a.seq || 0) || (a.id < b.id ? 1 : -1));
+    contenedor.replaceChildren(...items.map(item => {
+        const elemento = document.createElement('div');
+        elemento.className = 'contrato-item';
+        const titulo = document.createElement('div');
+        titulo.className = 'contrato-mision';
+        titulo.textContent = `${item.tipo === 'Contrato' ? '📜' : '🎫'} ${item.mision || item.tarea || item.id}`;
+        const detalles = document.createElement('div');
+        detalles.className = 'contrato-detalles';
+        [item.fecha_sellado || item.fecha_emision, item.arranque && `Arranque: ${item.arranque}`, item.duracion && `Duración: ${item.duracion}`]
+            .filter(Boolean)
+            .forEach(texto => {
+                const detalle = document.createElement('span');
+                detalle.textContent = texto;
+                detalles.appendChild(detalle);
+            });
+        elemento.append(titulo, detalles);
+        return elemento;
+    }));
+}
+
+// --- AVISOS DE ARRANQUE (SERVER-SENT EVENTS) ---
+// Una conexión abierta con el servidor: cada aviso llega cuando vence.
+// EventSource se reconecta solo y manda 'Last-Event-ID'; al abrir la app
+// se pasa el último aviso visto para no repetirlo.
+let fuenteAvisos = null;
+
+function conectarAvisos() {
+    if (fuenteAvisos || !('EventSource' in window)) return;
+    const parametros = new URLSearchParams({ usuario_id: USUARIO_ID });
+    const ultimo = localStorage.getItem('guardian_ultimo_aviso');
+    if (ultimo) parametros.set('ultimo', ultimo);
+    fuenteAvisos = new EventSource(`${URL_ALE_EVENTOS}?${parametros}`);
+    fuenteAvisos.addEventListener('recordatorio', event => {
+        localStorage.setItem('guardian_ultimo_aviso', event.lastEventId);
+        mostrarAviso(JSON.parse(event.data));
+    });
+}
+
+function mostrarAviso(aviso) {
+    const titulo = aviso.momento === 'inicio' ? 'Guardián: ¡Es la hora!' : 'Guardián: tiempo cumplido';
+    const cuerpo = aviso.momento === 'inicio'
+        ? `'${aviso.titulo}' arranca ahora (${aviso.hora}).`
+        : `'${aviso.titulo}' terminó (${aviso.hora}).`;
+    addGuardianMessage(`🔔 ${cuerpo}`, false);
+    if (!('Notification' in window) || Notification.permission !== 'granted' || !('serviceWorker' in navigator)) return;
+    // La notificación la muestra el service worker: así también aparece con la pestaña en segundo plano.
+    navigator.serviceWorker.ready
+        .then(registro => registro.showNotification(titulo, { body: cuerpo, icon: 'icon-192.png', badge: 'icon-192.png', tag: aviso.item_id }))
+        .catch(error => console.warn("No se pudo mostrar la notificación:", error));
+}
+
+// El permiso se pide con un gesto del usuario (el navegador lo exige).
+function pedirPermisoAvisos() {
+    if ('Notification' in window && Notification.permission === 'default') {
+        Notification.requestPermission().catch(() => {});
+    }
+}
+
 async function llamarALE(comando) {
+    // Con comandos en cola, los nuevos van detrás para respetar el orden de la conversación.
+    const enCola = await contarCola().catch(() => 0);
+    if (enCola || !navigator.onLine) {
+        if (enCola || debeEncolarse(comando)) {
+            await encolar(comando);
+        } else {
+            addGuardianMessage("Sin conexión. La charla necesita al núcleo A.L.E.; los tickets y contratos sí se guardan para enviarlos después.", false);
+        }
+        return;
+    }
+
     showThinkingIndicator();
+    let burbujaEnVivo = null;
+    let respuestaRecibida = false;
 
     try {
-        const respuestaServidor = await fetch(URL_ALE_SERVER, {
+        const respuestaServidor = await fetch(URL_ALE_STREAM, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 comando: comando,
-                skillset_target: 'guardian',
-                estado_conversacion: estadoConversacion
+                // El Archivista corre en abanico junto al Guardián y añade lo relacionado.
+                skillset_target: ['guardian', 'archivista'],
+                usuario_id: USUARIO_ID,
+                sesion_token: sesionToken,
+                // Sin token todavía, el estado local siembra la sesión nueva.
+                ...(sesionToken ? {} : { estado_conversacion: estadoConversacion })
             })
         });
 
+        respuestaRecibida = true;
         if (!respuestaServidor.ok) {
             throw new Error(`Error ${respuestaServidor.status} del servidor A.L.E.`);
         }
 
-        const respuesta = await respuestaServidor.json();
-        removeThinkingIndicator();
-
-        if (respuesta.accion_ui) {
-            if (respuesta.accion_ui === 'MOSTRAR_RULETA') {
-                mostrarRuleta(respuesta.opciones_ruleta);
+        await leerMarcos(respuestaServidor, (marco) => {
+            if (marco.tipo === 'fragmento') {
+                // Los tokens de la charla se pintan a medida que llegan.
+                if (!burbujaEnVivo) {
+                    removeThinkingIndicator();
+                    burbujaEnVivo = crearBurbuja('guardian');
+                }
+                burbujaEnVivo.textContent += marco.texto;
+                history.scrollTop = history.scrollHeight;
+                return;
             }
-        } 
-        else if (respuesta.mensaje_para_ui) {
-            addGuardianMessage(respuesta.mensaje_para_ui, true);
-        }
-
-        if (respuesta.nuevo_estado) {
-            estadoConversacion = respuesta.nuevo_estado;
-            // Guardamos el estado después de recibirlo del servidor.
-            // Esto es importante para que el estado también sea persistente.
-            guardarHistorial();
-        }
+            procesarRespuestaFinal(marco, burbujaEnVivo);
+        });
+        sincronizarArchivo();
 
     } catch (error) {
         console.error("Error en llamarALE:", error);
         removeThinkingIndicator();
+        // Si fetch falló sin respuesta, el comando no llegó al servidor: se encola.
+        if (!respuestaRecibida && debeEncolarse(comando)) {
+            await encolar(comando);
+            return;
+        }
         addGuardianMessage("Error de conexión con el núcleo A.L.E. Revisa la consola.", false);
     }
 }
+
+// Aplica un delta de estado del servidor: {fijar: {...}, quitar: [...]}.
+function aplicarDelta(estado, delta) {
+    const nuevoEstado = { ...estado };
+    (delta.quitar || []).forEach(clave => delete nuevoEstado[clave]);
+    return Object.assign(nuevoEstado, delta.fijar || {});
+}
+
+function procesarRespuestaFinal(respuesta, burbujaEnVivo) {
+    removeThinkingIndicator();
+
+    if (respuesta.accion_ui) {
+        if (respuesta.accion_ui === 'MOSTRAR_RULETA') {
+            mostrarRuleta(respuesta.opciones_ruleta);
+        }
+    }
+    else if (burbujaEnVivo) {
+        // El texto ya se mostró en streaming: el marco final trae la versión completa.
+        if (respuesta.mensaje_para_ui) burbujaEnVivo.textContent = respuesta.mensaje_para_ui;
+        registrarMensaje('guardian', burbujaEnVivo.textContent);
+    }
+    else if (respuesta.mensaje_para_ui) {
+        addGuardianMessage(respuesta.mensaje_para_ui, true);
+    }
+    else if (respuesta.error) {
+        addGuardianMessage(respuesta.error, false);
+    }
+
+    if (respuesta.sesion_token) {
+        sesionToken = respuesta.sesion_token;
+        localStorage.setItem('guardian_sesion_token', sesionToken);
+    }
+
+    if (respuesta.estado_delta) {
+        estadoConversacion = aplicarDelta(estadoConversacion, respuesta.estado_delta);
+        guardarEstado();
+    }
+    else if (respuesta.nuevo_estado) {
+        estadoConversacion = respuesta.nuevo_estado;
+        // Guardamos el estado después de recibirlo del servidor.
+        // Esto es importante para que el estado también sea persistente.
+        guardarEstado();
+    }
+}
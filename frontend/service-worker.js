@@ -4,101 +4,64 @@
 
 // --- PASO 1: FUNCIONES PARA ACCEDER A LA BASE DE DATOS (IndexedDB) ---
 
-// Función para abrir la base de datos. Es como pedir la llave de la caja fuerte.
-function openDB() {
-    return new Promise((resolve, reject) => {
-        const request = indexedDB.open('GuardianDB', 1);
-        request.onerror = () => reject("Error abriendo DB");
-        request.onsuccess = () => resolve(request.result);
-        // Si la DB no existe, la crea con nuestro "almacén" de sistema.
-        request.onupgradeneeded = event => {
-            const db = event.target.result;
-            db.createObjectStore('sistema', { keyPath: 'id' });
-        };
-    });
-}
+// La base de datos es la misma que usa la app: openDB(), leerSistema(), etc.
+importScripts('./db.js');
 
-// Función para leer los datos desde la base de datos.
-async function getSistemaData() {
-    const db = await openDB();
-    return new Promise((resolve, reject) => {
-        const transaction = db.transaction(['sistema'], 'readonly');
-        const store = transaction.objectStore('sistema');
-        // Leemos el objeto que siempre guardamos con la misma clave: 'estado_actual'.
-        const request = store.get('estado_actual');
-        request.onerror = () => reject("Error leyendo datos");
-        // Si lo encuentra, devuelve los datos; si no, devuelve null.
-        request.onsuccess = () => resolve(request.result ? request.result.data : null);
-    });
-}
+// Archivos de la app que se guardan para poder abrirla sin conexión.
+// Al cambiar alguno de forma incompatible, subir la versión de la caché.
+const CACHE_APP = 'guardian-app-v2';
+const ARCHIVOS_APP = ['./', './index.html', './style.css', './db.js', './main.js', './manifest.json', './icon-192.png'];
 
-// --- PASO 2: LA LÓGICA DE NOTIFICACIÓN ---
-
-// Esta es tu función 'checkAndNotifyMissions', pero adaptada y corregida.
-async function checkAndNotifyContracts() {
-    console.log('Service Worker despertó para chequear Contratos.');
-    
-    // Leemos los datos desde IndexedDB, no desde localStorage.
-    const sistema = await getSistemaData();
-    
-    if (!sistema || !Array.isArray(sistema.contratos) || sistema.contratos.length === 0) {
-        console.log('No hay sistema o no hay contratos para chequear.');
-        return;
-    }
-
-    const ahora = new Date();
-
-    sistema.contratos.forEach(contrato => {
-        // Solo nos importan los contratos que están 'agendados'.
-        if (contrato.estado !== 'agendado') return;
-
-        // Convertimos la hora del contrato (ej: "22:30") a un objeto Date de hoy.
-        const [horas, minutos] = contrato.inicio.split(':');
-        const horaInicio = new Date();
-        horaInicio.setHours(horas, minutos, 0, 0);
-
-        // Si la hora del contrato ya pasó...
-        if (horaInicio <= ahora) {
-            console.log(`Notificando Contrato: ${contrato.mision}`);
-            
-            // Mostramos la notificación.
-            self.registration.showNotification(`Guardián: ¡Es la hora!`, {
-                body: `El Contrato '${contrato.mision}' ha comenzado.`,
-                icon: 'icon-192.png', // Usa el ícono que definiste.
-                badge: 'icon-192.png' // Ícono para la barra de notificaciones.
-            });
-            
-            // Aquí podríamos añadir lógica para marcar el contrato como 'notificado',
-            // pero por ahora, lo mantenemos simple.
-        }
-    });
-}
+// --- PASO 2: LAS NOTIFICACIONES ---
+// Los avisos de arranque los envía el servidor por '/eventos' y la app los
+// muestra con 'showNotification' (ver main.js): aquí ya no se revisan los
+// contratos a intervalos. Al tocar una notificación se abre (o enfoca) la app.
+self.addEventListener('notificationclick', event => {
+    event.notification.close();
+    event.waitUntil(
+        self.clients.matchAll({ type: 'window', includeUncontrolled: true }).then(ventanas => {
+            const abierta = ventanas.find(ventana => 'focus' in ventana);
+            return abierta ? abierta.focus() : self.clients.openWindow('./');
+        })
+    );
+});
 
 // --- PASO 3: LOS "LISTENERS" DEL SERVICE WORKER ---
 
 // Se activa cuando el SW se instala por primera vez.
 self.addEventListener('install', event => {
     console.log('Service Worker instalado.');
+    event.waitUntil(caches.open(CACHE_APP).then(cache => cache.addAll(ARCHIVOS_APP)));
     // Forzamos al nuevo SW a activarse inmediatamente.
     self.skipWaiting();
 });
 
-// Se activa cuando el SW toma el control.
+// Se activa cuando el SW toma el control: borra las cachés de versiones anteriores.
 self.addEventListener('activate', event => {
     console.log('Service Worker activado.');
-});
-
-// El evento que se dispara periódicamente en segundo plano.
-self.addEventListener('periodicsync', event => {
-    // Nos aseguramos de que es nuestra tarea programada.
-    if (event.tag === 'check-contracts') {
-        event.waitUntil(checkAndNotifyContracts());
-    }
+    event.waitUntil(
+        caches.keys()
+            .then(nombres => Promise.all(nombres.filter(nombre => nombre !== CACHE_APP).map(nombre => caches.delete(nombre))))
+            .then(() => self.clients.claim())
+    );
 });
 
 // Un listener para el evento 'fetch'. Es necesario para que la PWA sea 100% instalable.
-// Por ahora, no hace nada, pero es crucial que esté aquí.
+// Los archivos de la app van primero a la red (para recibir las actualizaciones) y,
+// sin conexión, salen de la caché. Las llamadas al servidor A.L.E. no se tocan:
+// de su cola offline se encarga main.js.
 self.addEventListener('fetch', event => {
-  // No intervenimos en las peticiones de red, simplemente las dejamos pasar.
-  return;
+  const url = new URL(event.request.url);
+  if (event.request.method !== 'GET' || url.origin !== self.location.origin) return;
+  event.respondWith(
+    fetch(event.request)
+      .then(respuesta => {
+        if (respuesta.ok) {
+          const copia = respuesta.clone();
+          caches.open(CACHE_APP).then(cache => cache.put(event.request, copia));
+        }
+        return respuesta;
+      })
+      .catch(() => caches.match(event.request, { ignoreSearch: true }))
+  );
 });